@@ -0,0 +1,98 @@
+import asyncio
+import hashlib
+from typing import Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes idénticas en una sola (single-flight).
+
+    La primera llamada con una clave lanza la petición real; las que llegan mientras
+    está en curso esperan a esa misma petición y reciben el mismo resultado. La petición
+    real lleva el plazo de la primera llamada (copia su contexto) y se cancela cuando
+    todas las llamadas que la esperan se han cancelado.
+
+    Atributos:
+    - inflight (dict): Peticiones en curso por clave.
+    - waiters (dict): Llamadas que esperan cada petición en curso.
+    - requests (int): Número total de llamadas recibidas.
+    - leaders (int): Número de llamadas que han ido realmente al upstream.
+    - coalesced (int): Número de llamadas que han reutilizado una petición en curso.
+    """
+
+    def __init__(self):
+        self.inflight: Dict[Hashable, asyncio.Task] = {}
+        self.waiters: Dict[Hashable, int] = {}
+        self.requests = 0
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        """
+        Ejecuta fn una sola vez para todas las llamadas concurrentes con la misma clave.
+
+        La petición se ejecuta en su propia tarea, así que si el cliente que la lanzó se
+        desconecta el resto de clientes que esperan no se ven afectados; si se desconectan
+        todos, se cancela.
+
+        Args:
+        - key (Hashable): Clave que identifica peticiones equivalentes.
+        - fn (Callable): Corrutina que realiza la petición real.
+
+        Returns:
+        - El resultado de fn, compartido entre todas las llamadas.
+        """
+        self.requests += 1
+        task = self.inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        self.waiters[key] = self.waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self.waiters[key] == 1:
+                task.cancel()
+            raise
+        finally:
+            self.waiters[key] -= 1
+            if not self.waiters[key]:
+                del self.waiters[key]
+
+    def metrics(self):
+        """
+        Métricas de coalescencia.
+
+        Returns:
+        - dict: Contadores y ratio de llamadas que no han llegado al upstream.
+        """
+        return {
+            "requests": self.requests,
+            "upstream_requests": self.leaders,
+            "coalesced": self.coalesced,
+            "coalescing_ratio": self.coalesced / self.requests if self.requests else 0.0,
+            "inflight": len(self.inflight),
+        }
+
+
+def scope_key(scope: str, headers) -> str:
+    """
+    Calcula la parte de la clave de coalescencia que depende de quién hace la petición.
+
+    Args:
+    - scope (str): "user" para no compartir respuestas entre credenciales distintas,
+      "global" para compartirlas entre todos los clientes.
+    - headers: Cabeceras de la petición.
+
+    Returns:
+    - str: Identificador del ámbito. Las credenciales se guardan solo como hash.
+    """
+    if scope == "global":
+        return "global"
+    credentials = headers.get("authorization", "") + \
+        "|" + headers.get("cookie", "")
+    return hashlib.sha256(credentials.encode()).hexdigest()
@@ -0,0 +1,150 @@
+import random
+import time
+from typing import Dict, List
+
+
+class NoInstanceError(Exception):
+    """
+    Se lanza cuando un servicio no tiene ninguna instancia disponible.
+    """
+
+
+class Instance:
+    """
+    Instancia de un microservicio y su estado de carga y salud.
+    """
+
+    __slots__ = ("url", "outstanding", "failures",
+                 "ejected_until", "added_at", "requests")
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.added_at = time.monotonic()
+        self.requests = 0
+
+
+class InstancePool:
+    """
+    Conjunto de instancias de un microservicio con balanceo de carga.
+
+    Estrategias:
+    - "least_outstanding": la instancia con menos peticiones en curso.
+    - "p2c": power of two choices; se comparan dos instancias al azar y se elige la menos cargada.
+
+    Las instancias nuevas arrancan con slow start: su peso crece linealmente durante
+    slow_start segundos, de modo que reciben una fracción creciente del tráfico. Una
+    instancia con eject_after fallos consecutivos queda fuera durante eject_seconds.
+
+    Atributos:
+    - instances (dict): Instancias por URL.
+    - static (list): URLs de la configuración estática; siempre forman parte del conjunto.
+    """
+
+    def __init__(self, urls: List[str], strategy: str = "p2c", slow_start: float = 30,
+                 eject_after: int = 3, eject_seconds: float = 30):
+        self.strategy = strategy
+        self.slow_start = slow_start
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.static = [url.rstrip("/") for url in urls]
+        self.instances: Dict[str, Instance] = {}
+        self.update([])
+        # Las instancias de la configuración inicial no pasan por slow start
+        for instance in self.instances.values():
+            instance.added_at -= slow_start
+
+    def update(self, urls: List[str]):
+        """
+        Sincroniza las instancias con la lista descubierta más la configuración estática,
+        conservando el estado de las que siguen. Las instancias estáticas no se retiran
+        aunque no estén en el registro; si no responden, las expulsa release().
+
+        Args:
+        - urls (List[str]): URLs de las instancias vivas según el registro.
+        """
+        urls = list(dict.fromkeys([*self.static, *(url.rstrip("/") for url in urls)]))
+        for url in urls:
+            if url not in self.instances:
+                self.instances[url] = Instance(url)
+        for url in list(self.instances):
+            if url not in urls:
+                del self.instances[url]
+
+    def _weight(self, instance: Instance, now: float):
+        if self.slow_start <= 0:
+            return 1.0
+        return min(1.0, max(0.1, (now - instance.added_at) / self.slow_start))
+
+    def _load(self, instance: Instance, now: float):
+        return (instance.outstanding + 1) / self._weight(instance, now)
+
+    def acquire(self):
+        """
+        Elige una instancia y le cuenta una petición en curso.
+
+        Raises:
+        - NoInstanceError: Si no hay instancias disponibles.
+
+        Returns:
+        - Instance: La instancia elegida; hay que devolverla con release().
+        """
+        now = time.monotonic()
+        available = [instance for instance in self.instances.values()
+                     if instance.ejected_until <= now]
+        if not available:
+            raise NoInstanceError()
+
+        if self.strategy == "least_outstanding" or len(available) < 3:
+            instance = min(
+                available, key=lambda candidate: self._load(candidate, now))
+        else:
+            first, second = random.sample(available, 2)
+            instance = first if self._load(
+                first, now) <= self._load(second, now) else second
+
+        instance.outstanding += 1
+        instance.requests += 1
+        return instance
+
+    def available(self):
+        """
+        Número de instancias que no están expulsadas.
+        """
+        now = time.monotonic()
+        return sum(1 for instance in self.instances.values() if instance.ejected_until <= now)
+
+    def release(self, instance: Instance, ok: bool, down: bool = False):
+        """
+        Devuelve una instancia tras la petición y actualiza su salud (expulsión pasiva).
+
+        Args:
+        - instance (Instance): La instancia usada.
+        - ok (bool): Si la petición ha ido bien.
+        - down (bool): Si la instancia no acepta conexiones; se expulsa sin esperar a eject_after.
+        """
+        instance.outstanding -= 1
+        if ok:
+            instance.failures = 0
+            return
+        instance.failures += 1
+        if down or instance.failures >= self.eject_after:
+            instance.ejected_until = time.monotonic() + self.eject_seconds
+            instance.failures = 0
+            # Al volver, la instancia repite el slow start
+            instance.added_at = instance.ejected_until
+
+    def snapshot(self):
+        """
+        Estado de las instancias para monitorización.
+        """
+        now = time.monotonic()
+        return [{
+            "url": instance.url,
+            "outstanding": instance.outstanding,
+            "requests": instance.requests,
+            "ejected": instance.ejected_until > now,
+            "weight": round(self._weight(instance, now), 2),
+        } for instance in self.instances.values()]
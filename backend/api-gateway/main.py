@@ -1,14 +1,64 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
+from contextlib import asynccontextmanager
+import asyncio
 import httpx
+# Codificaciones que httpx descomprime al leer la respuesta
+from httpx._decoders import SUPPORTED_DECODERS
 import uvicorn
 import logging
+import os
+import sys
+
+# El gateway se arranca desde su carpeta (python main.py), pero usa los módulos comunes de
+# ddbb como los microservicios: la raíz del backend se añade al path si no está en
+# PYTHONPATH
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
+
+from coalescing import SingleFlight, scope_key
+from ddbb import deadline
+from ddbb.profiling import ProfilingMiddleware
+from ddbb.redis.registry import get_registry_client, list_instances
+from ddbb.tracing import TracingMiddleware, TracingTransport
+from discovery import InstancePool, NoInstanceError
+from resilience import CircuitOpenError, UpstreamPolicy, send_with_policy
+
+# Presupuesto en ms de las peticiones que llegan al gateway sin X-Request-Deadline-Ms
+GATEWAY_DEADLINE_MS = float(os.getenv("GATEWAY_DEADLINE_MS", 15000))
 
 # Configuración del logger
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-app = FastAPI()
+# Cliente HTTP compartido: reutiliza conexiones con los microservicios entre peticiones
+http_client: httpx.AsyncClient = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global http_client
+    # El transporte propaga la traza (traceparent) y el plazo restante a los microservicios
+    http_client = httpx.AsyncClient(transport=deadline.DeadlineTransport(
+        TracingTransport(httpx.AsyncHTTPTransport())))
+    discovery_task = None
+    if DISCOVERY_ENABLED:
+        discovery_task = asyncio.create_task(discovery_loop())
+    yield
+    if discovery_task:
+        discovery_task.cancel()
+    await http_client.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
+# Perfila las peticiones con X-Profile autorizado y una muestra para los flamegraphs por ruta
+app.add_middleware(ProfilingMiddleware, service_name="api-gateway")
+# Fija el plazo de cada petición (GATEWAY_DEADLINE_MS si el cliente no envía el suyo)
+# y cancela las llamadas a los microservicios si el cliente se desconecta
+app.add_middleware(deadline.DeadlineMiddleware, default_ms=GATEWAY_DEADLINE_MS)
+# Inicia la traza de cada petición (o continúa la del cliente si envía traceparent)
+app.add_middleware(TracingMiddleware, service_name="api-gateway")
 
 # Microservicios configurados
 MICROSERVICES = {
@@ -17,41 +67,196 @@ MICROSERVICES = {
     "notification": "http://localhost:8002",
 }
 
-async def forward_request(service: str, path: str):
+# Estrategia de balanceo entre instancias: "p2c" o "least_outstanding"
+UPSTREAM_BALANCER = os.getenv("UPSTREAM_BALANCER", "p2c")
+# Descubrimiento de instancias en el registro de Redis (además de la configuración estática)
+DISCOVERY_ENABLED = os.getenv("GATEWAY_DISCOVERY", "false").lower() == "true"
+DISCOVERY_INTERVAL = float(os.getenv("GATEWAY_DISCOVERY_INTERVAL", 5))
+
+
+def _pool(service: str):
+    urls = os.getenv(f"UPSTREAM_{service.upper()}_URLS", MICROSERVICES[service])
+    return InstancePool(
+        [url.strip() for url in urls.split(",") if url.strip()],
+        strategy=UPSTREAM_BALANCER,
+        slow_start=float(os.getenv("UPSTREAM_SLOW_START", 30)),
+        eject_after=int(os.getenv("UPSTREAM_EJECT_AFTER", 3)),
+        eject_seconds=float(os.getenv("UPSTREAM_EJECT_SECONDS", 30)),
+    )
+
+
+# Instancias de cada microservicio
+UPSTREAM_POOLS = {service: _pool(service) for service in MICROSERVICES}
+
+
+def _policy(service: str, timeout: float, hedge: bool):
+    prefix = f"UPSTREAM_{service.upper()}"
+    return UpstreamPolicy(
+        timeout=float(os.getenv(f"{prefix}_TIMEOUT", timeout)),
+        retries=int(os.getenv(f"{prefix}_RETRIES", 2)),
+        hedge=os.getenv(f"{prefix}_HEDGE", str(hedge)).lower() == "true",
+        failure_threshold=int(os.getenv(f"{prefix}_BREAKER_FAILURES", 5)),
+        reset_timeout=float(os.getenv(f"{prefix}_BREAKER_RESET", 30)),
+    )
+
+
+# Timeout, reintentos, hedging y circuit breaker de cada microservicio
+UPSTREAM_POLICIES = {
+    "tickets": _policy("tickets", timeout=5, hedge=True),
+    "auth": _policy("auth", timeout=10, hedge=False),
+    "notification": _policy("notification", timeout=5, hedge=True),
+}
+
+# Ámbito de coalescencia por microservicio: "user" (por credenciales), "global" o "none"
+COALESCE_SCOPES = {
+    "tickets": os.getenv("COALESCE_SCOPE_TICKETS", "user"),
+    "auth": os.getenv("COALESCE_SCOPE_AUTH", "none"),
+    "notification": os.getenv("COALESCE_SCOPE_NOTIFICATION", "user"),
+}
+
+async def discovery_loop():
+    """
+    Actualiza periódicamente las instancias de cada microservicio desde el registro de Redis.
+
+    Las instancias registradas se suman a la configuración estática de cada servicio, que
+    se mantiene también si el registro no tiene ninguna o no responde.
+    """
+    client = get_registry_client()
+    try:
+        while True:
+            for service, pool in UPSTREAM_POOLS.items():
+                try:
+                    urls = await list_instances(client, service)
+                except Exception as e:
+                    logger.error(f"Error consultando el registro de {service}: {e}")
+                    continue
+                pool.update(urls)
+            await asyncio.sleep(DISCOVERY_INTERVAL)
+    finally:
+        await client.aclose()
+
+
+# Cabeceras del cliente que se reenvían al microservicio: credenciales, identificador del
+# cliente (ventana read-your-writes), negociación de formato y peticiones condicionales o
+# parciales
+FORWARDED_HEADERS = ("authorization", "cookie", "x-client-id", "accept", "accept-encoding",
+                     "if-none-match", "if-match", "if-modified-since", "range", "if-range")
+# Las que no identifican al cliente pueden cambiar la respuesta (formato, 304, 412, 206):
+# forman parte de la clave de coalescencia para no devolver a un cliente la respuesta de otro
+VARY_HEADERS = tuple(name for name in FORWARDED_HEADERS
+                     if name not in ("authorization", "cookie", "x-client-id"))
+# Cabeceras de la respuesta del microservicio que se devuelven al cliente
+RETURNED_HEADERS = ("content-type", "etag", "last-modified", "cache-control", "location",
+                    "content-disposition", "content-range", "accept-ranges", "retry-after",
+                    "x-next-cursor", "x-export-checkpoint", "idempotent-replayed")
+JSON_HEADERS = {"content-type": "application/json"}
+
+single_flight = SingleFlight()
+
+
+async def forward_request(service: str, path: str, query: str = "", headers: dict = None):
     """
     Reenvía una solicitud GET al microservicio especificado.
 
     Args:
         service (str): El nombre del microservicio al que se enviará la solicitud.
         path (str): La ruta del endpoint dentro del microservicio.
+        query (str): La query string de la solicitud original.
+        headers (dict): Las cabeceras que se reenvían al microservicio.
 
     Returns:
-        dict: La respuesta JSON del microservicio.
+        tuple: (código de estado, cuerpo en bytes, cabeceras de RETURNED_HEADERS) de la respuesta.
     """
-    url = f"{MICROSERVICES[service]}/{path}"
-    logger.info(f"Reenviando solicitud a {url}")
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        return response.json()
+    url = f"{path}?{query}" if query else path
+    logger.info(f"Reenviando solicitud a {service}/{url}")
+    try:
+        response = await send_with_policy(
+            http_client, UPSTREAM_POLICIES[service], UPSTREAM_POOLS[service], "GET", url, headers)
+    except CircuitOpenError:
+        logger.error(f"Circuito abierto para {service}")
+        return 503, b'{"error":"Servicio no disponible"}', JSON_HEADERS
+    except NoInstanceError:
+        logger.error(f"Sin instancias disponibles para {service}")
+        return 503, b'{"error":"Servicio no disponible"}', JSON_HEADERS
+    except deadline.DeadlineExceeded:
+        logger.error(f"Plazo vencido llamando a {service}/{url}")
+        return 504, b'{"error":"Deadline exceeded"}', JSON_HEADERS
+    except httpx.TimeoutException:
+        logger.error(f"Timeout llamando a {url}")
+        return 504, b'{"error":"Timeout del servicio"}', JSON_HEADERS
+    except httpx.HTTPError as e:
+        logger.error(f"Error llamando a {url}: {e}")
+        return 502, b'{"error":"Error del servicio"}', JSON_HEADERS
+    return response.status_code, response.content, _returned_headers(service, response)
+
+
+def _returned_headers(service: str, response: httpx.Response):
+    """
+    Cabeceras de la respuesta del microservicio que se devuelven al cliente.
+
+    Las redirecciones del microservicio (p. ej. a un ticket trasladado de shard) apuntan a
+    sus propias rutas; se les antepone el prefijo del servicio en el gateway. httpx ya ha
+    descomprimido el cuerpo si sabe hacerlo; si no, se conserva su Content-Encoding.
+    """
+    headers = {name: response.headers[name] for name in RETURNED_HEADERS if name in response.headers}
+    location = headers.get("location")
+    if location and location.startswith("/"):
+        headers["location"] = f"/{service}{location}"
+    encoding = response.headers.get("content-encoding")
+    if encoding and encoding not in SUPPORTED_DECODERS:
+        headers["content-encoding"] = encoding
+    return headers
+
+
+@app.get("/gateway/metrics")
+async def gateway_metrics():
+    """
+    Métricas del gateway: peticiones agrupadas por single-flight y estado de los circuit breakers.
+    """
+    return {
+        "coalescing": single_flight.metrics(),
+        "deadlines": deadline.stats(),
+        "upstreams": {service: policy.snapshot() for service, policy in UPSTREAM_POLICIES.items()},
+        "instances": {service: pool.snapshot() for service, pool in UPSTREAM_POOLS.items()},
+    }
 
 
 @app.get("/{service}/{path:path}")
-async def gateway(service: str, path: str):
+async def gateway(service: str, path: str, request: Request):
     """
     Gateway para reenviar solicitudes a microservicios.
 
+    Las peticiones idénticas concurrentes (mismo método, ruta, query, Accept,
+    Accept-Encoding y ámbito de credenciales) comparten una única llamada al microservicio.
+
     Args:
         service (str): El nombre del microservicio al que se enviará la solicitud.
         path (str): La ruta del endpoint dentro del microservicio.
 
     Returns:
-        dict: La respuesta del microservicio.
+        Response: La respuesta del microservicio.
     """
     logger.info(f"Reenviando solicitud a {service}/{path}")
     if service not in MICROSERVICES:
         logger.error(f"Microservicio {service} no encontrado")
         return {"error": "Microservicio no encontrado"}
-    return await forward_request(service, path)
+
+    query = request.url.query
+    headers = {name: request.headers[name]
+               for name in FORWARDED_HEADERS if name in request.headers}
+
+    scope = COALESCE_SCOPES.get(service, "user")
+    if scope == "none":
+        status_code, body, response_headers = await forward_request(service, path, query, headers)
+    else:
+        key = (request.method, service, path, query,
+               tuple(request.headers.get(name, "") for name in VARY_HEADERS),
+               scope_key(scope, request.headers))
+        status_code, body, response_headers = await single_flight.do(
+            key, lambda: forward_request(service, path, query, headers))
+    return Response(content=body, status_code=status_code, headers=response_headers)
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8080, reload=True)
\ No newline at end of file
+    # Desde backend/api-gateway: python main.py (o, desde backend,
+    # uvicorn main:app --app-dir api-gateway --port 8080)
+    uvicorn.run("main:app", host="0.0.0.0", port=8080, reload=True)
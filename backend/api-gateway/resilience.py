@@ -0,0 +1,290 @@
+import asyncio
+import random
+import time
+from collections import deque
+
+import httpx
+
+from ddbb.deadline import DEADLINE_MIN_MS, DeadlineExceeded, check_deadline, remaining
+from discovery import InstancePool, NoInstanceError
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+# Respuestas del upstream que cuentan como fallo para el breaker y permiten reintentar
+RETRYABLE_STATUS = {502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """
+    Se lanza cuando el circuito del microservicio está abierto y la petición no se envía.
+    """
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de tres estados (closed, open, half_open) para un microservicio.
+
+    Tras failure_threshold fallos consecutivos se abre y rechaza peticiones durante
+    reset_timeout segundos; después deja pasar half_open_max peticiones de prueba y vuelve
+    a cerrarse si salen bien o a abrirse si alguna falla.
+
+    Atributos:
+    - state (str): Estado actual del circuito.
+    - failures (int): Fallos consecutivos registrados.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30, half_open_max: int = 1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max = half_open_max
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.half_open_inflight = 0
+        self.rejected = 0
+
+    def allow(self):
+        """
+        Indica si se puede enviar una petición y, en half_open, reserva un hueco de prueba.
+
+        Raises:
+        - CircuitOpenError: Si el circuito está abierto.
+        """
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                raise CircuitOpenError()
+            self.state = self.HALF_OPEN
+            self.half_open_inflight = 0
+
+        if self.state == self.HALF_OPEN:
+            if self.half_open_inflight >= self.half_open_max:
+                self.rejected += 1
+                raise CircuitOpenError()
+            self.half_open_inflight += 1
+
+    def record_success(self):
+        self.failures = 0
+        if self.state == self.HALF_OPEN:
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def snapshot(self):
+        """
+        Estado del circuito para monitorización.
+        """
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "rejected": self.rejected,
+            "open_for": round(time.monotonic() - self.opened_at, 2) if self.state == self.OPEN else None,
+        }
+
+
+class LatencyTracker:
+    """
+    Ventana deslizante con las latencias recientes de un microservicio.
+    """
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, p: float):
+        """
+        Percentil p (0-100) de la ventana, o None si aún no hay muestras suficientes.
+        """
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class UpstreamPolicy:
+    """
+    Política de llamada a un microservicio.
+
+    Atributos:
+    - timeout (float): Presupuesto en segundos de cada intento.
+    - retries (int): Reintentos máximos para métodos idempotentes.
+    - hedge (bool): Si se lanza una segunda petición GET al superar el p95.
+    - breaker (CircuitBreaker): Circuit breaker del microservicio.
+    - latency (LatencyTracker): Latencias recientes del microservicio.
+    """
+
+    def __init__(self, timeout: float, retries: int = 2, hedge: bool = False,
+                 failure_threshold: int = 5, reset_timeout: float = 30):
+        self.timeout = timeout
+        self.retries = retries
+        self.hedge = hedge
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.latency = LatencyTracker()
+        self.hedged = 0
+
+    def snapshot(self):
+        p95 = self.latency.percentile(95)
+        return {
+            **self.breaker.snapshot(),
+            "timeout": self.timeout,
+            "p95_ms": round(p95 * 1000, 2) if p95 is not None else None,
+            "hedged_requests": self.hedged,
+        }
+
+
+async def _attempt(client: httpx.AsyncClient, policy: UpstreamPolicy, pool: InstancePool,
+                   method: str, path: str, headers: dict):
+    """
+    Un intento contra una instancia del upstream, registrado en el breaker, en las
+    latencias y en la salud de la instancia.
+    """
+    policy.breaker.allow()
+    try:
+        instance = pool.acquire()
+    except NoInstanceError:
+        if policy.breaker.state == CircuitBreaker.HALF_OPEN:
+            policy.breaker.half_open_inflight -= 1
+        raise
+    start = time.monotonic()
+    try:
+        response = await client.request(method, f"{instance.url}/{path}", headers=headers,
+                                        timeout=policy.timeout)
+    except (asyncio.CancelledError, DeadlineExceeded):
+        # Cancelado por el hedging o por el cliente, o sin plazo: no es un fallo del upstream
+        pool.release(instance, ok=True)
+        if policy.breaker.state == CircuitBreaker.HALF_OPEN:
+            policy.breaker.half_open_inflight -= 1
+        raise
+    except httpx.TimeoutException:
+        left = remaining()
+        if left is not None and left * 1000 < DEADLINE_MIN_MS:
+            # El timeout era el plazo de la petición, no la política del upstream
+            pool.release(instance, ok=True)
+            if policy.breaker.state == CircuitBreaker.HALF_OPEN:
+                policy.breaker.half_open_inflight -= 1
+            raise DeadlineExceeded()
+        pool.release(instance, ok=False)
+        policy.breaker.record_failure()
+        raise
+    except httpx.ConnectError:
+        # Instancia caída: se expulsa ya y solo cuenta para el breaker si no quedan otras
+        pool.release(instance, ok=False, down=True)
+        if pool.available():
+            if policy.breaker.state == CircuitBreaker.HALF_OPEN:
+                policy.breaker.half_open_inflight -= 1
+        else:
+            policy.breaker.record_failure()
+        raise
+    except httpx.HTTPError:
+        pool.release(instance, ok=False)
+        policy.breaker.record_failure()
+        raise
+
+    ok = response.status_code not in RETRYABLE_STATUS
+    pool.release(instance, ok)
+    if ok:
+        policy.breaker.record_success()
+        policy.latency.record(time.monotonic() - start)
+    else:
+        policy.breaker.record_failure()
+    return response
+
+
+async def _hedged_attempt(client: httpx.AsyncClient, policy: UpstreamPolicy, pool: InstancePool,
+                         method: str, path: str, headers: dict):
+    """
+    Lanza el intento y, si no ha respondido al llegar al p95, una segunda copia (que el
+    balanceador normalmente envía a otra instancia); devuelve la primera respuesta válida
+    y cancela la otra.
+    """
+    p95 = policy.latency.percentile(95)
+    first = asyncio.ensure_future(
+        _attempt(client, policy, pool, method, path, headers))
+    if p95 is None:
+        return await first
+
+    try:
+        done, _ = await asyncio.wait({first}, timeout=p95)
+    except asyncio.CancelledError:
+        # asyncio.wait no cancela las tareas que espera
+        first.cancel()
+        raise
+    if done:
+        return first.result()
+    if policy.breaker.state != CircuitBreaker.CLOSED:
+        # Con el circuito en prueba no se duplica la carga sobre el upstream
+        return await first
+
+    policy.hedged += 1
+    second = asyncio.ensure_future(
+        _attempt(client, policy, pool, method, path, headers))
+    pending = {first, second}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and task.result().status_code not in RETRYABLE_STATUS:
+                    return task.result()
+                error = task
+        return error.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def send_with_policy(client: httpx.AsyncClient, policy: UpstreamPolicy, pool: InstancePool,
+                           method: str, path: str, headers: dict = None):
+    """
+    Envía una petición aplicando timeout, circuit breaker, reintentos y hedging.
+
+    Los reintentos (con backoff exponencial y jitter) y el hedging solo se aplican a
+    métodos idempotentes; el hedging además solo a GET. Ningún intento empieza después
+    del plazo de la petición en curso, y el backoff no lo sobrepasa.
+
+    Args:
+    - client (httpx.AsyncClient): Cliente HTTP compartido.
+    - policy (UpstreamPolicy): Política del microservicio.
+    - pool (InstancePool): Instancias del microservicio; cada intento elige una.
+    - method (str): Método HTTP.
+    - path (str): Ruta (con query string) dentro del microservicio.
+    - headers (dict, optional): Cabeceras a reenviar.
+
+    Raises:
+    - CircuitOpenError: Si el circuito está abierto.
+    - NoInstanceError: Si no hay instancias disponibles.
+    - DeadlineExceeded: Si vence el plazo de la petición en curso.
+    - httpx.HTTPError: Si fallan todos los intentos por error de red o timeout.
+
+    Returns:
+    - httpx.Response: La respuesta del upstream (puede ser un 5xx si se agotan los reintentos).
+    """
+    idempotent = method in IDEMPOTENT_METHODS
+    attempts = 1 + (policy.retries if idempotent else 0)
+
+    for attempt in range(attempts):
+        last = attempt == attempts - 1
+        check_deadline()
+        try:
+            if method == "GET" and policy.hedge:
+                response = await _hedged_attempt(client, policy, pool, method, path, headers)
+            else:
+                response = await _attempt(client, policy, pool, method, path, headers)
+            if response.status_code not in RETRYABLE_STATUS or last:
+                return response
+        except httpx.HTTPError:
+            if last:
+                raise
+        backoff = min(1.0, 0.05 * 2 ** attempt) * random.random()
+        left = remaining()
+        await asyncio.sleep(backoff if left is None else max(0.0, min(backoff, left)))
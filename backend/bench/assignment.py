@@ -0,0 +1,73 @@
+"""
+Motor de asignación de tickets (user-038): reconstrucción del índice de carga y decisiones
+por segundo, frente a una consulta GROUP BY por decisión.
+
+10.000 agentes en dos equipos y 200.000 tickets en SQLite; Redis es fakeredis en proceso.
+
+    python -m bench.assignment
+"""
+from bench.common import per_call
+
+import random
+import time
+
+from sqlalchemy import insert, text
+
+from ddbb.database.db_postgres import SessionLocal, engine
+from ddbb.database.models import Role, Ticket, TicketStatus, User
+from ddbb.database.models.base import Base
+from ddbb.database.sharding import shards
+from services.ticket_service.services.assignment_service import AssignmentEngine
+
+AGENTS, TICKETS, OPS = 10_000, 200_000, 200_000
+
+random.seed(38)
+for shard_engine in shards.engines:
+    Base.metadata.create_all(bind=shard_engine)
+with SessionLocal() as db:
+    db.add_all([Role(id=1, name="customer"), Role(id=2, name="agent"), Role(id=3, name="billing")])
+    db.add_all([TicketStatus(id=i, name=name) for i, name in enumerate(["open", "in_progress", "closed"], 1)])
+    db.commit()
+    db.execute(insert(User), [
+        dict(id=i, email=f"a{i}@example.com", username=f"a{i}", full_name="a", phone="1",
+             hashed_password="x", role_id=2 if i % 2 else 3) for i in range(1, AGENTS + 1)])
+    db.execute(insert(Ticket), [
+        dict(title="t", description="d", status_id=random.choice([1, 2, 3]),
+             assignee_id=random.randint(1, AGENTS), version=1) for _ in range(TICKETS)])
+    db.commit()
+
+assignment = AssignmentEngine("least_open", ["agent", "billing"])
+start = time.perf_counter()
+assignment.rebuild()
+print(f"reconstrucción                    {(time.perf_counter() - start) * 1000:.0f} ms")
+# Sin sincronizar ni reconstruir durante la medida
+assignment._synced_at = assignment._rebuilt_at = float("inf")
+
+# Decisiones en memoria, sin el reflejo de los contadores en Redis
+assignment._mirror = lambda agent_id, delta: None
+start = time.perf_counter()
+for i in range(OPS):
+    agent_id = assignment.assign("billing" if i % 3 == 0 else None)
+    if i % 2:
+        assignment.status_changed(agent_id, "open", "closed")
+print(f"least_open en memoria             {OPS / (time.perf_counter() - start):,.0f} asignaciones+cambios/s")
+
+assignment.strategy = "round_robin"
+start = time.perf_counter()
+for _ in range(OPS):
+    assignment.assign()
+print(f"round_robin en memoria            {OPS / (time.perf_counter() - start):,.0f} asignaciones/s")
+
+del assignment._mirror
+assignment.strategy = "least_open"
+print(f"least_open con Redis (fakeredis)  {1 / per_call(assignment.assign, 20_000):,.0f} asignaciones/s")
+
+# Alternativa sin índice: el agente con menos tickets abiertos se calcula en cada decisión
+least_loaded = text(
+    "SELECT assignee_id, COUNT(*) AS open_tickets FROM tickets t "
+    "JOIN ticket_statuses s ON s.id = t.status_id "
+    "WHERE s.name != 'closed' AND assignee_id IS NOT NULL "
+    "GROUP BY assignee_id ORDER BY open_tickets LIMIT 1")
+with engine.connect() as connection:
+    seconds = per_call(lambda: connection.execute(least_loaded).all(), 20)
+print(f"GROUP BY por decisión             {1 / seconds:,.1f} asignaciones/s")
@@ -0,0 +1,52 @@
+"""
+Lectura de los comentarios de un ticket: ORM + validación con Pydantic + json frente a la
+selección de columnas + orjson que usa GET /tickets/{id}/comments/ (user-026).
+
+10.000 comentarios de un ticket en SQLite; se mide consulta y serialización.
+
+    python -m bench.comment_reads
+"""
+from bench.common import per_call
+
+import json
+from datetime import datetime
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from ddbb.database.db_postgres import SessionLocal, engine
+from ddbb.database.models import Comment
+from ddbb.database.models.base import Base
+from services.ticket_service.models.CommentBase import CommentBase
+from services.ticket_service.services.comment_service import (
+    get_comment_page_by_ticket_id, get_comments_by_ticket_id)
+
+ROWS = 10_000
+
+Base.metadata.create_all(bind=engine)
+with SessionLocal() as db:
+    db.execute(Comment.__table__.insert(), [
+        dict(content="x" * 200, created_at=datetime.now(), ticket_id=1, user_id=1, version=1)
+        for _ in range(ROWS)])
+    db.commit()
+
+comments_adapter = TypeAdapter(list[CommentBase])
+
+
+def orm_response_model():
+    with SessionLocal() as db:
+        rows = get_comments_by_ticket_id(db, 1)
+        return json.dumps(jsonable_encoder(
+            comments_adapter.validate_python(rows, from_attributes=True))).encode()
+
+
+def columns_orjson():
+    with SessionLocal() as db:
+        comments, _ = get_comment_page_by_ticket_id(db, 1, limit=ROWS)
+        return orjson.dumps(comments)
+
+
+assert json.loads(orm_response_model()) == json.loads(columns_orjson())
+for func in (orm_response_model, columns_orjson):
+    print(f"{func.__name__:20} {ROWS / per_call(func, 5):,.0f} filas/s")
@@ -0,0 +1,51 @@
+"""
+Entorno compartido por los benchmarks. Debe importarse antes que ddbb y los servicios, que
+leen la configuración al importarse: fija bases de datos SQLite nuevas en un directorio
+temporal (primario y un shard adicional), desactiva las tareas en segundo plano y sustituye
+Redis por fakeredis en el mismo proceso, de modo que los scripts no necesitan servicios
+externos. Requiere fakeredis (y lupa para los scripts Lua).
+
+Los benchmarks se ejecutan desde backend/ como módulos, por ejemplo:
+
+    python -m bench.comment_reads
+"""
+import os
+import tempfile
+import time
+
+import fakeredis
+import redis
+import redis.asyncio as aioredis
+
+DATA_DIR = tempfile.mkdtemp(prefix="ticket-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{DATA_DIR}/shard0.db"
+os.environ["DATABASE_SHARD_URLS"] = f"sqlite:///{DATA_DIR}/shard1.db"
+os.environ["DATABASE_REPLICA_URLS"] = ""
+os.environ["REDIS_URL"] = "redis://localhost:6379/15"
+os.environ["ATTACHMENT_ROOT"] = f"{DATA_DIR}/attachments"
+for name, value in (("SLA_SCHEDULER_ENABLED", "false"), ("ASSIGNMENT_STRATEGY", "none"),
+                    ("TICKET_ARCHIVE_INTERVAL_SECONDS", "0"), ("DEDUP_ENABLED", "false")):
+    os.environ.setdefault(name, value)
+
+# Todos los clientes (síncronos y asíncronos) comparten el mismo servidor en memoria
+_server = fakeredis.FakeServer()
+redis.Redis.from_url = classmethod(lambda cls, url, **kwargs: fakeredis.FakeRedis(server=_server))
+aioredis.from_url = lambda url, **kwargs: fakeredis.FakeAsyncRedis(server=_server)
+
+
+def per_call(func, repeat: int) -> float:
+    """
+    Mide el tiempo medio de una llamada, tras una primera de calentamiento.
+
+    Args:
+    - func (callable): Función sin argumentos a medir.
+    - repeat (int): Número de llamadas medidas.
+
+    Returns:
+    - float: Segundos por llamada.
+    """
+    func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
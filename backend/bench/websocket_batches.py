@@ -0,0 +1,73 @@
+"""
+Subprotocolos de los websockets de notificaciones (user-042): frames y bytes por cliente en
+el formato original (un objeto JSON por frame) y en los lotes notify.v1.json y
+notify.v1.msgpack, y tiempo de envío de la ráfaga a todas las conexiones.
+
+10.000 conexiones reciben 5 actualizaciones de un ticket publicadas seguidas. El tamaño
+con permessage-deflate se estima comprimiendo cada frame con zlib.
+
+    python -m bench.websocket_batches
+"""
+import bench.common  # noqa: F401
+
+import asyncio
+import time
+import zlib
+
+from services.notification_service.app.models.notification import NotificationContent
+from services.notification_service.app.services.codecs import EncodedNotification
+from services.notification_service.app.services.event_bus import EventBus
+
+CONNECTIONS, BURST = 10_000, 5
+
+
+class FakeSocket:
+    __slots__ = ("frames",)
+
+    def __init__(self):
+        self.frames = []
+
+    async def send_text(self, text):
+        self.frames.append(text)
+
+    async def send_bytes(self, data):
+        self.frames.append(data)
+
+    async def close(self, code=1000):
+        pass
+
+
+contents = [NotificationContent(
+    message=f"El ticket 4711 ha cambiado al estado in_progress (actualización {i})",
+    ticket_id="4711", notification_type="ticket_update") for i in range(BURST)]
+
+
+def deflated(frame):
+    # Sin la cabecera ni la suma de comprobación de zlib, como en permessage-deflate
+    return len(zlib.compress(frame if isinstance(frame, bytes) else frame.encode(), 6)[2:-4])
+
+
+async def burst(protocol, window):
+    bus = EventBus(batch_window=window)
+    sockets = [FakeSocket() for _ in range(CONNECTIONS)]
+    for user_id, websocket in enumerate(sockets):
+        await bus.subscribe(str(user_id), websocket, protocol)
+    task = asyncio.create_task(bus.broadcast_notifications())
+    # Sin subprotocolo cada notificación es un frame; con lotes, la ráfaga cabe en uno
+    expected = CONNECTIONS * BURST if protocol is None else CONNECTIONS
+    start = time.perf_counter()
+    for content in contents:
+        notification = EncodedNotification(content)
+        await bus.publish_frames([(str(user_id), notification) for user_id in range(CONNECTIONS)])
+        await asyncio.sleep(0)
+    while bus.frames_sent < expected:
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - start - window
+    task.cancel()
+    frames = sockets[0].frames
+    print(f"{protocol or 'formato original':18} {len(frames)} frames, {sum(map(len, frames))} B "
+          f"(≈{sum(map(deflated, frames))} B con deflate) por cliente, envío {elapsed * 1000:.0f} ms")
+
+
+for protocol, window in ((None, 0), ("notify.v1.json", 0.005), ("notify.v1.msgpack", 0.005)):
+    asyncio.run(burst(protocol, window))
@@ -0,0 +1,104 @@
+"""
+Registro de conexiones websocket (user-041): memoria por conexión, medida con tracemalloc
+sin contar los sockets, y coste de la ronda de heartbeats.
+
+100.000 clientes simulados, uno por usuario, con sockets que solo cuentan los envíos.
+
+    python -m bench.websocket_registry
+"""
+import bench.common  # noqa: F401
+
+import asyncio
+import gc
+import time
+import tracemalloc
+
+from services.notification_service.app.services.connection_registry import ConnectionRegistry
+
+CLIENTS = 100_000
+
+
+class FakeSocket:
+    __slots__ = ("sent",)
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send_text(self, text):
+        self.sent += 1
+
+    async def close(self, code=1000):
+        pass
+
+
+sockets = [FakeSocket() for _ in range(CLIENTS)]
+users = [str(i) for i in range(CLIENTS)]
+
+
+def allocated(build):
+    # Memoria que sigue reservada tras construir la estructura
+    gc.collect()
+    tracemalloc.start()
+    structure = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return structure, size
+
+
+def sets_by_user():
+    # Antes: un set de sockets por usuario, sin estado para los heartbeats
+    connections = {}
+    for user_id, websocket in zip(users, sockets):
+        connections.setdefault(user_id, set()).add(websocket)
+    return connections
+
+
+def records_with_dict():
+    class Record:
+        def __init__(self, websocket, user_id):
+            self.websocket = websocket
+            self.user_id = user_id
+            self.protocol = None
+            self.last_seen = time.monotonic()
+            self.pinged_at = 0.0
+
+    connections = {}
+    for user_id, websocket in zip(users, sockets):
+        connections.setdefault(user_id, []).append(Record(websocket, user_id))
+    return connections
+
+
+def registry():
+    connections = ConnectionRegistry(shards=64)
+    for user_id, websocket in zip(users, sockets):
+        connections.add(user_id, websocket)
+    return connections
+
+
+for label, build in (("dict[str, set] (sin heartbeat)", sets_by_user),
+                     ("registros con __dict__", records_with_dict),
+                     ("registro (__slots__ + 64 shards)", registry)):
+    structure, size = allocated(build)
+    print(f"{label:34} {size / CLIENTS:.0f} B/conexión")
+
+
+async def ping_everyone(connections):
+    # Todas las conexiones llevan más de un heartbeat sin tráfico, sin llegar al cierre
+    for shard in connections.shards:
+        for records in shard.values():
+            for record in records:
+                record.last_seen -= connections.heartbeat + 1
+    worst = 0.0
+    start = time.perf_counter()
+    for shard in connections.shards:
+        step = time.perf_counter()
+        await connections.sweep(shard)
+        worst = max(worst, time.perf_counter() - step)
+    print(f"ping a {CLIENTS:,} conexiones: {(time.perf_counter() - start) * 1000:.0f} ms en total, "
+          f"{worst * 1000:.2f} ms el peor paso (un shard)")
+    assert sum(websocket.sent for websocket in sockets) == CLIENTS
+
+
+# La última estructura construida es el registro
+asyncio.run(ping_everyone(structure))
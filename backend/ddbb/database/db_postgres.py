@@ -1,25 +1,354 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from fastapi import Request
+from itertools import count
+import base64
+import hashlib
+import json
+import logging
+import threading
+import time
 import os
 
 from dotenv import load_dotenv
 
+from ddbb.deadline import enforce_deadlines, is_cancellation, transaction_started
+from ddbb.redis.cache import TTLCache
+from ddbb.tracing import instrument_engine
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "")
 
+# Réplicas de solo lectura separadas por comas (vacío = todo va al primario)
+SQLALCHEMY_REPLICA_URLS = [url.strip() for url in os.getenv(
+    "DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# Estrategia de balanceo entre réplicas: "round_robin" o "least_connections"
+REPLICA_STRATEGY = os.getenv("DATABASE_REPLICA_STRATEGY", "round_robin")
+# Segundos que un cliente lee del primario tras escribir (read-your-writes)
+STICKY_PRIMARY_SECONDS = float(os.getenv("DATABASE_STICKY_SECONDS", 5))
+# Clientes que se recuerdan a la vez en la ventana read-your-writes (los más antiguos se descartan)
+STICKY_MAX_CLIENTS = int(os.getenv("DATABASE_STICKY_MAX_CLIENTS", 100000))
+# Sin token, el cliente se identifica para la ventana read-your-writes con esta cabecera o
+# esta cookie; si no envía ninguna, sus lecturas no se fijan al primario
+STICKY_CLIENT_HEADER = os.getenv("DATABASE_STICKY_CLIENT_HEADER", "x-client-id")
+STICKY_CLIENT_COOKIE = os.getenv("DATABASE_STICKY_CLIENT_COOKIE", "client_id")
+# Segundos que una réplica caída queda fuera del balanceo antes de volver a probarla
+REPLICA_EJECT_SECONDS = float(os.getenv("DATABASE_REPLICA_EJECT_SECONDS", 30))
+# Retraso de replicación máximo con el que una réplica recibe lecturas (0 = sin límite)
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("DATABASE_REPLICA_MAX_LAG_SECONDS", 10))
+# Segundos entre sondeos de las réplicas (retraso y readmisión de las expulsadas)
+REPLICA_PROBE_SECONDS = float(os.getenv("DATABASE_REPLICA_PROBE_SECONDS", 5))
+
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Configuración del pool de conexiones (por proceso; con N workers hay N pools)
+POOL_OPTIONS = {
+    "pool_size": int(os.getenv("DATABASE_POOL_SIZE", 5)),
+    "max_overflow": int(os.getenv("DATABASE_MAX_OVERFLOW", 10)),
+    "pool_timeout": float(os.getenv("DATABASE_POOL_TIMEOUT", 30)),
+    "pool_recycle": int(os.getenv("DATABASE_POOL_RECYCLE", 1800)),
+    "pool_pre_ping": os.getenv("DATABASE_POOL_PRE_PING", "true").lower() == "true",
+}
+# Conexiones que se abren al arrancar para que las primeras peticiones no paguen el connect
+POOL_WARMUP = int(os.getenv("DATABASE_POOL_WARMUP", 2))
+
 # Creamos motor de base de datos, sesiones y base de datos para controlar con SQLAlchemy
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **POOL_OPTIONS)
+instrument_engine(engine)
+enforce_deadlines(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
-def get_db():
-    db = SessionLocal()
+class ReplicaPool:
+    """
+    Conjunto de réplicas de lectura con balanceo, expulsión de réplicas caídas y exclusión
+    de las que van retrasadas.
+
+    Las réplicas se sondean en segundo plano (un solo sondeo a la vez, como mucho cada
+    probe_seconds): el sondeo mide el retraso de replicación y readmite las expulsadas que
+    vuelven a responder. Elegir réplica no hace ninguna consulta.
+
+    Atributos:
+    - engines (list): Motores de SQLAlchemy de cada réplica.
+    - strategy (str): "round_robin" o "least_connections".
+    - eject_seconds (float): Tiempo que una réplica caída queda fuera del balanceo.
+    - max_lag (float): Retraso máximo (segundos) para recibir lecturas; 0 = sin límite.
+    - probe_seconds (float): Segundos entre sondeos.
+    - lag (dict): Último retraso medido de cada réplica.
+    """
+
+    def __init__(self, urls, strategy: str = "round_robin", eject_seconds: float = 30,
+                 max_lag: float = 10, probe_seconds: float = 5):
+        self.engines = [create_engine(url, **POOL_OPTIONS) for url in urls]
+        self.strategy = strategy
+        self.eject_seconds = eject_seconds
+        self.max_lag = max_lag
+        self.probe_seconds = probe_seconds
+        self.ejected_until = {}
+        self.lag = {}
+        self._counter = count()
+        self._lock = threading.Lock()
+        self._probing = False
+        self._next_probe = 0.0
+
+        for replica in self.engines:
+            event.listen(replica, "handle_error", self._on_error)
+            instrument_engine(replica)
+            enforce_deadlines(replica)
+
+    def _on_error(self, context):
+        """
+        Expulsa la réplica cuando un error indica que la conexión no es utilizable. Una
+        consulta cancelada (plazo vencido o cliente desconectado) no cuenta.
+        """
+        if is_cancellation(context.original_exception):
+            return
+        if context.is_disconnect or isinstance(context.sqlalchemy_exception, OperationalError):
+            self.eject(context.engine)
+
+    def eject(self, replica):
+        """
+        Saca una réplica del balanceo durante eject_seconds.
+
+        Args:
+        - replica (Engine): El motor de la réplica caída.
+        """
+        with self._lock:
+            self.ejected_until[replica] = time.monotonic() + self.eject_seconds
+
+    @staticmethod
+    def _measure_lag(connection):
+        """
+        Retraso de replicación en segundos: 0 si la réplica ha aplicado todo lo recibido y,
+        si no, el tiempo desde la última transacción aplicada. Fuera de Postgres es 0.
+        """
+        if connection.dialect.name != "postgresql":
+            connection.execute(text("SELECT 1"))
+            return 0.0
+        return float(connection.execute(text(
+            "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+        )).scalar())
+
+    def probe(self, replica):
+        """
+        Sondea una réplica: mide su retraso y la readmite si estaba expulsada, o la expulsa
+        si no responde.
+
+        Args:
+        - replica (Engine): El motor de la réplica.
+
+        Returns:
+        - dict: Estado de la réplica ("ok", "lag", "error").
+        """
+        try:
+            with replica.connect() as connection:
+                lag = self._measure_lag(connection)
+        except Exception as e:
+            self.eject(replica)
+            return {"ok": False, "lag": None, "error": str(e)}
+        with self._lock:
+            self.lag[replica] = lag
+            self.ejected_until.pop(replica, None)
+        return {"ok": True, "lag": lag, "error": None}
+
+    def probe_all(self):
+        """
+        Sondea las réplicas activas y las expulsadas cuyo tiempo de expulsión ha pasado.
+        """
+        now = time.monotonic()
+        for replica in self.engines:
+            if self.ejected_until.get(replica, 0) <= now:
+                self.probe(replica)
+
+    def _probe_in_background(self):
+        try:
+            self.probe_all()
+        except Exception as e:
+            logger.error(f"Error sondeando las réplicas: {e}")
+        finally:
+            self._probing = False
+
+    def _schedule_probe(self):
+        """
+        Lanza un sondeo en segundo plano si toca y no hay otro en curso.
+        """
+        now = time.monotonic()
+        if self._probing or now < self._next_probe:
+            return
+        with self._lock:
+            if self._probing or now < self._next_probe:
+                return
+            self._probing = True
+            self._next_probe = now + self.probe_seconds
+        threading.Thread(target=self._probe_in_background,
+                         name="replica-probe", daemon=True).start()
+
+    def after_fork(self):
+        """
+        En un worker recién creado el hilo de sondeo del padre no existe: se permite otro.
+        """
+        self._probing = False
+        self._next_probe = 0.0
+
+    def _is_available(self, replica):
+        # Una réplica expulsada sigue fuera hasta que un sondeo la readmite
+        if replica in self.ejected_until:
+            return False
+        lag = self.lag.get(replica)
+        return not self.max_lag or lag is None or lag <= self.max_lag
+
+    def choose(self):
+        """
+        Elige una réplica sana y al día según la estrategia configurada.
+
+        Returns:
+        - Engine: El motor de la réplica elegida, o None si no hay ninguna disponible.
+        """
+        if not self.engines:
+            return None
+        self._schedule_probe()
+        available = [
+            replica for replica in self.engines if self._is_available(replica)]
+        if not available:
+            return None
+        if self.strategy == "least_connections":
+            return min(available, key=lambda replica: replica.pool.checkedout())
+        return available[next(self._counter) % len(available)]
+
+
+replicas = ReplicaPool(SQLALCHEMY_REPLICA_URLS,
+                       strategy=REPLICA_STRATEGY, eject_seconds=REPLICA_EJECT_SECONDS,
+                       max_lag=REPLICA_MAX_LAG_SECONDS, probe_seconds=REPLICA_PROBE_SECONDS)
+
+# Clientes que han escrito en los últimos STICKY_PRIMARY_SECONDS; leen del primario
+_sticky_clients = TTLCache(STICKY_MAX_CLIENTS, STICKY_PRIMARY_SECONDS)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _mark_flush_write(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _mark_statement_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _reject_readonly_write(orm_execute_state.session)
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(SessionLocal, "after_begin")
+def _apply_deadline(session, transaction, connection):
+    # Cada transacción de una petición con plazo lleva su statement_timeout
+    transaction_started(connection)
+
+
+@event.listens_for(SessionLocal, "before_flush")
+def _reject_readonly_flush(session, flush_context, instances):
+    _reject_readonly_write(session)
+
+
+def _reject_readonly_write(session):
+    if session.info.get("readonly"):
+        raise RuntimeError("No se puede escribir en una sesión de solo lectura")
+
+
+def _token_subject(authorization: str):
+    """
+    Usuario (claim "sub") de un token JWT Bearer, sin verificar la firma: solo se usa para
+    enrutar las lecturas, no para autorizar. Si no es un JWT, la propia cabecera.
+    """
+    token = authorization.split(" ", 1)[-1]
+    try:
+        payload = token.split(".")[1]
+        subject = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))).get("sub")
+    except (IndexError, ValueError, AttributeError):
+        subject = None
+    return str(subject) if subject is not None else authorization
+
+
+def _client_key(request: Request):
+    """
+    Identifica al cliente para la ventana read-your-writes: un hash del usuario del token
+    (los tokens renovados de un mismo usuario comparten ventana y la cabecera no se guarda
+    en memoria) o, sin token, de su identificador explícito (STICKY_CLIENT_HEADER o
+    STICKY_CLIENT_COOKIE). La IP no sirve: detrás del gateway todas las peticiones llegan
+    desde la suya, y una escritura anónima fijaría al primario las lecturas de todos.
+
+    Returns:
+    - str: La clave del cliente, o None si no se puede identificar (sin ventana).
+    """
+    authorization = request.headers.get("authorization")
+    if authorization:
+        return hashlib.sha256(_token_subject(authorization).encode()).hexdigest()
+    client_id = request.headers.get(STICKY_CLIENT_HEADER) or request.cookies.get(STICKY_CLIENT_COOKIE)
+    if client_id:
+        return hashlib.sha256(f"client:{client_id}".encode()).hexdigest()
+    return None
+
+
+def _is_sticky(key):
+    return key is not None and _sticky_clients.get(key) is not None
+
+
+def _open_session(request: Request = None, readonly: bool = False):
+    key = _client_key(request) if request is not None else None
+    replica = None
+    if readonly and not _is_sticky(key):
+        replica = replicas.choose()
+
+    if replica is None:
+        db = SessionLocal()
+    else:
+        db = SessionLocal(bind=replica)
+        db.info["readonly"] = True
+    db.info["client_key"] = key
+    return db
+
+
+def _close_session(db):
+    if db.info.get("wrote") and db.info.get("client_key") is not None:
+        _sticky_clients.set(db.info["client_key"], True)
+    db.close()
+
+
+def get_db(request: Request = None):
+    """
+    Sesión por petición. Las peticiones de lectura (GET/HEAD) van a una réplica salvo que
+    el cliente haya escrito en los últimos STICKY_PRIMARY_SECONDS; el resto van al primario.
+    """
+    db = _open_session(request, readonly=request is not None and request.method in READ_METHODS)
+    try:
+        yield db
+    finally:
+        _close_session(db)
+
+
+def get_readonly_db(request: Request = None):
+    """
+    Sesión de solo lectura explícita, enrutada a una réplica con independencia del método.
+    """
+    db = _open_session(request, readonly=True)
+    try:
+        yield db
+    finally:
+        _close_session(db)
+
+
+def get_primary_db(request: Request = None):
+    """
+    Sesión explícita contra el primario, para lecturas que no toleran retraso de replicación.
+    """
+    db = _open_session(request)
     try:
         yield db
     finally:
-        db.close()
+        _close_session(db)
 
 
 get_db()
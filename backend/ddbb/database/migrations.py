@@ -0,0 +1,121 @@
+import argparse
+import logging
+import os
+from datetime import date, datetime
+
+from dotenv import load_dotenv
+from sqlalchemy import MetaData, inspect, literal, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from ddbb.database.models.base import Base
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Tablespace de las particiones del archivo (p. ej. en discos más baratos); vacío = el de por defecto
+TICKET_ARCHIVE_TABLESPACE = os.getenv("TICKET_ARCHIVE_TABLESPACE", "")
+
+
+def _column_ddl(column, dialect):
+    """
+    Definición de una columna para ALTER TABLE ... ADD COLUMN: tipo, valor por defecto (el
+    escalar del modelo, para rellenar las filas existentes) y NOT NULL. Las claves foráneas
+    no se añaden: las columnas nuevas de las tablas repartidas no las tienen en los shards.
+    """
+    ddl = f"{dialect.identifier_preparer.quote(column.name)} {column.type.compile(dialect=dialect)}"
+    default = column.default
+    if default is not None and default.is_scalar:
+        value = literal(default.arg, column.type).compile(
+            dialect=dialect, compile_kwargs={"literal_binds": True})
+        ddl += f" DEFAULT {value}"
+    elif not column.nullable:
+        raise RuntimeError(
+            f"No se puede añadir la columna NOT NULL {column.table.name}.{column.name} sin valor por defecto")
+    if not column.nullable:
+        ddl += " NOT NULL"
+    return ddl
+
+
+def upgrade(engine: Engine, metadata: MetaData = Base.metadata):
+    """
+    Lleva las tablas existentes al esquema de los modelos. create_all solo crea las tablas
+    que faltan; aquí se añaden las columnas y los índices nuevos de las que ya existían
+    (p. ej. tickets.version o tickets.duplicate_of_id en una base de datos anterior).
+    Es idempotente; se llama al arrancar, después de create_all.
+
+    Args:
+    - engine (Engine): Motor de la base de datos.
+    - metadata (MetaData): Esquema esperado; por defecto el de todos los modelos.
+
+    Returns:
+    - list: Las columnas e índices añadidos, como "tabla.nombre".
+    """
+    changes = []
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        existing_tables = set(inspector.get_table_names())
+        preparer = connection.dialect.identifier_preparer
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in columns:
+                    continue
+                connection.execute(text(
+                    f"ALTER TABLE {preparer.format_table(table)} "
+                    f"ADD COLUMN {_column_ddl(column, connection.dialect)}"))
+                changes.append(f"{table.name}.{column.name}")
+            indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(connection)
+                    changes.append(f"{table.name}.{index.name}")
+    for change in changes:
+        logger.info(f"Esquema actualizado: {change} ({engine.url.render_as_string(hide_password=True)})")
+    return changes
+
+
+def _months(first: datetime, last: datetime):
+    month = date(first.year, first.month, 1)
+    while month <= last.date():
+        following = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+        yield month, following
+        month = following
+
+
+def ensure_monthly_partitions(db: Session, table_name: str, first: datetime, last: datetime):
+    """
+    Crea en Postgres las particiones mensuales que cubren de first a last en una tabla
+    particionada por rango de created_at (las del archivo). En otras bases de datos no hace nada.
+
+    Args:
+    - db (Session): Sesión de la base de datos.
+    - table_name (str): Tabla particionada.
+    - first (datetime): Fecha más antigua que se va a insertar.
+    - last (datetime): Fecha más reciente que se va a insertar.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    tablespace = f" TABLESPACE {TICKET_ARCHIVE_TABLESPACE}" if TICKET_ARCHIVE_TABLESPACE else ""
+    for start, end in _months(first, last):
+        db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {table_name}_{start:%Y%m} "
+            f"PARTITION OF {table_name} "
+            f"FOR VALUES FROM ('{start}') TO ('{end}'){tablespace}"))
+
+
+if __name__ == "__main__":
+    from ddbb.database.db_postgres import engine
+    from ddbb.database.sharding import shards
+
+    parser = argparse.ArgumentParser(
+        prog="python -m ddbb.database.migrations",
+        description="Añade las columnas e índices que faltan en las tablas existentes")
+    parser.parse_args()
+    for change in upgrade(engine):
+        print(f"Shard 0: {change}")
+    # Los shards adicionales se actualizan (y se crean) con su propio esquema
+    shards.prepare()
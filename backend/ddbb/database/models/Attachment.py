@@ -0,0 +1,33 @@
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Integer, String
+from .base import Base
+from datetime import datetime
+
+
+class Attachment(Base):
+    """
+    Modelo de adjunto de un ticket para la base de datos.
+
+    Solo guarda los metadatos; el contenido vive en el almacén de blobs, direccionado por
+    su hash, de modo que dos adjuntos con el mismo contenido comparten un único blob.
+
+    Atributos:
+    - id (Integer): Identificador único del adjunto, clave primaria e índice.
+    - ticket_id (Integer): Identificador del ticket, clave foránea a la tabla de tickets, indexada.
+    - user_id (Integer): Identificador del usuario que lo subió, clave foránea a la tabla de usuarios, opcional.
+    - filename (String): Nombre original del fichero, no nulo.
+    - content_type (String): Tipo MIME declarado al subirlo, no nulo.
+    - size (BigInteger): Tamaño en bytes, no nulo.
+    - sha256 (String): Hash SHA-256 del contenido (clave del blob), indexado.
+    - created_at (DateTime): Fecha y hora de subida, con valor predeterminado a la fecha y hora actuales.
+    """
+    __tablename__ = "attachments"
+
+    id = Column(Integer, primary_key=True, index=True)
+    ticket_id = Column(Integer, ForeignKey("tickets.id"),
+                       nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    filename = Column(String, nullable=False)
+    content_type = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    sha256 = Column(String(64), nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.now)
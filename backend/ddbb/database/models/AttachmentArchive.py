@@ -0,0 +1,35 @@
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Integer, String
+from .base import Base
+
+
+class AttachmentArchive(Base):
+    """
+    Modelo del archivo de metadatos de adjuntos de los tickets archivados. El contenido
+    sigue en el almacén de blobs.
+
+    Tiene las mismas columnas que attachments, sin claves foráneas, y en Postgres se
+    particiona por mes de created_at como tickets_archive.
+
+    Atributos:
+    - id (Integer): Identificador del adjunto (el mismo que tenía en attachments), indexado.
+    - ticket_id (Integer): Identificador del ticket archivado, indexado.
+    - user_id (Integer): Identificador del usuario que lo subió.
+    - filename (String): Nombre original del fichero.
+    - content_type (String): Tipo MIME.
+    - size (BigInteger): Tamaño en bytes.
+    - sha256 (String): Hash SHA-256 del contenido (clave del blob).
+    - created_at (DateTime): Fecha y hora de subida, clave de partición.
+    - created_at_missing (Boolean): Si created_at era nulo en la tabla caliente; al archivar se guarda la fecha del archivado (la clave de partición no puede ser nula) y al restaurar vuelve a ser nulo.
+    """
+    __tablename__ = "attachments_archive"
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
+
+    id = Column(Integer, primary_key=True, autoincrement=False, index=True)
+    ticket_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(Integer, nullable=True)
+    filename = Column(String, nullable=False)
+    content_type = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    sha256 = Column(String(64), nullable=False)
+    created_at = Column(DateTime, primary_key=True)
+    created_at_missing = Column(Boolean, nullable=False, default=False)
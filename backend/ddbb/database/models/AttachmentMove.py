@@ -0,0 +1,23 @@
+from sqlalchemy import Column, DateTime, Integer
+from .base import Base
+from datetime import datetime
+
+
+class AttachmentMove(Base):
+    """
+    Modelo de traslado de un adjunto entre shards junto con su ticket, en la base de datos
+    principal (shard 0).
+
+    Los adjuntos también cambian de id al trasladar su ticket; el registro permite redirigir
+    las descargas que aún usan el id anterior.
+
+    Atributos:
+    - old_id (Integer): Id del adjunto antes del traslado, clave primaria.
+    - new_id (Integer): Id del adjunto en el shard de destino, no nulo.
+    - moved_at (DateTime): Fecha y hora del traslado.
+    """
+    __tablename__ = "attachment_moves"
+
+    old_id = Column(Integer, primary_key=True, autoincrement=False)
+    new_id = Column(Integer, nullable=False)
+    moved_at = Column(DateTime, default=datetime.now)
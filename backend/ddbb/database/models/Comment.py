@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, Text, DateTime, ForeignKey, Index
 from .base import Base
 from datetime import datetime
 from sqlalchemy.orm import relationship
@@ -14,18 +14,30 @@ class Comment(Base):
     - created_at (DateTime): Fecha y hora de creación del comentario, con valor predeterminado a la fecha y hora actuales.
     - ticket_id (Integer): Identificador del ticket relacionado, clave foránea a la tabla de tickets, no nula.
     - user_id (Integer): Identificador del usuario relacionado, clave foránea a la tabla de usuarios, no nula.
+    - version (Integer): Versión de la fila para control de concurrencia optimista, se incrementa en cada actualización.
 
     Relaciones:
     - ticket (relationship): Relación con el modelo Ticket, que se popula mutuamente.
     - user (relationship): Relación con el modelo User, que se popula mutuamente.
+
+    Índices:
+    - ix_comments_ticket_created_id: (ticket_id, created_at, id), para listar y paginar por cursor los comentarios de un ticket.
     """
     __tablename__ = "comments"
+    __table_args__ = (
+        Index("ix_comments_ticket_created_id",
+              "ticket_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     content = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     ticket_id = Column(Integer, ForeignKey("tickets.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    version = Column(Integer, nullable=False, default=1)
 
     ticket = relationship("Ticket", back_populates="comments")
     user = relationship("User", back_populates="comments")
+
+    # SQLAlchemy añade "AND version = ?" a cada UPDATE del ORM y lanza StaleDataError si no coincide
+    __mapper_args__ = {"version_id_col": version}
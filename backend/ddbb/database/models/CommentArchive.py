@@ -0,0 +1,37 @@
+from sqlalchemy import Boolean, Column, DateTime, Index, Integer, Text
+from .base import Base
+
+
+class CommentArchive(Base):
+    """
+    Modelo del archivo de comentarios de los tickets archivados (almacenamiento frío).
+
+    Tiene las mismas columnas que comments, sin claves foráneas, y en Postgres se particiona
+    por mes de created_at como tickets_archive.
+
+    Atributos:
+    - id (Integer): Identificador del comentario (el mismo que tenía en comments), indexado.
+    - content (Text): Contenido del comentario.
+    - created_at (DateTime): Fecha y hora de creación del comentario, clave de partición.
+    - ticket_id (Integer): Identificador del ticket archivado.
+    - user_id (Integer): Identificador del autor.
+    - version (Integer): Versión de la fila al archivarla.
+    - created_at_missing (Boolean): Si created_at era nulo en la tabla caliente; al archivar se guarda la fecha del archivado (la clave de partición no puede ser nula) y al restaurar vuelve a ser nulo.
+
+    Índices:
+    - ix_comments_archive_ticket_created_id: (ticket_id, created_at, id), para paginar por cursor los comentarios de un ticket.
+    """
+    __tablename__ = "comments_archive"
+    __table_args__ = (
+        Index("ix_comments_archive_ticket_created_id",
+              "ticket_id", "created_at", "id"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False, index=True)
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime, primary_key=True)
+    ticket_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=False)
+    created_at_missing = Column(Boolean, nullable=False, default=False)
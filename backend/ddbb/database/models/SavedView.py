@@ -0,0 +1,25 @@
+from sqlalchemy import JSON, Column, DateTime, ForeignKey, Integer, String
+from .base import Base
+from datetime import datetime
+
+
+class SavedView(Base):
+    """
+    Modelo de vista guardada de tickets (p. ej. "mis tickets abiertos"), en la base de datos
+    principal (shard 0). Sus resultados se mantienen en Redis.
+
+    Atributos:
+    - id (Integer): Identificador único de la vista, clave primaria.
+    - name (String): Nombre de la vista, no nulo.
+    - owner_id (Integer): Usuario que creó la vista, opcional.
+    - filters (JSON): Filtro normalizado: cada campo de Ticket filtrado con la lista de
+      valores admitidos (None = sin valor).
+    - created_at (DateTime): Fecha y hora de creación de la vista.
+    """
+    __tablename__ = "saved_views"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    filters = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.now)
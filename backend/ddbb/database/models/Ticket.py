@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Integer, String, DateTime, Text
+from sqlalchemy import Column, ForeignKey, Integer, String, DateTime, Text, Index
 from .base import Base
 from datetime import datetime
 from sqlalchemy.orm import relationship
@@ -16,9 +16,13 @@ class Ticket(Base):
     - updated_at (DateTime): Fecha y hora de actualización del ticket, con valor predeterminado a la fecha y hora actuales y actualización automática.
     - user_id (Integer): Identificador del usuario relacionado, clave foránea a la tabla de usuarios, no nula.
     - status_id (Integer): Identificador del estado del ticket, clave foránea a la tabla de estados de ticket, no nula.
+    - assignee_id (Integer): Identificador del agente asignado, clave foránea a la tabla de usuarios, opcional.
+    - version (Integer): Versión de la fila para control de concurrencia optimista, se incrementa en cada actualización.
+    - duplicate_of_id (Integer): Ticket con el que se ha fusionado este duplicado, opcional (sin clave foránea: puede estar en otro shard).
 
     Relaciones:
     - user (relationship): Relación con el modelo User, que se popula mutuamente.
+    - assignee (relationship): Relación con el modelo User del agente asignado.
     - status (relationship): Relación con el modelo TicketStatus, que se popula mutuamente.
     - comments (relationship): Relación con el modelo Comment, que se popula mutuamente.
     """
@@ -33,7 +37,23 @@ class Ticket(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     status_id = Column(Integer, ForeignKey(
         "ticket_statuses.id"), nullable=False)
+    assignee_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    version = Column(Integer, nullable=False, default=1)
+    duplicate_of_id = Column(Integer, nullable=True)
 
-    user = relationship("User", back_populates="tickets")
+    user = relationship("User", back_populates="tickets",
+                        foreign_keys=[user_id])
+    assignee = relationship("User", foreign_keys=[assignee_id])
     status = relationship("TicketStatus", back_populates="tickets")
     comments = relationship("Comment", back_populates="ticket")
+
+    # SQLAlchemy añade "AND version = ?" a cada UPDATE del ORM y lanza StaleDataError si no coincide
+    __mapper_args__ = {"version_id_col": version}
+
+    # Recuento de tickets abiertos por agente al reconstruir el índice de asignación, y
+    # listado paginado por cursor (created_at, id) en cada shard, y exportación incremental
+    # por (updated_at, id)
+    __table_args__ = (Index("ix_tickets_assignee_status",
+                      "assignee_id", "status_id"),
+                      Index("ix_tickets_created_id", "created_at", "id"),
+                      Index("ix_tickets_updated_id", "updated_at", "id"))
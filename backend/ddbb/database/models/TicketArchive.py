@@ -0,0 +1,45 @@
+from sqlalchemy import Boolean, Column, DateTime, Index, Integer, String, Text, func
+from .base import Base
+
+
+class TicketArchive(Base):
+    """
+    Modelo del archivo de tickets cerrados (almacenamiento frío).
+
+    Tiene las mismas columnas que tickets, sin claves foráneas. En Postgres es una tabla
+    particionada por rango de created_at, con una partición por mes que se crea al archivar
+    el primer ticket de ese mes; por eso la clave primaria incluye created_at.
+
+    Atributos:
+    - id (Integer): Identificador del ticket (el mismo que tenía en tickets), indexado.
+    - title (String): Título del ticket.
+    - description (Text): Descripción del ticket.
+    - created_at (DateTime): Fecha y hora de creación del ticket, clave de partición.
+    - updated_at (DateTime): Fecha y hora de la última actualización del ticket.
+    - user_id (Integer): Identificador del usuario que creó el ticket.
+    - status_id (Integer): Identificador del estado del ticket.
+    - assignee_id (Integer): Identificador del agente asignado.
+    - version (Integer): Versión de la fila al archivarla.
+    - duplicate_of_id (Integer): Ticket con el que se fusionó, si era un duplicado.
+    - archived_at (DateTime): Fecha y hora del archivado.
+    - created_at_missing (Boolean): Si created_at era nulo en la tabla caliente; al archivar se guarda la fecha del archivado (la clave de partición no puede ser nula) y al restaurar vuelve a ser nulo.
+    """
+    __tablename__ = "tickets_archive"
+    __table_args__ = (
+        Index("ix_tickets_archive_user_created", "user_id", "created_at"),
+        Index("ix_tickets_archive_updated_id", "updated_at", "id"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False, index=True)
+    title = Column(String, nullable=False)
+    description = Column(Text, nullable=False)
+    created_at = Column(DateTime, primary_key=True)
+    updated_at = Column(DateTime)
+    user_id = Column(Integer, nullable=True)
+    status_id = Column(Integer, nullable=False)
+    assignee_id = Column(Integer, nullable=True)
+    version = Column(Integer, nullable=False)
+    duplicate_of_id = Column(Integer, nullable=True)
+    archived_at = Column(DateTime, server_default=func.now())
+    created_at_missing = Column(Boolean, nullable=False, default=False)
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, ForeignKey, Integer, DateTime
+from .base import Base
+
+
+class TicketDeadline(Base):
+    """
+    Modelo de vencimiento de SLA de un ticket para la base de datos.
+
+    Cada ticket en un estado con SLA tiene como mucho un vencimiento pendiente. El
+    planificador lee solo los próximos vencimientos a través del índice de due_at, sin
+    recorrer la tabla de tickets.
+
+    Atributos:
+    - ticket_id (Integer): Identificador del ticket, clave primaria y foránea a la tabla de tickets.
+    - status_id (Integer): Estado del ticket al que aplica el SLA.
+    - due_at (DateTime): Fecha y hora en la que vence el SLA, indexada.
+    - level (Integer): Nivel de escalado; se incrementa cada vez que vence sin que el ticket cambie de estado.
+    """
+    __tablename__ = "ticket_deadlines"
+
+    ticket_id = Column(Integer, ForeignKey(
+        "tickets.id", ondelete="CASCADE"), primary_key=True)
+    status_id = Column(Integer, ForeignKey(
+        "ticket_statuses.id"), nullable=False)
+    due_at = Column(DateTime, nullable=False, index=True)
+    level = Column(Integer, nullable=False, default=0)
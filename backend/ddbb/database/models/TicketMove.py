@@ -0,0 +1,22 @@
+from sqlalchemy import Column, DateTime, Integer
+from .base import Base
+from datetime import datetime
+
+
+class TicketMove(Base):
+    """
+    Modelo de traslado de un ticket entre shards, en la base de datos principal (shard 0).
+
+    Al trasladar un ticket cambia su id, porque el id indica el shard; el registro permite
+    redirigir las peticiones que aún usan el id anterior.
+
+    Atributos:
+    - old_id (Integer): Id del ticket antes del traslado, clave primaria.
+    - new_id (Integer): Id del ticket en el shard de destino, no nulo.
+    - moved_at (DateTime): Fecha y hora del traslado.
+    """
+    __tablename__ = "ticket_moves"
+
+    old_id = Column(Integer, primary_key=True, autoincrement=False)
+    new_id = Column(Integer, nullable=False)
+    moved_at = Column(DateTime, default=datetime.now)
@@ -1,7 +1,15 @@
 from .User import User  # Asegúrate de que User se carga primero
 from .Ticket import Ticket
 from .TicketStatus import TicketStatus
+from .TicketDeadline import TicketDeadline
+from .TicketMove import TicketMove
+from .AttachmentMove import AttachmentMove
+from .SavedView import SavedView
 from .Comment import Comment
+from .Attachment import Attachment
+from .TicketArchive import TicketArchive
+from .CommentArchive import CommentArchive
+from .AttachmentArchive import AttachmentArchive
 from .ActivityLog import ActivityLog
 from .Role import Role
 from .notification import Notification
@@ -0,0 +1,638 @@
+import argparse
+import contextvars
+import heapq
+import importlib
+import logging
+import os
+import threading
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from itertools import islice
+from typing import Callable, Iterable, List, Optional
+
+from dotenv import load_dotenv
+from fastapi import Request
+from fastapi.responses import RedirectResponse
+from sqlalchemy import MetaData, create_engine, delete, func, insert, select, text, update
+from sqlalchemy.orm import Session
+
+from ddbb.database.db_postgres import POOL_OPTIONS, READ_METHODS, SessionLocal, _open_session, engine, get_db
+from ddbb.database.migrations import ensure_monthly_partitions, upgrade
+from ddbb.database.models import AttachmentMove, Ticket, TicketArchive, TicketMove, TicketStatus
+from ddbb.database.models.base import Base
+from ddbb.deadline import enforce_deadlines
+from ddbb.tracing import instrument_engine, span
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Bases de datos de los shards adicionales (1..N-1) separadas por comas. El shard 0 es
+# DATABASE_URL, que guarda además las tablas globales (usuarios, roles). Vacío = un shard
+SHARD_URLS = [url.strip() for url in os.getenv(
+    "DATABASE_SHARD_URLS", "").split(",") if url.strip()]
+# Shard de los tickets nuevos:
+# - "hash": por hash del usuario que crea el ticket; los de un usuario quedan juntos.
+# - "range": todos al shard activo (DATABASE_SHARD_ACTIVE, por defecto el último), de modo
+#   que al añadir un shard las escrituras pasan a él y cada shard guarda un rango de ids.
+SHARD_STRATEGY = os.getenv("DATABASE_SHARD_STRATEGY", "hash")
+SHARD_ACTIVE = int(os.getenv("DATABASE_SHARD_ACTIVE", -1))
+# El shard va en los bits altos del id: el shard k usa los ids de [k << SHARD_ID_BITS,
+# (k + 1) << SHARD_ID_BITS). Con 24 bits caben 16,7 M filas por shard y 127 shards en un
+# INTEGER; los ids del shard 0 son los de siempre
+SHARD_ID_BITS = int(os.getenv("DATABASE_SHARD_ID_BITS", 24))
+# Hilos para las consultas en paralelo de los listados entre shards (0 = 4 por shard)
+SHARD_GATHER_WORKERS = int(os.getenv("DATABASE_SHARD_GATHER_WORKERS", 0))
+# Módulos que registran con on_ticket_moved los índices que hay que actualizar al trasladar
+# un ticket (duplicados, vistas guardadas, asignación); la herramienta de resharding los
+# importa antes de trasladar
+SHARD_MOVE_LISTENERS = [module.strip() for module in os.getenv(
+    "DATABASE_SHARD_MOVE_LISTENERS", "services.ticket_service.services.ticket_moves").split(",") if module.strip()]
+
+# Tablas que se reparten entre los shards: cada ticket con sus comentarios, adjuntos y
+# vencimientos (y su archivo) en el mismo shard. Los registros de actividad van al shard
+# de su usuario
+SHARDED_TABLES = ("tickets", "comments", "attachments", "ticket_deadlines", "activity_logs",
+                  "tickets_archive", "comments_archive", "attachments_archive")
+# Tablas de referencia que se copian, con los mismos ids, en todos los shards
+REFERENCE_TABLES = ("ticket_statuses",)
+# Tablas cuyo id autoincremental empieza en el rango del shard
+ID_TABLES = ("tickets", "comments", "attachments", "activity_logs")
+
+
+def _shard_metadata():
+    """
+    Esquema de los shards adicionales: las tablas repartidas y las de referencia, sin las
+    claves foráneas a tablas globales, que no pueden cruzar bases de datos.
+    """
+    metadata = MetaData()
+    for name in (*REFERENCE_TABLES, *SHARDED_TABLES):
+        table = Base.metadata.tables[name].to_metadata(metadata)
+        if name in ID_TABLES:
+            # En SQLite el contador de ids solo se puede fijar con AUTOINCREMENT
+            table.dialect_options["sqlite"]["autoincrement"] = True
+    for table in metadata.tables.values():
+        for constraint in list(table.foreign_key_constraints):
+            if constraint.elements[0].target_fullname.split(".")[0] not in metadata.tables:
+                table.constraints.discard(constraint)
+                for foreign_key in constraint.elements:
+                    foreign_key.parent.foreign_keys.discard(foreign_key)
+                    table.foreign_keys.discard(foreign_key)
+    return metadata
+
+
+class ShardSet:
+    """
+    Conjunto de bases de datos entre las que se reparten los tickets.
+
+    El shard 0 es la base de datos principal, con sus réplicas de lectura; los demás solo
+    tienen las tablas de SHARDED_TABLES y una copia de REFERENCE_TABLES. El id de un ticket
+    (y de sus comentarios y adjuntos) indica su shard, así que las rutas por id no
+    necesitan ninguna consulta de directorio.
+
+    Atributos:
+    - engines (list): Motor de SQLAlchemy de cada shard; engines[0] es el primario.
+    - strategy (str): "hash" o "range".
+    - active (int): Shard de los tickets nuevos con la estrategia "range".
+    - id_bits (int): Bits del id que numeran las filas dentro de un shard.
+    """
+
+    def __init__(self, urls, strategy: str = "hash", active: int = -1, id_bits: int = 24):
+        self.engines = [engine]
+        for url in urls:
+            shard = create_engine(url, **POOL_OPTIONS)
+            instrument_engine(shard)
+            enforce_deadlines(shard)
+            self.engines.append(shard)
+        self.strategy = strategy
+        self.active = active % len(self.engines)
+        self.id_bits = id_bits
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.engines)
+
+    def shard_of(self, row_id: int) -> int:
+        """
+        Shard de un ticket, comentario o adjunto a partir de su id. Los ids de shards que no
+        existen se resuelven al shard 0, donde no se encontrarán.
+        """
+        index = row_id >> self.id_bits if row_id > 0 else 0
+        return index if index < len(self.engines) else 0
+
+    def id_range(self, index: int):
+        """
+        Rango de ids [inicio, fin) de un shard.
+        """
+        return index << self.id_bits, (index + 1) << self.id_bits
+
+    def choose(self, user_id: Optional[int]) -> int:
+        """
+        Shard en el que se crea un ticket nuevo.
+
+        Args:
+        - user_id (int): Usuario que crea el ticket.
+
+        Returns:
+        - int: El índice del shard.
+        """
+        if len(self.engines) == 1:
+            return 0
+        if self.strategy == "range" or user_id is None:
+            return self.active
+        # crc32 y no hash(): el resultado debe ser el mismo en todos los procesos
+        return zlib.crc32(str(user_id).encode()) % len(self.engines)
+
+    def session(self, index: int, readonly: bool = False) -> Session:
+        """
+        Abre una sesión en un shard. En el shard 0 las de solo lectura van a una réplica.
+        """
+        if index == 0:
+            return _open_session(readonly=readonly)
+        db = SessionLocal(bind=self.engines[index])
+        if readonly:
+            db.info["readonly"] = True
+        return db
+
+    def _get_executor(self):
+        with self._lock:
+            # Los hilos del pool no sobreviven a un fork
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._executor = ThreadPoolExecutor(
+                    max_workers=SHARD_GATHER_WORKERS or 4 * len(self.engines),
+                    thread_name_prefix="shard-gather")
+        return self._executor
+
+    def _fetch(self, index: int, statement):
+        with self.session(index, readonly=True) as db:
+            result = db.execute(statement)
+            keys = tuple(result.keys())
+            return [dict(zip(keys, row)) for row in result]
+
+    def gather(self, statement, key: Callable, limit: int, reverse: bool = False) -> List[dict]:
+        """
+        Scatter-gather: ejecuta una consulta ordenada en todos los shards en paralelo y
+        mezcla los resultados.
+
+        Cada shard devuelve como mucho limit filas ya ordenadas y la mezcla (heapq.merge de
+        listas ordenadas) se detiene al llegar a limit, así que una página cuesta una
+        consulta con LIMIT por shard, en paralelo, sin importar cuántos haya.
+
+        Args:
+        - statement (Select): Consulta con su ORDER BY y sin LIMIT.
+        - key (Callable): Clave de orden de una fila (dict); debe coincidir con el ORDER BY.
+        - limit (int): Número de filas que se devuelven.
+        - reverse (bool): True si el ORDER BY es descendente.
+
+        Returns:
+        - List[dict]: Las primeras limit filas del conjunto de todos los shards.
+        """
+        statement = statement.limit(limit)
+        if len(self.engines) == 1:
+            return self._fetch(0, statement)
+        with span("shards.gather", attributes={"db.shards": len(self.engines)}):
+            executor = self._get_executor()
+            # Cada consulta se ejecuta con el contexto de la petición (traza en curso)
+            futures = [executor.submit(contextvars.copy_context().run, self._fetch, index, statement)
+                       for index in range(len(self.engines))]
+            results = [future.result() for future in futures]
+        return list(islice(heapq.merge(*results, key=key, reverse=reverse), limit))
+
+    def prepare(self):
+        """
+        Prepara los shards adicionales: crea sus tablas (y añade las columnas e índices
+        nuevos a las existentes), copia los estados de ticket del shard 0 (con los mismos
+        ids, porque cada shard los resuelve por nombre) y limita el contador de ids de cada
+        tabla a su rango en todos los shards, el 0 incluido. Es idempotente; se llama al
+        arrancar el servicio, después de crear las tablas del shard 0.
+        """
+        if len(self.engines) == 1:
+            return
+        with engine.begin() as connection:
+            self._set_id_range(connection, 0)
+        metadata = _shard_metadata()
+        statuses_table = metadata.tables[TicketStatus.__tablename__]
+        with SessionLocal() as db:
+            statuses = [row._asdict() for row in db.execute(
+                select(TicketStatus.id, TicketStatus.name))]
+
+        for index, shard in enumerate(self.engines[1:], start=1):
+            metadata.create_all(bind=shard)
+            upgrade(shard, metadata)
+            with shard.begin() as connection:
+                existing = set(connection.execute(
+                    select(statuses_table.c.id)).scalars())
+                missing = [status for status in statuses if status["id"] not in existing]
+                if missing:
+                    connection.execute(insert(statuses_table), missing)
+                self._set_id_range(connection, index)
+            logger.info(f"Shard {index} preparado ({shard.url.render_as_string(hide_password=True)})")
+
+    def _set_id_range(self, connection, index: int):
+        """
+        Lleva el contador de ids de cada tabla de ID_TABLES al inicio del rango del shard (sin
+        bajarlo nunca) y hace que un insert falle al agotar el rango, en lugar de crear ids
+        que el enrutado atribuiría al shard siguiente: MAXVALUE en las secuencias de
+        Postgres y un trigger en SQLite.
+        """
+        start, end = self.id_range(index)
+        dialect = connection.dialect.name
+        for table in ID_TABLES:
+            highest = connection.execute(text(f"SELECT MAX(id) FROM {table}")).scalar() or 0
+            if highest >= end:
+                raise RuntimeError(f"La tabla {table} del shard {index} ha superado su rango de ids")
+            if dialect == "postgresql":
+                sequence = connection.execute(text(
+                    f"SELECT pg_get_serial_sequence('{table}', 'id')")).scalar()
+                connection.execute(text(f"ALTER SEQUENCE {sequence} MAXVALUE {end - 1} NO CYCLE"))
+                # Los ids de filas borradas o archivadas tampoco se reutilizan
+                value = max(highest, start, connection.execute(
+                    text(f"SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM {sequence}")).scalar())
+                if value > 0:
+                    connection.execute(text("SELECT setval(:sequence, :value)"),
+                                       {"sequence": sequence, "value": value})
+            elif dialect == "sqlite":
+                connection.execute(text(f"DROP TRIGGER IF EXISTS {table}_id_range"))
+                connection.execute(text(
+                    f"CREATE TRIGGER {table}_id_range AFTER INSERT ON {table} WHEN NEW.id >= {end} "
+                    f"BEGIN SELECT RAISE(ABORT, 'Rango de ids del shard {index} agotado en {table}'); END"))
+                if start == 0:
+                    continue
+                connection.execute(text(
+                    "INSERT INTO sqlite_sequence (name, seq) SELECT :table, 0 "
+                    "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :table)"),
+                    {"table": table})
+                connection.execute(text(
+                    "UPDATE sqlite_sequence SET seq = MAX(seq, :value) WHERE name = :table"),
+                    {"table": table, "value": start})
+            else:
+                raise RuntimeError(f"Sharding no soportado en {dialect}")
+
+
+shards = ShardSet(SHARD_URLS, strategy=SHARD_STRATEGY,
+                  active=SHARD_ACTIVE, id_bits=SHARD_ID_BITS)
+
+
+def _shard_db(index: int, request: Request = None):
+    if index == 0:
+        # El shard 0 conserva las réplicas y la ventana read-your-writes de get_db
+        yield from get_db(request)
+        return
+    db = shards.session(index)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_ticket_db(ticket_id: int, request: Request):
+    """
+    Sesión por petición en el shard del ticket de la ruta.
+    """
+    yield from _shard_db(shards.shard_of(ticket_id), request)
+
+
+def get_comment_db(comment_id: int, request: Request):
+    """
+    Sesión por petición en el shard del comentario de la ruta (el de su ticket).
+    """
+    yield from _shard_db(shards.shard_of(comment_id), request)
+
+
+@contextmanager
+def shard_session(index: int, request: Request = None):
+    """
+    Sesión en un shard concreto, para las rutas que eligen el shard con datos del cuerpo
+    de la petición (al crear un ticket).
+    """
+    yield from _shard_db(index, request)
+
+
+def find_moved_ticket(ticket_id: int) -> Optional[int]:
+    """
+    Id actual de un ticket trasladado de shard, o None. Solo se consulta cuando un ticket
+    no existe, así que no añade nada a las lecturas normales.
+    """
+    with SessionLocal() as db:
+        return db.execute(select(TicketMove.new_id).where(
+            TicketMove.old_id == ticket_id)).scalar()
+
+
+def find_moved_attachment(attachment_id: int) -> Optional[int]:
+    """
+    Id actual de un adjunto trasladado de shard con su ticket, o None.
+    """
+    with SessionLocal() as db:
+        return db.execute(select(AttachmentMove.new_id).where(
+            AttachmentMove.old_id == attachment_id)).scalar()
+
+
+def moved_ticket_redirect(ticket_id: int, request: Request,
+                          attachment_id: int = None) -> Optional[RedirectResponse]:
+    """
+    Redirección de cualquier ruta de un ticket trasladado de shard a la misma ruta con su id
+    actual, o None si no se ha trasladado. Las lecturas se redirigen con 301 y el resto con
+    308, para que el cliente repita el método y el cuerpo. Se llama solo cuando el ticket no
+    existe en su shard. En las rutas de un adjunto (attachment_id) se sustituye también el
+    id del adjunto, que cambia con el traslado.
+    """
+    new_id = find_moved_ticket(ticket_id)
+    if new_id is None:
+        return None
+    segments = request.url.path.split("/")
+    segments[segments.index(str(ticket_id))] = str(new_id)
+    if attachment_id is not None:
+        new_attachment_id = find_moved_attachment(attachment_id)
+        if new_attachment_id is None:
+            return None
+        # El id del adjunto va detrás del del ticket
+        position = len(segments) - 1 - segments[::-1].index(str(attachment_id))
+        segments[position] = str(new_attachment_id)
+    url = "/".join(segments) + (f"?{request.url.query}" if request.url.query else "")
+    return RedirectResponse(url, status_code=301 if request.method in READ_METHODS else 308)
+
+
+# --- Traslado de tickets entre shards (resharding) ---
+
+# Funciones registradas con on_ticket_moved
+_move_listeners = []
+
+
+def on_ticket_moved(listener: Callable):
+    """
+    Registra una función que se llama después de trasladar un ticket, con su id anterior,
+    la fila del ticket con el id nuevo y si estaba archivado. Los servicios la usan para
+    actualizar los índices que guardan ids de tickets. Se usa como decorador.
+    """
+    _move_listeners.append(listener)
+    return listener
+
+
+def _load_move_listeners():
+    for module in SHARD_MOVE_LISTENERS:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            logger.warning(f"No se pudieron cargar los índices de {module}, no se actualizarán: {e}")
+
+
+def _notify_moved(old_id: int, ticket: dict, archived: bool):
+    for listener in _move_listeners:
+        try:
+            listener(old_id, ticket, archived)
+        except Exception as e:
+            # El traslado ya está confirmado: un índice desactualizado se corrige al reconstruirlo
+            logger.error(f"Error actualizando los índices del ticket {old_id} trasladado: {e}")
+
+
+def _without_id(row):
+    return {name: value for name, value in row.items() if name != "id"}
+
+
+def _hot_values(table, row):
+    return {name: value for name, value in row.items() if name in table.c and name != "id"}
+
+
+def _copy_with_new_ids(source: Session, target: Session, table, hot, ticket_id: int, new_id: int):
+    """
+    Copia las filas de un ticket en table (adjuntos o comentarios) una a una para conocer
+    sus ids nuevos, que salen del contador de la tabla caliente hot en el destino.
+
+    Returns:
+    - tuple: Las filas copiadas y el id nuevo de cada una ({id anterior: id nuevo}).
+    """
+    rows, ids = [], {}
+    for row in source.execute(select(table).where(
+            table.c.ticket_id == ticket_id).order_by(table.c.id)).mappings():
+        row = {**row, "ticket_id": new_id}
+        ids[row["id"]] = row["id"] = target.execute(insert(hot).values(
+            **_hot_values(hot, row)).returning(hot.c.id)).scalar_one()
+        rows.append(row)
+    return rows, ids
+
+
+def _copy_ticket(source: Session, target: Session, ticket: dict):
+    tables = Base.metadata.tables
+    tickets = tables["tickets"]
+    new_id = target.execute(insert(tickets).values(
+        **_without_id(ticket)).returning(tickets.c.id)).scalar_one()
+    # Los comentarios y adjuntos reciben ids del shard de destino; los vencimientos usan el del ticket
+    for name, keep_id in (("comments", False), ("ticket_deadlines", True)):
+        table = tables[name]
+        rows = [{**(dict(row) if keep_id else _without_id(row)), "ticket_id": new_id}
+                for row in source.execute(select(table).where(
+                    table.c.ticket_id == ticket["id"]).order_by(*table.primary_key.columns)).mappings()]
+        if rows:
+            target.execute(insert(table), rows)
+    _, attachments = _copy_with_new_ids(
+        source, target, tables["attachments"], tables["attachments"], ticket["id"], new_id)
+    return new_id, attachments
+
+
+def _copy_archived_ticket(source: Session, target: Session, ticket: dict):
+    """
+    Copia un ticket archivado, con sus comentarios y adjuntos archivados, al archivo del
+    shard de destino. Los ids nuevos salen del rango del destino: cada fila se inserta en su
+    tabla caliente, que es la que tiene el contador, y se borra en la misma transacción, de
+    modo que al restaurar el ticket no chocan con los de las tablas calientes.
+    """
+    tables = Base.metadata.tables
+    tickets = tables["tickets"]
+    new_id = target.execute(insert(tickets).values(
+        **_hot_values(tickets, ticket)).returning(tickets.c.id)).scalar_one()
+    copies, ids = {"tickets_archive": [{**ticket, "id": new_id}]}, {}
+    for name, hot_name in (("comments_archive", "comments"), ("attachments_archive", "attachments")):
+        copies[name], ids[hot_name] = _copy_with_new_ids(
+            source, target, tables[name], tables[hot_name], ticket["id"], new_id)
+        target.execute(delete(tables[hot_name]).where(tables[hot_name].c.ticket_id == new_id))
+    target.execute(delete(tickets).where(tickets.c.id == new_id))
+
+    for name, rows in copies.items():
+        if rows:
+            created = [row["created_at"] for row in rows]
+            ensure_monthly_partitions(target, name, min(created), max(created))
+            target.execute(insert(tables[name]), rows)
+    return new_id, ids["attachments"]
+
+
+def move_ticket(ticket_id: int, target_index: int) -> Optional[int]:
+    """
+    Traslada un ticket, con sus comentarios, adjuntos y vencimiento, a otro shard. Un ticket
+    archivado se traslada al archivo del destino con sus comentarios y adjuntos archivados.
+
+    El ticket recibe un id del shard de destino y el traslado se registra en ticket_moves
+    (shard 0) antes de confirmar la copia, de modo que si se interrumpe se puede repetir:
+    una copia confirmada y registrada solo necesita borrar el origen. La fila de origen se
+    bloquea durante la copia para que no se pierdan escrituras concurrentes. Los ids de los
+    comentarios también cambian. Al terminar se avisa a las funciones de on_ticket_moved.
+
+    Args:
+    - ticket_id (int): Id actual del ticket.
+    - target_index (int): Shard de destino.
+
+    Returns:
+    - int: El nuevo id del ticket, o None si no existe.
+    """
+    source_index = shards.shard_of(ticket_id)
+    if source_index == target_index:
+        return ticket_id
+    tables = Base.metadata.tables
+    # Si el destino es el shard 0, el registro va en la misma transacción que la copia
+    with shards.session(source_index) as source, shards.session(target_index) as target, \
+            (nullcontext(target) if target_index == 0 else SessionLocal()) as directory:
+        for archived, tickets in ((False, tables["tickets"]), (True, tables["tickets_archive"])):
+            ticket = source.execute(select(tickets).where(
+                tickets.c.id == ticket_id).with_for_update()).mappings().first()
+            if ticket is not None:
+                break
+        else:
+            return None
+
+        new_id = directory.execute(select(TicketMove.new_id).where(
+            TicketMove.old_id == ticket_id)).scalar()
+        if new_id is None or shards.shard_of(new_id) != target_index or target.execute(
+                select(tickets.c.id).where(tickets.c.id == new_id)).first() is None:
+            # Primera ejecución, o una anterior que no llegó a confirmar la copia
+            directory.execute(delete(TicketMove).where(TicketMove.old_id == ticket_id))
+            new_id, attachments = (_copy_archived_ticket if archived else _copy_ticket)(
+                source, target, dict(ticket))
+            directory.execute(insert(TicketMove).values(old_id=ticket_id, new_id=new_id))
+            # Los ids anteriores que apuntaban a este ticket pasan a apuntar al nuevo
+            directory.execute(update(TicketMove).where(
+                TicketMove.new_id == ticket_id).values(new_id=new_id))
+            if attachments:
+                directory.execute(delete(AttachmentMove).where(AttachmentMove.old_id.in_(list(attachments))))
+                directory.execute(insert(AttachmentMove), [
+                    {"old_id": old_id, "new_id": new_attachment_id}
+                    for old_id, new_attachment_id in attachments.items()])
+                for old_id, new_attachment_id in attachments.items():
+                    directory.execute(update(AttachmentMove).where(
+                        AttachmentMove.new_id == old_id).values(new_id=new_attachment_id))
+            directory.commit()
+            target.commit()
+
+        children = ("attachments_archive", "comments_archive") if archived else (
+            "ticket_deadlines", "attachments", "comments")
+        for name in children:
+            table = tables[name]
+            source.execute(delete(table).where(table.c.ticket_id == ticket_id))
+        source.execute(delete(tickets).where(tickets.c.id == ticket_id))
+        source.commit()
+    logger.info(f"Ticket {ticket_id} trasladado al shard {target_index} como {new_id}")
+    _notify_moved(ticket_id, {**ticket, "id": new_id}, archived)
+    return new_id
+
+
+def _ticket_ids(index: int, user_id=None, all_users: bool = False):
+    ticket_ids = []
+    with shards.session(index) as db:
+        for model in (Ticket, TicketArchive):
+            query = select(model.id).order_by(model.id)
+            if not all_users:
+                query = query.where(model.user_id.is_(None) if user_id is None else model.user_id == user_id)
+            ticket_ids += db.execute(query).scalars().all()
+    return ticket_ids
+
+
+def rebalance(dry_run: bool = False) -> Counter:
+    """
+    Traslada los tickets que, con la estrategia "hash" y el número actual de shards,
+    corresponden a otro shard (por ejemplo después de añadir uno). Los tickets de un
+    usuario se trasladan juntos.
+
+    Args:
+    - dry_run (bool): Solo cuenta los tickets que se trasladarían.
+
+    Returns:
+    - Counter: Tickets trasladados por (shard de origen, shard de destino).
+    """
+    moved = Counter()
+    if shards.strategy != "hash":
+        return moved
+    for index in range(len(shards)):
+        with shards.session(index) as db:
+            users = db.execute(select(Ticket.user_id).union(select(TicketArchive.user_id))).scalars().all()
+        for user_id in users:
+            target_index = shards.choose(user_id)
+            if target_index == index:
+                continue
+            for ticket_id in _ticket_ids(index, user_id):
+                if dry_run or move_ticket(ticket_id, target_index) is not None:
+                    moved[(index, target_index)] += 1
+    return moved
+
+
+def shard_status():
+    """
+    Número de tickets y rango de ids ocupado de cada shard.
+    """
+    status = []
+    for index, shard in enumerate(shards.engines):
+        with shards.session(index) as db:
+            count, highest = db.execute(select(func.count(), func.max(Ticket.id))).one()
+        status.append({"shard": index, "url": shard.url.render_as_string(hide_password=True),
+                       "tickets": count, "max_id": highest, "id_range": shards.id_range(index)})
+    return status
+
+
+def main(argv: Iterable[str] = None):
+    """
+    Herramienta de resharding:
+
+        python -m ddbb.database.sharding status
+        python -m ddbb.database.sharding prepare
+        python -m ddbb.database.sharding move --to 2 (--ticket 15 [--ticket 16] | --user 7 | --from 0)
+        python -m ddbb.database.sharding rebalance [--dry-run]
+    """
+    parser = argparse.ArgumentParser(prog="python -m ddbb.database.sharding")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="Tickets y rango de ids de cada shard")
+    commands.add_parser("prepare", help="Crea las tablas de los shards adicionales")
+    move = commands.add_parser("move", help="Traslada tickets a otro shard")
+    move.add_argument("--to", type=int, required=True)
+    source = move.add_mutually_exclusive_group(required=True)
+    source.add_argument("--ticket", type=int, action="append")
+    source.add_argument("--user", type=int)
+    source.add_argument("--from", dest="from_shard", type=int,
+                        help="Todos los tickets de un shard (para vaciarlo)")
+    balance = commands.add_parser("rebalance", help="Reparte los tickets según el hash de su usuario")
+    balance.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "status":
+        for shard in shard_status():
+            print(f"shard {shard['shard']}: {shard['tickets']} tickets, max id {shard['max_id']}, "
+                  f"rango {shard['id_range']} - {shard['url']}")
+    elif args.command == "prepare":
+        shards.prepare()
+    elif args.command == "move":
+        if not 0 <= args.to < len(shards):
+            parser.error(f"El shard {args.to} no existe")
+        shards.prepare()
+        _load_move_listeners()
+        if args.ticket:
+            ticket_ids = args.ticket
+        elif args.user is not None:
+            ticket_ids = [ticket_id for index in range(len(shards)) if index != args.to
+                          for ticket_id in _ticket_ids(index, args.user)]
+        else:
+            ticket_ids = _ticket_ids(args.from_shard, all_users=True)
+        for ticket_id in ticket_ids:
+            new_id = move_ticket(ticket_id, args.to)
+            print(f"{ticket_id} -> {new_id}")
+    elif args.command == "rebalance":
+        shards.prepare()
+        if not args.dry_run:
+            _load_move_listeners()
+        for (source_index, target_index), count in sorted(rebalance(args.dry_run).items()):
+            print(f"shard {source_index} -> shard {target_index}: {count} tickets")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import json
+import logging
+import os
+
+from dotenv import load_dotenv
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from ddbb.database.db_postgres import SessionLocal
+from ddbb.database.models.Role import Role
+from ddbb.database.models.User import User
+from ddbb.redis.cache import MISSING, BloomFilter, TTLCache
+from ddbb.redis.db_redis import r
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Caché local (por proceso) delante de Redis. La caché local no se invalida entre
+# instancias, así que su TTL acota cuánto tarda otra instancia en ver un cambio
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+USER_CACHE_LOCAL_TTL = float(os.getenv("USER_CACHE_LOCAL_TTL", 30))
+USER_CACHE_REDIS_TTL = int(os.getenv("USER_CACHE_REDIS_TTL", 300))
+# Los emails desconocidos también se cachean, con un TTL corto
+USER_CACHE_NEGATIVE_TTL = int(os.getenv("USER_CACHE_NEGATIVE_TTL", 10))
+# Filtro de Bloom de emails registrados: 2^24 bits (2 MB) y 7 hashes dan ~1% de falsos
+# positivos con un millón de usuarios
+USER_EMAIL_BLOOM_BITS = int(os.getenv("USER_EMAIL_BLOOM_BITS", 1 << 24))
+USER_EMAIL_BLOOM_HASHES = int(os.getenv("USER_EMAIL_BLOOM_HASHES", 7))
+
+# Columnas que se cachean; nunca la contraseña
+USER_COLUMNS = (User.id, User.email, User.username,
+                User.full_name, User.phone, User.is_active, User.role_id)
+
+_users = TTLCache(USER_CACHE_SIZE, USER_CACHE_LOCAL_TTL)
+_roles = TTLCache(1000, USER_CACHE_LOCAL_TTL)
+email_filter = BloomFilter(
+    "bloom:user_emails", USER_EMAIL_BLOOM_BITS, USER_EMAIL_BLOOM_HASHES)
+
+# Valor que marca en Redis un email o id sin usuario
+_NEGATIVE = b"-"
+
+
+def _user_keys(user_id=None, email=None):
+    keys = []
+    if user_id is not None:
+        keys.append(f"user:id:{user_id}")
+    if email is not None:
+        keys.append(f"user:email:{email}")
+    return keys
+
+
+def _redis_get(key):
+    try:
+        return r.get(key)
+    except Exception as e:
+        logger.error(f"Redis no disponible para la caché de usuarios: {e}")
+        return None
+
+
+def _redis_set(key, value, ttl):
+    try:
+        r.set(key, value, ex=ttl)
+    except Exception as e:
+        logger.error(f"Redis no disponible para la caché de usuarios: {e}")
+
+
+def _lookup(key, load):
+    """
+    Busca en la caché local, luego en Redis y por último con load(), cacheando también
+    los resultados vacíos.
+    """
+    value = _users.get(key, MISSING)
+    if value is not MISSING:
+        return value
+
+    cached = _redis_get(key)
+    if cached is not None:
+        value = None if cached == _NEGATIVE else json.loads(cached)
+        _users.set(key, value, ttl=None if value else min(
+            USER_CACHE_LOCAL_TTL, USER_CACHE_NEGATIVE_TTL))
+        return value
+
+    value = load()
+    if value is None:
+        _redis_set(key, _NEGATIVE, USER_CACHE_NEGATIVE_TTL)
+        _users.set(key, None, ttl=min(
+            USER_CACHE_LOCAL_TTL, USER_CACHE_NEGATIVE_TTL))
+        return None
+
+    payload = json.dumps(value)
+    for other_key in _user_keys(value["id"], value["email"]):
+        _redis_set(other_key, payload, USER_CACHE_REDIS_TTL)
+        _users.set(other_key, value)
+    return value
+
+
+def _load_user(db: Session, condition):
+    row = db.execute(select(*USER_COLUMNS).where(condition)).mappings().first()
+    return dict(row) if row else None
+
+
+def get_user_by_email(db: Session, email: str):
+    """
+    Obtiene un usuario por email a través de la caché (local, Redis y base de datos).
+
+    Args:
+    - db (Session): Sesión de la base de datos.
+    - email (str): Correo electrónico del usuario.
+
+    Returns:
+    - dict or None: Columnas de USER_COLUMNS del usuario, o None si no existe.
+    """
+    return _lookup(_user_keys(email=email)[0], lambda: _load_user(db, User.email == email))
+
+
+def get_user_by_id(db: Session, user_id: int):
+    """
+    Obtiene un usuario por id a través de la caché (local, Redis y base de datos).
+
+    Args:
+    - db (Session): Sesión de la base de datos.
+    - user_id (int): Identificador del usuario.
+
+    Returns:
+    - dict or None: Columnas de USER_COLUMNS del usuario, o None si no existe.
+    """
+    return _lookup(_user_keys(user_id=user_id)[0], lambda: _load_user(db, User.id == user_id))
+
+
+def get_role_name(db: Session, role_id: int):
+    """
+    Obtiene el nombre de un rol, cacheado en memoria (los roles apenas cambian).
+
+    Args:
+    - db (Session): Sesión de la base de datos.
+    - role_id (int): Identificador del rol.
+
+    Returns:
+    - str or None: El nombre del rol, o None si no existe.
+    """
+    name = _roles.get(role_id, MISSING)
+    if name is MISSING:
+        name = db.execute(select(Role.name).where(
+            Role.id == role_id)).scalar_one_or_none()
+        _roles.set(role_id, name)
+    return name
+
+
+def invalidate_user(user_id: int = None, *emails: str):
+    """
+    Elimina un usuario de la caché local y de Redis.
+
+    Args:
+    - user_id (int): Identificador del usuario.
+    - emails (str): Emails del usuario (el actual y, si ha cambiado, el anterior).
+    """
+    keys = _user_keys(user_id)
+    for email in emails:
+        keys += _user_keys(email=email)
+    _users.delete(*keys)
+    try:
+        r.delete(*keys)
+    except Exception as e:
+        logger.error(f"Error invalidando la caché de usuarios {keys}: {e}")
+
+
+def email_may_exist(email: str):
+    """
+    Comprobación probabilística de si un email ya está registrado.
+
+    Devuelve False solo si el email seguro que no está registrado. Si el filtro aún no
+    se ha construido o Redis no responde, devuelve True.
+    """
+    try:
+        return email_filter.might_contain(email)
+    except Exception as e:
+        logger.error(f"Error consultando el filtro de emails: {e}")
+        return True
+
+
+def build_email_filter():
+    """
+    Construye el filtro de Bloom de emails si no existe. Se llama al arrancar el servicio;
+    un lock en Redis evita que varias instancias lo construyan a la vez.
+    """
+    if r.exists(email_filter.ready_key) or not r.set(f"{email_filter.key}:lock", 1, nx=True, ex=300):
+        return
+    db = SessionLocal()
+    try:
+        emails = db.execute(select(User.email).execution_options(
+            yield_per=1000)).scalars()
+        email_filter.rebuild(emails)
+        logger.info("Filtro de emails construido")
+    finally:
+        db.close()
+        r.delete(f"{email_filter.key}:lock")
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_changed_users(session, flush_context):
+    # Se recogen en el flush pero se invalidan tras el commit: si se invalidara antes,
+    # otra petición podría volver a cachear los datos antiguos antes de que se confirmen
+    changed = session.info.setdefault("changed_users", [])
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, User):
+            history = inspect(instance).attrs.email.history
+            changed.append(
+                (instance.id, *{instance.email, *history.deleted} - {None}))
+        elif isinstance(instance, Role):
+            changed.append(None)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _invalidate_changed_users(session):
+    for change in session.info.pop("changed_users", ()):
+        if change is None:
+            _roles.clear()
+            continue
+        invalidate_user(*change)
+        for email in change[1:]:
+            try:
+                email_filter.add(email)
+            except Exception as e:
+                logger.error(f"Error añadiendo {email} al filtro de emails: {e}")
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_changed_users(session):
+    session.info.pop("changed_users", None)
@@ -0,0 +1,413 @@
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import event
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Presupuesto (ms) de las peticiones que llegan sin cabecera X-Request-Deadline-Ms; 0 = sin
+# plazo. El gateway fija el suyo con GATEWAY_DEADLINE_MS
+DEADLINE_DEFAULT_MS = float(os.getenv("DEADLINE_DEFAULT_MS", 0))
+# Máximo que se acepta de la cabecera
+DEADLINE_MAX_MS = float(os.getenv("DEADLINE_MAX_MS", 60000))
+# Una petición con menos presupuesto que esto se rechaza sin empezarla
+DEADLINE_MIN_MS = float(os.getenv("DEADLINE_MIN_MS", 5))
+# Ventana (s) en la que se mide el tiempo de cola para el control de admisión
+DEADLINE_QUEUE_WINDOW = float(os.getenv("DEADLINE_QUEUE_WINDOW", 1))
+# Muestras de la ventana necesarias para rechazar peticiones por el tiempo de cola
+DEADLINE_QUEUE_MIN_SAMPLES = int(os.getenv("DEADLINE_QUEUE_MIN_SAMPLES", 5))
+
+# Presupuesto restante en milisegundos; cada salto envía el que le queda al siguiente
+DEADLINE_HEADER = "x-request-deadline-ms"
+_HEADER = DEADLINE_HEADER.encode()
+
+counters = Counter()
+
+
+class DeadlineExceeded(Exception):
+    """
+    Se lanza cuando se agota el plazo de la petición antes de hacer (o terminar) un trabajo.
+    """
+
+
+class RequestCancelled(Exception):
+    """
+    Se lanza al intentar seguir trabajando para una petición cuyo cliente se ha desconectado.
+    """
+
+
+class RequestScope:
+    """
+    Plazo y estado de cancelación de una petición. Se comparte por referencia con los hilos
+    en los que se ejecutan sus rutas síncronas (que copian el contexto).
+
+    Atributos:
+    - deadline (float): Instante (time.monotonic) en el que vence la petición, o None.
+    - arrival (float): Instante en el que llegó la petición.
+    - cancelled (bool): Si el cliente se ha desconectado.
+    - connections (set): Conexiones DBAPI que están ejecutando una sentencia de la petición.
+    """
+
+    __slots__ = ("deadline", "arrival", "cancelled", "started", "connections", "_lock")
+
+    def __init__(self, deadline: Optional[float], arrival: float):
+        self.deadline = deadline
+        self.arrival = arrival
+        self.cancelled = False
+        self.started = False
+        self.connections = set()
+        self._lock = threading.Lock()
+
+    def remaining(self) -> Optional[float]:
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    def check(self):
+        """
+        Raises:
+        - RequestCancelled: Si el cliente se ha desconectado.
+        - DeadlineExceeded: Si el plazo ha vencido.
+        """
+        if self.cancelled:
+            raise RequestCancelled()
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise DeadlineExceeded()
+
+    def track(self, connection):
+        with self._lock:
+            self.connections.add(connection)
+
+    def untrack(self, connection):
+        with self._lock:
+            self.connections.discard(connection)
+
+    def cancel(self):
+        """
+        Marca la petición como cancelada y cancela las sentencias en curso (pg_cancel_backend
+        vía psycopg en Postgres, interrupt en SQLite). Se llama desde el bucle de eventos
+        mientras el hilo de la ruta está bloqueado en la base de datos.
+
+        Se cancela con el lock tomado: una conexión que se devuelve al pool se desregistra
+        antes (o espera a que termine la cancelación), así que nunca se cancela la sentencia
+        de otra petición que la haya reutilizado.
+        """
+        self.cancelled = True
+        with self._lock:
+            for connection in self.connections:
+                try:
+                    if hasattr(connection, "cancel"):
+                        connection.cancel()
+                    elif hasattr(connection, "interrupt"):
+                        connection.interrupt()
+                except Exception as e:
+                    logger.error(f"Error cancelando una consulta: {e}")
+
+
+_scope: ContextVar[Optional[RequestScope]] = ContextVar("request_scope", default=None)
+
+
+def remaining() -> Optional[float]:
+    """
+    Segundos que le quedan a la petición en curso, o None si no tiene plazo.
+    """
+    scope = _scope.get()
+    return scope.remaining() if scope is not None else None
+
+
+def check_deadline():
+    """
+    Comprueba que la petición en curso sigue viva (véase RequestScope.check).
+    """
+    scope = _scope.get()
+    if scope is not None:
+        scope.check()
+
+
+class QueueMonitor:
+    """
+    Tiempo que esperan las peticiones antes de empezar a trabajar (hilos y conexiones del
+    pool ocupados), medido al abrir su primera transacción.
+
+    La estimación es el mínimo de la ventana (como en CoDel): si hasta la petición que
+    menos ha esperado en el último segundo ha esperado más que el presupuesto de una
+    petición nueva, esta vencería en la cola y se rechaza al llegar. Sin muestras recientes
+    no hay estimación y todas las peticiones se admiten.
+    """
+
+    def __init__(self, window: float = DEADLINE_QUEUE_WINDOW, min_samples: int = DEADLINE_QUEUE_MIN_SAMPLES):
+        self.window = window
+        self.min_samples = min_samples
+        self.samples = deque()
+        # Candidatos al mínimo, con tiempos de espera crecientes
+        self.minimums = deque()
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        while self.samples and self.samples[0][0] < now - self.window:
+            expired = self.samples.popleft()
+            if self.minimums and self.minimums[0] is expired:
+                self.minimums.popleft()
+
+    def record(self, delay: float):
+        now = time.monotonic()
+        sample = (now, delay)
+        with self._lock:
+            self._expire(now)
+            self.samples.append(sample)
+            while self.minimums and self.minimums[-1][1] >= delay:
+                self.minimums.pop()
+            self.minimums.append(sample)
+
+    def estimate(self) -> Optional[float]:
+        with self._lock:
+            self._expire(time.monotonic())
+            if len(self.samples) < self.min_samples:
+                return None
+            return self.minimums[0][1]
+
+
+queue_monitor = QueueMonitor()
+
+
+def stats():
+    estimate = queue_monitor.estimate()
+    return {**counters, "queue_ms": round(estimate * 1000, 2) if estimate is not None else None}
+
+
+def _budget(headers, default_ms: float) -> Optional[float]:
+    """
+    Presupuesto de la petición en segundos (0 o negativo si ya ha vencido), o None si no
+    tiene plazo. Una cabecera que no es un número finito (p. ej. "nan") se ignora.
+    """
+    for name, value in headers:
+        if name == _HEADER:
+            try:
+                budget = float(value)
+            except ValueError:
+                break
+            if not math.isfinite(budget):
+                break
+            return min(budget, DEADLINE_MAX_MS) / 1000
+    return min(default_ms, DEADLINE_MAX_MS) / 1000 if default_ms > 0 else None
+
+
+async def _respond(send, status: int, body: bytes, headers=()):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"content-length", str(len(body)).encode()), *headers]})
+    await send({"type": "http.response.body", "body": body})
+
+
+class DeadlineMiddleware:
+    """
+    Middleware ASGI de plazos y cancelación.
+
+    - Lee el presupuesto de la cabecera X-Request-Deadline-Ms (o usa default_ms) y lo deja
+      en el contexto para las consultas y las llamadas salientes.
+    - Rechaza con 504 las peticiones que llegan sin presupuesto y con 503 (control de
+      admisión) las que vencerían esperando en la cola, según QueueMonitor.
+    - Si el cliente se desconecta antes de recibir la respuesta, cancela la petición: las
+      rutas asíncronas (el gateway) se cancelan y sus llamadas salientes se cierran, y en
+      las síncronas se cancelan las consultas en curso y las siguientes fallan.
+    - Si la petición falla por haber vencido el plazo, responde 504.
+    """
+
+    def __init__(self, app, default_ms: float = DEADLINE_DEFAULT_MS):
+        self.app = app
+        self.default_ms = default_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        arrival = time.monotonic()
+        budget = _budget(scope["headers"], self.default_ms)
+        if budget is not None:
+            if budget * 1000 < DEADLINE_MIN_MS:
+                counters["expired"] += 1
+                await _respond(send, 504, b'{"error":"Deadline exceeded"}')
+                return
+            queued = queue_monitor.estimate()
+            if queued is not None and queued >= budget:
+                counters["shed"] += 1
+                await _respond(send, 503, b'{"error":"Servicio saturado"}', [(b"retry-after", b"1")])
+                return
+
+        request = RequestScope(arrival + budget if budget is not None else None, arrival)
+        token = _scope.set(request)
+        messages = asyncio.Queue(maxsize=1)
+        disconnected = False
+        response_started = False
+
+        async def receive_buffered():
+            if disconnected and messages.empty():
+                return {"type": "http.disconnect"}
+            return await messages.get()
+
+        async def send_tracked(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        # La ruta se ejecuta en su propia tarea para poder cancelarla
+        task = asyncio.ensure_future(self.app(scope, receive_buffered, send_tracked))
+
+        async def listen():
+            nonlocal disconnected
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    disconnected = True
+                    # Si la cola está llena la ruta no está esperando: leerá el mensaje
+                    # pendiente y después la desconexión
+                    if messages.empty():
+                        messages.put_nowait(message)
+                    if not response_started and not task.done():
+                        counters["cancelled"] += 1
+                        request.cancel()
+                        task.cancel()
+                    return
+                await messages.put(message)
+
+        listener = asyncio.ensure_future(listen())
+        try:
+            await task
+        except asyncio.CancelledError:
+            if not request.cancelled:
+                raise
+        except Exception as e:
+            if request.cancelled:
+                # El cliente ya no espera ninguna respuesta; el error es la consulta cancelada
+                return
+            if response_started or not (isinstance(e, DeadlineExceeded) or (
+                    request.deadline is not None and time.monotonic() >= request.deadline)):
+                raise
+            counters["timed_out"] += 1
+            logger.warning(f"Plazo vencido en {scope['method']} {scope['path']}: {type(e).__name__}")
+            await _respond(send, 504, b'{"error":"Deadline exceeded"}')
+        finally:
+            listener.cancel()
+            task.cancel()
+            _scope.reset(token)
+
+
+class DeadlineTransport:
+    """
+    Transporte de httpx que envía en cada llamada el presupuesto que le queda a la petición
+    en curso (X-Request-Deadline-Ms) y limita a él los timeouts de la llamada.
+
+    Args:
+    - transport (httpx.AsyncBaseTransport): El transporte que envía las peticiones.
+
+    Raises:
+    - DeadlineExceeded: Si la petición ya ha vencido (no se envía).
+    """
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    async def handle_async_request(self, request):
+        left = remaining()
+        if left is not None:
+            if left * 1000 < DEADLINE_MIN_MS:
+                raise DeadlineExceeded()
+            request.headers[DEADLINE_HEADER] = str(int(left * 1000))
+            timeouts = request.extensions.get("timeout")
+            if timeouts:
+                request.extensions["timeout"] = {
+                    key: left if value is None else min(value, left) for key, value in timeouts.items()}
+        return await self.transport.handle_async_request(request)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+    async def __aenter__(self):
+        await self.transport.__aenter__()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.transport.__aexit__(*args)
+
+
+def transaction_started(connection):
+    """
+    Se llama al empezar cada transacción de una sesión (Session.after_begin).
+
+    En la primera de la petición registra el tiempo que ha esperado en la cola. Si el plazo
+    ya ha vencido, la petición no llega a trabajar; si no, en Postgres el presupuesto
+    restante se aplica como statement_timeout de la transacción (SET LOCAL), de modo que
+    ninguna consulta sigue ejecutándose después de que el cliente haya dejado de esperar.
+    """
+    scope = _scope.get()
+    if scope is None:
+        return
+    if not scope.started:
+        scope.started = True
+        queue_monitor.record(time.monotonic() - scope.arrival)
+    scope.check()
+    left = scope.remaining()
+    if left is not None and connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {max(1, int(left * 1000))}")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    scope = _scope.get()
+    if scope is None:
+        return
+    scope.check()
+    dbapi_connection = conn.connection.dbapi_connection
+    scope.track(dbapi_connection)
+    conn.info["deadline_scope"] = scope
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    scope = conn.info.pop("deadline_scope", None)
+    if scope is not None:
+        scope.untrack(conn.connection.dbapi_connection)
+
+
+def _on_db_error(context):
+    connection = context.connection
+    scope = connection.info.pop("deadline_scope", None) if connection is not None else None
+    if scope is not None and connection.connection is not None:
+        scope.untrack(connection.connection.dbapi_connection)
+
+
+def _on_checkin(dbapi_connection, connection_record):
+    # La conexión vuelve al pool (p. ej. tras un error sin handle_error): deja de ser de la
+    # petición antes de que otra la reutilice
+    scope = connection_record.info.pop("deadline_scope", None)
+    if scope is not None:
+        scope.untrack(dbapi_connection)
+
+
+def enforce_deadlines(engine):
+    """
+    Comprueba el plazo de la petición antes de cada sentencia y registra la conexión
+    mientras se ejecuta para poder cancelarla si el cliente se desconecta. La conexión se
+    desregistra al terminar la sentencia o, como muy tarde, al volver al pool.
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _on_db_error)
+    event.listen(engine, "checkin", _on_checkin)
+
+
+def is_cancellation(error) -> bool:
+    """
+    Indica si un error de la base de datos es una consulta cancelada (statement_timeout o
+    cancelación por desconexión) y no un fallo del servidor.
+    """
+    original = getattr(error, "orig", error)
+    return getattr(original, "pgcode", None) == "57014" or "interrupted" in str(original)
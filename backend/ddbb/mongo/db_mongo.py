@@ -0,0 +1,94 @@
+import os
+from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from dotenv import load_dotenv
+
+from ddbb.tracing import CLIENT, TRACING_ENABLED, start_span
+
+load_dotenv()
+
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "notifications")
+
+# Configuración del pool de conexiones (por proceso; con N workers hay N pools)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+# minPoolSize hace que el driver mantenga abiertas (y precaliente) estas conexiones
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 2))
+MONGO_TIMEOUT_MS = int(os.getenv("MONGO_TIMEOUT_MS", 5000))
+
+_client: Optional[AsyncIOMotorClient] = None
+
+
+class TracingCommandListener(monitoring.CommandListener):
+    """
+    Crea un span por cada comando de Mongo que se ejecuta dentro de una traza muestreada.
+
+    Motor ejecuta los comandos en su pool de hilos copiando el contexto de la corrutina,
+    por lo que el listener ve el span activo de la petición.
+    """
+
+    def __init__(self):
+        self.spans = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        current = start_span(f"mongodb {event.command_name}", CLIENT, attributes={
+            "db.system": "mongodb",
+            "db.name": event.database_name,
+            "db.operation": event.command_name,
+            "db.mongodb.collection": collection if isinstance(collection, str) else "",
+        }, child_only=True)
+        if current is not None:
+            self.spans[(event.connection_id, event.request_id)] = current
+
+    def succeeded(self, event):
+        current = self.spans.pop((event.connection_id, event.request_id), None)
+        if current is not None:
+            current.finish()
+
+    def failed(self, event):
+        current = self.spans.pop((event.connection_id, event.request_id), None)
+        if current is not None:
+            current.record_error(event.failure)
+            current.finish()
+
+
+def get_mongo_client():
+    """
+    Devuelve el cliente de Mongo del proceso, creándolo en el primer uso.
+
+    El cliente se crea de forma perezosa para que cada worker (tras el fork) y cada
+    bucle de eventos tenga el suyo; MongoClient no es seguro entre procesos.
+
+    Returns:
+    - AsyncIOMotorClient: El cliente de Mongo.
+    """
+    global _client
+    if _client is None:
+        _client = AsyncIOMotorClient(
+            MONGO_URL,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            serverSelectionTimeoutMS=MONGO_TIMEOUT_MS,
+            event_listeners=[TracingCommandListener()] if TRACING_ENABLED else [],
+        )
+    return _client
+
+
+def close_mongo_client():
+    """
+    Cierra el cliente de Mongo del proceso si existe.
+    """
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+def reset_mongo_client():
+    """
+    Olvida el cliente heredado del proceso padre sin cerrarlo (se usa tras un fork).
+    """
+    global _client
+    _client = None
@@ -0,0 +1,323 @@
+import asyncio
+import hmac
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Perfilado bajo demanda: una petición con la cabecera X-Profile: <PROFILE_TOKEN> se perfila
+# y su resultado se descarga en PROFILE_ROUTE/<id> (con la misma cabecera). Sin token, el
+# perfilado bajo demanda está desactivado
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+# Fracción de peticiones que se perfilan para los flamegraphs agregados por ruta (0 = nunca)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 1))
+# Cada PROFILE_AGGREGATE_SECONDS se escribe el flamegraph de cada ruta y se empieza otro;
+# se conservan los PROFILE_AGGREGATE_KEEP últimos de cada ruta
+PROFILE_AGGREGATE_SECONDS = float(os.getenv("PROFILE_AGGREGATE_SECONDS", 600))
+PROFILE_AGGREGATE_KEEP = int(os.getenv("PROFILE_AGGREGATE_KEEP", 6))
+PROFILE_ROUTE = "/_profiles/"
+
+PROFILE_HEADER = b"x-profile"
+
+_session: ContextVar[Optional["ProfileSession"]] = ContextVar("profile_session", default=None)
+
+
+class ProfileSession:
+    """
+    Muestras de pila de una petición perfilada.
+
+    Atributos:
+    - id (str): Identificador del perfil.
+    - task (asyncio.Task): La tarea que atiende la petición.
+    - stacks (Counter): Milisegundos muestreados en cada pila (tupla de code objects, de la
+      raíz a la hoja).
+    """
+
+    __slots__ = ("id", "task", "loop", "loop_thread", "stacks")
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.task = asyncio.current_task()
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        self.stacks = Counter()
+
+
+def _worker_code():
+    """
+    Código del bucle de los hilos de anyio (run_in_threadpool), donde se ejecutan las
+    rutas y dependencias síncronas con el contexto de la petición que las lanzó.
+    """
+    try:
+        from anyio._backends._asyncio import WorkerThread
+        return WorkerThread.run.__code__
+    except (ImportError, AttributeError):
+        return None
+
+
+class StackSampler:
+    """
+    Profiler por muestreo para peticiones concretas.
+
+    Un hilo toma cada PROFILE_INTERVAL_MS la pila de los hilos del proceso mientras haya
+    peticiones perfiladas. Una muestra del hilo del bucle de eventos se atribuye a una
+    petición solo si en ese momento se está ejecutando su tarea, y una de un hilo de anyio
+    solo si ejecuta una función lanzada desde la petición (su contexto contiene la sesión),
+    de modo que las peticiones concurrentes no se mezclan.
+
+    Mientras hay sesiones activas se reduce el intervalo de cambio de hilo del intérprete
+    (sys.setswitchinterval) al de muestreo: con el de por defecto (5 ms) el hilo de muestreo
+    solo obtendría el GIL cuando el hilo perfilado hace E/S, y las pilas de CPU no
+    aparecerían nunca.
+
+    Las sesiones de las peticiones muestreadas para el agregado se suman, al terminar, al
+    flamegraph de su ruta.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_MS / 1000):
+        self.interval = interval
+        self.sessions = set()
+        self.aggregates = {}
+        self.aggregate_started = time.time()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._switch_interval = None
+        self._worker_code = _worker_code()
+        self._stop_code = ProfilingMiddleware.__call__.__code__
+
+    def start(self, session: ProfileSession):
+        with self._lock:
+            self.sessions.add(session)
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self, session: ProfileSession, route: str):
+        with self._lock:
+            self.sessions.discard(session)
+            if PROFILE_SAMPLE_RATE > 0 and route:
+                self.aggregates.setdefault(route, Counter()).update(session.stacks)
+
+    def _run(self):
+        last = None
+        while True:
+            self._flush_aggregates()
+            if not self.sessions:
+                if self._switch_interval is not None:
+                    sys.setswitchinterval(self._switch_interval)
+                    self._switch_interval = None
+                self._wake.wait(1)
+                self._wake.clear()
+                last = None
+                continue
+            if self._switch_interval is None:
+                self._switch_interval = sys.getswitchinterval()
+                sys.setswitchinterval(min(self._switch_interval, self.interval / 2))
+            # Cada muestra pesa el tiempo real transcurrido desde la anterior
+            now = time.perf_counter()
+            self._sample((now - last) * 1000 if last is not None else self.interval * 1000)
+            last = now
+            time.sleep(self.interval)
+
+    def _stack(self, frame, stop_code):
+        stack = []
+        while frame is not None and frame.f_code is not stop_code:
+            stack.append(frame.f_code)
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def _sample(self, weight: float):
+        with self._lock:
+            sessions = list(self.sessions)
+        frames = sys._current_frames()
+        by_loop = {}
+        for session in sessions:
+            by_loop.setdefault(session.loop_thread, []).append(session)
+
+        for thread_id, frame in frames.items():
+            if thread_id in by_loop:
+                for session in by_loop[thread_id]:
+                    if asyncio.current_task(session.loop) is session.task:
+                        session.stacks[self._stack(frame, self._stop_code)] += weight
+                        break
+                continue
+            if self._worker_code is None:
+                continue
+            # Se busca el marco de WorkerThread.run para leer el contexto de la petición
+            worker = frame
+            while worker is not None and worker.f_code is not self._worker_code:
+                worker = worker.f_back
+            if worker is None:
+                continue
+            context = worker.f_locals.get("context")
+            session = context.get(_session) if context is not None else None
+            if session in sessions:
+                session.stacks[self._stack(frame, self._worker_code)] += weight
+
+    def _flush_aggregates(self):
+        if time.time() - self.aggregate_started < PROFILE_AGGREGATE_SECONDS:
+            return
+        with self._lock:
+            aggregates, self.aggregates = self.aggregates, {}
+            started, self.aggregate_started = self.aggregate_started, time.time()
+        for route, stacks in aggregates.items():
+            try:
+                write_aggregate(route, stacks, started)
+            except OSError as e:
+                logger.error(f"Error guardando el flamegraph de {route}: {e}")
+
+
+def _frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def to_speedscope(session: ProfileSession, name: str):
+    """
+    Convierte las muestras de una sesión al formato de speedscope (https://www.speedscope.app).
+    """
+    frames, index = [], {}
+    samples, weights = [], []
+    for stack, weight in session.stacks.items():
+        ids = []
+        for code in stack:
+            if code not in index:
+                index[code] = len(frames)
+                frames.append({"name": code.co_name, "file": code.co_filename,
+                               "line": code.co_firstlineno})
+            ids.append(index[code])
+        samples.append(ids)
+        weights.append(round(weight, 3))
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": __name__,
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled", "name": name, "unit": "milliseconds",
+            "startValue": 0, "endValue": sum(weights),
+            "samples": samples, "weights": weights,
+        }],
+    }
+
+
+def _route_file(route: str):
+    return "".join(c if c.isalnum() else "_" for c in route).strip("_") or "root"
+
+
+def write_aggregate(route: str, stacks: Counter, started: float):
+    """
+    Guarda el flamegraph de una ruta en formato "folded" (una pila por línea con sus
+    microsegundos muestreados), que leen flamegraph.pl y speedscope, y elimina los más
+    antiguos.
+    """
+    directory = os.path.join(PROFILE_DIR, "aggregate", _route_file(route))
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(started))
+    with open(os.path.join(directory, f"{stamp}.folded"), "w", encoding="utf-8") as f:
+        for stack, weight in stacks.most_common():
+            f.write(";".join(_frame_name(code) for code in stack) + f" {round(weight * 1000)}\n")
+    for old in sorted(os.listdir(directory))[:-PROFILE_AGGREGATE_KEEP]:
+        os.remove(os.path.join(directory, old))
+
+
+def _authorized(headers):
+    if not PROFILE_TOKEN:
+        return False
+    for name, value in headers:
+        if name == PROFILE_HEADER:
+            return hmac.compare_digest(value, PROFILE_TOKEN.encode())
+    return False
+
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI de perfilado bajo demanda.
+
+    Perfila una petición si trae la cabecera X-Profile con PROFILE_TOKEN (y devuelve el id
+    del perfil en X-Profile-Id) o si sale elegida por PROFILE_SAMPLE_RATE para el
+    flamegraph agregado de su ruta. Sirve además los perfiles guardados en
+    PROFILE_ROUTE/<id>, con la misma cabecera.
+    """
+
+    def __init__(self, app, service_name: str = "service"):
+        self.app = app
+        self.service_name = service_name
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        detailed = _authorized(scope["headers"])
+        if detailed and scope["path"].startswith(PROFILE_ROUTE):
+            await self._serve(scope["path"][len(PROFILE_ROUTE):], send)
+            return
+        if not detailed and not (PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE):
+            await self.app(scope, receive, send)
+            return
+
+        session = ProfileSession()
+        token = _session.set(session)
+
+        async def send_profiled(message):
+            if detailed and message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []),
+                                      (b"x-profile-id", session.id.encode()),
+                                      (b"x-profile-url", f"{PROFILE_ROUTE}{session.id}".encode())]
+            await send(message)
+
+        sampler.start(session)
+        try:
+            await self.app(scope, receive, send_profiled)
+        finally:
+            _session.reset(token)
+            route = scope.get("route")
+            name = f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+            sampler.stop(session, name)
+            if detailed:
+                await asyncio.to_thread(self._save, session, name)
+
+    def _save(self, session: ProfileSession, name: str):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profile = to_speedscope(session, f"{self.service_name} {name}")
+        path = os.path.join(PROFILE_DIR, f"{session.id}.speedscope.json")
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(profile, f)
+        except OSError as e:
+            logger.error(f"Error guardando el perfil {session.id}: {e}")
+
+    @staticmethod
+    async def _serve(profile_id: str, send):
+        path = os.path.join(PROFILE_DIR, f"{profile_id}.speedscope.json")
+        body, status = b'{"error":"Perfil no encontrado"}', 404
+        if profile_id.isalnum() and os.path.exists(path):
+            with open(path, "rb") as f:
+                body, status = f.read(), 200
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json"),
+                                (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+
+sampler = StackSampler()
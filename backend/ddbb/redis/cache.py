@@ -0,0 +1,146 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from .db_redis import r
+
+# Marca de "no existe" en las cachés con caché negativa
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Caché LRU en memoria del proceso con caducidad por entrada.
+
+    Es segura entre hilos (los endpoints síncronos de FastAPI se ejecutan en un threadpool).
+
+    Atributos:
+    - maxsize (int): Número máximo de entradas; al superarlo se descarta la menos usada.
+    - ttl (float): Segundos que vive una entrada si no se indica otro valor al guardarla.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """
+        Devuelve el valor de la clave, o default si no está o ha caducado.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl: float = None):
+        """
+        Guarda un valor; ttl sustituye al ttl por defecto de la caché.
+        """
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+class BloomFilter:
+    """
+    Filtro de Bloom guardado como bitmap en Redis, compartido por todas las instancias.
+
+    Responde "seguro que no está" o "puede que esté": no hay falsos negativos mientras el
+    filtro esté completo, así que solo se confía en él cuando está marcado como listo.
+
+    Atributos:
+    - key (str): Clave del bitmap en Redis.
+    - bits (int): Tamaño del bitmap (m).
+    - hashes (int): Número de funciones hash (k).
+    """
+
+    def __init__(self, key: str, bits: int = 1 << 24, hashes: int = 7):
+        self.key = key
+        self.bits = bits
+        self.hashes = hashes
+
+    @property
+    def ready_key(self):
+        return f"{self.key}:ready"
+
+    def _offsets(self, value: str):
+        # Doble hashing (Kirsch-Mitzenmacher): h1 + i·h2 a partir de un único sha256
+        digest = hashlib.sha256(value.encode()).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:16], "big") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, value: str, key: str = None, pipe=None):
+        """
+        Añade un valor al filtro. Con pipe, los SETBIT se acumulan en esa pipeline.
+        """
+        target = pipe if pipe is not None else r.pipeline(transaction=False)
+        for offset in self._offsets(value):
+            target.setbit(key or self.key, offset, 1)
+        if pipe is None:
+            target.execute()
+
+    def might_contain(self, value: str):
+        """
+        Devuelve False si el valor seguro que no está, True si puede estar
+        (o si el filtro aún no está listo).
+        """
+        with r.pipeline(transaction=False) as pipe:
+            pipe.exists(self.ready_key)
+            for offset in self._offsets(value):
+                pipe.getbit(self.key, offset)
+            ready, *bits = pipe.execute()
+        return not ready or all(bits)
+
+    def rebuild(self, values, batch_size: int = 1000):
+        """
+        Reconstruye el filtro en una clave temporal y la sustituye de forma atómica.
+
+        Args:
+        - values (Iterable[str]): Todos los valores que deben estar en el filtro.
+        - batch_size (int): Valores por pipeline.
+        """
+        tmp_key = f"{self.key}:building"
+        pipe = r.pipeline(transaction=False)
+        pipe.delete(tmp_key)
+        # Se reserva el bitmap completo de una vez en lugar de crecer con cada SETBIT
+        pipe.setbit(tmp_key, self.bits - 1, 0)
+        pending = 0
+        for value in values:
+            self.add(value, key=tmp_key, pipe=pipe)
+            pending += 1
+            if pending >= batch_size:
+                pipe.execute()
+                pending = 0
+        pipe.execute()
+        with r.pipeline() as pipe:
+            pipe.rename(tmp_key, self.key)
+            pipe.set(self.ready_key, 1)
+            pipe.execute()
@@ -2,18 +2,25 @@ import os
 import redis
 from dotenv import load_dotenv
 
+from ddbb.tracing import instrument_redis
+
 load_dotenv()
 
 REDIS_URL = os.getenv("REDIS_URL", "")
 
-# Conexión a Redis
-r = redis.Redis.from_url(REDIS_URL)
+# Configuración del pool de conexiones (por proceso; con N workers hay N pools)
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 5))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30))
+# Conexiones que se abren al arrancar para que las primeras peticiones no paguen el connect
+REDIS_POOL_WARMUP = int(os.getenv("REDIS_POOL_WARMUP", 2))
 
-# Probamos si la conexión es exitosa
-try:
-    if not r:
-        raise Exception("No se pudo conectar a Redis")
-    response = r.ping()
-    print("Conexión a Redis exitosa:", response)
-except redis.ConnectionError as e:
-    print("Error de conexión a Redis:", e)
+# Conexión a Redis. No se conecta hasta el primer comando; el arranque y la
+# comprobación de salud los hace ddbb.resources.ResourceManager
+r = instrument_redis(redis.Redis.from_url(
+    REDIS_URL,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    socket_timeout=REDIS_SOCKET_TIMEOUT,
+    socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+    health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+))
@@ -0,0 +1,157 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+
+from dotenv import load_dotenv
+
+from .db_redis import r
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Tiempo que se conserva la respuesta de una clave de idempotencia
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 86400))
+# Duración del lock de la primera petición; se renueva cada tercio mientras se procesa,
+# así que solo expira si el proceso muere
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", 10))
+# Tiempo que espera un duplicado concurrente a que la primera petición termine
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", 5))
+IDEMPOTENCY_POLL_SECONDS = 0.05
+
+# Borra el lock solo si sigue siendo nuestro (puede haber expirado y pertenecer a otro)
+_release_lock = r.register_script("""
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+""")
+
+# Alarga el lock solo si sigue siendo nuestro
+_extend_lock = r.register_script("""
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+""")
+
+
+class IdempotencyInProgress(Exception):
+    """
+    La petición original con la misma clave sigue en curso tras el tiempo de espera.
+    """
+
+
+class IdempotencyMismatch(Exception):
+    """
+    La clave ya se usó con un cuerpo de petición distinto.
+    """
+
+
+def request_fingerprint(payload: bytes):
+    """
+    Huella del cuerpo de la petición, para detectar claves reutilizadas con otros datos.
+    """
+    return hashlib.sha256(payload).hexdigest()
+
+
+def _load(result_key: str, fingerprint: str):
+    stored_fingerprint, status_code, body = r.hmget(
+        result_key, "fingerprint", "status", "body")
+    if status_code is None:
+        return None
+    if stored_fingerprint.decode() != fingerprint:
+        raise IdempotencyMismatch()
+    return int(status_code), body
+
+
+def _keep_lock(lock_key: str, token: str, done: threading.Event):
+    """
+    Renueva el lock hasta que termina la operación, para que un duplicado no la ejecute de
+    nuevo mientras la primera sigue en curso (p. ej. una creación lenta).
+    """
+    lock_ms = int(IDEMPOTENCY_LOCK_SECONDS * 1000)
+    while not done.wait(IDEMPOTENCY_LOCK_SECONDS / 3):
+        try:
+            if not _extend_lock(keys=[lock_key], args=[token, lock_ms]):
+                logger.error(f"Lock de idempotencia {lock_key} perdido durante la operación")
+                return
+        except Exception as e:
+            logger.error(f"Error renovando el lock de idempotencia {lock_key}: {e}")
+
+
+def run_idempotent(key: str, scope: str, fingerprint: str, fn, subject: str = None):
+    """
+    Ejecuta fn una sola vez por clave de idempotencia y guarda su respuesta en Redis.
+
+    - Si ya hay una respuesta guardada para la clave, se devuelve sin ejecutar fn.
+    - Si otra petición con la misma clave está en curso, se espera a su respuesta.
+    - Las respuestas 5xx y las excepciones no se guardan, para que el cliente pueda reintentar.
+
+    Si Redis no está disponible, fn se ejecuta sin garantía de idempotencia.
+
+    Args:
+    - key (str): Valor de la cabecera Idempotency-Key.
+    - scope (str): Operación a la que pertenece la clave (p. ej. "POST /tickets/").
+    - fingerprint (str): Huella del cuerpo de la petición.
+    - fn (Callable): Función que realiza la operación y devuelve (código de estado, cuerpo en bytes).
+    - subject (str, optional): Credencial del cliente (solo se guarda su hash); las claves
+      de clientes distintos no colisionan ni comparten respuestas.
+
+    Raises:
+    - IdempotencyInProgress: Si la petición original no termina dentro del tiempo de espera.
+    - IdempotencyMismatch: Si la clave se usó con otro cuerpo.
+
+    Returns:
+    - tuple: (código de estado, cuerpo en bytes, True si es una respuesta repetida).
+    """
+    owner = hashlib.sha256(subject.encode()).hexdigest()[:32] if subject else "anonymous"
+    result_key = f"idempotency:{scope}:{owner}:{key}"
+    lock_key = f"{result_key}:lock"
+    token = uuid.uuid4().hex
+
+    try:
+        stored = _load(result_key, fingerprint)
+        if stored:
+            return (*stored, True)
+
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+        while not r.set(lock_key, token, nx=True, px=int(IDEMPOTENCY_LOCK_SECONDS * 1000)):
+            # Duplicado concurrente: esperamos a que la primera petición guarde su respuesta
+            if time.monotonic() >= deadline:
+                raise IdempotencyInProgress()
+            time.sleep(IDEMPOTENCY_POLL_SECONDS)
+            stored = _load(result_key, fingerprint)
+            if stored:
+                return (*stored, True)
+    except (IdempotencyInProgress, IdempotencyMismatch):
+        raise
+    except Exception as e:
+        logger.error(f"Redis no disponible para idempotencia: {e}")
+        return (*fn(), False)
+
+    done = threading.Event()
+    threading.Thread(target=_keep_lock, args=(lock_key, token, done), daemon=True,
+                     name="idempotency-lock").start()
+    try:
+        status_code, body = fn()
+        if status_code < 500:
+            try:
+                with r.pipeline() as pipe:
+                    pipe.hset(result_key, mapping={
+                        "fingerprint": fingerprint, "status": status_code, "body": body})
+                    pipe.expire(result_key, IDEMPOTENCY_TTL_SECONDS)
+                    pipe.execute()
+            except Exception as e:
+                # La operación ya se hizo: se responde igualmente aunque no quede guardada
+                logger.error(f"Error guardando la respuesta de {result_key}: {e}")
+        return status_code, body, False
+    finally:
+        done.set()
+        try:
+            _release_lock(keys=[lock_key], args=[token])
+        except Exception as e:
+            logger.error(f"Error liberando el lock de idempotencia {lock_key}: {e}")
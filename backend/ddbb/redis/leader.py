@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Renueva o libera el lock solo si sigue siendo nuestro
+_RENEW = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaderLock:
+    """
+    Elección de líder entre réplicas con un lock de Redis con caducidad.
+
+    La réplica que consigue el lock es líder mientras lo renueve antes de ttl; si se cae,
+    el lock caduca y otra réplica lo obtiene en su siguiente intento.
+
+    Atributos:
+    - client: Cliente asíncrono de Redis.
+    - key (str): Clave del lock.
+    - ttl (float): Segundos de validez del lock sin renovar.
+    """
+
+    def __init__(self, client, name: str, ttl: float = 15):
+        self.client = client
+        self.key = f"leader:{name}"
+        self.ttl = ttl
+        self.token = uuid.uuid4().hex
+        self.is_leader = False
+
+    async def acquire_or_renew(self):
+        """
+        Intenta obtener el liderazgo o renovarlo si ya se tiene.
+
+        Returns:
+        - bool: True si esta réplica es líder.
+        """
+        ttl_ms = int(self.ttl * 1000)
+        try:
+            if self.is_leader:
+                self.is_leader = bool(await self.client.eval(_RENEW, 1, self.key, self.token, ttl_ms))
+                if not self.is_leader:
+                    logger.error(f"Liderazgo de {self.key} perdido")
+            else:
+                self.is_leader = bool(await self.client.set(self.key, self.token, nx=True, px=ttl_ms))
+                if self.is_leader:
+                    logger.info(f"Liderazgo de {self.key} obtenido")
+        except Exception as e:
+            # Sin Redis no se puede garantizar que no haya otro líder
+            logger.error(f"Error renovando el liderazgo de {self.key}: {e}")
+            self.is_leader = False
+        return self.is_leader
+
+    async def run_renewing(self, func, *args):
+        """
+        Ejecuta func(*args, lost) en un hilo renovando el liderazgo cada ttl / 3 mientras
+        dura, para que otra réplica no tome el lock y repita la tarea a la vez cuando esta
+        dura más que ttl. Si el liderazgo se pierde se activa lost (threading.Event), que func
+        consulta para parar en cuanto pueda.
+
+        Returns:
+        - El resultado de func.
+        """
+        lost = threading.Event()
+        task = asyncio.ensure_future(asyncio.to_thread(func, *args, lost))
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=self.ttl / 3)
+                if done:
+                    return task.result()
+                if not lost.is_set() and not await self.acquire_or_renew():
+                    lost.set()
+        except asyncio.CancelledError:
+            lost.set()
+            raise
+
+    async def release(self):
+        """
+        Libera el liderazgo para que otra réplica lo tome sin esperar a que caduque.
+        """
+        if not self.is_leader:
+            return
+        self.is_leader = False
+        try:
+            await self.client.eval(_RELEASE, 1, self.key, self.token)
+        except Exception as e:
+            logger.error(f"Error liberando el liderazgo de {self.key}: {e}")
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import os
+import time
+
+import redis.asyncio as aioredis
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "")
+# Cada instancia renueva su registro cada REGISTRY_HEARTBEAT_SECONDS; si deja de hacerlo
+# durante REGISTRY_TTL_SECONDS se considera caída
+REGISTRY_HEARTBEAT_SECONDS = float(os.getenv("REGISTRY_HEARTBEAT_SECONDS", 5))
+REGISTRY_TTL_SECONDS = float(os.getenv("REGISTRY_TTL_SECONDS", 15))
+
+
+def registry_key(service: str):
+    """
+    Clave del sorted set con las instancias de un servicio (miembro = URL, score = último latido).
+    """
+    return f"registry:{service}"
+
+
+def get_registry_client():
+    """
+    Cliente asíncrono de Redis para el registro de servicios.
+    """
+    return aioredis.from_url(REDIS_URL)
+
+
+async def heartbeat(client, service: str, url: str):
+    """
+    Registra o renueva una instancia en el registro.
+
+    Args:
+    - client: Cliente asíncrono de Redis.
+    - service (str): Nombre del servicio (p. ej. "tickets").
+    - url (str): URL en la que la instancia atiende peticiones.
+    """
+    await client.zadd(registry_key(service), {url: time.time()})
+
+
+async def heartbeat_loop(service: str, url: str):
+    """
+    Renueva periódicamente el registro de la instancia hasta que se cancela la tarea;
+    al cancelarse la da de baja para que el gateway deje de enviarle tráfico.
+
+    Args:
+    - service (str): Nombre del servicio.
+    - url (str): URL en la que la instancia atiende peticiones.
+    """
+    client = get_registry_client()
+    try:
+        while True:
+            try:
+                await heartbeat(client, service, url)
+            except Exception as e:
+                logger.error(f"Error registrando {service} en {url}: {e}")
+            await asyncio.sleep(REGISTRY_HEARTBEAT_SECONDS)
+    finally:
+        try:
+            await client.zrem(registry_key(service), url)
+        finally:
+            await client.aclose()
+
+
+async def list_instances(client, service: str):
+    """
+    Obtiene las instancias vivas de un servicio y purga las que han dejado de latir.
+
+    Args:
+    - client: Cliente asíncrono de Redis.
+    - service (str): Nombre del servicio.
+
+    Returns:
+    - List[str]: URLs de las instancias con latido reciente.
+    """
+    key = registry_key(service)
+    cutoff = time.time() - REGISTRY_TTL_SECONDS
+    async with client.pipeline(transaction=False) as pipe:
+        pipe.zremrangebyscore(key, "-inf", cutoff)
+        pipe.zrangebyscore(key, cutoff, "+inf")
+        _, members = await pipe.execute()
+    return [member.decode() for member in members]
@@ -0,0 +1,309 @@
+import asyncio
+import importlib
+import logging
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Segundos entre comprobaciones de salud en segundo plano (0 = desactivadas)
+RESOURCE_HEALTH_INTERVAL = float(os.getenv("RESOURCE_HEALTH_INTERVAL", 15))
+# Si se definen, la instancia se anuncia en el registro de Redis para que el gateway la descubra
+SERVICE_NAME = os.getenv("SERVICE_NAME", "")
+SERVICE_ADVERTISE_URL = os.getenv("SERVICE_ADVERTISE_URL", "")
+
+# Cada recurso vive en su módulo; se importan solo los que usa el servicio para que,
+# por ejemplo, el servicio de notificaciones no necesite DATABASE_URL
+RESOURCES = {
+    "postgres": "ddbb.database.db_postgres",
+    "redis": "ddbb.redis.db_redis",
+    "mongo": "ddbb.mongo.db_mongo",
+}
+
+
+def _module(name):
+    return importlib.import_module(RESOURCES[name])
+
+
+def _loaded(name):
+    return sys.modules.get(RESOURCES[name])
+
+
+def _shard_engines():
+    """
+    Motores de los shards adicionales, si el servicio los usa.
+    """
+    sharding = sys.modules.get("ddbb.database.sharding")
+    return sharding.shards.engines[1:] if sharding else []
+
+
+class ResourceManager:
+    """
+    Gestor de los clientes compartidos (Postgres, Redis y Mongo) durante la vida de la app.
+
+    Precalienta los pools al arrancar, comprueba su salud en segundo plano, los cierra al
+    parar y expone estadísticas de cada pool. Cada servicio indica qué recursos usa al
+    crear su lifespan.
+
+    Atributos:
+    - enabled (tuple): Recursos activos en este proceso.
+    - health (dict): Último resultado de la comprobación de salud de cada recurso.
+    """
+
+    def __init__(self):
+        self.enabled = ()
+        self.health = {}
+        self._health_task = None
+        self._heartbeat_task = None
+
+        # Los pools heredados del proceso padre no se pueden compartir con los workers
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        """
+        Descarta en el hijo las conexiones abiertas por el padre antes del fork.
+        """
+        db_postgres = _loaded("postgres")
+        if db_postgres:
+            db_postgres.engine.dispose(close=False)
+            for replica in [*db_postgres.replicas.engines, *_shard_engines()]:
+                replica.dispose(close=False)
+            db_postgres.replicas.after_fork()
+        db_redis = _loaded("redis")
+        if db_redis:
+            db_redis.r.connection_pool.reset()
+        db_mongo = _loaded("mongo")
+        if db_mongo:
+            db_mongo.reset_mongo_client()
+        self._health_task = None
+        self._heartbeat_task = None
+
+    @property
+    def mongo(self):
+        """
+        Cliente de Mongo del proceso.
+        """
+        return _module("mongo").get_mongo_client()
+
+    def lifespan(self, *names):
+        """
+        Crea el lifespan de FastAPI que arranca y cierra los recursos indicados.
+
+        Args:
+        - names (str): Recursos que usa el servicio ("postgres", "redis", "mongo").
+
+        Returns:
+        - Callable: Función lifespan para FastAPI(lifespan=...).
+        """
+        unknown = set(names) - RESOURCES.keys()
+        if unknown:
+            raise ValueError(f"Recursos desconocidos: {unknown}")
+
+        @asynccontextmanager
+        async def lifespan(app):
+            await self.start(*names)
+            try:
+                yield
+            finally:
+                await self.stop()
+
+        return lifespan
+
+    async def start(self, *names):
+        """
+        Precalienta los pools indicados y lanza la comprobación de salud periódica.
+
+        Args:
+        - names (str): Recursos que usa el servicio.
+        """
+        self.enabled = names
+        await asyncio.gather(*(self._warmup(name) for name in names))
+        await self.check_health()
+        if RESOURCE_HEALTH_INTERVAL > 0:
+            self._health_task = asyncio.create_task(self._health_loop())
+        if SERVICE_NAME and SERVICE_ADVERTISE_URL:
+            from ddbb.redis.registry import heartbeat_loop
+            self._heartbeat_task = asyncio.create_task(
+                heartbeat_loop(SERVICE_NAME, SERVICE_ADVERTISE_URL))
+
+    async def stop(self):
+        """
+        Detiene la comprobación de salud y cierra los pools.
+        """
+        if self._health_task:
+            self._health_task.cancel()
+            self._health_task = None
+        if self._heartbeat_task:
+            # Al cancelarse, el latido da de baja la instancia del registro
+            self._heartbeat_task.cancel()
+            await asyncio.gather(self._heartbeat_task, return_exceptions=True)
+            self._heartbeat_task = None
+        if "postgres" in self.enabled:
+            db_postgres = _module("postgres")
+            db_postgres.engine.dispose()
+            for replica in [*db_postgres.replicas.engines, *_shard_engines()]:
+                replica.dispose()
+        if "redis" in self.enabled:
+            _module("redis").r.connection_pool.disconnect()
+        if "mongo" in self.enabled:
+            _module("mongo").close_mongo_client()
+
+    async def _warmup(self, name):
+        try:
+            if name == "postgres":
+                db_postgres = _module("postgres")
+                engines = [db_postgres.engine, *db_postgres.replicas.engines, *_shard_engines()]
+                await asyncio.gather(*(asyncio.to_thread(self._warmup_engine, engine)
+                                       for engine in engines))
+            elif name == "redis":
+                await asyncio.to_thread(self._warmup_redis)
+            elif name == "mongo":
+                # minPoolSize hace que el driver abra el resto de conexiones en segundo plano
+                await self.mongo.admin.command("ping")
+            logger.info(f"Pool {name} precalentado")
+        except Exception as e:
+            # Un recurso caído al arrancar no impide levantar el servicio; lo refleja la salud
+            logger.error(f"Error precalentando {name}: {e}")
+
+    @staticmethod
+    def _warmup_engine(engine):
+        db_postgres = _module("postgres")
+        connections = []
+        try:
+            for _ in range(min(db_postgres.POOL_WARMUP, db_postgres.POOL_OPTIONS["pool_size"])):
+                connection = engine.connect()
+                connection.execute(text("SELECT 1"))
+                connections.append(connection)
+        finally:
+            # Al devolverlas quedan abiertas en el pool para las primeras peticiones
+            for connection in connections:
+                connection.close()
+
+    @staticmethod
+    def _warmup_redis():
+        db_redis = _module("redis")
+        pool = db_redis.r.connection_pool
+        connections = []
+        try:
+            for _ in range(min(db_redis.REDIS_POOL_WARMUP, db_redis.REDIS_MAX_CONNECTIONS)):
+                connection = pool.get_connection("PING")
+                connection.send_command("PING")
+                connection.read_response()
+                connections.append(connection)
+        finally:
+            for connection in connections:
+                pool.release(connection)
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(RESOURCE_HEALTH_INTERVAL)
+            await self.check_health()
+
+    async def check_health(self):
+        """
+        Comprueba cada recurso activo y guarda su estado y latencia. En Postgres se sondea
+        además cada réplica, con su propio estado y retraso.
+
+        Returns:
+        - dict: Estado de cada recurso.
+        """
+        for name in self.enabled:
+            start = time.perf_counter()
+            try:
+                if name == "postgres":
+                    await asyncio.to_thread(self._ping_postgres)
+                elif name == "redis":
+                    await asyncio.to_thread(_module("redis").r.ping)
+                elif name == "mongo":
+                    await self.mongo.admin.command("ping")
+                self.health[name] = {"ok": True, "error": None}
+            except Exception as e:
+                logger.error(f"Health check de {name} fallido: {e}")
+                self.health[name] = {"ok": False, "error": str(e)}
+            self.health[name]["latency_ms"] = round(
+                (time.perf_counter() - start) * 1000, 2)
+            self.health[name]["checked_at"] = time.time()
+            if name == "postgres":
+                self.health[name]["replicas"] = await asyncio.to_thread(self._probe_replicas)
+        return self.health
+
+    @staticmethod
+    def _ping_postgres():
+        # Sin uno de los shards no se pueden atender sus tickets: cuenta como caído
+        for engine in [_module("postgres").engine, *_shard_engines()]:
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+
+    @staticmethod
+    def _probe_replicas():
+        # Una réplica caída o retrasada no marca Postgres como caído (las lecturas pasan al
+        # primario), pero se informa de cada una; el sondeo también la expulsa o readmite.
+        # Una réplica expulsada no se sondea (ni se readmite) hasta que vence su expulsión
+        replicas = _module("postgres").replicas
+        health = []
+        now = time.monotonic()
+        for replica in replicas.engines:
+            ejected_until = replicas.ejected_until.get(replica, 0)
+            if ejected_until > now:
+                status = {"ok": False, "lag": replicas.lag.get(replica), "error": None,
+                          "ejected_for": round(ejected_until - now, 3)}
+            else:
+                status = {**replicas.probe(replica), "ejected_for": None}
+            lagging = bool(replicas.max_lag) and status["lag"] is not None and status["lag"] > replicas.max_lag
+            health.append({"url": replica.url.render_as_string(hide_password=True),
+                           **status, "ejected": status["ejected_for"] is not None, "lagging": lagging})
+        return health
+
+    def stats(self):
+        """
+        Estadísticas de los pools activos en este proceso.
+
+        Returns:
+        - dict: Por recurso, tamaño y uso del pool junto con su último estado de salud.
+        """
+        stats = {"pid": os.getpid()}
+        if "postgres" in self.enabled:
+            db_postgres = _module("postgres")
+            stats["postgres"] = {
+                "primary": self._engine_stats(db_postgres.engine),
+                "replicas": [self._engine_stats(replica) for replica in db_postgres.replicas.engines],
+                "shards": [self._engine_stats(shard) for shard in _shard_engines()],
+            }
+        if "redis" in self.enabled:
+            pool = _module("redis").r.connection_pool
+            stats["redis"] = {
+                "max_connections": pool.max_connections,
+                "created": pool._created_connections,
+                "available": len(pool._available_connections),
+                "in_use": len(pool._in_use_connections),
+            }
+        if "mongo" in self.enabled:
+            db_mongo = _module("mongo")
+            stats["mongo"] = {
+                "max_pool_size": db_mongo.MONGO_MAX_POOL_SIZE,
+                "min_pool_size": db_mongo.MONGO_MIN_POOL_SIZE,
+            }
+        for name in self.enabled:
+            stats[name]["health"] = self.health.get(name)
+        return stats
+
+    @staticmethod
+    def _engine_stats(engine):
+        pool = engine.pool
+        return {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        }
+
+
+resources = ResourceManager()
@@ -0,0 +1,532 @@
+import atexit
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import urllib.request
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import NamedTuple, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Destino de las trazas: "file" (una petición OTLP/JSON por línea en TRACE_FILE, la que lee
+# el receptor otlpjsonfile del collector), "otlp" (POST OTLP/HTTP JSON a TRACE_OTLP_ENDPOINT)
+# o "none" (trazas desactivadas, sin coste)
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none")
+TRACING_ENABLED = TRACE_EXPORTER in ("file", "otlp")
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.getenv(
+    "TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+# Fracción de trazas que se guardan; la decide el primer servicio (el gateway) y el resto
+# la respeta a través del flag de traceparent
+TRACE_SAMPLE_RATIO = float(os.getenv("TRACE_SAMPLE_RATIO", 0.1))
+TRACE_BATCH_SIZE = int(os.getenv("TRACE_BATCH_SIZE", 512))
+TRACE_FLUSH_SECONDS = float(os.getenv("TRACE_FLUSH_SECONDS", 2))
+# Spans pendientes de exportar; si el exportador no da abasto se descartan los nuevos
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", 10000))
+TRACE_STATEMENT_MAX = int(os.getenv("TRACE_STATEMENT_MAX", 1000))
+
+SERVICE_NAME = os.getenv("SERVICE_NAME", "")
+
+# Tipos de span de OTLP
+INTERNAL, SERVER, CLIENT, PRODUCER, CONSUMER = 1, 2, 3, 4, 5
+STATUS_ERROR = 2
+
+_SAMPLE_BOUND = int(TRACE_SAMPLE_RATIO * 2 ** 64)
+
+
+class SpanContext(NamedTuple):
+    """
+    Contexto de un span remoto, leído de una cabecera traceparent.
+    """
+    trace_id: str
+    span_id: str
+    sampled: bool
+
+
+class Span:
+    """
+    Una operación de una traza.
+
+    Los spans no muestreados no se exportan, pero se crean igualmente para propagar el
+    contexto (y la decisión de no muestrear) a las llamadas salientes.
+    """
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start", "end",
+                 "attributes", "status", "links", "sampled")
+
+    def __init__(self, name: str, kind: int, trace_id: str, parent_id: Optional[str],
+                 sampled: bool, attributes: dict = None, links=()):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start = time.time_ns()
+        self.end = 0
+        self.attributes = attributes or {}
+        self.status = None
+        self.links = links
+        self.sampled = sampled
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def record_error(self, error):
+        self.status = (STATUS_ERROR, str(error))
+        self.attributes["exception.type"] = type(error).__name__
+
+    def finish(self):
+        if self.sampled and not self.end:
+            self.end = time.time_ns()
+            exporter.export(self)
+
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+
+# Valor por defecto de parent: el span activo en el contexto
+CURRENT = object()
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def parse_traceparent(header: str) -> Optional[SpanContext]:
+    """
+    Lee una cabecera W3C traceparent ("00-<trace_id>-<span_id>-<flags>").
+
+    Returns:
+    - SpanContext: El contexto remoto, o None si la cabecera no es válida.
+    """
+    parts = header.strip().split("-") if header else ()
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        flags = int(parts[3][:2], 16)
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return SpanContext(parts[1], parts[2], bool(flags & 1))
+
+
+def start_span(name: str, kind: int = INTERNAL, parent=CURRENT, attributes: dict = None,
+               links=(), child_only: bool = False) -> Optional[Span]:
+    """
+    Crea un span sin activarlo.
+
+    Args:
+    - name (str): Nombre de la operación.
+    - kind (int): Tipo de span (INTERNAL, SERVER, CLIENT...).
+    - parent (Span | SpanContext, optional): Span padre; por defecto el activo y con None
+      empieza una traza nueva, muestreada según TRACE_SAMPLE_RATIO.
+    - attributes (dict, optional): Atributos del span.
+    - links (tuple, optional): Spans relacionados que no son el padre.
+    - child_only (bool): Si es True, solo se crea dentro de una traza muestreada (lo usan
+      las consultas a Postgres, Redis y Mongo, que no tienen sentido como traza propia).
+
+    Returns:
+    - Span: El span, o None si las trazas están desactivadas o no se crea.
+    """
+    if not TRACING_ENABLED:
+        return None
+    if parent is CURRENT:
+        parent = _current.get()
+    if parent is None:
+        if child_only:
+            return None
+        trace_id = f"{random.getrandbits(128):032x}"
+        # La decisión depende solo del trace_id, igual en todos los servicios
+        sampled = int(trace_id[16:], 16) < _SAMPLE_BOUND
+        return Span(name, kind, trace_id, None, sampled, attributes, links)
+    if child_only and not parent.sampled:
+        return None
+    return Span(name, kind, parent.trace_id, parent.span_id, parent.sampled, attributes, links)
+
+
+@contextmanager
+def span(name: str, kind: int = INTERNAL, attributes: dict = None, parent=CURRENT,
+         links=(), child_only: bool = False):
+    """
+    Crea un span, lo activa mientras dura el bloque y lo cierra al salir (con estado de
+    error si el bloque lanza una excepción). Devuelve None si no se crea el span.
+    """
+    current = start_span(name, kind, parent, attributes, links, child_only)
+    if current is None:
+        yield None
+        return
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.record_error(e)
+        raise
+    finally:
+        _current.reset(token)
+        current.finish()
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(item: Span):
+    data = {
+        "traceId": item.trace_id,
+        "spanId": item.span_id,
+        "name": item.name,
+        "kind": item.kind,
+        "startTimeUnixNano": str(item.start),
+        "endTimeUnixNano": str(item.end),
+        "attributes": [{"key": key, "value": _otlp_value(value)}
+                       for key, value in item.attributes.items()],
+    }
+    if item.parent_id:
+        data["parentSpanId"] = item.parent_id
+    if item.status:
+        data["status"] = {"code": item.status[0], "message": item.status[1]}
+    if item.links:
+        data["links"] = [{"traceId": link.trace_id, "spanId": link.span_id}
+                         for link in item.links]
+    return data
+
+
+class SpanExporter:
+    """
+    Exporta los spans terminados por lotes desde un hilo en segundo plano, para que
+    cerrar un span no haga nunca E/S en el hilo de la petición.
+
+    Atributos:
+    - service_name (str): Nombre del servicio en el recurso OTLP.
+    - exported (int): Spans exportados.
+    - dropped (int): Spans descartados por cola llena o error al exportar.
+    """
+
+    def __init__(self, kind: str, path: str = TRACE_FILE, endpoint: str = TRACE_OTLP_ENDPOINT):
+        self.kind = kind
+        self.path = path
+        self.endpoint = endpoint
+        self.service_name = SERVICE_NAME or "unknown"
+        self.queue = deque()
+        self.exported = 0
+        self.dropped = 0
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def export(self, item: Span):
+        if len(self.queue) >= TRACE_QUEUE_SIZE:
+            self.dropped += 1
+            return
+        self.queue.append(item)
+        if self._pid != os.getpid():
+            self._start()
+        if len(self.queue) >= TRACE_BATCH_SIZE:
+            self._wake.set()
+
+    def _start(self):
+        # También tras un fork: el hilo del proceso padre no existe en el hijo
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name="span-exporter", daemon=True).start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(TRACE_FLUSH_SECONDS)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """
+        Exporta todos los spans pendientes.
+        """
+        with self._lock:
+            while self.queue:
+                batch = []
+                while self.queue and len(batch) < TRACE_BATCH_SIZE:
+                    batch.append(self.queue.popleft())
+                try:
+                    self._write(batch)
+                    self.exported += len(batch)
+                except Exception as e:
+                    self.dropped += len(batch)
+                    logger.error(f"Error exportando {len(batch)} spans: {e}")
+
+    def _write(self, batch):
+        payload = json.dumps({"resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": __name__},
+                            "spans": [_otlp_span(item) for item in batch]}],
+        }]}, separators=(",", ":"))
+        if self.kind == "file":
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(payload + "\n")
+        else:
+            request = urllib.request.Request(
+                self.endpoint, data=payload.encode(), method="POST",
+                headers={"Content-Type": "application/json"})
+            with urllib.request.urlopen(request, timeout=5) as response:
+                response.read()
+
+    def stats(self):
+        return {"pending": len(self.queue), "exported": self.exported, "dropped": self.dropped}
+
+
+exporter = SpanExporter(TRACE_EXPORTER)
+
+
+class TracingMiddleware:
+    """
+    Middleware ASGI que crea un span por petición HTTP, continuando la traza de la cabecera
+    traceparent si la trae (o empezando una nueva, como hace el gateway). Si la traza se
+    muestrea, su id se devuelve en la cabecera X-Trace-Id.
+    """
+
+    def __init__(self, app, service_name: str = None):
+        self.app = app
+        if service_name and not SERVICE_NAME:
+            exporter.service_name = service_name
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        parent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                parent = parse_traceparent(value.decode("latin-1"))
+                break
+        method = scope["method"]
+        attributes = {"http.method": method, "http.target": scope["path"]}
+        with span(f"{method} {scope['path']}", SERVER, attributes, parent=parent) as current:
+            async def send_traced(message):
+                if message["type"] == "http.response.start":
+                    current.set_attribute("http.status_code", message["status"])
+                    if message["status"] >= 500:
+                        current.status = (STATUS_ERROR, f"HTTP {message['status']}")
+                    if current.sampled:
+                        message.setdefault("headers", [])
+                        message["headers"] = [
+                            *message["headers"], (b"x-trace-id", current.trace_id.encode())]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_traced)
+            finally:
+                # La plantilla de la ruta se conoce después del enrutado de FastAPI
+                route = scope.get("route")
+                if route is not None and getattr(route, "path", None):
+                    current.name = f"{method} {route.path}"
+                    current.set_attribute("http.route", route.path)
+
+
+class TracingTransport:
+    """
+    Transporte de httpx que crea un span por petición saliente y le añade la cabecera
+    traceparent para que el servicio de destino continúe la traza.
+
+    Args:
+    - transport (httpx.AsyncBaseTransport): El transporte que envía las peticiones.
+    """
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    async def handle_async_request(self, request):
+        attributes = {"http.method": request.method, "http.url": str(request.url)}
+        with span(f"{request.method} {request.url.host}", CLIENT, attributes) as current:
+            if current is None:
+                return await self.transport.handle_async_request(request)
+            request.headers["traceparent"] = current.traceparent()
+            response = await self.transport.handle_async_request(request)
+            current.set_attribute("http.status_code", response.status_code)
+            if response.status_code >= 500:
+                current.status = (STATUS_ERROR, f"HTTP {response.status_code}")
+            return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+    async def __aenter__(self):
+        await self.transport.__aenter__()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.transport.__aexit__(*args)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "SQL"
+    current = start_span(f"{conn.dialect.name} {operation}", CLIENT, attributes={
+        "db.system": conn.dialect.name,
+        "db.statement": statement[:TRACE_STATEMENT_MAX],
+    }, child_only=True)
+    if current is not None:
+        conn.info.setdefault("trace_spans", []).append(current)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    spans = conn.info.get("trace_spans")
+    if spans:
+        current = spans.pop()
+        if cursor.rowcount is not None and cursor.rowcount >= 0:
+            current.set_attribute("db.rows", cursor.rowcount)
+        current.finish()
+
+
+def _on_db_error(context):
+    spans = context.connection.info.get("trace_spans") if context.connection else None
+    if spans:
+        current = spans.pop()
+        current.record_error(context.original_exception)
+        current.finish()
+
+
+def instrument_engine(engine):
+    """
+    Crea un span por cada sentencia SQL que se ejecuta dentro de una traza muestreada.
+    """
+    if not TRACING_ENABLED:
+        return
+    from sqlalchemy import event
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _on_db_error)
+
+
+def instrument_redis(client):
+    """
+    Crea un span por cada comando (o pipeline) de Redis que se ejecuta dentro de una traza
+    muestreada. Sirve tanto para clientes síncronos como de redis.asyncio.
+
+    Returns:
+    - Redis: El mismo cliente.
+    """
+    if not TRACING_ENABLED or getattr(client, "_traced", False):
+        return client
+    client._traced = True
+    execute_command = client.execute_command
+    pipeline = client.pipeline
+    is_async = type(client).__module__.startswith("redis.asyncio")
+
+    def attributes(command, count=1):
+        return {"db.system": "redis", "db.operation": command, "db.redis.commands": count}
+
+    if is_async:
+        async def traced_command(*args, **options):
+            with span(f"redis {args[0]}", CLIENT, attributes(args[0]), child_only=True):
+                return await execute_command(*args, **options)
+    else:
+        def traced_command(*args, **options):
+            with span(f"redis {args[0]}", CLIENT, attributes(args[0]), child_only=True):
+                return execute_command(*args, **options)
+
+    def traced_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        if is_async:
+            async def traced_execute(*a, **k):
+                with span("redis PIPELINE", CLIENT, attributes("PIPELINE", len(pipe.command_stack)),
+                          child_only=True):
+                    return await execute(*a, **k)
+        else:
+            def traced_execute(*a, **k):
+                with span("redis PIPELINE", CLIENT, attributes("PIPELINE", len(pipe.command_stack)),
+                          child_only=True):
+                    return execute(*a, **k)
+        pipe.execute = traced_execute
+        return pipe
+
+    client.execute_command = traced_command
+    client.pipeline = traced_pipeline
+    return client
+
+
+def _print_trace(spans):
+    by_parent = {}
+    for item in spans:
+        by_parent.setdefault(item.get("parentSpanId"), []).append(item)
+    ids = {item["spanId"] for item in spans}
+    roots = [item for item in spans if item.get("parentSpanId") not in ids]
+
+    def show(item, depth):
+        start, end = int(item["startTimeUnixNano"]), int(item["endTimeUnixNano"])
+        error = " ERROR" if item.get("status", {}).get("code") == STATUS_ERROR else ""
+        print(f"{'  ' * depth}{item['name']} [{item['service']}] {(end - start) / 1e6:.2f} ms{error}")
+        for child in sorted(by_parent.get(item["spanId"], []), key=lambda c: int(c["startTimeUnixNano"])):
+            show(child, depth + 1)
+
+    for root in sorted(roots, key=lambda c: int(c["startTimeUnixNano"])):
+        show(root, 0)
+
+
+def main(argv):
+    """
+    Muestra como árbol las trazas de uno o varios ficheros de TRACE_FILE:
+
+        python -m ddbb.tracing traces.jsonl [...] [--trace <trace_id>] [--slowest N]
+    """
+    paths, trace_id, slowest = [], None, 10
+    args = iter(argv)
+    for arg in args:
+        if arg == "--trace":
+            trace_id = next(args)
+        elif arg == "--slowest":
+            slowest = int(next(args))
+        else:
+            paths.append(arg)
+
+    traces = {}
+    for path in paths or [TRACE_FILE]:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                for resource in json.loads(line)["resourceSpans"]:
+                    service = next((a["value"]["stringValue"] for a in resource["resource"]["attributes"]
+                                    if a["key"] == "service.name"), "?")
+                    for scope in resource["scopeSpans"]:
+                        for item in scope["spans"]:
+                            item["service"] = service
+                            traces.setdefault(item["traceId"], []).append(item)
+
+    if trace_id:
+        _print_trace(traces.get(trace_id, []))
+        return
+
+    def duration(spans):
+        return (max(int(s["endTimeUnixNano"]) for s in spans) - min(int(s["startTimeUnixNano"]) for s in spans))
+
+    for tid, spans in sorted(traces.items(), key=lambda item: -duration(item[1]))[:slowest]:
+        print(f"trace {tid} ({duration(spans) / 1e6:.2f} ms)")
+        _print_trace(spans)
+        print()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
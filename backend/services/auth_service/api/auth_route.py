@@ -2,9 +2,9 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from ddbb.database.db_postgres import get_db
 from ..schemas.user import UserCreate, UserLogin
-from ..schemas.token import Token
-from ..services.auth_service import create_user, login_user, forgot_password_s
-from ddbb.database.models.User import User
+from ..schemas.token import Token, RefreshRequest
+from ..services.auth_service import create_user, login_user, forgot_password_s, refresh_access_token
+from ..services.refresh_service import revoke_refresh_token, revoke_user_sessions
 
 
 router = APIRouter()
@@ -27,16 +27,41 @@ def login(user: UserLogin, db: Session = Depends(get_db)):
     return login_user(user_login=user, db=db)
 
 
+@router.post("/refresh", response_model=Token)
+def refresh(request: RefreshRequest):
+    """
+    Ruta para renovar el token de acceso con un refresh token (que se rota).
+    """
+    return refresh_access_token(request.refresh_token)
+
+
+@router.post("/logout")
+def logout(request: RefreshRequest):
+    """
+    Ruta para cerrar la sesión asociada a un refresh token.
+    """
+    revoke_refresh_token(request.refresh_token)
+    return {"msg": "Session closed."}
+
+
+@router.post("/logout-all")
+def logout_all(request: RefreshRequest):
+    """
+    Ruta para cerrar todas las sesiones del usuario al que pertenece el refresh token.
+    """
+    sub = revoke_refresh_token(request.refresh_token)
+    if not sub:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    revoke_user_sessions(sub)
+    return {"msg": "All sessions closed."}
+
+
 @router.post("/forgot-password")
 def forgot_password(email: str, db: Session = Depends(get_db)):
     """
     Ruta para solicitar el restablecimiento de la contraseña.
     Envía un correo electrónico con instrucciones.
     """
-    user = db.query(User).filter(User.email == email).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    # Llamamos al servicio para enviar el correo de recuperación
+    # El servicio ya comprueba que el usuario existe (404 si no)
     forgot_password_s(db, email)
     return {"msg": "Password reset email sent."}
@@ -8,6 +8,10 @@ JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "supersecretkey")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 JWT_EXPIRATION_MINUTES = int(os.getenv("JWT_EXPIRATION_MINUTES", 30))
 
+# Configuración de los refresh tokens (opacos, guardados como hash en Redis)
+REFRESH_TOKEN_EXPIRATION_DAYS = int(
+    os.getenv("REFRESH_TOKEN_EXPIRATION_DAYS", 30))
+
 # Configuración del correo (SMTP)
 EMAIL_HOST = os.getenv("EMAIL_HOST", "smtp.mailtrap.io")
 EMAIL_PORT = int(os.getenv("EMAIL_PORT", 587))
@@ -1,8 +1,30 @@
+from contextlib import asynccontextmanager
+import asyncio
+import logging
 from fastapi import FastAPI
 from services.auth_service.api.auth_route import router as auth_router
 from fastapi.middleware.cors import CORSMiddleware
+from ddbb.database.user_cache import build_email_filter
+from ddbb import deadline
+from ddbb.resources import resources
+from ddbb.profiling import ProfilingMiddleware
+from ddbb.tracing import TracingMiddleware
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with resources.lifespan("postgres", "redis")(app):
+        # Mientras el filtro de emails no esté listo, el registro consulta siempre la base de datos
+        try:
+            await asyncio.to_thread(build_email_filter)
+        except Exception as e:
+            logger.error(f"Error construyendo el filtro de emails: {e}")
+        yield
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -11,5 +33,13 @@ app.add_middleware(
     allow_methods=["*"],  # Permite todos los métodos (GET, POST, OPTIONS, etc.)
     allow_headers=["*"],  # Permite todos los headers
 )
+app.add_middleware(ProfilingMiddleware, service_name="auth_service")
+# Plazo de la petición (X-Request-Deadline-Ms), control de admisión y cancelación
+app.add_middleware(deadline.DeadlineMiddleware)
+app.add_middleware(TracingMiddleware, service_name="auth_service")
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
 
+
+@app.get("/health")
+def health():
+    return {**resources.stats(), "deadlines": deadline.stats()}
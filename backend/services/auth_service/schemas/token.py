@@ -1,9 +1,15 @@
+from typing import Optional
 from pydantic import BaseModel, EmailStr
 
 
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
 
     class Config:
         orm_mode = True
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
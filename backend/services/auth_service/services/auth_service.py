@@ -1,12 +1,16 @@
 from datetime import datetime, timedelta
 from jose import jwt
+from redis.exceptions import RedisError
 from passlib.context import CryptContext
 from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from ddbb.database.models.User import User
+from ddbb.database import user_cache
 from ..schemas.user import UserCreate, UserLogin
 from ..schemas.token import Token
-from . import email_service
+from . import email_service, refresh_service
 from ..app.config import JWT_SECRET_KEY, JWT_ALGORITHM, JWT_EXPIRATION_MINUTES
 
 import logging
@@ -76,11 +80,19 @@ def authenticate_user(db: Session, email: str, password: str):
     - password (str): Contraseña del usuario.
 
     Returns:
-    - User or None: El usuario autenticado si la autenticación es exitosa, None en caso contrario.
+    - dict or None: Las columnas cacheadas del usuario autenticado si la autenticación es
+      exitosa, None en caso contrario.
     """
-    user = db.query(User).filter(User.email == email).first()
+    # Los emails desconocidos se resuelven en la caché negativa sin ir a la base de datos
+    user = user_cache.get_user_by_email(db, email)
     logger.info(f"User found: {user}")
-    if user and verify_password(password, user.hashed_password):
+    if not user:
+        logger.error("User not found or password incorrect")
+        return None
+    # La caché nunca guarda la contraseña: solo se lee el hash, por clave primaria
+    hashed_password = db.execute(select(User.hashed_password).where(
+        User.id == user["id"])).scalar_one_or_none()
+    if hashed_password and verify_password(password, hashed_password):
         return user
     logger.error("User not found or password incorrect")
     return None
@@ -101,11 +113,13 @@ def create_user(db: Session, user: UserCreate):
     - User: El usuario creado.
     """
     logger.info(f"Creating user: {user}")
-    db_user = db.query(User).filter(User.email == user.email).first()
-    logger.info(f"User found: {db_user} expected None")
-    if db_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST, detail="El usuario ya existe")
+    # El filtro de Bloom descarta sin consultar la base de datos los emails que seguro son nuevos
+    if user_cache.email_may_exist(user.email):
+        db_user = user_cache.get_user_by_email(db, user.email)
+        logger.info(f"User found: {db_user} expected None")
+        if db_user:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="El usuario ya existe")
 
     hashed_password = get_password_hash(user.password)
     db_user = User(
@@ -118,7 +132,13 @@ def create_user(db: Session, user: UserCreate):
         role_id=1
     )
     db.add(db_user)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # La restricción unique de la base de datos sigue siendo la garantía final
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="El usuario ya existe")
     db.refresh(db_user)
     logger.info(f"User created: {db_user}")
     return db_user
@@ -136,7 +156,8 @@ def login_user(db: Session, user_login: UserLogin):
     - HTTPException: Si las credenciales son incorrectas.
 
     Returns:
-    - Token: El token de acceso.
+    - Token: El token de acceso y el refresh token de la nueva sesión (sin refresh token
+      si Redis no está disponible).
     """
     user = authenticate_user(db, user_login.email, user_login.password)
     logger.info(f"User authenticated: {user}")
@@ -145,9 +166,42 @@ def login_user(db: Session, user_login: UserLogin):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Credenciales incorrectas")
 
-    access_token = create_access_token(data={"sub": user.email})
+    access_token = create_access_token(data={"sub": user["email"]})
     logger.info(f"Token created: {access_token}")
-    return Token(access_token=access_token, token_type="bearer")
+    try:
+        refresh_token = refresh_service.issue_refresh_token(user["email"])
+    except RedisError as e:
+        # El login no depende de Redis: sin refresh token el cliente vuelve a autenticarse
+        # cuando caduque el token de acceso
+        logger.error(f"No se pudo emitir el refresh token: {e}")
+        refresh_token = None
+    return Token(access_token=access_token, token_type="bearer", refresh_token=refresh_token)
+
+
+def refresh_access_token(refresh_token: str):
+    """
+    Renueva el token de acceso a partir de un refresh token, sin consultar la base de datos
+    ni verificar la contraseña. El refresh token se rota en cada uso.
+
+    Args:
+    - refresh_token (str): El refresh token emitido en el login o en la última renovación.
+
+    Raises:
+    - HTTPException: 401 si el refresh token no es válido o ya se había usado, 503 si
+      Redis no está disponible.
+
+    Returns:
+    - Token: El nuevo token de acceso y el nuevo refresh token.
+    """
+    try:
+        sub, new_refresh_token = refresh_service.rotate_refresh_token(
+            refresh_token)
+    except RedisError as e:
+        logger.error(f"No se pudo rotar el refresh token: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Servicio de sesiones no disponible")
+    access_token = create_access_token(data={"sub": sub})
+    return Token(access_token=access_token, token_type="bearer", refresh_token=new_refresh_token)
 
 
 def forgot_password_s(db: Session, email: str):
@@ -164,12 +218,12 @@ def forgot_password_s(db: Session, email: str):
     Returns:
     - dict: Un diccionario con un mensaje de confirmación.
     """
-    user = db.query(User).filter(User.email == email).first()
+    user = user_cache.get_user_by_email(db, email)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Usuario no encontrado")
 
     # Aquí enviarías el correo con el enlace para cambiar la contraseña
-    reset_link = f"https://your-app.com/reset-password/{user.id}"
+    reset_link = f"https://your-app.com/reset-password/{user['id']}"
     email_service.send_password_reset_email(email, reset_link)
     return {"msg": "Correo de recuperación enviado"}
@@ -0,0 +1,158 @@
+import hashlib
+import secrets
+import uuid
+from fastapi import HTTPException, status
+from ddbb.redis.db_redis import r
+from ..app.config import REFRESH_TOKEN_EXPIRATION_DAYS
+
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+REFRESH_TOKEN_TTL_SECONDS = REFRESH_TOKEN_EXPIRATION_DAYS * 24 * 3600
+
+# Claves en Redis:
+# - refresh:{hash}         -> hash {sub, family} del refresh token vigente
+# - refresh_used:{hash}    -> familia de un token ya rotado (para detectar su reutilización)
+# - refresh_family:{id}    -> set con los hashes de los tokens de una sesión
+# - refresh_user:{sub}     -> set con las familias (sesiones) de un usuario
+
+# Consume un refresh token en una sola operación: KEYS = refresh:{hash} y
+# refresh_used:{hash}; ARGV = hash y ttl. Devuelve {1, sub, familia} si el token era
+# válido (y lo marca como usado), {0, familia} si ya se había rotado y {0} si no existe
+_rotate = r.register_script("""
+local sub = redis.call('hget', KEYS[1], 'sub')
+if not sub then
+    local family = redis.call('get', KEYS[2])
+    if family then
+        return {0, family}
+    end
+    return {0}
+end
+local family = redis.call('hget', KEYS[1], 'family')
+redis.call('del', KEYS[1])
+redis.call('set', KEYS[2], family, 'EX', ARGV[2])
+redis.call('srem', 'refresh_family:' .. family, ARGV[1])
+return {1, sub, family}
+""")
+
+
+def _hash(token: str):
+    """
+    Hash del refresh token; en Redis nunca se guarda el token en claro.
+    """
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _store(sub: str, family: str):
+    """
+    Genera un refresh token nuevo para la familia indicada y lo guarda en Redis.
+    """
+    token = secrets.token_urlsafe(32)
+    token_hash = _hash(token)
+    with r.pipeline() as pipe:
+        pipe.hset(f"refresh:{token_hash}", mapping={
+                  "sub": sub, "family": family})
+        pipe.expire(f"refresh:{token_hash}", REFRESH_TOKEN_TTL_SECONDS)
+        pipe.sadd(f"refresh_family:{family}", token_hash)
+        pipe.expire(f"refresh_family:{family}", REFRESH_TOKEN_TTL_SECONDS)
+        pipe.sadd(f"refresh_user:{sub}", family)
+        pipe.expire(f"refresh_user:{sub}", REFRESH_TOKEN_TTL_SECONDS)
+        pipe.execute()
+    return token
+
+
+def issue_refresh_token(sub: str):
+    """
+    Crea un refresh token para una sesión nueva (una familia nueva de tokens).
+
+    Args:
+    - sub (str): Identificador del usuario (el mismo "sub" que el token de acceso).
+
+    Returns:
+    - str: El refresh token opaco.
+    """
+    return _store(sub, uuid.uuid4().hex)
+
+
+def rotate_refresh_token(token: str):
+    """
+    Consume un refresh token y emite el siguiente de la misma sesión.
+
+    Cada token sirve una sola vez. Si se presenta un token ya rotado se asume que ha sido
+    robado y se revoca toda la sesión (detección de reutilización).
+
+    Args:
+    - token (str): El refresh token presentado por el cliente.
+
+    Raises:
+    - HTTPException: 401 si el token no es válido, ha caducado o ya se había usado.
+
+    Returns:
+    - tuple: (sub del usuario, nuevo refresh token).
+    """
+    token_hash = _hash(token)
+    # Lectura, borrado y marca de usado en el mismo script: solo una petición gana la
+    # rotación y un token rotado siempre queda registrado como usado
+    result = _rotate(keys=[f"refresh:{token_hash}", f"refresh_used:{token_hash}"],
+                     args=[token_hash, REFRESH_TOKEN_TTL_SECONDS])
+    if not result[0]:
+        if len(result) > 1:
+            family = result[1].decode()
+            logger.error(f"Refresh token reutilizado, revocando la sesión {family}")
+            revoke_family(family)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Refresh token inválido")
+
+    sub, family = result[1].decode(), result[2].decode()
+    return sub, _store(sub, family)
+
+
+def revoke_family(family: str):
+    """
+    Revoca todos los refresh tokens de una sesión.
+
+    Args:
+    - family (str): Identificador de la sesión.
+    """
+    token_hashes = r.smembers(f"refresh_family:{family}")
+    with r.pipeline() as pipe:
+        for token_hash in token_hashes:
+            pipe.hget(f"refresh:{token_hash.decode()}", "sub")
+        subs = {sub for sub in pipe.execute() if sub}
+        for token_hash in token_hashes:
+            pipe.delete(f"refresh:{token_hash.decode()}")
+        pipe.delete(f"refresh_family:{family}")
+        for sub in subs:
+            pipe.srem(f"refresh_user:{sub.decode()}", family)
+        pipe.execute()
+
+
+def revoke_refresh_token(token: str):
+    """
+    Cierra la sesión a la que pertenece un refresh token.
+
+    Args:
+    - token (str): El refresh token de la sesión.
+
+    Returns:
+    - str: El sub del usuario, o None si el token no es válido.
+    """
+    data = r.hgetall(f"refresh:{_hash(token)}")
+    if not data:
+        return None
+    revoke_family(data[b"family"].decode())
+    return data[b"sub"].decode()
+
+
+def revoke_user_sessions(sub: str):
+    """
+    Revoca todas las sesiones (refresh tokens) de un usuario.
+
+    Args:
+    - sub (str): Identificador del usuario.
+    """
+    for family in r.smembers(f"refresh_user:{sub}"):
+        revoke_family(family.decode())
+    r.delete(f"refresh_user:{sub}")
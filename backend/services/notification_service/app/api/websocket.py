@@ -1,13 +1,19 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
 from services.notification_service.app.services.event_bus import EventBus
+from services.notification_service.app.services.codecs import decode_message, negotiate
+from services.notification_service.app.services.connection_registry import PONG_FRAME
+from services.notification_service.app.services.dispatcher import NotificationDispatcher
 from logging import getLogger
-from services.notification_service.app.models.notification import Notification
+from services.notification_service.app.models.notification import (
+    Notification, NotificationBatch, NotificationContent, NotificationGroup)
 
 logger = getLogger(__name__)
 
 
 router = APIRouter()
 event_bus = EventBus()
+dispatcher = NotificationDispatcher(event_bus)
 
 
 @router.websocket("/ws/{user_id}")
@@ -18,21 +24,52 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
     Se suscribe al evento de notificación para el usuario especificado y espera a recibir
     eventos de notificación. Cuando se produce un evento, se envía a través del websocket.
 
+    El cliente puede pedir el subprotocolo notify.v1.msgpack (frames binarios) o
+    notify.v1.json; con ellos recibe en cada frame una lista con las notificaciones que han
+    llegado juntas. Sin subprotocolo recibe una notificación JSON por frame. La compresión
+    permessage-deflate la negocia el servidor websocket (uvicorn) si el cliente la ofrece.
+
+    El servidor envía {"type": "ping"} a las conexiones sin tráfico y el cliente responde
+    {"type": "pong"}; cualquier mensaje del cliente cuenta como señal de vida. Los demás
+    mensajes que sean notificaciones válidas se publican.
+
     Si se produce una desconexión del websocket, se desuscribe el usuario de las notificaciones.
 
     :param websocket: El websocket al que se va a conectar.
     :param user_id: El id del usuario al que se van a suscribir las notificaciones.
     """
-    await event_bus.subscribe(user_id, websocket)
+    protocol = negotiate(websocket.scope.get("subprotocols", []))
+    await websocket.accept(subprotocol=protocol)
+    connection = await event_bus.subscribe(user_id, websocket, protocol)
     try:
         while True:
-            data = await websocket.receive_json()
-            await event_bus.publish(data)
-            logger.info(f"Published event: {data}")
-            raise WebSocketDisconnect(1000)
+            data = await websocket.receive()
+            if data["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(data.get("code", 1000))
+            event_bus.registry.touch(connection)
+            if data.get("text") == PONG_FRAME:
+                continue
+            message = decode_message(data, protocol)
+            if not isinstance(message, dict):
+                continue
+            if message.get("type") == "pong":
+                continue
+            if message.get("type") == "ping":
+                await websocket.send_text(PONG_FRAME)
+                continue
+            try:
+                notification = Notification.model_validate(message)
+            except ValidationError:
+                logger.warning(f"Ignored invalid message from user {user_id}")
+                continue
+            content = NotificationContent(
+                **notification.model_dump(exclude={"user_id"}))
+            await dispatcher.dispatch(content, [notification.user_id])
+            logger.info(f"Published event: {notification}")
     except WebSocketDisconnect:
-        await event_bus.unsubscribe(user_id, websocket)
         logger.info(f"Unsubscribed user {user_id}")
+    finally:
+        await event_bus.unsubscribe(connection)
 
     logger.info(f"Closed connection for user {user_id}")
 
@@ -43,16 +80,55 @@ async def send_notification(notification: Notification):
     Publica una notificación para el usuario especificado.
 
     El endpoint publica una notificación para el usuario especificado y devuelve un
-    mensaje de confirmación.
+    mensaje de confirmación. Si el usuario acaba de recibir otra del mismo ticket, se
+    agrupa en un resumen.
 
     :param notification: La notificación a publicar.
     :return: Un mensaje de confirmación.
     """
-    await event_bus.publish(notification)
+    content = NotificationContent(
+        **notification.model_dump(exclude={"user_id"}))
+    await dispatcher.dispatch(content, [notification.user_id])
     logger.info(f"Published notification: {notification}")
     return {"status": "notification queued", "notification": notification}
 
 
+@router.post("/notify/batch")
+async def send_batch_notification(batch: NotificationBatch, request: Request):
+    """
+    Publica una misma notificación para varios usuarios: los de user_ids y los del grupo.
+
+    El contenido se serializa una vez, se publica para todos en una sola operación del bus
+    y se guarda con una única escritura.
+
+    :param batch: La notificación y sus destinatarios.
+    :return: Destinatarios notificados al momento y notificaciones agrupadas en resúmenes.
+    """
+    user_ids = list(batch.user_ids)
+    if batch.group:
+        user_ids += await request.app.state.notification_service.get_group_members(batch.group)
+    if not user_ids:
+        raise HTTPException(status_code=400, detail="No recipients")
+
+    content = NotificationContent(
+        **batch.model_dump(exclude={"user_ids", "group"}))
+    result = await dispatcher.dispatch(content, user_ids)
+    logger.info(f"Published batch notification to {len(user_ids)} recipients")
+    return {"status": "notification queued", **result}
+
+
+@router.put("/groups/{group}")
+async def set_notification_group(group: str, members: NotificationGroup, request: Request):
+    """
+    Crea o reemplaza los miembros de un grupo de notificación.
+
+    :param group: El nombre del grupo.
+    :param members: Los usuarios del grupo.
+    """
+    await request.app.state.notification_service.set_group_members(group, members.user_ids)
+    return {"group": group, "user_ids": members.user_ids}
+
+
 @router.get("/notifications/{user_id}")
 async def get_notifications(user_id: str):
     """
@@ -1 +1 @@
-from fastapi import FastAPIfrom services.notification_service.app.api.websocket import router as websocket_router, event_busfrom fastapi.middleware.cors import CORSMiddlewarefrom asyncio import create_taskapp = FastAPI(title="Notification Service")# CORS configurationapp.add_middleware(    CORSMiddleware,    allow_origins=["*"],    allow_credentials=True,    allow_methods=["*"],    allow_headers=["*"],)@app.lifespan("startup")async def startup_event():    create_task(event_bus.broadcast_notifications())app.include_router(    websocket_router, prefix="/api/notifications", tags=["notifications"])
\ No newline at end of file
+from fastapi import FastAPIfrom services.notification_service.app.api.websocket import router as websocket_router, event_bus, dispatcherfrom services.notification_service.app.services.notification_service import NotificationServicefrom fastapi.middleware.cors import CORSMiddlewarefrom contextlib import asynccontextmanagerfrom asyncio import create_taskfrom ddbb import deadlinefrom ddbb.resources import resourcesfrom ddbb.profiling import ProfilingMiddlewarefrom ddbb.tracing import TracingMiddleware@asynccontextmanagerasync def lifespan(app: FastAPI):    async with resources.lifespan("mongo")(app):        # El cliente de Mongo lo crea el gestor de recursos dentro del worker        app.state.notification_service = NotificationService(resources.mongo)        dispatcher.store = app.state.notification_service        broadcast_task = create_task(event_bus.broadcast_notifications())        digest_task = create_task(dispatcher.run())        heartbeat_task = create_task(event_bus.registry.run_heartbeats())        yield        heartbeat_task.cancel()        digest_task.cancel()        broadcast_task.cancel()app = FastAPI(title="Notification Service", lifespan=lifespan)# CORS configurationapp.add_middleware(    CORSMiddleware,    allow_origins=["*"],    allow_credentials=True,    allow_methods=["*"],    allow_headers=["*"],)app.add_middleware(ProfilingMiddleware, service_name="notification_service")# Plazo de la petición (X-Request-Deadline-Ms), control de admisión y cancelaciónapp.add_middleware(deadline.DeadlineMiddleware)app.add_middleware(TracingMiddleware, service_name="notification_service")app.include_router(    websocket_router, prefix="/api/notifications", tags=["notifications"])@app.get("/health")def health():    return {**resources.stats(), "dispatcher": dispatcher.stats(),            "websockets": event_bus.stats(), "deadlines": deadline.stats()}
\ No newline at end of file
@@ -1,12 +1,30 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 
-class Notification(BaseModel):
-    user_id: str
+class NotificationContent(BaseModel):
+    """
+    Contenido de una notificación, común a todos sus destinatarios.
+    """
     message: str
-    ticket_id: Optional[str]
-    created_at: datetime = datetime.now()
+    ticket_id: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.now)
     read: bool = False
     notification_type: str
+
+
+class Notification(NotificationContent):
+    user_id: str
+
+
+class NotificationBatch(NotificationContent):
+    """
+    Notificación para varios destinatarios: una lista de usuarios, un grupo o ambos.
+    """
+    user_ids: List[str] = []
+    group: Optional[str] = None
+
+
+class NotificationGroup(BaseModel):
+    user_ids: List[str]
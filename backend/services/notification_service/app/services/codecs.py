@@ -0,0 +1,107 @@
+import json
+from typing import Dict, List, Optional, Sequence
+
+import msgpack
+
+from services.notification_service.app.models.notification import NotificationContent
+
+# Subprotocolos que un cliente puede pedir en Sec-WebSocket-Protocol, por orden de
+# preferencia del cliente. Con ellos cada frame lleva una lista de notificaciones (las que
+# han llegado juntas) sin user_id, que es siempre el de la conexión:
+# - notify.v1.msgpack: frames binarios con un array MessagePack.
+# - notify.v1.json: frames de texto con un array JSON.
+# Sin subprotocolo se mantiene el formato original: un objeto JSON con user_id por frame.
+PROTOCOL_MSGPACK = "notify.v1.msgpack"
+PROTOCOL_JSON = "notify.v1.json"
+PROTOCOLS = (PROTOCOL_MSGPACK, PROTOCOL_JSON)
+
+_packer = msgpack.Packer()
+
+
+def negotiate(offered: Sequence[str]) -> Optional[str]:
+    """
+    Elige el subprotocolo de una conexión.
+
+    Args:
+    - offered (Sequence[str]): Subprotocolos que ofrece el cliente, por orden de preferencia.
+
+    Returns:
+    - str: El primero que soporta el servidor, o None para el formato original.
+    """
+    for protocol in offered:
+        if protocol in PROTOCOLS:
+            return protocol
+    return None
+
+
+class EncodedNotification:
+    """
+    Contenido de una notificación con sus codificaciones, que se calculan una sola vez y
+    se reutilizan para todos los destinatarios y conexiones.
+    """
+
+    __slots__ = ("content", "_json", "_msgpack")
+
+    def __init__(self, content: NotificationContent):
+        self.content = content
+        self._json = None
+        self._msgpack = None
+
+    def json(self) -> str:
+        if self._json is None:
+            self._json = self.content.model_dump_json()
+        return self._json
+
+    def msgpack(self) -> bytes:
+        if self._msgpack is None:
+            self._msgpack = _packer.pack(self.content.model_dump(mode="json"))
+        return self._msgpack
+
+
+def encode_frames(protocol: Optional[str], user_id: str,
+                  notifications: List[EncodedNotification], cache: Dict):
+    """
+    Codifica las notificaciones pendientes de una conexión.
+
+    Args:
+    - protocol (str): Subprotocolo de la conexión (None para el formato original).
+    - user_id (str): El usuario de la conexión.
+    - notifications (List[EncodedNotification]): Las notificaciones, en orden.
+    - cache (Dict): Frames ya codificados en esta ronda de envío; las conexiones que reciben
+      las mismas notificaciones comparten el frame.
+
+    Returns:
+    - List[str | bytes]: Los frames a enviar (uno salvo en el formato original).
+    """
+    if protocol is None:
+        # '{"message": ...}' -> '{"user_id": "...", "message": ...}' sin volver a serializar
+        prefix = f'{{"user_id":{json.dumps(user_id)},'
+        return [prefix + notification.json()[1:] for notification in notifications]
+
+    key = (protocol, tuple(map(id, notifications)))
+    frame = cache.get(key)
+    if frame is None:
+        if protocol == PROTOCOL_MSGPACK:
+            frame = _packer.pack_array_header(len(notifications)) + \
+                b"".join(notification.msgpack() for notification in notifications)
+        else:
+            frame = "[" + ",".join(notification.json() for notification in notifications) + "]"
+        cache[key] = frame
+    return [frame]
+
+
+def decode_message(message: dict, protocol: Optional[str]):
+    """
+    Decodifica un mensaje recibido de un cliente: texto JSON o, con MessagePack, binario.
+
+    Returns:
+    - object: El mensaje decodificado, o None si no se puede decodificar.
+    """
+    try:
+        if message.get("text") is not None:
+            return json.loads(message["text"])
+        if message.get("bytes") is not None and protocol == PROTOCOL_MSGPACK:
+            return msgpack.unpackb(message["bytes"])
+    except ValueError:
+        return None
+    return None
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List
+
+from dotenv import load_dotenv
+from fastapi import WebSocket
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# El servidor envía un ping a las conexiones sin tráfico durante WS_HEARTBEAT_SECONDS y
+# cierra las que llevan WS_IDLE_TIMEOUT_SECONDS sin responder (conexiones medio abiertas)
+WS_HEARTBEAT_SECONDS = float(os.getenv("WS_HEARTBEAT_SECONDS", 30))
+WS_IDLE_TIMEOUT_SECONDS = float(os.getenv("WS_IDLE_TIMEOUT_SECONDS", 75))
+# Conexiones simultáneas por usuario; al superarlo se cierra la más antigua
+WS_MAX_CONNECTIONS_PER_USER = int(os.getenv("WS_MAX_CONNECTIONS_PER_USER", 5))
+WS_REGISTRY_SHARDS = int(os.getenv("WS_REGISTRY_SHARDS", 64))
+
+PING_FRAME = '{"type":"ping"}'
+PONG_FRAME = '{"type":"pong"}'
+
+# Códigos de cierre del websocket
+CLOSE_IDLE = 4000
+CLOSE_TOO_MANY = 4001
+CLOSE_SLOW = 4002
+
+
+class Connection:
+    """
+    Registro de una conexión websocket.
+
+    Atributos:
+    - websocket (WebSocket): La conexión.
+    - user_id (str): El usuario suscrito.
+    - protocol (str): Subprotocolo negociado (None para el formato original).
+    - last_seen (float): Último mensaje recibido del cliente (reloj monotónico).
+    - pinged_at (float): Último ping enviado sin respuesta, o 0.
+    """
+
+    __slots__ = ("websocket", "user_id", "protocol", "last_seen", "pinged_at")
+
+    def __init__(self, websocket: WebSocket, user_id: str, protocol: str = None):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.protocol = protocol
+        self.last_seen = time.monotonic()
+        self.pinged_at = 0.0
+
+
+class ConnectionRegistry:
+    """
+    Registro de conexiones websocket repartido en shards por usuario.
+
+    Cada shard es un diccionario usuario -> lista de conexiones (casi siempre una). El
+    barrido de heartbeats recorre un shard en cada paso, de modo que el trabajo se reparte
+    a lo largo del intervalo en lugar de recorrer todas las conexiones de golpe.
+
+    Atributos:
+    - shards (List[dict]): Conexiones de cada shard por usuario.
+    - max_per_user (int): Conexiones simultáneas permitidas por usuario.
+    """
+
+    def __init__(self, shards: int = WS_REGISTRY_SHARDS,
+                 max_per_user: int = WS_MAX_CONNECTIONS_PER_USER,
+                 heartbeat: float = WS_HEARTBEAT_SECONDS,
+                 idle_timeout: float = WS_IDLE_TIMEOUT_SECONDS):
+        self.shards: List[Dict[str, List[Connection]]] = [
+            {} for _ in range(shards)]
+        self.max_per_user = max_per_user
+        self.heartbeat = heartbeat
+        self.idle_timeout = idle_timeout
+        self.count = 0
+        self.evicted = 0
+
+    def _shard(self, user_id: str):
+        return self.shards[hash(user_id) % len(self.shards)]
+
+    def add(self, user_id: str, websocket: WebSocket, protocol: str = None):
+        """
+        Registra una conexión.
+
+        Returns:
+        - tuple: (la conexión registrada, la conexión más antigua del usuario que hay que
+          cerrar por superar max_per_user, o None).
+        """
+        connection = Connection(websocket, user_id, protocol)
+        connections = self._shard(user_id).setdefault(user_id, [])
+        connections.append(connection)
+        self.count += 1
+        oldest = None
+        if len(connections) > self.max_per_user:
+            oldest = connections[0]
+            self.remove(oldest)
+        return connection, oldest
+
+    def remove(self, connection: Connection):
+        """
+        Elimina una conexión; no hace nada si ya no estaba registrada.
+        """
+        shard = self._shard(connection.user_id)
+        connections = shard.get(connection.user_id)
+        if not connections or connection not in connections:
+            return
+        connections.remove(connection)
+        self.count -= 1
+        if not connections:
+            del shard[connection.user_id]
+
+    def connections(self, user_id: str):
+        """
+        Conexiones de un usuario (lista vacía si no tiene).
+        """
+        return self._shard(user_id).get(user_id, ())
+
+    @staticmethod
+    def touch(connection: Connection):
+        """
+        Marca la conexión como viva al recibir cualquier mensaje del cliente.
+        """
+        connection.last_seen = time.monotonic()
+        connection.pinged_at = 0.0
+
+    async def _close(self, connection: Connection, code: int):
+        self.remove(connection)
+        try:
+            await connection.websocket.close(code=code)
+        except Exception:
+            # La conexión ya estaba rota
+            pass
+
+    async def close(self, connection: Connection, code: int = CLOSE_TOO_MANY):
+        await self._close(connection, code)
+
+    async def sweep(self, shard: Dict[str, List[Connection]]):
+        """
+        Envía ping a las conexiones inactivas de un shard y cierra las que no responden.
+        """
+        now = time.monotonic()
+        for connections in list(shard.values()):
+            for connection in list(connections):
+                idle = now - connection.last_seen
+                if idle >= self.idle_timeout:
+                    self.evicted += 1
+                    await self._close(connection, CLOSE_IDLE)
+                elif idle >= self.heartbeat and not connection.pinged_at:
+                    connection.pinged_at = now
+                    try:
+                        await connection.websocket.send_text(PING_FRAME)
+                    except Exception:
+                        self.evicted += 1
+                        await self._close(connection, CLOSE_IDLE)
+
+    async def run_heartbeats(self):
+        """
+        Recorre los shards de uno en uno, completando una vuelta cada heartbeat/2 segundos,
+        hasta que se cancela la tarea.
+        """
+        step = self.heartbeat / 2 / len(self.shards)
+        while True:
+            for shard in self.shards:
+                await asyncio.sleep(step)
+                try:
+                    await self.sweep(shard)
+                except Exception as e:
+                    logger.error(f"Error en el heartbeat de websockets: {e}")
+
+    def stats(self):
+        return {
+            "connections": self.count,
+            "users": sum(len(shard) for shard in self.shards),
+            "evicted": self.evicted,
+        }
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Tuple
+
+from dotenv import load_dotenv
+
+from services.notification_service.app.models.notification import NotificationContent
+from services.notification_service.app.services.codecs import EncodedNotification
+from services.notification_service.app.services.event_bus import EventBus
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Ventana de coalescencia: durante estos segundos tras notificar a un usuario sobre un
+# ticket, las siguientes notificaciones del mismo ticket se agrupan en un resumen (0 = sin agrupar)
+NOTIFY_COALESCE_SECONDS = float(os.getenv("NOTIFY_COALESCE_SECONDS", 5))
+# Mensajes que se listan en un resumen; del resto solo se indica cuántos hay
+NOTIFY_DIGEST_MAX_ITEMS = int(os.getenv("NOTIFY_DIGEST_MAX_ITEMS", 10))
+
+
+class _Window:
+    __slots__ = ("ends_at", "pending")
+
+    def __init__(self, ends_at: float):
+        self.ends_at = ends_at
+        self.pending: List[NotificationContent] = []
+
+
+class NotificationDispatcher:
+    """
+    Reparte notificaciones a sus destinatarios, las guarda y agrupa las ráfagas.
+
+    La primera notificación de un ticket para un usuario se entrega al momento y abre una
+    ventana de NOTIFY_COALESCE_SECONDS; las que llegan dentro de la ventana se acumulan y al
+    cerrarse se entregan como un único resumen. Cada entrega codifica el contenido una
+    vez por formato, publica todos los mensajes en el bus de una sola vez y los guarda en Mongo con una
+    única escritura.
+
+    Atributos:
+    - event_bus (EventBus): Bus que envía los mensajes a los websockets.
+    - store (NotificationService): Persistencia de las notificaciones; se asigna al arrancar.
+    - window (float): Segundos de la ventana de coalescencia.
+    """
+
+    def __init__(self, event_bus: EventBus, window: float = NOTIFY_COALESCE_SECONDS):
+        self.event_bus = event_bus
+        self.store = None
+        self.window = window
+        self.windows: Dict[Tuple[str, str], _Window] = {}
+        self.delivered = 0
+        self.coalesced = 0
+        self.digests = 0
+
+    async def dispatch(self, content: NotificationContent, user_ids: List[str]):
+        """
+        Notifica un mismo contenido a varios usuarios.
+
+        Args:
+        - content (NotificationContent): El contenido de la notificación.
+        - user_ids (List[str]): Los destinatarios (los repetidos se ignoran).
+
+        Returns:
+        - dict: Destinatarios notificados al momento y notificaciones agrupadas para un resumen.
+        """
+        now = time.monotonic()
+        immediate = []
+        coalesced = 0
+        for user_id in dict.fromkeys(user_ids):
+            if content.ticket_id is None or self.window <= 0:
+                immediate.append(user_id)
+                continue
+            key = (user_id, content.ticket_id)
+            window = self.windows.get(key)
+            if window is not None and (window.pending or window.ends_at > now):
+                window.pending.append(content)
+                coalesced += 1
+            else:
+                self.windows[key] = _Window(now + self.window)
+                immediate.append(user_id)
+
+        await self._deliver([(content, immediate)])
+        self.coalesced += coalesced
+        return {"delivered": len(immediate), "coalesced": coalesced}
+
+    async def _deliver(self, deliveries: List[Tuple[NotificationContent, List[str]]]):
+        """
+        Publica y guarda varias entregas: cada contenido se codifica una vez para todos sus
+        destinatarios.
+        """
+        frames = []
+        documents = []
+        for content, user_ids in deliveries:
+            if not user_ids:
+                continue
+            notification = EncodedNotification(content)
+            frames.extend((user_id, notification) for user_id in user_ids)
+            document = content.model_dump()
+            documents.extend({**document, "user_id": user_id}
+                             for user_id in user_ids)
+        if not frames:
+            return
+
+        await self.event_bus.publish_frames(frames)
+        self.delivered += len(frames)
+        if self.store is not None:
+            try:
+                await self.store.save_notifications(documents)
+            except Exception as e:
+                logger.error(f"Error guardando {len(documents)} notificaciones: {e}")
+
+    @staticmethod
+    def _digest(ticket_id: str, pending: List[NotificationContent]):
+        """
+        Resume en una notificación las acumuladas de un ticket.
+        """
+        if len(pending) == 1:
+            return pending[0]
+        lines = [f"- {content.message}" for content in pending[:NOTIFY_DIGEST_MAX_ITEMS]]
+        if len(pending) > NOTIFY_DIGEST_MAX_ITEMS:
+            lines.append(f"(+{len(pending) - NOTIFY_DIGEST_MAX_ITEMS} más)")
+        return NotificationContent(
+            message=f"{len(pending)} notificaciones sobre el ticket {ticket_id}:\n" + "\n".join(lines),
+            ticket_id=ticket_id,
+            notification_type="digest",
+        )
+
+    async def flush(self):
+        """
+        Cierra las ventanas vencidas y entrega sus resúmenes. Una ventana que tenía
+        notificaciones se reabre, para que una ráfaga larga siga agrupándose.
+        """
+        now = time.monotonic()
+        deliveries = []
+        for key, window in list(self.windows.items()):
+            if window.ends_at > now:
+                continue
+            if not window.pending:
+                del self.windows[key]
+                continue
+            user_id, ticket_id = key
+            digest = self._digest(ticket_id, window.pending)
+            if digest.notification_type == "digest":
+                self.digests += 1
+            deliveries.append((digest, [user_id]))
+            self.windows[key] = _Window(now + self.window)
+        await self._deliver(deliveries)
+
+    async def run(self):
+        """
+        Cierra periódicamente las ventanas de coalescencia hasta que se cancela la tarea.
+        """
+        interval = min(1.0, max(0.05, self.window / 4))
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error entregando resúmenes de notificaciones: {e}")
+
+    def stats(self):
+        return {
+            "windows": len(self.windows),
+            "delivered": self.delivered,
+            "coalesced": self.coalesced,
+            "digests": self.digests,
+        }
@@ -1,15 +1,41 @@
-from typing import Dict, Set
+from typing import Dict, Iterable, List, Tuple
 from fastapi import WebSocket
-from services.notification_service.app.models.notification import Notification
+from services.notification_service.app.models.notification import Notification, NotificationContent
+from services.notification_service.app.services.codecs import EncodedNotification, encode_frames
+from services.notification_service.app.services.connection_registry import (
+    CLOSE_SLOW, CLOSE_TOO_MANY, Connection, ConnectionRegistry)
+from ddbb.tracing import CONSUMER, current_span, span
+from dotenv import load_dotenv
 import asyncio
+import logging
+import os
+import time
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Las notificaciones que llegan dentro de esta ventana se envían juntas en un mismo frame
+# a las conexiones con subprotocolo (0 = sin esperar)
+WS_BATCH_WINDOW_MS = float(os.getenv("WS_BATCH_WINDOW_MS", 5))
+# Tiempo máximo para entregar los frames de una ronda a una conexión; las que no los
+# aceptan a tiempo (clientes lentos) se cierran para no retrasar al resto
+WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", 2))
 
 
 class EventBus:
-    def __init__(self):
-        self.subscribers: Dict[str, Set[WebSocket]] = {}
+    def __init__(self, registry: ConnectionRegistry = None,
+                 batch_window: float = WS_BATCH_WINDOW_MS / 1000,
+                 send_timeout: float = WS_SEND_TIMEOUT_SECONDS):
+        self.registry = registry or ConnectionRegistry()
         self.queue = asyncio.Queue()
+        self.batch_window = batch_window
+        self.send_timeout = send_timeout
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.slow_dropped = 0
 
-    async def subscribe(self, user_id: str, websocket: WebSocket):
+    async def subscribe(self, user_id: str, websocket: WebSocket, protocol: str = None):
         """
         Suscribe a una notificación.
 
@@ -18,25 +44,27 @@ class EventBus:
         Args:
         - user_id (str): El id del usuario al que se desea suscribir notificaciones.
         - websocket (WebSocket): El websocket al que se va a notificar.
+        - protocol (str, optional): Subprotocolo negociado con el cliente.
+
+        Returns:
+        - Connection: El registro de la conexión, para desuscribirla y marcarla como viva.
         """
-        if user_id not in self.subscribers:
-            self.subscribers[user_id] = set()
-        self.subscribers[user_id].add(websocket)
+        connection, oldest = self.registry.add(user_id, websocket, protocol)
+        if oldest is not None:
+            # El usuario ha superado el máximo de conexiones: se cierra la más antigua
+            await self.registry.close(oldest, CLOSE_TOO_MANY)
+        return connection
 
-    async def unsubscribe(self, user_id: str, websocket: WebSocket):
+    async def unsubscribe(self, connection: Connection):
         """
         Desuscribe a una notificación.
 
         Desuscribe un websocket de recibir notificaciones de un usuario.
 
         Args:
-        - user_id (str): El id del usuario al que se desea desuscribir notificaciones.
-        - websocket (WebSocket): El websocket al que se va a desnotificar.
+        - connection (Connection): La conexión devuelta por subscribe.
         """
-        if user_id in self.subscribers:
-            self.subscribers[user_id].remove(websocket)
-            if not self.subscribers[user_id]:
-                del self.subscribers[user_id]
+        self.registry.remove(connection)
 
     async def publish(self, notification: Notification):
         """
@@ -47,36 +75,108 @@ class EventBus:
         Args:
         - notification (Notification): La notificación a publicar.
         """
-        await self.queue.put(notification)
+        content = NotificationContent(**notification.model_dump(exclude={"user_id"}))
+        await self.publish_frames([(notification.user_id, EncodedNotification(content))])
+
+    async def publish_frames(self, frames: Iterable[Tuple[str, EncodedNotification]]):
+        """
+        Publica de una vez notificaciones para varios usuarios.
+
+        Args:
+        - frames (Iterable[Tuple[str, EncodedNotification]]): Pares (id del usuario,
+          notificación); una misma EncodedNotification puede ir a varios usuarios y se
+          codifica una sola vez.
+        """
+        # Con la publicación viaja el span activo, para enlazar la entrega con la petición
+        await self.queue.put((frames, current_span()))
+
+    def _drain(self, first):
+        """
+        Agrupa por usuario lo publicado en la cola, en orden de llegada.
+
+        Returns:
+        - tuple: (notificaciones de cada usuario, spans de las peticiones que las publicaron).
+        """
+        pending: Dict[str, List[EncodedNotification]] = {}
+        items = [first]
+        while not self.queue.empty():
+            items.append(self.queue.get_nowait())
+        for frames, _ in items:
+            for user_id, notification in frames:
+                pending.setdefault(user_id, []).append(notification)
+        return pending, [parent for _, parent in items if parent is not None]
+
+    async def _write(self, connection: Connection, frames: List):
+        for frame in frames:
+            if isinstance(frame, bytes):
+                await connection.websocket.send_bytes(frame)
+            else:
+                await connection.websocket.send_text(frame)
+            self.frames_sent += 1
+            self.bytes_sent += len(frame)
+
+    async def _send(self, connection: Connection, notifications: List[EncodedNotification], cache: Dict):
+        try:
+            frames = encode_frames(connection.protocol, connection.user_id, notifications, cache)
+        except Exception as e:
+            # Una notificación que no se puede codificar no debe cortar la ronda ni la conexión
+            logger.error(f"No se pudieron codificar las notificaciones del usuario {connection.user_id}: {e}")
+            return
+        try:
+            await asyncio.wait_for(self._write(connection, frames), self.send_timeout)
+        except asyncio.TimeoutError:
+            # El cliente no lee: se cierra su conexión (puede volver a conectarse) en lugar
+            # de retrasar la entrega a los demás
+            self.slow_dropped += 1
+            logger.warning(f"Conexión lenta del usuario {connection.user_id}, cerrándola")
+            try:
+                await asyncio.wait_for(self.registry.close(connection, CLOSE_SLOW), self.send_timeout)
+            except asyncio.TimeoutError:
+                pass
+        except Exception:
+            self.registry.remove(connection)
 
     async def broadcast_notifications(self):
         """
         Envía notificaciones a los suscriptores.
 
-        Envía notificaciones a los suscriptores de manera asíncrona.
+        Envía notificaciones a los suscriptores de manera asíncrona. Tras recibir una
+        publicación espera batch_window segundos y envía en la misma ronda todo lo que ha
+        llegado entretanto: cada conexión recibe un único frame con sus notificaciones.
+        Los envíos de una ronda se hacen en paralelo, cada uno con un límite de
+        send_timeout segundos.
         """
         while True:
-            notification = await self.queue.get()
-            if notification.user_id in self.subscribers:
-                dead_sockets = set()
-                for websocket in self.subscribers[notification.user_id]:
-                    try:
-                        await websocket.send_json(notification.dict())
-                    except:
-                        dead_sockets.add(websocket)
-
-                for dead_socket in dead_sockets:
-                    await self.unsubscribe(notification.user_id, dead_socket)
+            first = await self.queue.get()
+            if self.batch_window > 0:
+                await asyncio.sleep(self.batch_window)
+            pending, parents = self._drain(first)
+            # La entrega cuelga de la primera publicación y enlaza el resto
+            attributes = {"eventbus.users": len(pending), "eventbus.publications": len(parents)}
+            with span("eventbus.deliver", CONSUMER, attributes,
+                      parent=parents[0] if parents else None, links=tuple(parents[1:])):
+                # Frames ya codificados en esta ronda, compartidos entre conexiones
+                cache = {}
+                await asyncio.gather(*(
+                    self._send(connection, notifications, cache)
+                    for user_id, notifications in pending.items()
+                    for connection in tuple(self.registry.connections(user_id))))
 
     async def get_notifications(self, user_id: str):
         """
-        Obtiene las notificaciones para el usuario especificado.
-
-        Obtiene las notificaciones para el usuario especificado.
+        Obtiene las conexiones suscritas del usuario especificado.
 
         Args:
-        - user_id (str): El id del usuario al que se van a obtener las notificaciones.
+        - user_id (str): El id del usuario.
         Returns:
-        - List[Notification]: Las notificaciones del usuario.
+        - List[dict]: Subprotocolo y segundos sin actividad de cada conexión del usuario.
         """
-        return self.subscribers.get(user_id, set())
+        now = time.monotonic()
+        return [{"user_id": connection.user_id,
+                 "protocol": connection.protocol,
+                 "idle_seconds": round(now - connection.last_seen, 3)}
+                for connection in self.registry.connections(user_id)]
+
+    def stats(self):
+        return {**self.registry.stats(), "frames_sent": self.frames_sent, "bytes_sent": self.bytes_sent,
+                "slow_dropped": self.slow_dropped}
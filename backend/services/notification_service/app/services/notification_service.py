@@ -1,15 +1,16 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from app.config import settings
-from app.models.notification import Notification
+from ddbb.mongo.db_mongo import MONGO_DB_NAME
+from services.notification_service.app.models.notification import Notification
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 
 class NotificationService:
     def __init__(self, client: AsyncIOMotorClient):
         self.client = client
-        self.db = self.client[settings.DB_NAME]
+        self.db = self.client[MONGO_DB_NAME]
         self.notifications = self.db["notifications"]
+        self.groups = self.db["notification_groups"]
 
     async def create_notification(self, user_id: str, mensaje: str, ticket_id: Optional[str] = None) -> Notification:
         """
@@ -25,13 +26,48 @@ class NotificationService:
         """
         notificacion = Notification(
             user_id=user_id,
-            mensaje=mensaje,
+            message=mensaje,
             ticket_id=ticket_id,
-            created_at=datetime.now()
+            created_at=datetime.now(),
+            notification_type="message"
         )
-        await self.notifications.insert_one(notificacion.dict())
+        await self.notifications.insert_one(notificacion.model_dump())
         return notificacion
 
+    async def save_notifications(self, documents: List[Dict]):
+        """
+        Guarda varias notificaciones con una sola escritura.
+
+        Args:
+        - documents (List[Dict]): Las notificaciones, una por destinatario.
+        """
+        if documents:
+            await self.notifications.insert_many(documents, ordered=False)
+
+    async def get_group_members(self, group: str) -> List[str]:
+        """
+        Obtiene los usuarios de un grupo de notificación.
+
+        Args:
+        - group (str): El nombre del grupo.
+
+        Returns:
+        - List[str]: Los ids de los usuarios del grupo (vacío si no existe).
+        """
+        document = await self.groups.find_one({"_id": group})
+        return document["user_ids"] if document else []
+
+    async def set_group_members(self, group: str, user_ids: List[str]):
+        """
+        Crea o reemplaza los usuarios de un grupo de notificación.
+
+        Args:
+        - group (str): El nombre del grupo.
+        - user_ids (List[str]): Los ids de los usuarios del grupo.
+        """
+        await self.groups.update_one(
+            {"_id": group}, {"$set": {"user_ids": user_ids}}, upsert=True)
+
     async def get_notifications(self, user_id: str) -> List[Notification]:
         """
         Obtiene las notificaciones de un usuario ordenadas por fecha de creación en orden descendiente.
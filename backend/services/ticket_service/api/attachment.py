@@ -0,0 +1,163 @@
+import os
+from typing import Optional
+from urllib.parse import quote
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy.orm import Session
+from ..models.AttachmentBase import AttachmentBase
+from ..services.attachment_service import (
+    create_attachment, get_attachment_row, get_attachments_by_ticket_id, ticket_exists)
+from ..services.blob_store import get_blob_store
+from ddbb.database.sharding import get_ticket_db, moved_ticket_redirect
+
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+router = APIRouter()
+
+# Tamaño máximo de un adjunto
+ATTACHMENT_MAX_BYTES = int(os.getenv("ATTACHMENT_MAX_BYTES", 100 * 1024 * 1024))
+# Bytes que se acumulan antes de escribir en disco (acota la memoria por subida)
+ATTACHMENT_WRITE_BUFFER = int(os.getenv("ATTACHMENT_WRITE_BUFFER", 1024 * 1024))
+# Detrás de nginx, la descarga se delega con X-Accel-Redirect a una location interna que
+# apunta a ATTACHMENT_ROOT; nginx la sirve con sendfile y resuelve los Range
+ATTACHMENT_ACCEL_PREFIX = os.getenv("ATTACHMENT_ACCEL_PREFIX", "")
+
+
+def _byte_range(range_header: Optional[str], size: int):
+    """
+    Interpreta la cabecera Range de una descarga. Solo se atiende un rango; con varios, o
+    con una cabecera no válida, se sirve el blob completo.
+
+    Args:
+    - range_header (str): Valor de la cabecera Range.
+    - size (int): Tamaño del blob.
+
+    Raises:
+    - HTTPException: 416 si el rango empieza después del final del blob.
+
+    Returns:
+    - tuple: (primer byte, último byte), o None para servir el blob completo.
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    first, _, last = range_header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            if last and int(last) < start:
+                return None
+            end = min(int(last), size - 1) if last else size - 1
+        elif last:
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            return None
+    except ValueError:
+        return None
+    if start >= size:
+        raise HTTPException(status_code=416, detail="Range not satisfiable",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+@router.post("/{ticket_id}/attachments/", response_model=AttachmentBase, status_code=201)
+async def upload_attachment(ticket_id: int, request: Request,
+                            filename: str = Query(..., min_length=1, max_length=255),
+                            user_id: Optional[int] = None,
+                            content_type: str = Header("application/octet-stream"),
+                            content_length: Optional[int] = Header(None),
+                            db: Session = Depends(get_ticket_db)):
+    """
+    Sube un adjunto. El cuerpo de la petición es el contenido del fichero tal cual (no
+    multipart) y se escribe en el almacén por bloques, sin cargarlo entero en memoria.
+    """
+    if content_length is not None and content_length > ATTACHMENT_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Attachment too large")
+    if not await run_in_threadpool(ticket_exists, db, ticket_id):
+        # Un ticket trasladado a otro shard ha cambiado de id: se redirige al nuevo
+        redirect = await run_in_threadpool(moved_ticket_redirect, ticket_id, request)
+        if redirect:
+            return redirect
+        raise HTTPException(status_code=404, detail="Ticket not found")
+
+    writer = await run_in_threadpool(get_blob_store().open_writer)
+    try:
+        buffer = bytearray()
+        async for chunk in request.stream():
+            if writer.size + len(buffer) + len(chunk) > ATTACHMENT_MAX_BYTES:
+                raise HTTPException(status_code=413, detail="Attachment too large")
+            buffer += chunk
+            if len(buffer) >= ATTACHMENT_WRITE_BUFFER:
+                await run_in_threadpool(writer.write, bytes(buffer))
+                buffer.clear()
+        if buffer:
+            await run_in_threadpool(writer.write, bytes(buffer))
+        sha256, size = await run_in_threadpool(writer.commit)
+    except BaseException:
+        await run_in_threadpool(writer.abort)
+        raise
+
+    attachment = await run_in_threadpool(
+        create_attachment, db, ticket_id, filename, content_type, sha256, size, user_id)
+    return ORJSONResponse(attachment, status_code=201)
+
+
+@router.get("/{ticket_id}/attachments/", response_model=list[AttachmentBase])
+def get_ticket_attachments(ticket_id: int, request: Request, db: Session = Depends(get_ticket_db)):
+    attachments = get_attachments_by_ticket_id(db=db, ticket_id=ticket_id)
+    if not attachments and not ticket_exists(db, ticket_id):
+        redirect = moved_ticket_redirect(ticket_id, request)
+        if redirect:
+            return redirect
+    return ORJSONResponse(attachments)
+
+
+@router.get("/{ticket_id}/attachments/{attachment_id}")
+def download_attachment(ticket_id: int, attachment_id: int, request: Request,
+                        range_header: Optional[str] = Header(None, alias="Range"),
+                        if_range: Optional[str] = Header(None),
+                        db: Session = Depends(get_ticket_db)):
+    """
+    Descarga un adjunto. Soporta Range (descargas parciales y reanudables); el contenido se
+    lee del almacén de blobs por bloques, o lo envía nginx con sendfile si
+    ATTACHMENT_ACCEL_PREFIX está configurado y el almacén lo permite.
+    """
+    attachment = get_attachment_row(
+        db=db, ticket_id=ticket_id, attachment_id=attachment_id)
+    if not attachment:
+        # El adjunto de un ticket trasladado a otro shard ha cambiado de id, como el ticket
+        redirect = moved_ticket_redirect(ticket_id, request, attachment_id)
+        if redirect:
+            return redirect
+        raise HTTPException(status_code=404, detail="Attachment not found")
+
+    store = get_blob_store()
+    # El contenido de un blob no cambia nunca: su hash es un ETag fuerte
+    headers = {
+        "ETag": f'"{attachment["sha256"]}"',
+        "Cache-Control": "private, max-age=31536000, immutable",
+    }
+    headers["Content-Disposition"] = f"attachment; filename*=utf-8''{quote(attachment['filename'])}"
+    accel_path = store.accel_path(attachment["sha256"]) if ATTACHMENT_ACCEL_PREFIX else None
+    if accel_path:
+        headers["X-Accel-Redirect"] = ATTACHMENT_ACCEL_PREFIX.rstrip("/") + "/" + accel_path
+        return Response(media_type=attachment["content_type"], headers=headers)
+
+    try:
+        size = store.size(attachment["sha256"])
+        # If-Range: el rango solo vale si el cliente tiene esta misma versión del blob
+        byte_range = _byte_range(range_header, size) if if_range in (None, headers["ETag"]) else None
+        start, end = byte_range or (0, size - 1)
+        content = store.stream(attachment["sha256"], start, end)
+    except FileNotFoundError:
+        logger.error(f"Blob {attachment['sha256']} not found for attachment {attachment_id}")
+        raise HTTPException(status_code=404, detail="Attachment content not found")
+    headers["Accept-Ranges"] = "bytes"
+    headers["Content-Length"] = str(end - start + 1)
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StreamingResponse(content, status_code=206 if byte_range else 200,
+                             media_type=attachment["content_type"], headers=headers)
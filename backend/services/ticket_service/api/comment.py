@@ -1,32 +1,100 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from ..models.CommentCreate import CommentCreate
 from ..models.CommentBase import CommentBase
 from ..schemas.comment import CommentCreate, CommentUpdate
-from ..services.comment_service import create_comment, update_comment, get_comments_by_ticket_id
-from ddbb.database.db_postgres import get_db
+from ..services.comment_service import (
+    create_comment, update_comment, get_comment_page_by_ticket_id, stream_comments_by_ticket_id)
+from ..services.attachment_service import ticket_exists
+from ..services.exceptions import VersionConflict
+from ddbb.database.sharding import get_comment_db, get_ticket_db, moved_ticket_redirect, shards
+from .conditional import make_etag, parse_if_match
+from .idempotency import idempotent_response
 
 
 router = APIRouter()
 
 
 @router.post("/{ticket_id}/comments/", response_model=CommentBase)
-def create_new_comment(ticket_id: int, comment: CommentCreate, db: Session = Depends(get_db)):
-    return create_comment(db=db, ticket_id=ticket_id, comment=comment)
+def create_new_comment(ticket_id: int, comment: CommentCreate, request: Request,
+                       idempotency_key: Optional[str] = Header(None),
+                       db: Session = Depends(get_ticket_db)):
+    if not ticket_exists(db, ticket_id):
+        # Un ticket trasladado a otro shard ha cambiado de id: se redirige al nuevo
+        redirect = moved_ticket_redirect(ticket_id, request)
+        if redirect:
+            return redirect
+        raise HTTPException(status_code=404, detail="Ticket not found")
+
+    def create():
+        return CommentBase.model_validate(create_comment(db=db, ticket_id=ticket_id, comment=comment))
+
+    # Los reintentos con la misma Idempotency-Key devuelven el comentario ya creado
+    return idempotent_response(idempotency_key, f"POST /tickets/{ticket_id}/comments/", comment, create,
+                               request)
 
 
 @router.get("/{ticket_id}/comments/", response_model=list[CommentBase])
-def get_ticket_comments(ticket_id: int, db: Session = Depends(get_db)):
-    comments = get_comments_by_ticket_id(db=db, ticket_id=ticket_id)
-    if not comments:
+def get_ticket_comments(ticket_id: int, request: Request,
+                        limit: int = Query(50, ge=1, le=500),
+                        cursor: Optional[str] = None,
+                        db: Session = Depends(get_ticket_db)):
+    try:
+        comments, next_cursor = get_comment_page_by_ticket_id(
+            db=db, ticket_id=ticket_id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not comments and not cursor:
+        redirect = moved_ticket_redirect(ticket_id, request)
+        if redirect:
+            return redirect
         raise HTTPException(
             status_code=404, detail="No comments found for this ticket")
-    return comments
+    # Las filas ya tienen la forma de CommentBase: se serializan directamente sin revalidar
+    response = ORJSONResponse(comments)
+    if next_cursor:
+        # El cuerpo sigue siendo una lista; la siguiente página se indica en la cabecera
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+
+@router.get("/{ticket_id}/comments/export")
+def export_ticket_comments(ticket_id: int, request: Request):
+    """
+    Exporta todos los comentarios de un ticket en formato NDJSON (una línea por comentario).
+    """
+    with shards.session(shards.shard_of(ticket_id), readonly=True) as db:
+        exists = ticket_exists(db, ticket_id, include_archived=True)
+    if not exists:
+        redirect = moved_ticket_redirect(ticket_id, request)
+        if redirect:
+            return redirect
+        raise HTTPException(status_code=404, detail="Ticket not found")
+
+    def generate():
+        # La sesión vive lo que dura la respuesta, no lo que dura la dependencia get_db
+        db = shards.session(shards.shard_of(ticket_id), readonly=True)
+        try:
+            yield from stream_comments_by_ticket_id(db=db, ticket_id=ticket_id)
+        finally:
+            db.close()
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
 
 
 @router.put("/comments/{comment_id}", response_model=CommentBase)
-def update_existing_comment(comment_id: int, comment: CommentUpdate, db: Session = Depends(get_db)):
-    db_comment = update_comment(db=db, comment_id=comment_id, comment=comment)
+@router.patch("/comments/{comment_id}", response_model=CommentBase)
+def update_existing_comment(comment_id: int, comment: CommentUpdate,
+                            if_match: Optional[str] = Header(None),
+                            db: Session = Depends(get_comment_db)):
+    # Con If-Match la actualización solo se aplica si la versión no ha cambiado (412 si no)
+    try:
+        db_comment = update_comment(db=db, comment_id=comment_id, comment=comment,
+                                    expected_version=parse_if_match(if_match))
+    except VersionConflict as e:
+        raise HTTPException(status_code=412, detail=str(e))
     if db_comment is None:
         raise HTTPException(status_code=404, detail="Comment not found")
-    return db_comment
+    return ORJSONResponse(db_comment, headers={"ETag": make_etag(db_comment["version"])})
@@ -0,0 +1,58 @@
+from typing import Optional
+from fastapi import HTTPException, status
+
+
+def make_etag(version: int):
+    """
+    Genera el ETag de un recurso a partir de su versión.
+
+    Args:
+    - version (int): Versión actual de la fila.
+
+    Returns:
+    - str: El ETag entre comillas, tal y como se envía en la cabecera.
+    """
+    return f'"{version}"'
+
+
+def parse_if_match(if_match: Optional[str]):
+    """
+    Obtiene la versión esperada a partir de la cabecera If-Match.
+
+    Args:
+    - if_match (str, optional): Valor de la cabecera If-Match.
+
+    Raises:
+    - HTTPException: Si la cabecera no contiene un ETag generado por make_etag.
+
+    Returns:
+    - int: La versión esperada, o None si la cabecera no se envía o es "*".
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    value = if_match.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid If-Match header")
+
+
+def etag_matches(if_none_match: Optional[str], version: int):
+    """
+    Indica si la cabecera If-None-Match coincide con la versión actual del recurso.
+
+    Args:
+    - if_none_match (str, optional): Valor de la cabecera If-None-Match.
+    - version (int): Versión actual de la fila.
+
+    Returns:
+    - bool: True si el cliente ya tiene la versión actual.
+    """
+    if not if_none_match:
+        return False
+    etag = make_etag(version)
+    return any(tag.strip().removeprefix("W/") in (etag, "*")
+               for tag in if_none_match.split(","))
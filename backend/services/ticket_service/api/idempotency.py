@@ -0,0 +1,53 @@
+from typing import Callable, Optional
+import orjson
+from fastapi import HTTPException, Request, Response, status
+from pydantic import BaseModel
+from ddbb.redis.idempotency import (
+    IdempotencyInProgress, IdempotencyMismatch, request_fingerprint, run_idempotent)
+
+
+def idempotent_response(idempotency_key: Optional[str], scope: str, payload: BaseModel,
+                        create: Callable[[], BaseModel], request: Request = None):
+    """
+    Ejecuta una creación respetando la cabecera Idempotency-Key.
+
+    Sin cabecera se crea normalmente. Con cabecera, la primera respuesta se guarda en Redis
+    y los reintentos con la misma clave la reciben de nuevo sin tocar Postgres. Cada
+    credencial (la cabecera Authorization completa) tiene su propio espacio de claves: el
+    servicio no verifica la firma del token, así que no se puede fiar de su claim "sub"
+    para separar usuarios.
+
+    Args:
+    - idempotency_key (str, optional): Valor de la cabecera Idempotency-Key.
+    - scope (str): Operación a la que pertenece la clave.
+    - payload (BaseModel): Cuerpo de la petición, para detectar claves reutilizadas.
+    - create (Callable): Función que crea el recurso y devuelve su modelo de respuesta.
+    - request (Request, optional): Petición, para obtener la credencial del cliente.
+
+    Raises:
+    - HTTPException: 409 si la petición original sigue en curso, 422 si la clave se usó con otro cuerpo.
+
+    Returns:
+    - Response: La respuesta JSON, con la cabecera Idempotent-Replayed si es repetida.
+    """
+    def run():
+        return status.HTTP_200_OK, orjson.dumps(create().model_dump())
+
+    if not idempotency_key:
+        status_code, body = run()
+        return Response(content=body, status_code=status_code, media_type="application/json")
+
+    authorization = request.headers.get("authorization") if request is not None else None
+    try:
+        status_code, body, replayed = run_idempotent(
+            idempotency_key, scope, request_fingerprint(payload.model_dump_json().encode()), run,
+            subject=authorization)
+    except IdempotencyInProgress:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail="A request with this Idempotency-Key is still in progress")
+    except IdempotencyMismatch:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail="Idempotency-Key was already used with a different request body")
+
+    headers = {"Idempotent-Replayed": "true"} if replayed else {}
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
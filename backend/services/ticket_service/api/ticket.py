@@ -1,9 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from ..models.TicketBase import TicketBase
-from ..schemas.ticket import TicketCreate
-from ..services.ticket_service import create_ticket, get_ticket_by_id, update_ticket
-from ddbb.database.db_postgres import get_db
+from ..models.TicketCreated import TicketCreated
+from ..models.DuplicateCandidate import DuplicateCandidate
+from ..schemas.ticket import TicketCreate, TicketMerge, TicketUpdate
+from ..services.ticket_service import (
+    create_ticket, get_ticket_row_by_id, list_tickets, merge_ticket, resolve_canonical_ticket, update_ticket)
+from ..services.dedup_service import duplicate_index
+from ..services.exceptions import InvalidTicketUpdate, VersionConflict
+from ..services.export_service import (
+    EXPORT_FORMATS, MEDIA_TYPES, export_window, file_extension, stream_export)
+from .conditional import make_etag, parse_if_match, etag_matches
+from .idempotency import idempotent_response
+from ddbb.database.sharding import get_ticket_db, moved_ticket_redirect, shard_session, shards
 
 import logging
 
@@ -13,19 +24,148 @@ logger.setLevel(logging.DEBUG)
 router = APIRouter()
 
 
-@router.post("/", response_model=TicketBase)
-def create_new_ticket(ticket: TicketCreate, db: Session = Depends(get_db)):
-    ticket = create_ticket(db=db, ticket=ticket)
-    if not ticket:
-        logger.error(f"Error creating ticket")
-        raise HTTPException(status_code=500, detail="Error creating ticket")
-    return ticket
+@router.post("/", response_model=TicketCreated)
+def create_new_ticket(ticket: TicketCreate, request: Request,
+                      idempotency_key: Optional[str] = Header(None)):
+    def create():
+        # El shard se elige con el usuario del ticket; el id resultante lo identifica
+        with shard_session(shards.choose(ticket.user_id), request) as db:
+            db_ticket = create_ticket(db=db, ticket=ticket)
+            if not db_ticket:
+                logger.error(f"Error creating ticket")
+                raise HTTPException(status_code=500, detail="Error creating ticket")
+            created = TicketBase.model_validate(db_ticket)
+        # Los posibles duplicados (tickets recientes parecidos) van en la respuesta
+        duplicates = duplicate_index.add(created.id, created.title, created.description,
+                                         created.created_at)
+        return TicketCreated(**created.model_dump(), duplicates=duplicates)
+
+    # Los reintentos con la misma Idempotency-Key devuelven el ticket ya creado
+    return idempotent_response(idempotency_key, "POST /tickets/", ticket, create, request)
+
+
+@router.get("/", response_model=list[TicketBase])
+def get_tickets(user_id: Optional[int] = None,
+                assignee_id: Optional[int] = None,
+                status_id: Optional[int] = None,
+                archived: bool = False,
+                limit: int = Query(50, ge=1, le=500),
+                cursor: Optional[str] = None):
+    try:
+        tickets, next_cursor = list_tickets(user_id=user_id, assignee_id=assignee_id,
+                                            status_id=status_id, limit=limit, cursor=cursor,
+                                            archived=archived)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response = ORJSONResponse(tickets)
+    if next_cursor:
+        # El cuerpo sigue siendo una lista; la siguiente página se indica en la cabecera
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+
+@router.get("/export")
+def export_tickets(format: str = Query("csv", enum=list(EXPORT_FORMATS)),
+                   since: Optional[str] = None,
+                   gzip: bool = True,
+                   archived: bool = True):
+    # Volcado completo (o incremental desde el checkpoint since) por lotes; la cabecera
+    # X-Export-Checkpoint es el since de la siguiente exportación
+    try:
+        after, until, checkpoint = export_window(since)
+        chunks = stream_export(format, after, until, gzip=gzip, include_archived=archived)
+        first = next(chunks, b"")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def generate():
+        yield first
+        yield from chunks
+
+    filename = f"tickets-{until:%Y%m%d-%H%M%S}.{file_extension(format, gzip)}"
+    media_type = "application/gzip" if filename.endswith(".gz") else MEDIA_TYPES[format]
+    return StreamingResponse(generate(), media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "X-Export-Checkpoint": checkpoint,
+    })
 
 
 @router.get("/{ticket_id}", response_model=TicketBase)
-def get_ticket(ticket_id: int, db: Session = Depends(get_db)):
-    db_ticket = get_ticket_by_id(db=db, ticket_id=ticket_id)
+def get_ticket(ticket_id: int, request: Request,
+               if_none_match: Optional[str] = Header(None),
+               db: Session = Depends(get_ticket_db)):
+    db_ticket = get_ticket_row_by_id(db=db, ticket_id=ticket_id)
     if not db_ticket:
+        # Un ticket trasladado a otro shard ha cambiado de id: se redirige al nuevo
+        redirect = moved_ticket_redirect(ticket_id, request)
+        if redirect:
+            return redirect
         logger.error(f"Ticket with id {ticket_id} not found")
         raise HTTPException(status_code=404, detail="Ticket not found")
-    return db_ticket
+    etag = make_etag(db_ticket["version"])
+    if etag_matches(if_none_match, db_ticket["version"]):
+        return Response(status_code=304, headers={"ETag": etag})
+    return ORJSONResponse(db_ticket, headers={"ETag": etag})
+
+
+@router.put("/{ticket_id}", response_model=TicketBase)
+@router.patch("/{ticket_id}", response_model=TicketBase)
+def update_existing_ticket(ticket_id: int, ticket: TicketUpdate, request: Request,
+                           if_match: Optional[str] = Header(None),
+                           db: Session = Depends(get_ticket_db)):
+    # Con If-Match la actualización solo se aplica si la versión no ha cambiado (412 si no)
+    try:
+        db_ticket = update_ticket(db=db, ticket_id=ticket_id, ticket=ticket,
+                                  expected_version=parse_if_match(if_match))
+    except VersionConflict as e:
+        raise HTTPException(status_code=412, detail=str(e))
+    except InvalidTicketUpdate as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if db_ticket is None:
+        redirect = moved_ticket_redirect(ticket_id, request)
+        if redirect:
+            return redirect
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    if (ticket.title is not None or ticket.description is not None) and db_ticket["duplicate_of_id"] is None:
+        duplicate_index.add(ticket_id, db_ticket["title"], db_ticket["description"],
+                            db_ticket["created_at"], find=False)
+    return ORJSONResponse(db_ticket, headers={"ETag": make_etag(db_ticket["version"])})
+
+
+@router.get("/{ticket_id}/duplicates", response_model=list[DuplicateCandidate])
+def get_ticket_duplicates(ticket_id: int, request: Request, db: Session = Depends(get_ticket_db)):
+    db_ticket = get_ticket_row_by_id(db=db, ticket_id=ticket_id)
+    if not db_ticket:
+        redirect = moved_ticket_redirect(ticket_id, request)
+        if redirect:
+            return redirect
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    return duplicate_index.find(db_ticket["title"], db_ticket["description"], exclude=ticket_id)
+
+
+@router.post("/{ticket_id}/merge", response_model=TicketBase)
+def merge_duplicate_ticket(ticket_id: int, merge: TicketMerge, request: Request,
+                           if_match: Optional[str] = Header(None),
+                           db: Session = Depends(get_ticket_db)):
+    # El duplicado se enlaza con el original de la cadena y se cierra; deja de proponerse
+    canonical_id = resolve_canonical_ticket(merge.into)
+    if canonical_id is None:
+        raise HTTPException(status_code=404, detail="Target ticket not found")
+    try:
+        db_ticket = merge_ticket(db=db, ticket_id=ticket_id, canonical_id=canonical_id,
+                                 expected_version=parse_if_match(if_match))
+    except VersionConflict as e:
+        raise HTTPException(status_code=412, detail=str(e))
+    except InvalidTicketUpdate as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if db_ticket is None:
+        redirect = moved_ticket_redirect(ticket_id, request)
+        if redirect:
+            return redirect
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    duplicate_index.remove(ticket_id)
+    return ORJSONResponse(db_ticket, headers={"ETag": make_etag(db_ticket["version"])})
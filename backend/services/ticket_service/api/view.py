@@ -0,0 +1,85 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy.orm import Session
+from ..models.SavedViewBase import SavedViewBase
+from ..models.ViewPage import ViewPage
+from ..schemas.view import SavedViewCreate
+from ..services.exceptions import InvalidViewFilter, ViewNotFound
+from ..services.ticket_service import get_ticket_rows_by_ids
+from ..services.view_service import (
+    create_view, delete_view, get_view, list_views, rebuild_view, ticket_views, view_events)
+from ddbb.database.db_postgres import get_db, get_primary_db
+
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+router = APIRouter()
+
+
+@router.post("/", response_model=SavedViewBase)
+def create_new_view(view: SavedViewCreate, db: Session = Depends(get_primary_db)):
+    # Los resultados se materializan al crearla; después se mantienen con cada escritura
+    try:
+        return create_view(db=db, view=view)
+    except InvalidViewFilter as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ViewNotFound:
+        raise HTTPException(status_code=404, detail="View not found")
+
+
+@router.get("/", response_model=list[SavedViewBase])
+def get_views(owner_id: Optional[int] = None, db: Session = Depends(get_db)):
+    return list_views(db=db, owner_id=owner_id)
+
+
+@router.get("/{view_id}", response_model=SavedViewBase)
+def get_saved_view(view_id: int, db: Session = Depends(get_db)):
+    db_view = get_view(db=db, view_id=view_id)
+    if db_view is None:
+        raise HTTPException(status_code=404, detail="View not found")
+    return db_view
+
+
+@router.delete("/{view_id}")
+def delete_saved_view(view_id: int, db: Session = Depends(get_primary_db)):
+    if not delete_view(db=db, view_id=view_id):
+        raise HTTPException(status_code=404, detail="View not found")
+    return {"deleted": view_id}
+
+
+@router.get("/{view_id}/tickets", response_model=ViewPage)
+def get_view_tickets(view_id: int,
+                     offset: int = Query(0, ge=0),
+                     limit: int = Query(50, ge=1, le=500),
+                     expand: bool = False):
+    # Solo Redis: ids, total y cursor de eventos en una transacción, sin consultar los shards
+    page = ticket_views.page(view_id, offset, limit)
+    if page is None:
+        raise HTTPException(status_code=404, detail="View not found")
+    if expand:
+        page["tickets"] = get_ticket_rows_by_ids(page["ids"])
+    return ORJSONResponse(page)
+
+
+@router.get("/{view_id}/events")
+def get_view_events(view_id: int,
+                    after: Optional[str] = None,
+                    last_event_id: Optional[str] = Header(None)):
+    # Server-Sent Events con los cambios de la vista desde el cursor de una página (after)
+    # o el último evento recibido antes de reconectar (Last-Event-ID)
+    if not ticket_views.exists(view_id):
+        raise HTTPException(status_code=404, detail="View not found")
+    return StreamingResponse(view_events(view_id, last_event_id or after or "$"),
+                             media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.post("/{view_id}/rebuild")
+def rebuild_saved_view(view_id: int, db: Session = Depends(get_primary_db)):
+    result = rebuild_view(db=db, view_id=view_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="View not found")
+    return result
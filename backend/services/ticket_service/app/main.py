@@ -1,20 +1,92 @@
+from contextlib import asynccontextmanager
+import asyncio
+import logging
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from services.ticket_service.api.ticket import router as ticket_router
 from services.ticket_service.api.comment import router as comment_router
+from services.ticket_service.api.attachment import router as attachment_router
+from services.ticket_service.api.view import router as view_router
 from ddbb.database.db_postgres import engine
+from ddbb.database.migrations import upgrade
+from ddbb.database.sharding import shards
+from ddbb import deadline
+from ddbb.resources import resources
+from ddbb.profiling import ProfilingMiddleware
+from ddbb.tracing import TracingMiddleware
 from ddbb.database.models.base import Base
 from ddbb.database.models.Ticket import Ticket
 from ddbb.database.models.Comment import Comment
+from ddbb.database.models.TicketDeadline import TicketDeadline
+from ddbb.database.models.Attachment import Attachment
+from ddbb.database.models.TicketMove import TicketMove
+from ddbb.database.models.AttachmentMove import AttachmentMove
+from ddbb.database.models.TicketArchive import TicketArchive
+from ddbb.database.models.CommentArchive import CommentArchive
+from ddbb.database.models.AttachmentArchive import AttachmentArchive
+from ddbb.database.models.SavedView import SavedView
+from services.ticket_service.services.sla_service import SLA_SCHEDULER_ENABLED, SlaScheduler
+from services.ticket_service.services.assignment_service import assignment_engine
+from services.ticket_service.services.archive_service import TicketArchiver
+from services.ticket_service.services.dedup_service import duplicate_index
+from services.ticket_service.services.view_service import ticket_views
 
-# Crear las tablas en la base de datos (si no existen)
+# Crear las tablas en la base de datos (si no existen), añadir a las existentes las
+# columnas e índices nuevos, y preparar los shards adicionales
 Base.metadata.create_all(bind=engine)
+upgrade(engine)
+shards.prepare()
 
-# Inicializar la aplicación FastAPI
-app = FastAPI()
+logger = logging.getLogger(__name__)
 
-# Incluir las rutas de ticket y comentarios en la aplicación
+sla_scheduler = SlaScheduler()
+ticket_archiver = TicketArchiver()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with resources.lifespan("postgres", "redis")(app):
+        if assignment_engine.enabled:
+            try:
+                await asyncio.to_thread(assignment_engine.rebuild)
+            except Exception as e:
+                # Se reintentará en la primera asignación
+                logger.error(f"Error construyendo el índice de asignación: {e}")
+        if duplicate_index.enabled:
+            try:
+                await asyncio.to_thread(duplicate_index.load)
+            except Exception as e:
+                # Sin índice inicial solo se detectan duplicados de los tickets nuevos
+                logger.error(f"Error cargando el índice de duplicados: {e}")
+        # Todas las réplicas lanzan el planificador, pero solo la líder procesa vencimientos
+        tasks = []
+        if SLA_SCHEDULER_ENABLED:
+            tasks.append(asyncio.create_task(sla_scheduler.run()))
+        # Igual que el planificador, el archivado solo lo ejecuta la réplica líder
+        if ticket_archiver.enabled:
+            tasks.append(asyncio.create_task(ticket_archiver.run()))
+        # Los snapshots del índice de duplicados también los guarda solo la líder
+        if duplicate_index.enabled:
+            tasks.append(asyncio.create_task(duplicate_index.run()))
+        yield
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Inicializar la aplicación FastAPI (orjson como serializador por defecto)
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+app.add_middleware(ProfilingMiddleware, service_name="ticket_service")
+# Plazo de la petición (X-Request-Deadline-Ms), control de admisión y cancelación
+app.add_middleware(deadline.DeadlineMiddleware)
+app.add_middleware(TracingMiddleware, service_name="ticket_service")
+
+# Incluir las rutas de tickets, comentarios, adjuntos y vistas en la aplicación
 app.include_router(ticket_router, prefix="/tickets", tags=["tickets"])
 app.include_router(comment_router, prefix="/tickets", tags=["comments"])
+app.include_router(attachment_router, prefix="/tickets", tags=["attachments"])
+# Vistas guardadas (fuera de /tickets para no chocar con /tickets/{ticket_id})
+app.include_router(view_router, prefix="/views", tags=["views"])
 
 # Ruta raíz para comprobar que la API está funcionando
 
@@ -22,3 +94,10 @@ app.include_router(comment_router, prefix="/tickets", tags=["comments"])
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Ticket Management System API!"}
+
+
+@app.get("/health")
+def health():
+    return {**resources.stats(), "sla_scheduler": sla_scheduler.stats(),
+            "assignment": assignment_engine.stats(), "archive": ticket_archiver.stats(),
+            "dedup": duplicate_index.stats(), "views": ticket_views.stats(), "deadlines": deadline.stats()}
@@ -0,0 +1,30 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+
+class AttachmentBase(BaseModel):
+    """
+    Metadatos de un adjunto de ticket. FUNCIONAL API.
+
+    Atributos:
+    - id (int): Identificador único del adjunto.
+    - ticket_id (int): Identificador del ticket.
+    - user_id (int): Identificador del usuario que lo subió, si se conoce.
+    - filename (str): Nombre original del fichero.
+    - content_type (str): Tipo MIME.
+    - size (int): Tamaño en bytes.
+    - sha256 (str): Hash SHA-256 del contenido.
+    - created_at (datetime): Fecha y hora de subida.
+    """
+    id: int
+    ticket_id: int
+    user_id: Optional[int] = None
+    filename: str
+    content_type: str
+    size: int
+    sha256: str
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
@@ -8,6 +8,7 @@ class CommentBase(BaseModel):
     created_at: datetime
     ticket_id: int
     user_id: int
+    version: int
 
     class Config:
         from_attributes = True
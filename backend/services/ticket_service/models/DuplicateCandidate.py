@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+
+
+class DuplicateCandidate(BaseModel):
+    """
+    Posible duplicado de un ticket.
+
+    Atributos:
+    - ticket_id (int): Identificador del ticket parecido.
+    - similarity (float): Similitud estimada (Jaccard de los shingles del título y la descripción), de 0 a 1.
+    """
+    ticket_id: int
+    similarity: float
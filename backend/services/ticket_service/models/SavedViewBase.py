@@ -0,0 +1,24 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+
+class SavedViewBase(BaseModel):
+    """
+    Vista guardada de tickets.
+
+    Atributos:
+    - id (int): Identificador único de la vista.
+    - name (str): Nombre de la vista.
+    - owner_id (int): Usuario que creó la vista, si lo hay.
+    - filters (dict): Filtro normalizado: campo -> lista de valores admitidos (null = sin valor).
+    - created_at (datetime): Fecha y hora de creación de la vista.
+    """
+    id: int
+    name: str
+    owner_id: Optional[int] = None
+    filters: dict
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
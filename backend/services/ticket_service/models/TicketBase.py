@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
+from typing import Optional
 
 
 class TicketBase(BaseModel):
@@ -14,6 +15,9 @@ class TicketBase(BaseModel):
     - updated_at (datetime): Fecha y hora de última actualización del ticket.
     - user_id (int): Identificador del usuario relacionado.
     - status_id (int): Identificador del estado del ticket.
+    - assignee_id (int): Identificador del agente asignado, si lo hay.
+    - version (int): Versión del ticket, usada como ETag.
+    - duplicate_of_id (int): Ticket con el que se ha fusionado, si es un duplicado.
     """
     id: int
     title: str
@@ -22,6 +26,9 @@ class TicketBase(BaseModel):
     updated_at: datetime
     user_id: int
     status_id: int
+    assignee_id: Optional[int] = None
+    version: int
+    duplicate_of_id: Optional[int] = None
 
     class Config:
         from_attributes = True
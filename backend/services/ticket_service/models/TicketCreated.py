@@ -0,0 +1,13 @@
+from typing import List
+from .TicketBase import TicketBase
+from .DuplicateCandidate import DuplicateCandidate
+
+
+class TicketCreated(TicketBase):
+    """
+    Respuesta de la creación de un ticket: el ticket y sus posibles duplicados.
+
+    Atributos:
+    - duplicates (List[DuplicateCandidate]): Tickets recientes parecidos, del más al menos parecido.
+    """
+    duplicates: List[DuplicateCandidate] = []
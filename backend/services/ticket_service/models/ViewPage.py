@@ -0,0 +1,20 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from .TicketBase import TicketBase
+
+
+class ViewPage(BaseModel):
+    """
+    Página de resultados de una vista guardada, del ticket más reciente al más antiguo.
+
+    Atributos:
+    - total (int): Número de tickets de la vista.
+    - ids (List[int]): Ids de los tickets de la página.
+    - cursor (str): Último evento de la vista incluido en la página; los cambios posteriores
+      se reciben en /views/{id}/events con Last-Event-ID igual a este cursor.
+    - tickets (List[TicketBase]): Los tickets de la página, solo si se piden con expand.
+    """
+    total: int
+    ids: List[int]
+    cursor: str
+    tickets: Optional[List[TicketBase]] = None
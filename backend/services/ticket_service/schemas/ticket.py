@@ -20,6 +20,9 @@ class TicketCreate(BaseModel):
     description: str
     status: Optional[int] = 1
     user_id: int
+    # Sin assignee_id el motor de asignación elige un agente, del equipo (rol) indicado si lo hay
+    assignee_id: Optional[int] = None
+    team: Optional[str] = None
 
     class Config:
         """
@@ -28,10 +31,17 @@ class TicketCreate(BaseModel):
         from_attributes = True  # permite usar el modelo con SQLAlchemy
 
 
+class TicketMerge(BaseModel):
+    """
+    Modelo para fusionar un ticket duplicado con el original.
+    """
+    into: int  # Ticket original; si es a su vez un duplicado se usa el suyo
+
+
 class TicketUpdate(BaseModel):
-    title: Optional[str]  # El título puede actualizarse
-    description: Optional[str]  # La descripción también puede actualizarse
-    status: Optional[TicketStatus]  # El estado también puede actualizarse
+    title: Optional[str] = None  # El título puede actualizarse
+    description: Optional[str] = None  # La descripción también puede actualizarse
+    status: Optional[TicketStatus] = None  # El estado también puede actualizarse
 
     class Config:
         from_attributes = True
@@ -0,0 +1,30 @@
+from pydantic import BaseModel
+from typing import List, Optional, Union
+from .ticket import TicketStatus
+
+
+class TicketFilter(BaseModel):
+    """
+    Filtro de una vista sobre los campos de los tickets.
+
+    Un campo omitido no filtra; a null solo admite los tickets sin valor (assignee_id: null
+    son los tickets sin asignar) y con una lista admite cualquiera de sus valores. El
+    estado puede indicarse por id (status_id) o por nombre (status).
+    """
+    user_id: Optional[Union[int, List[Optional[int]]]] = None
+    assignee_id: Optional[Union[int, List[Optional[int]]]] = None
+    status_id: Optional[Union[int, List[int]]] = None
+    status: Optional[Union[TicketStatus, List[TicketStatus]]] = None
+    duplicate_of_id: Optional[Union[int, List[Optional[int]]]] = None
+
+    class Config:
+        extra = "forbid"
+
+
+class SavedViewCreate(BaseModel):
+    """
+    Modelo para crear una vista guardada.
+    """
+    name: str
+    owner_id: Optional[int] = None
+    filters: TicketFilter = TicketFilter()
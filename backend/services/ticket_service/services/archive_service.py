@@ -0,0 +1,223 @@
+import argparse
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import redis.asyncio as aioredis
+from dotenv import load_dotenv
+from sqlalchemy import case, delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from ddbb.database.models.Attachment import Attachment
+from ddbb.database.models.AttachmentArchive import AttachmentArchive
+from ddbb.database.models.Comment import Comment
+from ddbb.database.models.CommentArchive import CommentArchive
+from ddbb.database.models.Ticket import Ticket
+from ddbb.database.models.TicketArchive import TicketArchive
+from ddbb.database.models.TicketDeadline import TicketDeadline
+from ddbb.database.models.TicketStatus import TicketStatus
+from ddbb.database.migrations import ensure_monthly_partitions
+from ddbb.database.sharding import shards
+from ddbb.redis.db_redis import REDIS_URL
+from ddbb.redis.leader import LeaderLock
+from ddbb.tracing import span
+from .assignment_service import CLOSED_STATUS
+from .view_service import ticket_views
+
+import logging
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# Los tickets cerrados (sin cambios) desde hace más de TICKET_ARCHIVE_AFTER_DAYS pasan al
+# archivo, de modo que tickets y comments solo contienen el conjunto de trabajo y sus
+# índices no crecen con el histórico
+TICKET_ARCHIVE_AFTER_DAYS = float(os.getenv("TICKET_ARCHIVE_AFTER_DAYS", 90))
+# Segundos entre pasadas del archivado (0 = desactivado)
+TICKET_ARCHIVE_INTERVAL_SECONDS = float(os.getenv("TICKET_ARCHIVE_INTERVAL_SECONDS", 3600))
+# Tickets que se archivan en cada transacción
+TICKET_ARCHIVE_BATCH = int(os.getenv("TICKET_ARCHIVE_BATCH", 500))
+TICKET_ARCHIVE_LEADER_TTL = float(os.getenv("TICKET_ARCHIVE_LEADER_TTL", 60))
+
+# Tabla caliente, su archivo y la columna con el id del ticket; los hijos van antes que el
+# ticket al borrar y después al restaurar
+ARCHIVES = (
+    (Comment, CommentArchive, Comment.ticket_id),
+    (Attachment, AttachmentArchive, Attachment.ticket_id),
+    (Ticket, TicketArchive, Ticket.id),
+)
+
+
+def archived_columns(columns, model):
+    """
+    Las mismas columnas que columns (de una tabla caliente) en su tabla de archivo.
+    """
+    return tuple(getattr(model, column.key) for column in columns)
+
+
+def _ensure_partitions(db: Session, ticket_ids, now: datetime):
+    """
+    Crea en Postgres las particiones mensuales del archivo que necesitan las filas a archivar.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    for hot, cold, key in ARCHIVES:
+        created_at = func.coalesce(hot.created_at, now)
+        first, last = db.execute(select(func.min(created_at), func.max(created_at))
+                                 .where(key.in_(ticket_ids))).one()
+        if first is not None:
+            ensure_monthly_partitions(db, cold.__tablename__, first, last)
+
+
+def archive_closed_tickets(db: Session, older_than: datetime, limit: int = TICKET_ARCHIVE_BATCH):
+    """
+    Traslada al archivo un lote de tickets cerrados antes de older_than, con sus comentarios
+    y adjuntos, en una sola transacción.
+
+    Args:
+    - db (Session): Sesión del shard.
+    - older_than (datetime): Se archivan los tickets cerrados sin cambios desde antes de esta fecha.
+    - limit (int): Número máximo de tickets del lote.
+
+    Returns:
+    - int: Número de tickets archivados.
+    """
+    ticket_ids = db.execute(
+        select(Ticket.id)
+        .join(TicketStatus, TicketStatus.id == Ticket.status_id)
+        .where(TicketStatus.name == CLOSED_STATUS, Ticket.updated_at < older_than)
+        .order_by(Ticket.id)
+        .limit(limit)
+        .with_for_update(of=Ticket, skip_locked=True)
+    ).scalars().all()
+    if not ticket_ids:
+        return 0
+
+    now = datetime.now()
+    _ensure_partitions(db, ticket_ids, now)
+    for hot, cold, key in ARCHIVES:
+        names = [column.name for column in hot.__table__.columns]
+        # created_at es la clave de partición y no puede ser nula en el archivo: se guarda la
+        # fecha del archivado y se marca para devolver el nulo al restaurar
+        values = [func.coalesce(hot.created_at, now) if name == "created_at" else getattr(hot, name)
+                  for name in names]
+        db.execute(insert(cold).from_select(
+            [*names, "created_at_missing"],
+            select(*values, hot.created_at.is_(None)).where(key.in_(ticket_ids))))
+    db.execute(delete(TicketDeadline).where(TicketDeadline.ticket_id.in_(ticket_ids)))
+    for hot, _, key in ARCHIVES:
+        db.execute(delete(hot).where(key.in_(ticket_ids))
+                   .execution_options(synchronize_session=False))
+    db.commit()
+    # Los tickets archivados dejan de aparecer en las vistas guardadas
+    ticket_views.remove(ticket_ids)
+    return len(ticket_ids)
+
+
+def restore_ticket(db: Session, ticket_id: int):
+    """
+    Devuelve un ticket archivado, con sus comentarios y adjuntos, a las tablas calientes
+    (por ejemplo para reabrirlo). No hace commit.
+
+    Args:
+    - db (Session): Sesión del shard del ticket.
+    - ticket_id (int): Identificador del ticket.
+
+    Returns:
+    - bool: True si el ticket estaba archivado.
+    """
+    if db.execute(select(TicketArchive.id).where(TicketArchive.id == ticket_id)).first() is None:
+        return False
+    for hot, cold, key in reversed(ARCHIVES):
+        cold_key = getattr(cold, key.key)
+        names = [column.name for column in hot.__table__.columns]
+        values = [case((cold.created_at_missing, None), else_=cold.created_at) if name == "created_at"
+                  else getattr(cold, name) for name in names]
+        db.execute(insert(hot).from_select(names, select(*values).where(cold_key == ticket_id)))
+        db.execute(delete(cold).where(cold_key == ticket_id))
+    logger.info(f"Ticket {ticket_id} restaurado del archivo")
+    return True
+
+
+def archive_all(older_than: datetime = None, stop: threading.Event = None):
+    """
+    Archiva en todos los shards los tickets cerrados antes de older_than (por defecto hace
+    TICKET_ARCHIVE_AFTER_DAYS días), lote a lote.
+
+    Args:
+    - older_than (datetime, optional): Se archivan los tickets cerrados sin cambios desde antes de esta fecha.
+    - stop (threading.Event, optional): Si se activa, la pasada termina al acabar el lote en curso.
+
+    Returns:
+    - int: Número de tickets archivados.
+    """
+    older_than = older_than or datetime.now() - timedelta(days=TICKET_ARCHIVE_AFTER_DAYS)
+    archived = 0
+    for index in range(len(shards)):
+        while True:
+            if stop is not None and stop.is_set():
+                logger.warning(f"Archivado interrumpido tras {archived} tickets")
+                return archived
+            with shards.session(index) as db:
+                count = archive_closed_tickets(db, older_than)
+            archived += count
+            if count < TICKET_ARCHIVE_BATCH:
+                break
+    return archived
+
+
+class TicketArchiver:
+    """
+    Archivado periódico de tickets cerrados. Todas las réplicas lo lanzan, pero solo la
+    líder (lock de Redis) archiva.
+    """
+
+    def __init__(self, interval: float = TICKET_ARCHIVE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.archived = 0
+        self.last_run = None
+
+    @property
+    def enabled(self):
+        return self.interval > 0
+
+    async def run(self):
+        """
+        Bucle del archivado; se ejecuta hasta que se cancela la tarea.
+        """
+        client = aioredis.from_url(REDIS_URL)
+        lock = LeaderLock(client, "ticket_archiver", TICKET_ARCHIVE_LEADER_TTL)
+        next_run = 0.0
+        try:
+            while True:
+                # El lock se renueva mientras dura la pasada; si aun así se pierde, la pasada
+                # para tras el lote en curso (los lotes bloquean sus tickets con SKIP LOCKED)
+                if await lock.acquire_or_renew() and time.monotonic() >= next_run:
+                    try:
+                        with span("tickets.archive"):
+                            self.archived += await lock.run_renewing(archive_all, None)
+                        self.last_run = datetime.now().isoformat()
+                    except Exception as e:
+                        logger.error(f"Error archivando tickets: {e}")
+                    next_run = time.monotonic() + self.interval
+                await asyncio.sleep(lock.ttl / 3)
+        finally:
+            await lock.release()
+            await client.aclose()
+
+    def stats(self):
+        return {"archived": self.archived, "last_run": self.last_run}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python -m services.ticket_service.services.archive_service",
+        description="Archiva los tickets cerrados hace más de --days días")
+    parser.add_argument("--days", type=float, default=TICKET_ARCHIVE_AFTER_DAYS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(f"{archive_all(datetime.now() - timedelta(days=args.days))} tickets archivados")
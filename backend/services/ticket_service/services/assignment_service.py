@@ -0,0 +1,352 @@
+import os
+import threading
+import time
+from collections import Counter
+
+from dotenv import load_dotenv
+from sqlalchemy import func, select
+
+from ddbb.database.db_postgres import SessionLocal
+from ddbb.database.sharding import shards
+from ddbb.database.models.Role import Role
+from ddbb.database.models.Ticket import Ticket
+from ddbb.database.models.TicketStatus import TicketStatus
+from ddbb.database.models.User import User
+from ddbb.redis.db_redis import r
+
+import logging
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# Estrategia de asignación al crear un ticket: "least_open", "round_robin" o "none"
+ASSIGNMENT_STRATEGY = os.getenv("ASSIGNMENT_STRATEGY", "least_open")
+# Roles de los usuarios que reciben tickets; cada rol es además un equipo al que se puede
+# dirigir un ticket (asignación por rol)
+ASSIGNMENT_AGENT_ROLES = [role.strip() for role in os.getenv(
+    "ASSIGNMENT_AGENT_ROLES", "agent").split(",") if role.strip()]
+# Cada ASSIGNMENT_SYNC_SECONDS se leen de Redis los recuentos (cambios de otras réplicas)
+# y cada ASSIGNMENT_REBUILD_SECONDS se reconstruyen desde la base de datos (agentes nuevos)
+ASSIGNMENT_SYNC_SECONDS = float(os.getenv("ASSIGNMENT_SYNC_SECONDS", 5))
+ASSIGNMENT_REBUILD_SECONDS = float(
+    os.getenv("ASSIGNMENT_REBUILD_SECONDS", 300))
+ASSIGNMENT_REDIS_KEY = "assignment:open_tickets"
+# Marca para que la primera réplica que sincronice reconstruya el índice desde la base de datos
+ASSIGNMENT_STALE_KEY = "assignment:stale"
+
+# Estado en el que un ticket deja de contar como abierto
+CLOSED_STATUS = "closed"
+
+# Equipo que agrupa a todos los agentes
+ALL_AGENTS = "*"
+
+
+class LoadIndex:
+    """
+    Índice de agentes por número de tickets abiertos.
+
+    Los agentes se agrupan en cubetas por recuento y se mantiene el recuento mínimo, de modo
+    que elegir el agente menos cargado y actualizar un recuento son O(1). Dentro de una
+    cubeta se rota por orden de llegada para repartir los empates.
+
+    Atributos:
+    - counts (dict): Tickets abiertos de cada agente.
+    - buckets (dict): Agentes de cada recuento, en orden de rotación.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.buckets = {}
+        self.min_count = None
+
+    def __len__(self):
+        return len(self.counts)
+
+    def _insert(self, agent_id, count):
+        self.counts[agent_id] = count
+        self.buckets.setdefault(count, {})[agent_id] = None
+        if self.min_count is None or count < self.min_count:
+            self.min_count = count
+
+    def _discard(self, agent_id):
+        count = self.counts.pop(agent_id)
+        bucket = self.buckets[count]
+        del bucket[agent_id]
+        if not bucket:
+            del self.buckets[count]
+            if count == self.min_count:
+                self.min_count = min(self.buckets) if self.buckets else None
+        return count
+
+    def set(self, agent_id, count: int):
+        """
+        Añade un agente o fija su recuento.
+        """
+        if self.counts.get(agent_id) == count:
+            return
+        if agent_id in self.counts:
+            self._discard(agent_id)
+        self._insert(agent_id, max(0, count))
+
+    def remove(self, agent_id):
+        if agent_id in self.counts:
+            self._discard(agent_id)
+
+    def change(self, agent_id, delta: int):
+        """
+        Suma delta al recuento de un agente (sin bajar de cero).
+        """
+        if agent_id in self.counts:
+            count = self._discard(agent_id)
+            self._insert(agent_id, max(0, count + delta))
+
+    def least(self):
+        """
+        Agente con menos tickets abiertos, o None si el índice está vacío. El agente pasa al
+        final de su cubeta para que el siguiente empate lo resuelva otro.
+        """
+        if self.min_count is None:
+            return None
+        bucket = self.buckets[self.min_count]
+        agent_id = next(iter(bucket))
+        del bucket[agent_id]
+        bucket[agent_id] = None
+        return agent_id
+
+
+class AssignmentEngine:
+    """
+    Motor de asignación automática de tickets a agentes.
+
+    Mantiene en memoria, por equipo (rol), un LoadIndex con los tickets abiertos de cada
+    agente y una lista para el round-robin. Los recuentos se actualizan de forma incremental
+    al crear un ticket y al cambiar su estado, y se replican en un hash de Redis para que
+    las demás réplicas los vean; ninguna decisión hace un COUNT por agente.
+
+    Atributos:
+    - strategy (str): "least_open", "round_robin" o "none".
+    - indexes (dict): LoadIndex de cada equipo; ALL_AGENTS contiene a todos los agentes.
+    - teams (dict): Equipo de cada agente.
+    """
+
+    def __init__(self, strategy: str = "least_open", roles=None):
+        self.strategy = strategy
+        self.roles = roles or ["agent"]
+        self.indexes = {}
+        self.teams = {}
+        self._rotation = {}
+        self._cursor = {}
+        self._lock = threading.Lock()
+        self._synced_at = 0.0
+        self._rebuilt_at = 0.0
+        self._rebuilding = False
+
+    @property
+    def enabled(self):
+        return self.strategy != "none"
+
+    def rebuild(self):
+        """
+        Reconstruye el índice desde la base de datos: la lista de agentes y un único
+        GROUP BY por shard con los tickets abiertos de todos ellos. Publica el resultado en Redis.
+        """
+        with SessionLocal() as db:
+            agents = db.execute(
+                select(User.id, Role.name)
+                .join(Role, Role.id == User.role_id)
+                .where(Role.name.in_(self.roles), User.is_active.isnot(False))
+            ).all()
+        counts = Counter()
+        for index in range(len(shards)):
+            with shards.session(index) as db:
+                counts.update(dict(db.execute(
+                    select(Ticket.assignee_id, func.count())
+                    .join(TicketStatus, TicketStatus.id == Ticket.status_id)
+                    .where(Ticket.assignee_id.isnot(None), TicketStatus.name != CLOSED_STATUS)
+                    .group_by(Ticket.assignee_id)
+                ).all()))
+
+        with self._lock:
+            self.indexes = {ALL_AGENTS: LoadIndex()}
+            self.teams = {}
+            for agent_id, team in agents:
+                self.teams[agent_id] = team
+                for name in (ALL_AGENTS, team):
+                    self.indexes.setdefault(name, LoadIndex()).set(
+                        agent_id, counts.get(agent_id, 0))
+            self._rotation = {name: list(index.counts)
+                              for name, index in self.indexes.items()}
+            self._rebuilt_at = self._synced_at = time.monotonic()
+
+        try:
+            with r.pipeline() as pipe:
+                pipe.delete(ASSIGNMENT_REDIS_KEY)
+                if agents:
+                    pipe.hset(ASSIGNMENT_REDIS_KEY, mapping={
+                        agent_id: counts.get(agent_id, 0) for agent_id, _ in agents})
+                pipe.execute()
+        except Exception as e:
+            logger.error(f"Error publicando los recuentos de asignación: {e}")
+        logger.info(f"Índice de asignación reconstruido con {len(agents)} agentes")
+
+    def _sync(self):
+        """
+        Aplica los recuentos de Redis, que incluyen los cambios hechos por otras réplicas.
+        """
+        try:
+            with r.pipeline() as pipe:
+                pipe.hgetall(ASSIGNMENT_REDIS_KEY)
+                pipe.getdel(ASSIGNMENT_STALE_KEY)
+                counts, stale = pipe.execute()
+        except Exception as e:
+            logger.error(f"Error leyendo los recuentos de asignación: {e}")
+            return
+        with self._lock:
+            if stale:
+                # Se reconstruye en la siguiente asignación (en segundo plano)
+                self._rebuilt_at = 0.0
+            for agent_id, count in counts.items():
+                agent_id, count = int(agent_id), int(count)
+                team = self.teams.get(agent_id)
+                if team is not None:
+                    self.indexes[ALL_AGENTS].set(agent_id, count)
+                    self.indexes[team].set(agent_id, count)
+            self._synced_at = time.monotonic()
+
+    @staticmethod
+    def invalidate():
+        """
+        Pide que una réplica reconstruya el índice desde la base de datos, p. ej. después
+        de trasladar tickets entre shards: una reconstrucción durante el traslado puede
+        haber contado un ticket en los dos shards. La hace la primera réplica que sincroniza.
+        """
+        try:
+            r.set(ASSIGNMENT_STALE_KEY, 1)
+        except Exception as e:
+            logger.error(f"Error marcando el índice de asignación para reconstruirlo: {e}")
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        except Exception as e:
+            # Se reintentará pasado ASSIGNMENT_REBUILD_SECONDS; mientras, sigue el índice anterior
+            logger.error(f"Error reconstruyendo el índice de asignación: {e}")
+        finally:
+            self._rebuilding = False
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._rebuilt_at >= ASSIGNMENT_REBUILD_SECONDS:
+            with self._lock:
+                if self._rebuilding:
+                    return
+                # Se marca antes para que las peticiones concurrentes no reconstruyan también
+                self._rebuilt_at = now
+                self._rebuilding = bool(self.indexes)
+            if not self._rebuilding:
+                # Sin índice anterior que servir, la primera petición lo construye
+                self.rebuild()
+                return
+            # La reconstrucción (una consulta por shard) va en un hilo aparte: la petición
+            # usa el índice anterior, que los recuentos de Redis mantienen al día
+            threading.Thread(target=self._rebuild_in_background,
+                             name="assignment-rebuild", daemon=True).start()
+            self._sync()
+        elif now - self._synced_at >= ASSIGNMENT_SYNC_SECONDS:
+            self._sync()
+
+    def _change(self, agent_id, delta: int):
+        """
+        Ajusta el recuento de un agente en memoria. Se llama con el lock tomado.
+
+        Returns:
+        - bool: True si el usuario es un agente del índice.
+        """
+        team = self.teams.get(agent_id)
+        if team is None:
+            return False
+        self.indexes[ALL_AGENTS].change(agent_id, delta)
+        self.indexes[team].change(agent_id, delta)
+        return True
+
+    @staticmethod
+    def _mirror(agent_id, delta: int):
+        """
+        Replica en Redis un cambio de recuento, fuera del lock.
+        """
+        try:
+            r.hincrby(ASSIGNMENT_REDIS_KEY, agent_id, delta)
+        except Exception as e:
+            logger.error(f"Error actualizando el recuento de {agent_id}: {e}")
+
+    def assign(self, team: str = None):
+        """
+        Elige un agente para un ticket nuevo y le cuenta el ticket como abierto.
+
+        Args:
+        - team (str, optional): Rol al que se dirige el ticket; sin él se elige entre todos.
+
+        Returns:
+        - int: El id del agente, o None si no hay agentes (o la asignación está desactivada).
+        """
+        if not self.enabled:
+            return None
+        self._refresh()
+        name = team or ALL_AGENTS
+        with self._lock:
+            index = self.indexes.get(name)
+            if not index:
+                return None
+            if self.strategy == "round_robin":
+                rotation = self._rotation[name]
+                cursor = self._cursor.get(name, 0) % len(rotation)
+                agent_id = rotation[cursor]
+                self._cursor[name] = cursor + 1
+            else:
+                agent_id = index.least()
+            self._change(agent_id, 1)
+        self._mirror(agent_id, 1)
+        return agent_id
+
+    def release(self, agent_id):
+        """
+        Devuelve el ticket contado por assign() si finalmente no se ha creado.
+        """
+        self.opened(agent_id, -1)
+
+    def opened(self, agent_id, delta: int = 1):
+        """
+        Cuenta (o descuenta) un ticket abierto de un agente.
+        """
+        if agent_id is None or not self.enabled:
+            return
+        with self._lock:
+            known = self._change(agent_id, delta)
+        if known:
+            self._mirror(agent_id, delta)
+
+    def status_changed(self, agent_id, old_status: str, new_status: str):
+        """
+        Actualiza el recuento de un agente al cambiar el estado de uno de sus tickets.
+
+        Args:
+        - agent_id (int): El agente asignado al ticket.
+        - old_status (str): Nombre del estado anterior.
+        - new_status (str): Nombre del estado nuevo.
+        """
+        was_open = old_status != CLOSED_STATUS
+        is_open = new_status != CLOSED_STATUS
+        if was_open != is_open:
+            self.opened(agent_id, 1 if is_open else -1)
+
+    def stats(self):
+        return {
+            "strategy": self.strategy,
+            "agents": len(self.indexes.get(ALL_AGENTS, ())),
+            "teams": {name: len(index) for name, index in self.indexes.items() if name != ALL_AGENTS},
+        }
+
+
+assignment_engine = AssignmentEngine(ASSIGNMENT_STRATEGY, ASSIGNMENT_AGENT_ROLES)
@@ -0,0 +1,114 @@
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from ddbb.database.models.Attachment import Attachment
+from ddbb.database.models.AttachmentArchive import AttachmentArchive
+from ddbb.database.models.Ticket import Ticket
+from ddbb.database.models.TicketArchive import TicketArchive
+from .archive_service import archived_columns
+
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# Columnas que se devuelven en las lecturas; coinciden con los campos de AttachmentBase
+ATTACHMENT_COLUMNS = (
+    Attachment.id,
+    Attachment.ticket_id,
+    Attachment.user_id,
+    Attachment.filename,
+    Attachment.content_type,
+    Attachment.size,
+    Attachment.sha256,
+    Attachment.created_at,
+)
+
+
+def ticket_exists(db: Session, ticket_id: int, include_archived: bool = False):
+    """
+    Comprueba si existe un ticket sin cargar la fila.
+
+    Args:
+    - db (Session): Sesión de la base de datos.
+    - ticket_id (int): Identificador del ticket.
+    - include_archived (bool): Si también cuentan los tickets archivados.
+
+    Returns:
+    - bool: True si el ticket existe.
+    """
+    if db.execute(select(Ticket.id).where(Ticket.id == ticket_id)).first() is not None:
+        return True
+    return include_archived and db.execute(
+        select(TicketArchive.id).where(TicketArchive.id == ticket_id)).first() is not None
+
+
+def create_attachment(db: Session, ticket_id: int, filename: str, content_type: str,
+                      sha256: str, size: int, user_id: int = None):
+    """
+    Guarda los metadatos de un adjunto cuyo contenido ya está en el almacén de blobs.
+
+    Args:
+    - db (Session): Sesión de la base de datos.
+    - ticket_id (int): Identificador del ticket.
+    - filename (str): Nombre original del fichero.
+    - content_type (str): Tipo MIME.
+    - sha256 (str): Hash del contenido (clave del blob).
+    - size (int): Tamaño en bytes.
+    - user_id (int, optional): Usuario que lo subió.
+
+    Returns:
+    - dict: Los campos de AttachmentBase del adjunto creado.
+    """
+    row = db.execute(
+        insert(Attachment)
+        .values(ticket_id=ticket_id, user_id=user_id, filename=filename,
+                content_type=content_type, sha256=sha256, size=size)
+        .returning(*ATTACHMENT_COLUMNS)
+    ).first()
+    db.commit()
+    logger.debug(f"Attachment created: {row}")
+    return row._asdict()
+
+
+def get_attachments_by_ticket_id(db: Session, ticket_id: int):
+    """
+    Obtiene los metadatos de los adjuntos de un ticket (del archivo si el ticket está archivado).
+
+    Args:
+    - db (Session): Sesión de la base de datos.
+    - ticket_id (int): Identificador del ticket.
+
+    Returns:
+    - List[dict]: Los campos de AttachmentBase de cada adjunto, por orden de subida.
+    """
+    for model in (Attachment, AttachmentArchive):
+        rows = db.execute(
+            select(*archived_columns(ATTACHMENT_COLUMNS, model))
+            .where(model.ticket_id == ticket_id)
+            .order_by(model.id)
+        ).all()
+        if rows:
+            break
+    return [row._asdict() for row in rows]
+
+
+def get_attachment_row(db: Session, ticket_id: int, attachment_id: int):
+    """
+    Obtiene los metadatos de un adjunto de un ticket (del archivo si el ticket está archivado).
+
+    Args:
+    - db (Session): Sesión de la base de datos.
+    - ticket_id (int): Identificador del ticket.
+    - attachment_id (int): Identificador del adjunto.
+
+    Returns:
+    - dict: Los campos de AttachmentBase, o None si no existe.
+    """
+    for model in (Attachment, AttachmentArchive):
+        row = db.execute(
+            select(*archived_columns(ATTACHMENT_COLUMNS, model))
+            .where(model.id == attachment_id, model.ticket_id == ticket_id)
+        ).first()
+        if row:
+            return row._asdict()
+    return None
@@ -0,0 +1,200 @@
+import hashlib
+import os
+import tempfile
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Almacén de los adjuntos ("local" = sistema de ficheros) y su directorio raíz
+ATTACHMENT_STORE = os.getenv("ATTACHMENT_STORE", "local")
+ATTACHMENT_ROOT = os.getenv("ATTACHMENT_ROOT", "./data/attachments")
+# Tamaño de los bloques en que se lee un blob al servirlo
+BLOB_CHUNK_SIZE = int(os.getenv("BLOB_CHUNK_SIZE", 64 * 1024))
+
+
+class BlobWriter:
+    """
+    Escritura incremental de un blob: el contenido se escribe en un fichero temporal
+    mientras se calcula su hash, y al confirmar se mueve a su ruta definitiva.
+
+    Atributos:
+    - size (int): Bytes escritos hasta el momento.
+    """
+
+    def __init__(self, store: "LocalBlobStore"):
+        self.store = store
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._file = tempfile.NamedTemporaryFile(
+            dir=store.tmp_dir, delete=False)
+
+    def write(self, chunk: bytes):
+        self._hash.update(chunk)
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self):
+        """
+        Cierra el blob y lo guarda bajo su hash. Si ya existe un blob con el mismo contenido
+        se descarta el temporal (deduplicación).
+
+        Returns:
+        - tuple: (hash SHA-256 en hexadecimal, tamaño en bytes).
+        """
+        self._file.close()
+        digest = self._hash.hexdigest()
+        path = self.store.local_path(digest)
+        if os.path.exists(path):
+            os.remove(self._file.name)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # rename es atómico: un lector nunca ve un blob a medio escribir
+            os.replace(self._file.name, path)
+        return digest, self.size
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self._file.name):
+            os.remove(self._file.name)
+
+
+class BlobStore:
+    """
+    Interfaz de un almacén de blobs direccionado por contenido (la clave es el SHA-256).
+    La API solo usa estos métodos, así que cualquier almacén (p. ej. S3) puede servir las
+    descargas.
+    """
+
+    def open_writer(self):
+        """
+        Returns:
+        - BlobWriter: Escritor para un blob nuevo; se guarda al confirmarlo.
+        """
+        raise NotImplementedError
+
+    def exists(self, digest: str):
+        raise NotImplementedError
+
+    def size(self, digest: str):
+        """
+        Raises:
+        - FileNotFoundError: Si el blob no existe.
+
+        Returns:
+        - int: Tamaño del blob en bytes.
+        """
+        raise NotImplementedError
+
+    def open(self, digest: str):
+        """
+        Abre el blob para leerlo.
+
+        Raises:
+        - FileNotFoundError: Si el blob no existe.
+
+        Returns:
+        - BinaryIO: Fichero (o equivalente) en modo binario; lo cierra quien lo abre.
+        """
+        raise NotImplementedError
+
+    def stream(self, digest: str, start: int = 0, end: int = None, chunk_size: int = BLOB_CHUNK_SIZE):
+        """
+        Contenido de un blob por bloques, opcionalmente solo un rango. El blob se abre al
+        llamar, de modo que un blob inexistente falla aquí y no a mitad de la respuesta.
+
+        Args:
+        - digest (str): Hash del blob.
+        - start (int): Primer byte.
+        - end (int): Último byte (incluido); None hasta el final.
+        - chunk_size (int): Bytes por bloque.
+
+        Raises:
+        - FileNotFoundError: Si el blob no existe.
+
+        Returns:
+        - Iterator[bytes]: Los bloques del rango pedido.
+        """
+        file = self.open(digest)
+
+        def chunks():
+            try:
+                file.seek(start)
+                remaining = None if end is None else end - start + 1
+                while remaining is None or remaining > 0:
+                    chunk = file.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                    if not chunk:
+                        break
+                    if remaining is not None:
+                        remaining -= len(chunk)
+                    yield chunk
+            finally:
+                file.close()
+
+        return chunks()
+
+    def accel_path(self, digest: str):
+        """
+        Ruta del blob relativa a la location interna de nginx (X-Accel-Redirect), o None si
+        este almacén no puede servirse así.
+        """
+        return None
+
+
+class LocalBlobStore(BlobStore):
+    """
+    Almacén de blobs en el sistema de ficheros, direccionado por contenido.
+
+    Cada blob se guarda en root/ab/cd/<sha256>; los temporales de las subidas en curso en
+    root/tmp, dentro del mismo sistema de ficheros para que el rename final sea atómico.
+
+    Atributos:
+    - root (str): Directorio raíz del almacén.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def relative_path(self, digest: str):
+        return os.path.join(digest[:2], digest[2:4], digest)
+
+    def local_path(self, digest: str):
+        """
+        Ruta del blob en disco, para servirlo con sendfile.
+        """
+        return os.path.join(self.root, self.relative_path(digest))
+
+    def open_writer(self):
+        return BlobWriter(self)
+
+    def exists(self, digest: str):
+        return os.path.exists(self.local_path(digest))
+
+    def size(self, digest: str):
+        return os.path.getsize(self.local_path(digest))
+
+    def open(self, digest: str):
+        return open(self.local_path(digest), "rb")
+
+    def accel_path(self, digest: str):
+        return self.relative_path(digest).replace(os.sep, "/")
+
+
+# Implementaciones disponibles; otro almacén (p. ej. S3) debe implementar BlobStore
+BLOB_STORES = {
+    "local": lambda: LocalBlobStore(ATTACHMENT_ROOT),
+}
+
+_blob_store = None
+
+
+def get_blob_store():
+    """
+    Almacén de blobs configurado en ATTACHMENT_STORE (se crea en el primer uso).
+    """
+    global _blob_store
+    if _blob_store is None:
+        _blob_store = BLOB_STORES[ATTACHMENT_STORE]()
+    return _blob_store
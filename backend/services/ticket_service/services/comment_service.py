@@ -1,6 +1,29 @@
+import base64
+from datetime import datetime
+from typing import Optional
+
+import orjson
+from sqlalchemy import select, tuple_, update
 from sqlalchemy.orm import Session
 from ddbb.database.models.Comment import Comment
+from ddbb.database.models.CommentArchive import CommentArchive
 from ..schemas.comment import CommentCreate, CommentUpdate
+from .archive_service import archived_columns
+from .exceptions import VersionConflict
+
+
+# Columnas que se devuelven en los listados; coinciden con los campos de CommentBase
+COMMENT_COLUMNS = (
+    Comment.id,
+    Comment.content,
+    Comment.created_at,
+    Comment.ticket_id,
+    Comment.user_id,
+    Comment.version,
+)
+
+# Orden estable de los comentarios de un ticket; lo cubre el índice ix_comments_ticket_created_id
+COMMENT_ORDER = (Comment.created_at, Comment.id)
 
 
 def create_comment(db: Session, ticket_id: int, comment: CommentCreate):
@@ -41,23 +64,179 @@ def get_comments_by_ticket_id(db: Session, ticket_id: int):
     return db.query(Comment).filter(Comment.ticket_id == ticket_id).all()
 
 
-def update_comment(db: Session, comment_id: int, comment: CommentUpdate):
+def update_comment(db: Session, comment_id: int, comment: CommentUpdate, expected_version: int = None):
     """
-    Actualiza un comentario existente.
+    Actualiza un comentario existente con control de concurrencia optimista.
+
+    La actualización es una única sentencia UPDATE ... WHERE id = ? AND version = ? que
+    incrementa la versión y devuelve la fila resultante, sin SELECT previo.
 
     Args:
     - db (Session): La sesión de base de datos.
     - comment_id (int): El ID del comentario a actualizar.
-    - comment (CommentUpdate): Los datos a actualizar.
+    - comment (CommentUpdate): Los datos a actualizar. Solo el contenido es editable.
+    - expected_version (int, optional): Versión que el cliente leyó (If-Match). Si es None
+      la actualización no se condiciona a la versión.
+
+    Raises:
+    - VersionConflict: Si el comentario ha sido modificado desde expected_version.
+
+    Returns:
+    - dict: El comentario actualizado con las claves de CommentBase, o None si no se encuentra.
+    """
+    values = comment.model_dump(exclude_unset=True, include={"content"})
+
+    conditions = [Comment.id == comment_id]
+    if expected_version is not None:
+        conditions.append(Comment.version == expected_version)
+
+    row = db.execute(
+        update(Comment)
+        .where(*conditions)
+        .values(**values, version=Comment.version + 1)
+        .returning(*COMMENT_COLUMNS)
+        .execution_options(synchronize_session=False)
+    ).first()
+
+    if row is None:
+        db.rollback()
+        if expected_version is not None and db.execute(
+                select(Comment.id).where(Comment.id == comment_id)).first():
+            raise VersionConflict("Comment was modified by another request")
+        return None
+
+    db.commit()
+    return row._asdict()
+
+
+def encode_comment_cursor(created_at: Optional[datetime], comment_id: int):
+    """
+    Codifica la posición de un comentario como cursor opaco para la paginación.
+
+    Args:
+    - created_at (datetime, optional): Fecha de creación del último comentario devuelto;
+      None si no la tiene (se codifica como null).
+    - comment_id (int): El ID del último comentario devuelto.
+
+    Returns:
+    - str: El cursor codificado en base64 apto para URLs.
+    """
+    raw = orjson.dumps([created_at.isoformat() if created_at is not None else None, comment_id])
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_comment_cursor(cursor: str):
+    """
+    Decodifica un cursor generado por encode_comment_cursor.
+
+    Args:
+    - cursor (str): El cursor recibido del cliente.
+
+    Raises:
+    - ValueError: Si el cursor no es válido.
 
     Returns:
-    - Comment: El comentario actualizado, o None si no se encuentra.
-    """
-    db_comment = db.query(Comment).filter(Comment.id == comment_id).first()
-    if db_comment:
-        for field, value in comment.dict(exclude_unset=True).items():
-            setattr(db_comment, field, value)  # Actualizamos el campo
-        db.commit()
-        db.refresh(db_comment)
-        return db_comment
-    return None
+    - tuple: (created_at o None, id) del último comentario de la página anterior.
+    """
+    try:
+        created_at, comment_id = orjson.loads(
+            base64.urlsafe_b64decode(cursor.encode()))
+        return (datetime.fromisoformat(created_at) if created_at is not None else None,
+                int(comment_id))
+    except Exception as e:
+        raise ValueError(f"Cursor inválido: {cursor}") from e
+
+
+def _fetch(db: Session, query):
+    result = db.execute(query)
+    keys = tuple(result.keys())
+    return [dict(zip(keys, row)) for row in result]
+
+
+def get_comment_page_by_ticket_id(db: Session, ticket_id: int, limit: int = 50, cursor: str = None):
+    """
+    Obtiene una página de comentarios de un ticket mediante paginación por cursor (keyset).
+
+    En lugar de OFFSET se filtra por (created_at, id) mayor que el último elemento de la
+    página anterior, de modo que cada página cuesta lo mismo sin importar su posición. Los
+    comentarios sin created_at van al final, ordenados por id. Los comentarios de un ticket
+    archivado se leen del archivo.
+
+    Args:
+    - db (Session): La sesión de base de datos.
+    - ticket_id (int): El ID del ticket.
+    - limit (int): Número máximo de comentarios de la página.
+    - cursor (str, optional): Cursor devuelto por la página anterior.
+
+    Raises:
+    - ValueError: Si el cursor no es válido.
+
+    Returns:
+    - tuple: (comentarios como diccionarios, cursor de la siguiente página o None).
+    """
+    after = decode_comment_cursor(cursor) if cursor else None
+    # Los comentarios de un ticket están todos en comments o todos en el archivo
+    for model in (Comment, CommentArchive):
+        order = archived_columns(COMMENT_ORDER, model)
+        created_at, comment_id = order
+        query = select(*archived_columns(COMMENT_COLUMNS, model)
+                       ).where(model.ticket_id == ticket_id)
+        # Pedimos una fila de más para saber si hay página siguiente. Primero los que tienen
+        # fecha y después los que no; cada parte es una consulta que recorre el índice
+        # (ticket_id, created_at, id) en orden, sea cual sea el lugar de los NULL en el motor
+        comments = []
+        if after is None or after[0] is not None:
+            dated = query.where(created_at.is_not(None))
+            if after:
+                dated = dated.where(tuple_(*order) > after)
+            comments = _fetch(db, dated.order_by(*order).limit(limit + 1))
+        if len(comments) <= limit:
+            undated = query.where(created_at.is_(None))
+            if after and after[0] is None:
+                undated = undated.where(comment_id > after[1])
+            comments += _fetch(db, undated.order_by(comment_id).limit(limit + 1 - len(comments)))
+        if comments:
+            break
+
+    next_cursor = None
+    if len(comments) > limit:
+        comments = comments[:limit]
+        last = comments[-1]
+        next_cursor = encode_comment_cursor(last["created_at"], last["id"])
+    return comments, next_cursor
+
+
+def stream_comments_by_ticket_id(db: Session, ticket_id: int, batch_size: int = 1000):
+    """
+    Genera los comentarios de un ticket en formato NDJSON usando un cursor de servidor.
+
+    Las filas se leen en lotes de batch_size (yield_per), así que la memoria usada no
+    depende del número de comentarios del ticket. Los comentarios de un ticket archivado se
+    leen del archivo.
+
+    Args:
+    - db (Session): La sesión de base de datos.
+    - ticket_id (int): El ID del ticket.
+    - batch_size (int): Número de filas que se leen de la base de datos en cada lote.
+
+    Yields:
+    - bytes: Una línea NDJSON por comentario.
+    """
+    for model in (Comment, CommentArchive):
+        result = db.execute(
+            select(*archived_columns(COMMENT_COLUMNS, model))
+            .where(model.ticket_id == ticket_id)
+            .order_by(model.created_at.asc().nulls_last(), model.id)
+            .execution_options(yield_per=batch_size)
+        )
+        keys = tuple(result.keys())
+        found = False
+        try:
+            for partition in result.partitions():
+                found = True
+                yield b"".join(orjson.dumps(dict(zip(keys, row))) + b"\n"
+                               for row in partition)
+        finally:
+            result.close()
+        if found:
+            return
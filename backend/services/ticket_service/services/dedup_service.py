@@ -0,0 +1,486 @@
+import asyncio
+import heapq
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from itertools import islice
+
+import numpy as np
+import orjson
+import redis.asyncio as aioredis
+from dotenv import load_dotenv
+from sqlalchemy import select
+
+from ddbb.database.models.Ticket import Ticket
+from ddbb.database.sharding import shards
+from ddbb.redis.db_redis import REDIS_URL, r
+from ddbb.redis.leader import LeaderLock
+
+import logging
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+# Firma MinHash de DEDUP_BANDS * DEDUP_ROWS permutaciones. Dos tickets son candidatos si
+# coinciden en todas las filas de alguna banda: con 20 bandas de 5 filas, uno con
+# similitud 0.7 es candidato con probabilidad 0.97 y uno con similitud 0.3 con 0.05
+DEDUP_BANDS = int(os.getenv("DEDUP_BANDS", 20))
+DEDUP_ROWS = int(os.getenv("DEDUP_ROWS", 5))
+# Longitud de los shingles (en bytes del texto normalizado)
+DEDUP_SHINGLE = int(os.getenv("DEDUP_SHINGLE", 5))
+# Solo se usan los primeros DEDUP_MAX_CHARS caracteres de título y descripción
+DEDUP_MAX_CHARS = int(os.getenv("DEDUP_MAX_CHARS", 4000))
+# Similitud (Jaccard estimada) mínima de un posible duplicado y número de ellos que se devuelven
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", 0.7))
+DEDUP_MAX_RESULTS = int(os.getenv("DEDUP_MAX_RESULTS", 5))
+# El índice contiene los tickets de los últimos DEDUP_WINDOW_DAYS días, como mucho
+# DEDUP_MAX_TICKETS (unos 2 KiB de memoria por ticket en cada réplica)
+DEDUP_WINDOW_DAYS = float(os.getenv("DEDUP_WINDOW_DAYS", 14))
+DEDUP_MAX_TICKETS = int(os.getenv("DEDUP_MAX_TICKETS", 50000))
+# Cada DEDUP_SYNC_SECONDS se aplican los cambios de las demás réplicas, y cada
+# DEDUP_SNAPSHOT_SECONDS la réplica líder guarda el índice completo en Redis
+DEDUP_SYNC_SECONDS = float(os.getenv("DEDUP_SYNC_SECONDS", 1))
+DEDUP_SNAPSHOT_SECONDS = float(os.getenv("DEDUP_SNAPSHOT_SECONDS", 300))
+DEDUP_LEADER_TTL = float(os.getenv("DEDUP_LEADER_TTL", 60))
+DEDUP_SEED = int(os.getenv("DEDUP_SEED", 1))
+
+DEDUP_STREAM_KEY = "dedup:changes"
+DEDUP_SNAPSHOT_KEY = "dedup:snapshot"
+# Cambios que se conservan en el stream; deben cubrir al menos un intervalo entre snapshots
+DEDUP_STREAM_MAXLEN = int(os.getenv("DEDUP_STREAM_MAXLEN", 100000))
+
+_MAX_HASH = np.uint32((1 << 32) - 1)
+_SHIFT = np.uint64(32)
+# Elementos (permutaciones x shingles) que se calculan a la vez al firmar varios textos
+_BLOCK = 1 << 21
+
+_DIGITS = re.compile(r"\d+")
+
+
+class MinHasher:
+    """
+    Firmas MinHash de textos, calculadas con NumPy.
+
+    El texto se normaliza (minúsculas, números a "0", espacios agrupados) y se divide en
+    shingles de DEDUP_SHINGLE bytes; cada shingle se convierte en un hash h de 32 bits y la
+    firma es, para cada permutación, el mínimo sobre los shingles de (a * h + b) >> 32 en
+    aritmética de 64 bits (multiply-add-shift: una familia universal que evita el módulo por
+    un primo, mucho más lento). Todas las permutaciones de todos los shingles se calculan
+    como una sola operación matricial.
+    """
+
+    def __init__(self, num_perm: int, shingle: int = DEDUP_SHINGLE, seed: int = DEDUP_SEED):
+        self.num_perm = num_perm
+        self.shingle = shingle
+        generator = np.random.RandomState(seed)
+        self.a = generator.randint(1, 1 << 63, num_perm, dtype=np.uint64)[:, None] | np.uint64(1)
+        self.b = generator.randint(0, 1 << 63, num_perm, dtype=np.uint64)[:, None]
+
+    @staticmethod
+    def normalize(text: str) -> bytes:
+        return " ".join(_DIGITS.sub("0", text[:DEDUP_MAX_CHARS].lower()).split()).encode()
+
+    def shingles(self, text: str) -> np.ndarray:
+        """
+        Hashes (uint64 menores de 2^32) de los shingles de un texto. Los repetidos no se
+        quitan: no cambian el mínimo y ordenarlos cuesta más que permutarlos.
+        """
+        data = np.frombuffer(self.normalize(text), dtype=np.uint8)
+        if len(data) == 0:
+            return np.zeros(0, dtype=np.uint64)
+        if len(data) < self.shingle:
+            data = np.pad(data, (0, self.shingle - len(data)))
+        data = data.astype(np.uint64)
+        count = len(data) - self.shingle + 1
+        # Los bytes del shingle forman un entero (hasta 8 bytes, sin colisiones)
+        values = data[:count].copy()
+        for offset in range(1, self.shingle):
+            values <<= np.uint64(8)
+            values |= data[offset:offset + count]
+        # Mezcla multiplicativa (Fibonacci) de los bits del shingle a 32
+        values *= np.uint64(0x9E3779B97F4A7C15)
+        values >>= _SHIFT
+        return values
+
+    def _permute(self, values: np.ndarray) -> np.ndarray:
+        # Matriz (num_perm, len(values)), calculada en su sitio para no crear temporales
+        permuted = self.a * values
+        permuted += self.b
+        permuted >>= _SHIFT
+        return permuted
+
+    def signatures(self, texts) -> np.ndarray:
+        """
+        Firmas de varios textos.
+
+        Returns:
+        - np.ndarray: Matriz (len(texts), num_perm) de uint32; un texto vacío tiene todos
+          los valores al máximo y no se parece a ninguno.
+        """
+        hashes = [self.shingles(text) for text in texts]
+        result = np.full((len(hashes), self.num_perm), _MAX_HASH, dtype=np.uint32)
+        rows = [row for row, values in enumerate(hashes) if len(values)]
+        start = 0
+        while start < len(rows):
+            # Bloques de textos cuya matriz de permutaciones cabe en _BLOCK elementos
+            end, size = start + 1, len(hashes[rows[start]])
+            while end < len(rows) and (size + len(hashes[rows[end]])) * self.num_perm <= _BLOCK:
+                size += len(hashes[rows[end]])
+                end += 1
+            block = rows[start:end]
+            if len(block) == 1:
+                result[block[0]] = self._permute(hashes[block[0]]).min(axis=1)
+            else:
+                # Mínimo de cada permutación en el tramo de columnas de cada texto
+                offsets = np.cumsum([0] + [len(hashes[row]) for row in block[:-1]])
+                permuted = self._permute(np.concatenate([hashes[row] for row in block]))
+                result[block] = np.minimum.reduceat(permuted, offsets, axis=1).T
+            start = end
+        return result
+
+    def signature(self, text: str) -> np.ndarray:
+        return self.signatures([text])[0]
+
+
+class DuplicateIndex:
+    """
+    Índice LSH (locality-sensitive hashing) de los tickets recientes para detectar
+    duplicados casi idénticos al crearlos.
+
+    Cada ticket se guarda con su firma MinHash y, en cada banda, con el hash de su trozo de
+    firma; los candidatos de una consulta son los tickets que comparten el hash de alguna
+    banda, y se ordenan por la similitud estimada con la firma completa. Una consulta no
+    depende del tamaño del índice.
+
+    El índice está en memoria en cada réplica. Los cambios se publican en un stream de Redis
+    que las demás réplicas aplican cada DEDUP_SYNC_SECONDS, y la réplica líder guarda cada
+    DEDUP_SNAPSHOT_SECONDS una copia completa desde la que arrancan las réplicas nuevas (sin
+    recalcular las firmas desde la base de datos).
+
+    Atributos:
+    - signatures (OrderedDict): Firma de cada ticket, del más antiguo al más reciente.
+    - created (dict): Fecha de creación (timestamp) de cada ticket.
+    - buckets (list): Por banda, los tickets de cada hash de banda: casi todos los hashes
+      son de un solo ticket, que se guarda sin conjunto (un set vacío ocupa 216 bytes y
+      hay DEDUP_BANDS por ticket).
+    """
+
+    def __init__(self, bands: int = DEDUP_BANDS, rows: int = DEDUP_ROWS, enabled: bool = DEDUP_ENABLED):
+        self.bands = bands
+        self.rows = rows
+        self.enabled = enabled
+        self.hasher = MinHasher(bands * rows)
+        # Multiplicadores del hash de cada banda
+        self.band_mix = np.random.RandomState(DEDUP_SEED + 1).randint(
+            1, 1 << 63, rows, dtype=np.uint64) | np.uint64(1)
+        self.signatures = OrderedDict()
+        self.created = {}
+        self.buckets = [{} for _ in range(bands)]
+        self.stream_id = "0-0"
+        self.loaded_from = None
+        self.snapshot_at = None
+        self._lock = threading.Lock()
+        self._synced_at = 0.0
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def _band_keys(self, signature: np.ndarray):
+        bands = signature.astype(np.uint64).reshape(self.bands, self.rows)
+        return (bands * self.band_mix).sum(axis=1).tolist()
+
+    def _insert(self, ticket_id: int, signature: np.ndarray, created: float):
+        """
+        Añade o sustituye un ticket. Se llama con el lock tomado.
+        """
+        if ticket_id in self.signatures:
+            self._discard(ticket_id)
+        self.signatures[ticket_id] = signature
+        self.created[ticket_id] = created
+        for bucket, key in zip(self.buckets, self._band_keys(signature)):
+            members = bucket.get(key)
+            if members is None:
+                bucket[key] = ticket_id
+            elif isinstance(members, set):
+                members.add(ticket_id)
+            else:
+                bucket[key] = {members, ticket_id}
+        self._evict()
+
+    def _discard(self, ticket_id: int):
+        signature = self.signatures.pop(ticket_id, None)
+        if signature is None:
+            return
+        del self.created[ticket_id]
+        for bucket, key in zip(self.buckets, self._band_keys(signature)):
+            members = bucket.get(key)
+            if members == ticket_id:
+                del bucket[key]
+            elif isinstance(members, set):
+                members.discard(ticket_id)
+                if len(members) == 1:
+                    bucket[key] = members.pop()
+
+    def _evict(self):
+        # Los tickets están (aproximadamente) por orden de creación: se quitan los del
+        # principio mientras sobren o se hayan salido de la ventana
+        oldest = time.time() - DEDUP_WINDOW_DAYS * 86400
+        while self.signatures:
+            ticket_id = next(iter(self.signatures))
+            if len(self.signatures) <= DEDUP_MAX_TICKETS and self.created[ticket_id] >= oldest:
+                break
+            self._discard(ticket_id)
+
+    def _query(self, signature: np.ndarray, exclude: int = None):
+        candidates = set()
+        for bucket, key in zip(self.buckets, self._band_keys(signature)):
+            members = bucket.get(key)
+            if isinstance(members, set):
+                candidates.update(members)
+            elif members is not None:
+                candidates.add(members)
+        candidates.discard(exclude)
+        if not candidates:
+            return []
+        ids = list(candidates)
+        # Similitud estimada: fracción de permutaciones en las que coinciden las firmas
+        similarity = (np.stack([self.signatures[i] for i in ids]) == signature).mean(axis=1)
+        found = [(float(s), i) for s, i in zip(similarity, ids) if s >= DEDUP_THRESHOLD]
+        return [{"ticket_id": i, "similarity": round(s, 3)}
+                for s, i in heapq.nlargest(DEDUP_MAX_RESULTS, found)]
+
+    @staticmethod
+    def text(title: str, description: str):
+        return f"{title or ''} {description or ''}"
+
+    def add(self, ticket_id: int, title: str, description: str, created_at: datetime = None,
+            find: bool = True):
+        """
+        Indexa un ticket nuevo (o actualizado) y devuelve sus posibles duplicados.
+
+        Args:
+        - ticket_id (int): Identificador del ticket.
+        - title (str): Título del ticket.
+        - description (str): Descripción del ticket.
+        - created_at (datetime, optional): Fecha de creación del ticket (por defecto, ahora).
+        - find (bool): Busca los posibles duplicados antes de indexarlo.
+
+        Returns:
+        - list: Los posibles duplicados ({"ticket_id", "similarity"}), del más parecido al menos.
+        """
+        if not self.enabled:
+            return []
+        self._refresh()
+        signature = self.hasher.signature(self.text(title, description))
+        created = (created_at or datetime.now()).timestamp()
+        with self._lock:
+            duplicates = self._query(signature, exclude=ticket_id) if find else []
+            self._insert(ticket_id, signature, created)
+        self._publish({"op": "add", "id": ticket_id, "t": created, "sig": signature.tobytes()})
+        return duplicates
+
+    def find(self, title: str, description: str, exclude: int = None):
+        """
+        Posibles duplicados de un texto, sin indexarlo.
+        """
+        if not self.enabled:
+            return []
+        self._refresh()
+        signature = self.hasher.signature(self.text(title, description))
+        with self._lock:
+            return self._query(signature, exclude=exclude)
+
+    def remove(self, ticket_id: int):
+        """
+        Quita un ticket del índice (p. ej. al fusionarlo con otro).
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._discard(ticket_id)
+        self._publish({"op": "del", "id": ticket_id})
+
+    @staticmethod
+    def _publish(fields: dict):
+        try:
+            r.xadd(DEDUP_STREAM_KEY, fields, maxlen=DEDUP_STREAM_MAXLEN, approximate=True)
+        except Exception as e:
+            logger.error(f"Error publicando un cambio del índice de duplicados: {e}")
+
+    def _apply(self, entries):
+        """
+        Aplica entradas del stream de cambios. Se llama con el lock tomado; aplicar de nuevo
+        un cambio propio no tiene efecto.
+        """
+        for entry_id, fields in entries:
+            ticket_id = int(fields[b"id"])
+            if fields[b"op"] == b"add":
+                self._insert(ticket_id, np.frombuffer(fields[b"sig"], dtype=np.uint32),
+                             float(fields[b"t"]))
+            else:
+                self._discard(ticket_id)
+            self.stream_id = _decode(entry_id)
+
+    def sync(self, batch: int = 1000):
+        """
+        Aplica los cambios publicados en Redis desde la última sincronización.
+        """
+        try:
+            while True:
+                entries = r.xrange(DEDUP_STREAM_KEY, min=f"({self.stream_id}", count=batch)
+                with self._lock:
+                    self._apply(entries)
+                if len(entries) < batch:
+                    break
+        except Exception as e:
+            logger.error(f"Error sincronizando el índice de duplicados: {e}")
+        self._synced_at = time.monotonic()
+
+    def _refresh(self):
+        if time.monotonic() - self._synced_at >= DEDUP_SYNC_SECONDS:
+            self.sync()
+
+    def save_snapshot(self):
+        """
+        Guarda en Redis el índice completo: los ids y fechas (JSON) y las firmas (una matriz
+        uint32 en binario), con la posición del stream hasta la que llega.
+        """
+        self.sync()
+        with self._lock:
+            ids = list(self.signatures)
+            meta = {"stream_id": self.stream_id, "ids": ids,
+                    "created": [self.created[i] for i in ids],
+                    "bands": self.bands, "rows": self.rows,
+                    "shingle": self.hasher.shingle, "seed": DEDUP_SEED}
+            matrix = np.stack(list(self.signatures.values())) if ids else np.zeros(0, np.uint32)
+        with r.pipeline() as pipe:
+            pipe.hset(DEDUP_SNAPSHOT_KEY, mapping={"meta": orjson.dumps(meta), "signatures": matrix.tobytes()})
+            pipe.execute()
+        self.snapshot_at = datetime.now().isoformat()
+        logger.info(f"Índice de duplicados guardado con {len(ids)} tickets")
+
+    def _load_snapshot(self):
+        """
+        Carga el snapshot de Redis si es compatible y el stream conserva todos los cambios
+        posteriores.
+
+        Returns:
+        - bool: True si se ha cargado.
+        """
+        snapshot = r.hgetall(DEDUP_SNAPSHOT_KEY)
+        if not snapshot:
+            return False
+        meta = orjson.loads(snapshot[b"meta"])
+        if (meta["bands"], meta["rows"], meta["shingle"], meta["seed"]) != (
+                self.bands, self.rows, self.hasher.shingle, DEDUP_SEED):
+            logger.info("Snapshot del índice de duplicados con otros parámetros, se descarta")
+            return False
+        first = r.xrange(DEDUP_STREAM_KEY, count=1)
+        if first and _stream_id(first[0][0]) > _stream_id(meta["stream_id"]) and meta["stream_id"] != "0-0":
+            # El stream ya no tiene los cambios siguientes al snapshot
+            logger.info("Snapshot del índice de duplicados demasiado antiguo, se descarta")
+            return False
+        matrix = np.frombuffer(snapshot[b"signatures"], dtype=np.uint32).reshape(-1, self.hasher.num_perm)
+        with self._lock:
+            for ticket_id, created, signature in zip(meta["ids"], meta["created"], matrix):
+                self._insert(ticket_id, signature, created)
+            self.stream_id = meta["stream_id"]
+        return True
+
+    def rebuild(self, batch: int = 1000):
+        """
+        Reconstruye el índice desde la base de datos con los tickets de la ventana (sin
+        fusionar) de todos los shards, firmando por lotes.
+        """
+        oldest = datetime.now() - timedelta(days=DEDUP_WINDOW_DAYS)
+        streams = []
+        sessions = []
+        try:
+            # Posición actual del stream: los cambios posteriores se aplicarán al sincronizar
+            last = r.xrevrange(DEDUP_STREAM_KEY, count=1)
+            stream_id = _decode(last[0][0]) if last else "0-0"
+            for index in range(len(shards)):
+                db = shards.session(index, readonly=True)
+                sessions.append(db)
+                streams.append(iter(db.execute(
+                    select(Ticket.created_at, Ticket.id, Ticket.title, Ticket.description)
+                    .where(Ticket.created_at >= oldest, Ticket.duplicate_of_id.is_(None))
+                    .order_by(Ticket.created_at, Ticket.id)
+                    .execution_options(yield_per=batch))))
+            rows = heapq.merge(*streams, key=lambda row: (row[0], row[1]))
+            with self._lock:
+                self.signatures.clear()
+                self.created.clear()
+                self.buckets = [{} for _ in range(self.bands)]
+            while chunk := list(islice(rows, batch)):
+                signatures = self.hasher.signatures([self.text(row[2], row[3]) for row in chunk])
+                with self._lock:
+                    for row, signature in zip(chunk, signatures):
+                        self._insert(row[1], signature, row[0].timestamp())
+            self.stream_id = stream_id
+        finally:
+            for db in sessions:
+                db.close()
+
+    def load(self):
+        """
+        Arranque: carga el snapshot de Redis o, si no lo hay, reconstruye desde la base de
+        datos; después aplica los cambios pendientes del stream.
+        """
+        if not self.enabled:
+            return
+        started = time.perf_counter()
+        try:
+            loaded = self._load_snapshot()
+        except Exception as e:
+            logger.error(f"Error cargando el snapshot del índice de duplicados: {e}")
+            loaded = False
+        if not loaded:
+            self.rebuild()
+        self.sync()
+        self.loaded_from = "snapshot" if loaded else "database"
+        logger.info(f"Índice de duplicados cargado ({self.loaded_from}) con {len(self)} tickets "
+                    f"en {time.perf_counter() - started:.2f}s")
+
+    async def run(self):
+        """
+        Bucle de los snapshots; solo los guarda la réplica líder. Se ejecuta hasta que se
+        cancela la tarea.
+        """
+        client = aioredis.from_url(REDIS_URL)
+        lock = LeaderLock(client, "dedup_snapshot", DEDUP_LEADER_TTL)
+        next_run = time.monotonic() + DEDUP_SNAPSHOT_SECONDS
+        try:
+            while True:
+                if await lock.acquire_or_renew() and time.monotonic() >= next_run:
+                    try:
+                        await asyncio.to_thread(self.save_snapshot)
+                    except Exception as e:
+                        logger.error(f"Error guardando el índice de duplicados: {e}")
+                    next_run = time.monotonic() + DEDUP_SNAPSHOT_SECONDS
+                await asyncio.sleep(min(lock.ttl / 3, DEDUP_SNAPSHOT_SECONDS))
+        finally:
+            await lock.release()
+            await client.aclose()
+
+    def stats(self):
+        return {"enabled": self.enabled, "tickets": len(self), "loaded_from": self.loaded_from,
+                "snapshot_at": self.snapshot_at}
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _stream_id(value):
+    milliseconds, sequence = _decode(value).split("-")
+    return int(milliseconds), int(sequence)
+
+
+duplicate_index = DuplicateIndex()
@@ -0,0 +1,38 @@
+class VersionConflict(Exception):
+    """
+    Se lanza cuando una actualización condicionada (If-Match) encuentra la fila en otra
+    versión: ha sido modificada por otra petición. La API la traduce a 412.
+    """
+
+
+class UnknownTicketStatus(ValueError):
+    """
+    Se lanza cuando se pide un estado de ticket que no existe en ticket_statuses. La API la
+    traduce a 400.
+    """
+
+
+class InvalidTicketUpdate(ValueError):
+    """
+    Se lanza cuando una actualización de ticket viola una restricción de la tabla distinta
+    del estado (p. ej. un título nulo o un agente que no existe). La API la traduce a 422.
+    """
+
+
+class InvalidMerge(ValueError):
+    """
+    Se lanza al fusionar un ticket consigo mismo. La API la traduce a 400.
+    """
+
+
+class InvalidViewFilter(ValueError):
+    """
+    Se lanza cuando el filtro de una vista guardada no es válido. La API la traduce a 400.
+    """
+
+
+class ViewNotFound(LookupError):
+    """
+    Se lanza cuando la vista guardada deja de existir mientras se materializa. La API la
+    traduce a 404.
+    """
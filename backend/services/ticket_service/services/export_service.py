@@ -0,0 +1,369 @@
+import argparse
+import base64
+import csv
+import heapq
+import io
+import json
+import os
+import zlib
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+from itertools import islice
+
+import orjson
+from dotenv import load_dotenv
+from sqlalchemy import func, literal, select, tuple_
+
+from ddbb.database.models.Comment import Comment
+from ddbb.database.models.CommentArchive import CommentArchive
+from ddbb.database.models.Ticket import Ticket
+from ddbb.database.models.TicketArchive import TicketArchive
+from ddbb.database.models.TicketStatus import TicketStatus
+from ddbb.database.sharding import shards
+
+import logging
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Filas por lote: lo que se lee del cursor de servidor y se escribe de una vez
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 5000))
+# Una exportación incluye los cambios hasta hace EXPORT_SAFETY_SECONDS: las transacciones
+# que aún no han confirmado un updated_at anterior entran en la siguiente
+EXPORT_SAFETY_SECONDS = float(os.getenv("EXPORT_SAFETY_SECONDS", 60))
+
+EXPORT_FORMATS = ("csv", "ndjson", "parquet")
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson",
+               "parquet": "application/vnd.apache.parquet"}
+
+# Columnas exportadas, en orden
+EXPORT_COLUMNS = ("id", "title", "description", "status", "user_id", "assignee_id",
+                  "created_at", "updated_at", "version", "comment_count", "archived")
+
+
+def encode_checkpoint(updated_at: datetime, ticket_id: int):
+    """
+    Codifica la posición (updated_at, id) hasta la que llega una exportación.
+
+    Returns:
+    - str: El checkpoint en base64 apto para URLs.
+    """
+    raw = orjson.dumps([updated_at.isoformat(), ticket_id])
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_checkpoint(checkpoint: str):
+    """
+    Decodifica un checkpoint generado por encode_checkpoint.
+
+    Raises:
+    - ValueError: Si el checkpoint no es válido.
+
+    Returns:
+    - tuple: (updated_at, id).
+    """
+    try:
+        updated_at, ticket_id = orjson.loads(base64.urlsafe_b64decode(checkpoint.encode()))
+        return datetime.fromisoformat(updated_at), int(ticket_id)
+    except Exception as e:
+        raise ValueError(f"Checkpoint inválido: {checkpoint}") from e
+
+
+def export_window(since: str = None):
+    """
+    Ventana de una exportación: las filas con (updated_at, id) mayor que since y updated_at
+    anterior a until. El checkpoint de la siguiente exportación es (until, 0), así que dos
+    exportaciones seguidas no dejan huecos ni se solapan.
+
+    Args:
+    - since (str, optional): Checkpoint de la exportación anterior (None = todo).
+
+    Returns:
+    - tuple: ((updated_at, id) inicial o None, until, checkpoint de la siguiente).
+    """
+    after = decode_checkpoint(since) if since else None
+    until = datetime.now() - timedelta(seconds=EXPORT_SAFETY_SECONDS)
+    if after and after[0] > until:
+        until = after[0]
+    return after, until, encode_checkpoint(until, 0)
+
+
+def _query(ticket_model, comment_model, after, until):
+    # Recuento correlacionado: lo resuelve el índice (ticket_id, created_at, id) de comentarios
+    # sin agrupar, de modo que el cursor puede ir devolviendo filas desde el principio
+    comment_count = select(func.count()).where(
+        comment_model.ticket_id == ticket_model.id).scalar_subquery()
+    query = (
+        select(ticket_model.id, ticket_model.title, ticket_model.description,
+               TicketStatus.name, ticket_model.user_id, ticket_model.assignee_id,
+               ticket_model.created_at, ticket_model.updated_at, ticket_model.version,
+               comment_count, literal(ticket_model is TicketArchive))
+        .outerjoin(TicketStatus, TicketStatus.id == ticket_model.status_id)
+        .where(ticket_model.updated_at < until)
+        .order_by(ticket_model.updated_at, ticket_model.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    if after:
+        query = query.where(tuple_(ticket_model.updated_at, ticket_model.id) > after)
+    return query
+
+
+def iter_export_rows(after=None, until: datetime = None, include_archived: bool = True):
+    """
+    Genera las filas de la exportación ordenadas por (updated_at, id).
+
+    Cada shard (y su archivo) se lee con un cursor de servidor en lotes de
+    EXPORT_BATCH_SIZE y los flujos ordenados se mezclan con heapq.merge, así que la memoria
+    usada no depende del número de tickets.
+
+    Args:
+    - after (tuple, optional): (updated_at, id) a partir del que se exporta (sin incluirlo).
+    - until (datetime, optional): Solo las filas con updated_at anterior.
+    - include_archived (bool): Incluye los tickets archivados.
+
+    Yields:
+    - tuple: Los valores de EXPORT_COLUMNS de cada ticket.
+    """
+    until = until or datetime.now() - timedelta(seconds=EXPORT_SAFETY_SECONDS)
+    sources = [(Ticket, Comment)]
+    if include_archived:
+        sources.append((TicketArchive, CommentArchive))
+    with ExitStack() as stack:
+        streams = []
+        for index in range(len(shards)):
+            for ticket_model, comment_model in sources:
+                db = stack.enter_context(shards.session(index, readonly=True))
+                result = db.execute(_query(ticket_model, comment_model, after, until))
+                stack.callback(result.close)
+                streams.append(iter(result))
+        for row in heapq.merge(*streams, key=lambda row: (row[7], row[0])):
+            yield tuple(row)
+
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class CsvExporter:
+    def __init__(self):
+        self.header = True
+
+    def write(self, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if self.header:
+            writer.writerow(EXPORT_COLUMNS)
+            self.header = False
+        writer.writerows([_value(value) for value in row] for row in rows)
+        return buffer.getvalue().encode()
+
+    def close(self):
+        # Una exportación sin filas también lleva la cabecera
+        return self.write([]) if self.header else b""
+
+
+class NdjsonExporter:
+    def write(self, rows):
+        return b"".join(orjson.dumps(dict(zip(EXPORT_COLUMNS, row))) + b"\n" for row in rows)
+
+    def close(self):
+        return b""
+
+
+class _Sink(io.RawIOBase):
+    """
+    Destino de pyarrow que acumula lo escrito hasta que se recoge.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+class ParquetExporter:
+    """
+    Escribe Parquet con un row group por lote, cada uno construido columna a columna. Cada
+    columna va comprimida por pyarrow (zstd), así que no se comprime otra vez el flujo.
+    """
+
+    def __init__(self):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ValueError("La exportación a Parquet necesita pyarrow") from e
+        self.pa = pa
+        self.schema = pa.schema([
+            ("id", pa.int64()), ("title", pa.string()), ("description", pa.string()),
+            ("status", pa.string()), ("user_id", pa.int64()), ("assignee_id", pa.int64()),
+            ("created_at", pa.timestamp("us")), ("updated_at", pa.timestamp("us")),
+            ("version", pa.int64()), ("comment_count", pa.int64()), ("archived", pa.bool_()),
+        ])
+        self.sink = _Sink()
+        self.writer = pq.ParquetWriter(self.sink, self.schema, compression="zstd")
+
+    def write(self, rows):
+        columns = list(zip(*rows)) if rows else [[] for _ in EXPORT_COLUMNS]
+        batch = self.pa.RecordBatch.from_arrays(
+            [self.pa.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema)
+        self.writer.write_batch(batch)
+        return self.sink.drain()
+
+    def close(self):
+        self.writer.close()
+        return self.sink.drain()
+
+
+EXPORTERS = {"csv": CsvExporter, "ndjson": NdjsonExporter, "parquet": ParquetExporter}
+
+
+def _exporter(export_format: str):
+    if export_format not in EXPORTERS:
+        raise ValueError(f"Formato de exportación desconocido: {export_format}")
+    return EXPORTERS[export_format]()
+
+
+def _batches(rows, size: int):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def stream_export(export_format: str, after=None, until: datetime = None, gzip: bool = True,
+                  include_archived: bool = True, on_batch=None):
+    """
+    Genera el fichero de exportación por bloques, lote a lote.
+
+    Args:
+    - export_format (str): "csv", "ndjson" o "parquet".
+    - after (tuple, optional): (updated_at, id) a partir del que se exporta.
+    - until (datetime, optional): Solo las filas con updated_at anterior.
+    - gzip (bool): Comprime CSV y NDJSON con gzip sobre la marcha (Parquet ya va comprimido).
+    - include_archived (bool): Incluye los tickets archivados.
+    - on_batch (Callable, optional): Se llama con (updated_at, id) de la última fila de cada
+      lote y el número de filas, después de generar sus bytes (para guardar el progreso).
+
+    Raises:
+    - ValueError: Si el formato no es válido o no está disponible.
+
+    Yields:
+    - bytes: Fragmentos del fichero.
+    """
+    exporter = _exporter(export_format)
+    # wbits=31: formato gzip, que se puede concatenar al reanudar
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip and export_format != "parquet" else None
+
+    def emit(data):
+        return compressor.compress(data) if compressor else data
+
+    for batch in _batches(iter_export_rows(after, until, include_archived), EXPORT_BATCH_SIZE):
+        data = emit(exporter.write(batch))
+        if compressor:
+            # Cada lote sale entero para que el progreso guardado corresponda a lo escrito
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+        if on_batch:
+            last = batch[-1]
+            on_batch((last[7], last[0]), len(batch))
+    data = emit(exporter.close())
+    if compressor:
+        data += compressor.flush()
+    if data:
+        yield data
+
+
+def file_extension(export_format: str, gzip: bool = True):
+    return export_format + (".gz" if gzip and export_format != "parquet" else "")
+
+
+def _load_checkpoint(path: str):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_checkpoint(path: str, state: dict):
+    # Se escribe en un temporal y se renombra para que un corte no deje el fichero a medias
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+
+def run_export(export_format: str, directory: str, checkpoint_path: str = None,
+               gzip: bool = True, full: bool = False):
+    """
+    Exportación incremental a un fichero nuevo de directory.
+
+    El checkpoint (JSON) guarda dónde empieza la siguiente exportación. Mientras una
+    exportación está en curso se actualiza tras cada lote escrito, de modo que si se
+    interrumpe la siguiente continúa desde el último lote completo (en un fichero nuevo); el
+    fichero interrumpido contiene los lotes completos (gzip legible hasta el último).
+
+    Args:
+    - export_format (str): "csv", "ndjson" o "parquet".
+    - directory (str): Directorio de los ficheros exportados.
+    - checkpoint_path (str, optional): Fichero de checkpoint (por defecto en directory).
+    - gzip (bool): Comprime CSV y NDJSON.
+    - full (bool): Ignora el checkpoint y lo exporta todo.
+
+    Returns:
+    - tuple: (ruta del fichero, filas exportadas).
+    """
+    os.makedirs(directory, exist_ok=True)
+    checkpoint_path = checkpoint_path or os.path.join(directory, f"tickets.{export_format}.checkpoint")
+    state = {} if full else _load_checkpoint(checkpoint_path)
+    after, until, next_checkpoint = export_window(state.get("since"))
+    path = os.path.join(directory, f"tickets-{datetime.now():%Y%m%d-%H%M%S}.{file_extension(export_format, gzip)}")
+    exported = 0
+
+    with open(path, "wb") as f:
+        def on_batch(position, rows):
+            nonlocal exported
+            exported += rows
+            # Lo escrito llega a disco antes de avanzar el progreso: si se interrumpe, la
+            # siguiente exportación continúa justo después de la última fila guardada
+            f.flush()
+            _save_checkpoint(checkpoint_path, {"since": encode_checkpoint(*position)})
+
+        for chunk in stream_export(export_format, after, until, gzip=gzip, on_batch=on_batch):
+            f.write(chunk)
+    _save_checkpoint(checkpoint_path, {"since": next_checkpoint, "until": until.isoformat()})
+    logger.info(f"{exported} tickets exportados a {path}")
+    return path, exported
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python -m services.ticket_service.services.export_service",
+        description="Exporta los tickets cambiados desde la exportación anterior")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--out", default="exports", help="Directorio de los ficheros exportados")
+    parser.add_argument("--checkpoint", help="Fichero de checkpoint (por defecto en --out)")
+    parser.add_argument("--full", action="store_true", help="Ignora el checkpoint y lo exporta todo")
+    parser.add_argument("--no-gzip", dest="gzip", action="store_false")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    path, exported = run_export(args.format, args.out, args.checkpoint, gzip=args.gzip, full=args.full)
+    print(f"{exported} tickets exportados a {path}")
@@ -0,0 +1,265 @@
+import asyncio
+import heapq
+import os
+from datetime import datetime, timedelta
+
+import httpx
+import redis.asyncio as aioredis
+from dotenv import load_dotenv
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from ddbb.database.sharding import shards
+from ddbb.database.models.Ticket import Ticket
+from ddbb.database.models.TicketDeadline import TicketDeadline
+from ddbb.database.models.TicketStatus import TicketStatus
+from ddbb.redis.db_redis import REDIS_URL
+from ddbb.redis.leader import LeaderLock
+from ddbb.tracing import TracingTransport, span
+
+import logging
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# Tiempo máximo en cada estado antes de escalar; los estados sin SLA no tienen vencimiento
+SLA_SECONDS = {
+    "open": int(os.getenv("TICKET_SLA_OPEN_SECONDS", 4 * 3600)),
+    "in_progress": int(os.getenv("TICKET_SLA_IN_PROGRESS_SECONDS", 24 * 3600)),
+}
+# Veces que se notifica un mismo vencimiento (cada SLA_SECONDS) antes de dejar de escalar
+SLA_ESCALATION_LEVELS = int(os.getenv("TICKET_SLA_ESCALATION_LEVELS", 3))
+
+SLA_SCHEDULER_ENABLED = os.getenv(
+    "SLA_SCHEDULER_ENABLED", "true").lower() == "true"
+# El heap solo contiene los vencimientos de los próximos SLA_HORIZON_SECONDS; se recarga
+# desde ticket_deadlines cada SLA_REFILL_SECONDS con una consulta por rango del índice
+SLA_HORIZON_SECONDS = float(os.getenv("SLA_HORIZON_SECONDS", 300))
+SLA_REFILL_SECONDS = float(os.getenv("SLA_REFILL_SECONDS", 30))
+SLA_REFILL_LIMIT = int(os.getenv("SLA_REFILL_LIMIT", 10000))
+SLA_FIRE_BATCH = int(os.getenv("SLA_FIRE_BATCH", 100))
+SLA_RETRY_SECONDS = float(os.getenv("SLA_RETRY_SECONDS", 30))
+SLA_LEADER_TTL = float(os.getenv("SLA_LEADER_TTL", 15))
+NOTIFICATION_SERVICE_URL = os.getenv(
+    "NOTIFICATION_SERVICE_URL", "http://localhost:8002")
+
+
+def schedule_ticket_deadline(db: Session, ticket_id: int, status_name: str):
+    """
+    Programa (o reprograma) el vencimiento de SLA de un ticket al entrar en un estado.
+
+    No hace commit: se llama dentro de la transacción que cambia el estado del ticket.
+
+    Args:
+    - db (Session): Sesión de la base de datos.
+    - ticket_id (int): Identificador del ticket.
+    - status_name (str): Nombre del nuevo estado (p. ej. "open"); si no tiene SLA solo se
+      elimina el vencimiento pendiente.
+    """
+    db.execute(delete(TicketDeadline).where(
+        TicketDeadline.ticket_id == ticket_id))
+    sla = SLA_SECONDS.get(status_name)
+    if sla is None:
+        return
+    db.execute(insert(TicketDeadline).values(
+        ticket_id=ticket_id,
+        status_id=select(TicketStatus.id).where(
+            TicketStatus.name == status_name).scalar_subquery(),
+        due_at=datetime.now() + timedelta(seconds=sla),
+        level=0,
+    ))
+
+
+class SlaScheduler:
+    """
+    Planificador de vencimientos de SLA con un min-heap en memoria.
+
+    Solo la réplica líder (lock de Redis) lo ejecuta. Cada SLA_REFILL_SECONDS carga en el
+    heap los vencimientos de la ventana [ahora, ahora + SLA_HORIZON_SECONDS] y duerme hasta
+    el siguiente. Al vencer uno, notifica al usuario del ticket a través del servicio de
+    notificaciones y pasa al siguiente nivel de escalado.
+
+    Las entradas del heap no se borran al reprogramar un ticket: al sacarlas se comparan
+    con scheduled y con la fila de la base de datos, y se descartan si ya no coinciden.
+
+    Atributos:
+    - heap (list): Entradas (fire_at, ticket_id, due_at, level) ordenadas por fire_at.
+    - scheduled (dict): Vencimiento vigente (due_at, level) de cada ticket del heap.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.scheduled = {}
+        self.fired = 0
+
+    def _push(self, ticket_id, due_at, level, fire_at=None):
+        self.scheduled[ticket_id] = (due_at, level)
+        heapq.heappush(self.heap, (fire_at or due_at, ticket_id, due_at, level))
+
+    def _refill(self):
+        """
+        Carga en el heap los vencimientos de la ventana que aún no tiene, de todos los shards.
+        """
+        horizon = datetime.now() + timedelta(seconds=SLA_HORIZON_SECONDS)
+        rows = shards.gather(
+            select(TicketDeadline.ticket_id,
+                   TicketDeadline.due_at, TicketDeadline.level)
+            .where(TicketDeadline.due_at <= horizon)
+            .order_by(TicketDeadline.due_at),
+            key=lambda row: row["due_at"], limit=SLA_REFILL_LIMIT)
+        for ticket_id, due_at, level in (row.values() for row in rows):
+            if self.scheduled.get(ticket_id) != (due_at, level):
+                self._push(ticket_id, due_at, level)
+
+    def _pop_due(self):
+        now = datetime.now()
+        due = []
+        while self.heap and self.heap[0][0] <= now and len(due) < SLA_FIRE_BATCH:
+            _, ticket_id, due_at, level = heapq.heappop(self.heap)
+            if self.scheduled.get(ticket_id) == (due_at, level):
+                due.append((ticket_id, due_at, level))
+        return due
+
+    @staticmethod
+    def _load(due):
+        """
+        Lee los vencimientos que siguen vigentes junto con los datos del ticket, con una
+        consulta por shard.
+        """
+        by_shard = {}
+        for ticket_id, _, _ in due:
+            by_shard.setdefault(shards.shard_of(ticket_id), []).append(ticket_id)
+        rows = []
+        for index, ticket_ids in by_shard.items():
+            with shards.session(index) as db:
+                rows.extend(db.execute(
+                    select(TicketDeadline.ticket_id, TicketDeadline.due_at, TicketDeadline.level,
+                           Ticket.user_id, Ticket.title, TicketStatus.name.label("status"))
+                    .join(Ticket, Ticket.id == TicketDeadline.ticket_id)
+                    .join(TicketStatus, TicketStatus.id == TicketDeadline.status_id)
+                    .where(TicketDeadline.ticket_id.in_(ticket_ids))
+                ).mappings().all())
+        current = {(ticket_id, due_at, level) for ticket_id, due_at, level in due}
+        return [row for row in rows if (row["ticket_id"], row["due_at"], row["level"]) in current]
+
+    @staticmethod
+    def _advance(row):
+        """
+        Pasa el vencimiento al siguiente nivel de escalado, o lo elimina si era el último o
+        su estado no tiene SLA. Solo se aplica si la fila no ha cambiado desde que se leyó.
+
+        Returns:
+        - datetime: El siguiente vencimiento, o None si ya no hay más.
+        """
+        conditions = (TicketDeadline.ticket_id == row["ticket_id"],
+                      TicketDeadline.due_at == row["due_at"],
+                      TicketDeadline.level == row["level"])
+        next_due = None
+        sla = SLA_SECONDS.get(row["status"])
+        with shards.session(shards.shard_of(row["ticket_id"])) as db:
+            if sla and row["level"] + 1 < SLA_ESCALATION_LEVELS:
+                next_due = row["due_at"] + timedelta(seconds=sla)
+                result = db.execute(update(TicketDeadline).where(*conditions).values(
+                    due_at=next_due, level=row["level"] + 1))
+            else:
+                result = db.execute(delete(TicketDeadline).where(*conditions))
+            db.commit()
+        return next_due if result.rowcount else None
+
+    async def _notify(self, http: httpx.AsyncClient, row):
+        if row["user_id"] is None:
+            return True
+        notification = {
+            "user_id": str(row["user_id"]),
+            "ticket_id": str(row["ticket_id"]),
+            "message": f"El ticket {row['ticket_id']} ({row['title']}) ha superado el SLA del estado {row['status']}",
+            "notification_type": f"sla_escalation_{row['level'] + 1}",
+        }
+        try:
+            response = await http.post(f"{NOTIFICATION_SERVICE_URL}/api/notifications/notify", json=notification)
+            response.raise_for_status()
+            return True
+        except httpx.HTTPError as e:
+            logger.error(
+                f"Error notificando el SLA del ticket {row['ticket_id']}: {e}")
+            return False
+
+    async def _fire(self, http: httpx.AsyncClient, due):
+        with span("sla.fire", attributes={"sla.due": len(due)}):
+            await self._fire_due(http, due)
+
+    async def _fire_due(self, http: httpx.AsyncClient, due):
+        rows = await asyncio.to_thread(self._load, due)
+        # Los que ya no están en la base de datos se han reprogramado o eliminado
+        current = {row["ticket_id"] for row in rows}
+        for ticket_id, _, _ in due:
+            if ticket_id not in current:
+                self.scheduled.pop(ticket_id, None)
+        # Un estado sin SLA configurado (p. ej. añadido después) no se escala: se descarta
+        # su vencimiento sin notificar
+        for row in [row for row in rows if row["status"] not in SLA_SECONDS]:
+            logger.warning(f"Estado sin SLA {row['status']!r} en el ticket {row['ticket_id']}")
+            await asyncio.to_thread(self._advance, row)
+            self.scheduled.pop(row["ticket_id"], None)
+        rows = [row for row in rows if row["status"] in SLA_SECONDS]
+        sent = await asyncio.gather(*(self._notify(http, row) for row in rows))
+        for row, ok in zip(rows, sent):
+            ticket_id = row["ticket_id"]
+            if not ok:
+                # Se reintenta más tarde con el mismo vencimiento
+                self._push(ticket_id, row["due_at"], row["level"],
+                           fire_at=datetime.now() + timedelta(seconds=SLA_RETRY_SECONDS))
+                continue
+            self.fired += 1
+            next_due = await asyncio.to_thread(self._advance, row)
+            if next_due is None:
+                self.scheduled.pop(ticket_id, None)
+            else:
+                self._push(ticket_id, next_due, row["level"] + 1)
+
+    async def run(self):
+        """
+        Bucle del planificador; se ejecuta hasta que se cancela la tarea.
+        """
+        client = aioredis.from_url(REDIS_URL)
+        lock = LeaderLock(client, "sla_scheduler", SLA_LEADER_TTL)
+        http = httpx.AsyncClient(
+            timeout=5, transport=TracingTransport(httpx.AsyncHTTPTransport()))
+        next_refill = datetime.min
+        try:
+            while True:
+                if not await lock.acquire_or_renew():
+                    # Al perder el liderazgo el estado se descarta; el nuevo líder lo recarga
+                    self.heap.clear()
+                    self.scheduled.clear()
+                    next_refill = datetime.min
+                    await asyncio.sleep(lock.ttl / 3)
+                    continue
+
+                try:
+                    if datetime.now() >= next_refill:
+                        await asyncio.to_thread(self._refill)
+                        next_refill = datetime.now() + timedelta(seconds=SLA_REFILL_SECONDS)
+                    due = self._pop_due()
+                    if due:
+                        await self._fire(http, due)
+                        continue
+                except Exception as e:
+                    # Se descarta el estado en memoria y se recarga desde la tabla más tarde
+                    logger.error(f"Error en el planificador de SLA: {e}")
+                    self.heap.clear()
+                    self.scheduled.clear()
+                    next_refill = datetime.now() + timedelta(seconds=SLA_RETRY_SECONDS)
+
+                wake_at = min(next_refill, self.heap[0][0]) if self.heap else next_refill
+                sleep = (wake_at - datetime.now()).total_seconds()
+                await asyncio.sleep(max(0, min(sleep, lock.ttl / 3)))
+        finally:
+            await lock.release()
+            await http.aclose()
+            await client.aclose()
+
+    def stats(self):
+        return {"pending": len(self.scheduled), "heap": len(self.heap), "fired": self.fired}
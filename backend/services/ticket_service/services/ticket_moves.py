@@ -0,0 +1,33 @@
+from ddbb.database.sharding import on_ticket_moved
+from .assignment_service import assignment_engine
+from .dedup_service import duplicate_index
+from .view_service import ticket_views
+
+
+@on_ticket_moved
+def update_indexes(old_id: int, ticket: dict, archived: bool):
+    """
+    Actualiza los índices del servicio que guardan ids de tickets después de trasladar un
+    ticket de shard (con ddbb.database.sharding, que importa este módulo):
+
+    - El índice de duplicados cambia el id anterior por el nuevo (salvo en los duplicados
+      ya fusionados, que no se proponen).
+    - Las vistas guardadas sacan el id anterior y, si el ticket no está archivado, reciben
+      el nuevo.
+    - Los recuentos de asignación no dependen del id, pero se reconstruyen por si una
+      reconstrucción leyó el ticket en los dos shards durante el traslado.
+
+    Args:
+    - old_id (int): Id del ticket antes del traslado.
+    - ticket (dict): La fila del ticket con su id nuevo.
+    - archived (bool): Si el ticket estaba archivado.
+    """
+    duplicate_index.remove(old_id)
+    if ticket["duplicate_of_id"] is None:
+        created_at = None if ticket.get("created_at_missing") else ticket["created_at"]
+        duplicate_index.add(ticket["id"], ticket["title"], ticket["description"], created_at,
+                            find=False)
+    ticket_views.remove([old_id])
+    if not archived:
+        ticket_views.apply(ticket)
+    assignment_engine.invalidate()
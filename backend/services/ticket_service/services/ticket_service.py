@@ -1,17 +1,71 @@
+import base64
+from datetime import datetime
+from typing import Optional
+
+import orjson
+from sqlalchemy import select, tuple_, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from ddbb.database.models.Ticket import Ticket
-from ..schemas.ticket import TicketCreate, TicketUpdate
+from ddbb.database.models.TicketArchive import TicketArchive
+from ..schemas.ticket import TicketCreate, TicketUpdate, TicketStatus as TicketStatusName
 from ddbb.database.models.TicketStatus import TicketStatus
+from ddbb.database.sharding import find_moved_ticket, shards
+from .sla_service import schedule_ticket_deadline
+from .archive_service import archived_columns, restore_ticket
+from .assignment_service import CLOSED_STATUS, assignment_engine
+from .exceptions import InvalidMerge, InvalidTicketUpdate, UnknownTicketStatus, VersionConflict
+from .view_service import ticket_views
 
 import logging
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+# Columnas que se devuelven en las lecturas; coinciden con los campos de TicketBase
+TICKET_COLUMNS = (
+    Ticket.id,
+    Ticket.title,
+    Ticket.description,
+    Ticket.created_at,
+    Ticket.updated_at,
+    Ticket.user_id,
+    Ticket.status_id,
+    Ticket.assignee_id,
+    Ticket.version,
+    Ticket.duplicate_of_id,
+)
+
+# Orden de los listados, del más reciente al más antiguo; lo cubre ix_tickets_created_id
+TICKET_ORDER = (Ticket.created_at, Ticket.id)
+
+# Nombre de cada estado por id; ticket_statuses es una tabla de referencia con los mismos
+# ids en todos los shards, así que se carga una vez
+_status_names = {}
+
+
+def _status_name(db: Session, status_id: int):
+    if status_id not in _status_names:
+        _status_names.update(db.execute(select(TicketStatus.id, TicketStatus.name)).all())
+    return _status_names.get(status_id)
+
+
+def _status_id(db: Session, name: str):
+    """
+    Id de un estado por su nombre, o None si no existe.
+    """
+    for _ in range(2):
+        for status_id, status_name in _status_names.items():
+            if status_name == name:
+                return status_id
+        # Un estado creado después de la última carga: se recarga una vez
+        _status_names.update(db.execute(select(TicketStatus.id, TicketStatus.name)).all())
+    return None
+
 
 def create_ticket(db: Session, ticket: TicketCreate):
     """
-    Crea un nuevo ticket en la base de datos.
+    Crea un nuevo ticket en la base de datos y, si no trae agente, lo asigna con el motor de asignación.
 
     Args:
     - db (Session): Sesión de la base de datos.
@@ -20,6 +74,7 @@ def create_ticket(db: Session, ticket: TicketCreate):
     Returns:
     - Ticket: El ticket creado, con sus datos actualizados en la base de datos.
     """
+    assignee_id = None
     try:
         status = db.query(TicketStatus).filter(
             TicketStatus.id == ticket.status).first()
@@ -27,23 +82,36 @@ def create_ticket(db: Session, ticket: TicketCreate):
         if not status:
             status = create_ticket_status(db)
 
+        if status.name != CLOSED_STATUS:
+            # assign() ya cuenta el ticket en el agente elegido; se descuenta si falla la creación
+            assignee_id = ticket.assignee_id
+            if assignee_id is None:
+                assignee_id = assignment_engine.assign(ticket.team)
+            else:
+                assignment_engine.opened(assignee_id)
+
         db_ticket = Ticket(
             title=ticket.title,
             description=ticket.description,
             status=status,
-            user_id=ticket.user_id
+            user_id=ticket.user_id,
+            assignee_id=assignee_id
         )
         print(db_ticket)
         if not db_ticket.status:
 
             raise ValueError("Status not provided, setting to open")
         db.add(db_ticket)
+        db.flush()
+        schedule_ticket_deadline(db, db_ticket.id, status.name)
         db.commit()
         db.refresh(db_ticket)
         logger.debug(f"Ticket created: {db_ticket}")
+        ticket_views.apply({column.key: getattr(db_ticket, column.key) for column in TICKET_COLUMNS})
         return db_ticket
     except Exception as e:
         logger.error(f"Error creating ticket: {e}")
+        assignment_engine.release(assignee_id)
         return None
 
 
@@ -97,33 +165,289 @@ def get_ticket_by_id(db: Session, ticket_id: int):
     return db_ticket
 
 
-def update_ticket(db: Session, ticket_id: int, ticket: TicketUpdate):
+def get_ticket_row_by_id(db: Session, ticket_id: int):
     """
-    Actualiza un ticket existente en la base de datos.
+    Obtiene un ticket por su ID como diccionario plano, sin hidratar la entidad ORM. Si no
+    está entre los tickets activos se busca en el archivo.
+
+    Args:
+    - db (Session): Sesión de la base de datos.
+    - ticket_id (int): Identificador del ticket a obtener.
+
+    Returns:
+    - dict: Los campos de TicketBase del ticket, o None si no se encuentra el ticket.
+    """
+    row = db.execute(
+        select(*TICKET_COLUMNS).where(Ticket.id == ticket_id)).first()
+    if row is None:
+        row = db.execute(select(*archived_columns(TICKET_COLUMNS, TicketArchive))
+                         .where(TicketArchive.id == ticket_id)).first()
+    return row._asdict() if row else None
+
+
+def encode_ticket_cursor(created_at: Optional[datetime], ticket_id: int):
+    """
+    Codifica la posición de un ticket en el listado como cursor opaco para la paginación.
+
+    Args:
+    - created_at (datetime, optional): Fecha de creación del último ticket devuelto; None
+      si no la tiene (se codifica como null).
+    - ticket_id (int): El ID del último ticket devuelto.
+
+    Returns:
+    - str: El cursor codificado en base64 apto para URLs.
+    """
+    raw = orjson.dumps([created_at.isoformat() if created_at is not None else None, ticket_id])
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_ticket_cursor(cursor: str):
+    """
+    Decodifica un cursor generado por encode_ticket_cursor.
+
+    Args:
+    - cursor (str): El cursor recibido del cliente.
+
+    Raises:
+    - ValueError: Si el cursor no es válido.
+
+    Returns:
+    - tuple: (created_at o None, id) del último ticket de la página anterior.
+    """
+    try:
+        created_at, ticket_id = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (datetime.fromisoformat(created_at) if created_at is not None else None,
+                int(ticket_id))
+    except Exception as e:
+        raise ValueError(f"Cursor inválido: {cursor}") from e
+
+
+def list_tickets(user_id: int = None, assignee_id: int = None, status_id: int = None,
+                 limit: int = 50, cursor: str = None, archived: bool = False):
+    """
+    Lista tickets, del más reciente al más antiguo, de todos los shards con paginación por
+    cursor (keyset).
+
+    Cada shard devuelve su página ordenada por (created_at, id) y se mezclan con un
+    merge-sort, así que el cursor de (created_at, id) del último ticket sirve para todos los
+    shards a la vez. Los tickets sin created_at van al final, del id mayor al menor.
+
+    Args:
+    - user_id (int, optional): Solo los tickets de este usuario.
+    - assignee_id (int, optional): Solo los tickets asignados a este agente.
+    - status_id (int, optional): Solo los tickets en este estado.
+    - limit (int): Número máximo de tickets de la página.
+    - cursor (str, optional): Cursor devuelto por la página anterior.
+    - archived (bool): Lista los tickets archivados en lugar de los activos.
+
+    Raises:
+    - ValueError: Si el cursor no es válido.
+
+    Returns:
+    - tuple: (tickets como diccionarios, cursor de la siguiente página o None).
+    """
+    model = TicketArchive if archived else Ticket
+    order = archived_columns(TICKET_ORDER, model)
+    query = select(*archived_columns(TICKET_COLUMNS, model))
+    if user_id is not None:
+        query = query.where(model.user_id == user_id)
+    if assignee_id is not None:
+        query = query.where(model.assignee_id == assignee_id)
+    if status_id is not None:
+        query = query.where(model.status_id == status_id)
+    after = decode_ticket_cursor(cursor) if cursor else None
+    created_at, ticket_id = order
+
+    # Pedimos una fila de más para saber si hay página siguiente. Primero los que tienen
+    # fecha y después los que no; cada parte es una consulta que recorre el índice
+    # (created_at, id) en orden, sea cual sea el lugar de los NULL en el motor
+    tickets = []
+    if after is None or after[0] is not None:
+        dated = query.where(created_at.is_not(None))
+        if after:
+            dated = dated.where(tuple_(*order) < after)
+        tickets = shards.gather(
+            dated.order_by(*(column.desc() for column in order)),
+            key=lambda row: (row["created_at"], row["id"]), limit=limit + 1, reverse=True)
+    if len(tickets) <= limit:
+        undated = query.where(created_at.is_(None))
+        if after and after[0] is None:
+            undated = undated.where(ticket_id < after[1])
+        tickets += shards.gather(undated.order_by(ticket_id.desc()), key=lambda row: row["id"],
+                                 limit=limit + 1 - len(tickets), reverse=True)
+
+    next_cursor = None
+    if len(tickets) > limit:
+        tickets = tickets[:limit]
+        last = tickets[-1]
+        next_cursor = encode_ticket_cursor(last["created_at"], last["id"])
+    return tickets, next_cursor
+
+
+def get_ticket_rows_by_ids(ticket_ids):
+    """
+    Obtiene varios tickets activos por su ID, cada uno de su shard, en el orden pedido.
+
+    Args:
+    - ticket_ids (list): Identificadores de los tickets.
+
+    Returns:
+    - list: Los campos de TicketBase de los tickets encontrados.
+    """
+    by_shard = {}
+    for ticket_id in ticket_ids:
+        by_shard.setdefault(shards.shard_of(ticket_id), []).append(ticket_id)
+    rows = {}
+    for index, ids in by_shard.items():
+        with shards.session(index, readonly=True) as db:
+            for row in db.execute(select(*TICKET_COLUMNS).where(Ticket.id.in_(ids))):
+                rows[row.id] = row._asdict()
+    return [rows[ticket_id] for ticket_id in ticket_ids if ticket_id in rows]
+
+
+def _lock_status(db: Session, ticket_id: int):
+    """
+    Estado actual de un ticket, bloqueando su fila hasta el final de la transacción: ningún
+    otro cambio de estado puede colarse entre esta lectura y el UPDATE.
+    """
+    return db.execute(select(Ticket.status_id).where(Ticket.id == ticket_id).with_for_update()).scalar()
+
+
+def update_ticket(db: Session, ticket_id: int, ticket: TicketUpdate, expected_version: int = None,
+                  extra_values: dict = None):
+    """
+    Actualiza un ticket existente en la base de datos con control de concurrencia optimista.
+
+    La actualización es una única sentencia UPDATE ... WHERE id = ? AND version = ? que
+    incrementa la versión y devuelve la fila resultante. Solo un cambio de estado lee antes
+    el estado anterior (SELECT ... FOR UPDATE), que deciden el SLA y la carga del agente.
 
     Args:
     - db (Session): Sesión de la base de datos.
     - ticket_id (int): Identificador del ticket a actualizar.
     - ticket (TicketUpdate): Datos del ticket actualizados.
+    - expected_version (int, optional): Versión que el cliente leyó (If-Match). Si es None
+      la actualización no se condiciona a la versión.
+    - extra_values (dict, optional): Otras columnas que fija el servicio (no la API).
+
+    Raises:
+    - UnknownTicketStatus: Si el estado no existe.
+    - InvalidTicketUpdate: Si los valores violan otra restricción de la tabla (p. ej. un
+      título nulo o un agente inexistente).
+    - VersionConflict: Si el ticket ha sido modificado desde expected_version.
 
     Returns:
-    - Ticket: El ticket actualizado, o None si no se encuentra el ticket.
+    - dict: Los campos de TicketBase del ticket actualizado, o None si no se encuentra el ticket.
     """
+    values = ticket.model_dump(exclude_unset=True, exclude={"status"})
+    values.update(extra_values or {})
+    if ticket.status:
+        # El estado llega como enum de la API; su id sale de la tabla de referencia cacheada
+        values["status_id"] = _status_id(db, ticket.status.name.lower())
+        if values["status_id"] is None:
+            raise UnknownTicketStatus("Unknown ticket status")
 
-    # obtenemos el ticket de la base de datos
-    db_ticket = db.query(Ticket).filter(Ticket.id == ticket_id).first()
-    if db_ticket:
-        # actualizamos los campos del ticket con los nuevos valores
-        for field, value in ticket.model_dump(exclude_unset=True).items():
-            setattr(db_ticket, field, value)  # actualizamos el campo
-
-        # actualizamos el estado del ticket si se ha proporcionado
-        if ticket.status:
-            db_ticket.status = TicketStatus(ticket.status)
-        db.commit()
-        db.refresh(db_ticket)
-        logger.debug(f"Ticket updated: {db_ticket}")
-        return db_ticket
+    conditions = [Ticket.id == ticket_id]
+    if expected_version is not None:
+        conditions.append(Ticket.version == expected_version)
 
-    logger.error(f"Ticket with id {ticket_id} not found")
-    return None
+    statement = (
+        update(Ticket)
+        .where(*conditions)
+        .values(**values, version=Ticket.version + 1)
+        .returning(*TICKET_COLUMNS)
+        .execution_options(synchronize_session=False)
+    )
+    try:
+        previous_status_id = _lock_status(db, ticket_id) if ticket.status else None
+        row = db.execute(statement).first()
+        if row is None and restore_ticket(db, ticket_id):
+            # Un ticket archivado vuelve a las tablas activas en la misma transacción que la
+            # actualización (p. ej. al reabrirlo); si la versión no coincide se deshace todo
+            previous_status_id = _lock_status(db, ticket_id) if ticket.status else None
+            row = db.execute(statement).first()
+    except IntegrityError as e:
+        # El estado ya está comprobado: es otra restricción (NOT NULL, clave foránea...)
+        db.rollback()
+        logger.error(f"Ticket {ticket_id} update violates a constraint: {e.orig}")
+        raise InvalidTicketUpdate(f"Ticket update violates a constraint: {str(e.orig).splitlines()[0]}")
+
+    if row is None:
+        db.rollback()
+        if expected_version is not None and get_ticket_row_by_id(db, ticket_id):
+            logger.error(
+                f"Ticket with id {ticket_id} modified since version {expected_version}")
+            raise VersionConflict("Ticket was modified by another request")
+        logger.error(f"Ticket with id {ticket_id} not found")
+        return None
+
+    row = row._asdict()
+    status_changed = ticket.status and previous_status_id != row["status_id"]
+    if status_changed:
+        # El SLA empieza de nuevo al cambiar de estado (o desaparece si el estado no tiene
+        # SLA); repetir el mismo estado no reinicia el reloj
+        schedule_ticket_deadline(db, ticket_id, ticket.status.name.lower())
+    db.commit()
+    if status_changed:
+        # El estado anterior decide si el ticket deja de contar (o vuelve a contar) como
+        # abierto para su agente
+        assignment_engine.status_changed(
+            row["assignee_id"], _status_name(db, previous_status_id), ticket.status.name.lower())
+    logger.debug(f"Ticket updated: {row}")
+    # Las vistas guardadas se actualizan con la fila resultante, sin volver a consultarlas
+    ticket_views.apply(row)
+    return row
+
+
+# Saltos que se siguen como mucho al resolver una cadena de duplicados
+MAX_DUPLICATE_HOPS = 10
+
+
+def resolve_canonical_ticket(ticket_id: int):
+    """
+    Ticket original de un ticket: si es un duplicado fusionado, el ticket con el que se
+    fusionó (siguiendo la cadena), buscándolo en su shard. Los tickets trasladados de shard
+    se siguen hasta su id actual.
+
+    Args:
+    - ticket_id (int): Identificador del ticket.
+
+    Returns:
+    - int: El id del ticket original, o None si el ticket (o alguno de la cadena) no existe.
+    """
+    for _ in range(MAX_DUPLICATE_HOPS):
+        with shards.session(shards.shard_of(ticket_id), readonly=True) as db:
+            row = get_ticket_row_by_id(db, ticket_id)
+        if row is None:
+            ticket_id = find_moved_ticket(ticket_id)
+            if ticket_id is None:
+                return None
+            continue
+        if row["duplicate_of_id"] is None:
+            return ticket_id
+        ticket_id = row["duplicate_of_id"]
+    return ticket_id
+
+
+def merge_ticket(db: Session, ticket_id: int, canonical_id: int, expected_version: int = None):
+    """
+    Fusiona un ticket duplicado con su original: lo enlaza con él (duplicate_of_id) y lo
+    cierra, en una sola actualización.
+
+    Args:
+    - db (Session): Sesión del shard del ticket duplicado.
+    - ticket_id (int): Identificador del ticket duplicado.
+    - canonical_id (int): Identificador del ticket original (ya resuelto con resolve_canonical_ticket).
+    - expected_version (int, optional): Versión que el cliente leyó (If-Match).
+
+    Raises:
+    - InvalidMerge: Si el ticket se fusionaría consigo mismo.
+    - VersionConflict: Si el ticket ha sido modificado desde expected_version.
+
+    Returns:
+    - dict: Los campos de TicketBase del ticket fusionado, o None si no se encuentra el ticket.
+    """
+    if canonical_id == ticket_id:
+        raise InvalidMerge("A ticket cannot be merged into itself")
+    return update_ticket(db, ticket_id, TicketUpdate(status=TicketStatusName.CLOSED),
+                         expected_version, extra_values={"duplicate_of_id": canonical_id})
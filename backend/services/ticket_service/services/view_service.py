@@ -0,0 +1,631 @@
+import argparse
+import os
+import threading
+import time
+from datetime import datetime
+
+import orjson
+import redis.asyncio as aioredis
+from dotenv import load_dotenv
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import Session
+
+from ddbb.database.db_postgres import SessionLocal
+from ddbb.database.models.SavedView import SavedView
+from ddbb.database.models.Ticket import Ticket
+from ddbb.database.models.TicketStatus import TicketStatus
+from ddbb.database.sharding import shards
+from ddbb.redis.db_redis import REDIS_URL, r
+from ..schemas.view import SavedViewCreate, TicketFilter
+from .exceptions import InvalidViewFilter, ViewNotFound
+
+import logging
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+TICKET_VIEWS_ENABLED = os.getenv("TICKET_VIEWS_ENABLED", "true").lower() == "true"
+# Cambios que se conservan en el stream de eventos de cada vista (dashboards en vivo)
+TICKET_VIEW_EVENTS_MAXLEN = int(os.getenv("TICKET_VIEW_EVENTS_MAXLEN", 10000))
+# Segundos que se recuerda la versión de un ticket que no está en ninguna vista, para
+# descartar escrituras anteriores que lleguen tarde
+TICKET_VIEW_VERSION_TTL = int(os.getenv("TICKET_VIEW_VERSION_TTL", 86400))
+# Tickets por lote al materializar una vista
+TICKET_VIEW_BUILD_BATCH = int(os.getenv("TICKET_VIEW_BUILD_BATCH", 5000))
+# Milisegundos que espera cada lectura de eventos antes de enviar un latido
+TICKET_VIEW_EVENTS_BLOCK_MS = int(os.getenv("TICKET_VIEW_EVENTS_BLOCK_MS", 15000))
+
+# Campos de Ticket por los que se puede filtrar, en orden de preferencia para indexar las
+# vistas (los más selectivos primero)
+FILTER_FIELDS = ("assignee_id", "user_id", "duplicate_of_id", "status_id")
+
+# Claves de Redis:
+# - views:generation: se incrementa al crear o borrar una vista; las escrituras evaluadas
+#   con definiciones de otra generación se rechazan y se vuelven a evaluar.
+# - views:active: ids de las vistas que existen.
+# - views:{vista}:ids: sorted set con los tickets de la vista (score = created_at).
+# - views:{vista}:events: stream de cambios de la vista (add, upd, del).
+# - views:ticket:{ticket}: vistas que contienen el ticket y su última versión aplicada (v).
+# Los scripts construyen las claves de las vistas a partir de sus ids, así que todas deben
+# estar en el mismo nodo (no hay Redis Cluster)
+GENERATION_KEY = "views:generation"
+ACTIVE_KEY = "views:active"
+
+
+def _ids_key(view_id):
+    return f"views:{view_id}:ids"
+
+
+def _events_key(view_id):
+    return f"views:{view_id}:events"
+
+
+def _ticket_key(ticket_id):
+    return f"views:ticket:{ticket_id}"
+
+
+# Aplica una escritura de un ticket: ARGV = generación, versión, ticket, score, ttl,
+# maxlen y las vistas con las que coincide ahora. Devuelve -1 si la generación no es la
+# actual, 0 si ya se había aplicado una versión igual o posterior, y si no el número de
+# eventos publicados
+_apply_change = r.register_script("""
+if (redis.call('get', KEYS[1]) or '0') ~= ARGV[1] then
+    return -1
+end
+local version = tonumber(ARGV[2])
+if version <= tonumber(redis.call('hget', KEYS[2], 'v') or '-1') then
+    return 0
+end
+local ticket, score, ttl, maxlen = ARGV[3], ARGV[4], ARGV[5], ARGV[6]
+local matches = {}
+for i = 7, #ARGV do
+    matches[ARGV[i]] = true
+end
+local events = 0
+for _, view in ipairs(redis.call('hkeys', KEYS[2])) do
+    if view ~= 'v' and not matches[view] then
+        redis.call('hdel', KEYS[2], view)
+        if redis.call('zrem', 'views:' .. view .. ':ids', ticket) == 1 then
+            redis.call('xadd', 'views:' .. view .. ':events', 'MAXLEN', '~', maxlen, '*',
+                       'op', 'del', 'id', ticket, 'v', version)
+            events = events + 1
+        end
+    end
+end
+for i = 7, #ARGV do
+    local view = ARGV[i]
+    local op = 'upd'
+    if redis.call('hset', KEYS[2], view, 1) == 1 then
+        redis.call('zadd', 'views:' .. view .. ':ids', score, ticket)
+        op = 'add'
+    end
+    redis.call('xadd', 'views:' .. view .. ':events', 'MAXLEN', '~', maxlen, '*',
+               'op', op, 'id', ticket, 'v', version)
+    events = events + 1
+end
+redis.call('hset', KEYS[2], 'v', version)
+if #ARGV > 6 then
+    redis.call('persist', KEYS[2])
+else
+    redis.call('expire', KEYS[2], ttl)
+end
+return events
+""")
+
+# Saca tickets de todas sus vistas (al archivarlos): ARGV = maxlen y los tickets
+_remove_tickets = r.register_script("""
+local maxlen = ARGV[1]
+for i = 2, #ARGV do
+    local ticket = ARGV[i]
+    local key = 'views:ticket:' .. ticket
+    for _, view in ipairs(redis.call('hkeys', key)) do
+        if view ~= 'v' and redis.call('zrem', 'views:' .. view .. ':ids', ticket) == 1 then
+            redis.call('xadd', 'views:' .. view .. ':events', 'MAXLEN', '~', maxlen, '*',
+                       'op', 'del', 'id', ticket)
+        end
+    end
+    redis.call('del', key)
+end
+return #ARGV - 1
+""")
+
+# Añade a una vista un lote de tickets leídos de la base de datos: ARGV = vista, maxlen,
+# si se publican eventos y tríos (ticket, versión, score). Un ticket con una versión
+# aplicada posterior a la leída no se toca: esa escritura ya se evaluó contra la vista
+_populate_view = r.register_script("""
+local view, maxlen, events = ARGV[1], ARGV[2], ARGV[3] == '1'
+if redis.call('sismember', KEYS[1], view) == 0 then
+    return -1
+end
+local added = 0
+for i = 4, #ARGV, 3 do
+    local ticket, version = ARGV[i], tonumber(ARGV[i + 1])
+    local key = 'views:ticket:' .. ticket
+    local seen = tonumber(redis.call('hget', key, 'v') or '-1')
+    if version >= seen then
+        redis.call('hset', key, 'v', version)
+        redis.call('persist', key)
+        redis.call('hset', key, view, 1)
+        if redis.call('zadd', 'views:' .. view .. ':ids', ARGV[i + 2], ticket) == 1 then
+            added = added + 1
+            if events then
+                redis.call('xadd', 'views:' .. view .. ':events', 'MAXLEN', '~', maxlen, '*',
+                           'op', 'add', 'id', ticket, 'v', version)
+            end
+        end
+    end
+end
+return added
+""")
+
+# Quita de una vista los tickets que ya no cumplen su filtro, salvo los que han cambiado
+# desde que se leyeron: ARGV = vista, maxlen, ttl y pares (ticket, versión leída)
+_prune_view = r.register_script("""
+local view, maxlen, ttl = ARGV[1], ARGV[2], ARGV[3]
+local removed = 0
+for i = 4, #ARGV, 2 do
+    local ticket = ARGV[i]
+    local key = 'views:ticket:' .. ticket
+    if (redis.call('hget', key, 'v') or '-1') == ARGV[i + 1] then
+        redis.call('hdel', key, view)
+        if redis.call('zrem', 'views:' .. view .. ':ids', ticket) == 1 then
+            redis.call('xadd', 'views:' .. view .. ':events', 'MAXLEN', '~', maxlen, '*',
+                       'op', 'del', 'id', ticket, 'v', ARGV[i + 1])
+            removed = removed + 1
+        end
+        if redis.call('hlen', key) <= 1 then
+            redis.call('expire', key, ttl)
+        end
+    end
+end
+return removed
+""")
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _score(created_at: datetime):
+    return created_at.timestamp() if created_at else 0.0
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def normalize_filters(db: Session, filters: TicketFilter):
+    """
+    Convierte el filtro de la API en el que se guarda: cada campo filtrado con la lista de
+    valores admitidos, con los nombres de estado resueltos a su id.
+
+    Args:
+    - db (Session): Sesión de la base de datos principal.
+    - filters (TicketFilter): Filtro recibido.
+
+    Raises:
+    - InvalidViewFilter: Si un estado no existe o se filtra por status y status_id a la vez.
+
+    Returns:
+    - dict: Campo -> lista de valores, solo con los campos filtrados.
+    """
+    normalized = {}
+    for field in filters.model_fields_set:
+        value = getattr(filters, field)
+        normalized[field] = value if isinstance(value, list) else [value]
+
+    if "status" in normalized:
+        if "status_id" in normalized:
+            raise InvalidViewFilter("Filter by status or status_id, not both")
+        names = [status.name.lower() for status in normalized.pop("status") if status is not None]
+        ids = dict(db.execute(select(TicketStatus.name, TicketStatus.id)
+                              .where(TicketStatus.name.in_(names))).all())
+        if len(ids) < len(set(names)):
+            raise InvalidViewFilter("Unknown ticket status")
+        normalized["status_id"] = [ids[name] for name in dict.fromkeys(names)]
+    return {field: list(dict.fromkeys(normalized[field])) for field in FILTER_FIELDS if field in normalized}
+
+
+def _filter_clause(filters: dict):
+    """
+    Condición SQL equivalente a un filtro normalizado.
+    """
+    clauses = []
+    for field, values in filters.items():
+        column = getattr(Ticket, field)
+        present = [value for value in values if value is not None]
+        options = [column.in_(present)] if present else []
+        if len(present) < len(values):
+            options.append(column.is_(None))
+        # Una lista vacía no admite ningún ticket
+        clauses.append(or_(*options) if options else column.in_([]))
+    return and_(*clauses)
+
+
+class TicketViews:
+    """
+    Resultados de las vistas guardadas, mantenidos en Redis de forma incremental.
+
+    Cada vista guarda en un sorted set los ids de sus tickets, del más antiguo al más
+    reciente, de modo que consultarla es un ZREVRANGE en lugar de repetir su consulta en
+    todos los shards. Se materializa al crearla; después cada creación o actualización de
+    un ticket se evalúa, en la réplica que la hace, contra las vistas a las que puede
+    afectar, y un script de Redis mueve el ticket entre vistas y publica el cambio en el
+    stream de eventos de cada una.
+
+    Las vistas se indexan por el valor de uno de sus campos (el primero de FILTER_FIELDS
+    que filtran), así que una escritura solo evalúa las vistas de los valores del ticket y
+    las que no filtran nada; las vistas que ya contienen el ticket las conoce Redis. Las
+    escrituras de un ticket que llegan desordenadas se descartan por su versión, y las
+    evaluadas con definiciones antiguas (otra réplica ha creado o borrado una vista) se
+    vuelven a evaluar tras recargarlas.
+
+    Los traslados de tickets entre shards cambian su id: tras un rebalanceo hay que
+    reconstruir las vistas (rebuild).
+
+    Atributos:
+    - enabled (bool): Si se mantienen las vistas.
+    - generation (str): Generación de las definiciones cargadas, o None si hay que cargarlas.
+    - views (dict): Filtro normalizado de cada vista.
+    """
+
+    def __init__(self, enabled: bool = TICKET_VIEWS_ENABLED):
+        self.enabled = enabled
+        self.generation = None
+        self.views = {}
+        # (campo, valor) -> vistas indexadas por ese valor, y vistas sin filtro
+        self.index = {}
+        self.unfiltered = set()
+        self._lock = threading.Lock()
+        self.applied = 0
+        self.events = 0
+        self.reloads = 0
+        self.errors = 0
+
+    def load(self):
+        """
+        Carga las definiciones de las vistas de la base de datos principal. La generación
+        se lee antes, de modo que una vista creada entretanto obliga a recargar.
+        """
+        generation = _decode(r.get(GENERATION_KEY)) or "0"
+        with SessionLocal() as db:
+            rows = db.execute(select(SavedView.id, SavedView.filters)).all()
+        views, index, unfiltered = {}, {}, set()
+        for view_id, filters in rows:
+            key = str(view_id)
+            views[key] = {field: frozenset(values) for field, values in filters.items()}
+            anchor = next((field for field in FILTER_FIELDS if field in filters), None)
+            if anchor is None:
+                unfiltered.add(key)
+                continue
+            for value in filters[anchor]:
+                index.setdefault((anchor, value), set()).add(key)
+        with self._lock:
+            self.views, self.index, self.unfiltered = views, index, unfiltered
+            self.generation = generation
+
+    def invalidate(self):
+        """
+        Marca las definiciones para recargarlas en la siguiente escritura.
+        """
+        with self._lock:
+            self.generation = None
+
+    def matching(self, row: dict):
+        """
+        Vistas cuyo filtro cumple un ticket.
+
+        Args:
+        - row (dict): Los campos del ticket.
+
+        Returns:
+        - list: Ids (str) de las vistas.
+        """
+        candidates = set(self.unfiltered)
+        for field in FILTER_FIELDS:
+            candidates.update(self.index.get((field, row[field]), ()))
+        return [view for view in candidates
+                if all(row[field] in values for field, values in self.views[view].items())]
+
+    def apply(self, row: dict):
+        """
+        Aplica a las vistas la creación o actualización de un ticket, ya confirmada en la
+        base de datos. Un fallo de Redis no hace fallar la escritura: se registra y la
+        vista queda desactualizada hasta que se reconstruye.
+
+        Args:
+        - row (dict): Los campos del ticket (los de TicketBase), con su nueva versión.
+        """
+        if not self.enabled:
+            return
+        try:
+            for _ in range(3):
+                if self.generation is None:
+                    self.load()
+                with self._lock:
+                    generation, matching = self.generation, self.matching(row)
+                result = _apply_change(
+                    keys=[GENERATION_KEY, _ticket_key(row["id"])],
+                    args=[generation, row["version"], row["id"], _score(row["created_at"]),
+                          TICKET_VIEW_VERSION_TTL, TICKET_VIEW_EVENTS_MAXLEN, *matching])
+                if result != -1:
+                    self.applied += 1
+                    self.events += result
+                    return
+                # Otra réplica ha creado o borrado una vista
+                self.reloads += 1
+                self.invalidate()
+            logger.error(f"Vistas sin aplicar para el ticket {row['id']}: cambian sin parar")
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Error aplicando el ticket {row['id']} a las vistas: {e}")
+
+    def remove(self, ticket_ids):
+        """
+        Saca tickets de todas sus vistas (p. ej. al archivarlos).
+
+        Args:
+        - ticket_ids (list): Ids de los tickets.
+        """
+        if not self.enabled or not ticket_ids:
+            return
+        try:
+            for chunk in _chunks(list(ticket_ids), TICKET_VIEW_BUILD_BATCH):
+                _remove_tickets(args=[TICKET_VIEW_EVENTS_MAXLEN, *chunk])
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Error sacando {len(ticket_ids)} tickets de las vistas: {e}")
+
+    def build(self, view_id: int, filters: dict, events: bool = True):
+        """
+        Materializa una vista a partir de los tickets de todos los shards (del primario, sin
+        retraso de replicación) y quita los que ya no cumplen el filtro. Es segura con
+        escrituras concurrentes: las posteriores a la lectura de un ticket prevalecen.
+
+        Args:
+        - view_id (int): Identificador de la vista; ya debe estar en views:active.
+        - filters (dict): Filtro normalizado de la vista.
+        - events (bool): Si se publican como eventos los tickets añadidos.
+
+        Raises:
+        - ViewNotFound: Si la vista se borra mientras se materializa.
+
+        Returns:
+        - dict: Tickets añadidos y quitados.
+        """
+        view = str(view_id)
+        # Miembros actuales con su versión, leídos antes que la base de datos: solo se
+        # quitan si no han cambiado entretanto
+        members = [_decode(member) for member in r.zrange(_ids_key(view), 0, -1)]
+        versions = {}
+        for chunk in _chunks(members, TICKET_VIEW_BUILD_BATCH):
+            pipe = r.pipeline(transaction=False)
+            for member in chunk:
+                pipe.hget(_ticket_key(member), "v")
+            versions.update(zip(chunk, (_decode(v) or "-1" for v in pipe.execute())))
+
+        added = 0
+        statement = (select(Ticket.id, Ticket.version, Ticket.created_at)
+                     .where(_filter_clause(filters))
+                     .execution_options(yield_per=TICKET_VIEW_BUILD_BATCH))
+        for index in range(len(shards)):
+            with shards.session(index) as db:
+                for batch in db.execute(statement).partitions():
+                    args = [view, TICKET_VIEW_EVENTS_MAXLEN, int(events)]
+                    for ticket_id, version, created_at in batch:
+                        versions.pop(str(ticket_id), None)
+                        args += [ticket_id, version, _score(created_at)]
+                    result = _populate_view(keys=[ACTIVE_KEY], args=args)
+                    if result == -1:
+                        raise ViewNotFound(f"View {view_id} not found")
+                    added += result
+
+        removed = 0
+        stale = list(versions.items())
+        for chunk in _chunks(stale, TICKET_VIEW_BUILD_BATCH):
+            args = [view, TICKET_VIEW_EVENTS_MAXLEN, TICKET_VIEW_VERSION_TTL]
+            for member, version in chunk:
+                args += [member, version]
+            removed += _prune_view(args=args)
+        logger.info(f"Vista {view_id} materializada: {added} añadidos, {removed} quitados")
+        return {"added": added, "removed": removed}
+
+    @staticmethod
+    def exists(view_id: int):
+        return bool(r.sismember(ACTIVE_KEY, view_id))
+
+    def page(self, view_id: int, offset: int = 0, limit: int = 50):
+        """
+        Página de resultados de una vista, del ticket más reciente al más antiguo, en una
+        sola transacción de Redis.
+
+        Args:
+        - view_id (int): Identificador de la vista.
+        - offset (int): Tickets que se saltan.
+        - limit (int): Número máximo de tickets de la página.
+
+        Returns:
+        - dict: total, ids y cursor (último evento de la vista incluido en la página), o
+          None si la vista no existe.
+        """
+        pipe = r.pipeline()
+        pipe.sismember(ACTIVE_KEY, view_id)
+        pipe.zrevrange(_ids_key(view_id), offset, offset + limit - 1)
+        pipe.zcard(_ids_key(view_id))
+        pipe.xrevrange(_events_key(view_id), count=1)
+        exists, ids, total, last = pipe.execute()
+        if not exists:
+            return None
+        return {"total": total, "ids": [int(ticket_id) for ticket_id in ids],
+                "cursor": _decode(last[0][0]) if last else "0-0"}
+
+    def stats(self):
+        return {"enabled": self.enabled, "views": len(self.views), "applied": self.applied,
+                "events": self.events, "reloads": self.reloads, "errors": self.errors}
+
+
+ticket_views = TicketViews()
+
+
+def _bump_generation(view_id: int, active: bool):
+    pipe = r.pipeline()
+    if active:
+        pipe.sadd(ACTIVE_KEY, view_id)
+    else:
+        pipe.srem(ACTIVE_KEY, view_id)
+        pipe.delete(_ids_key(view_id), _events_key(view_id))
+    pipe.incr(GENERATION_KEY)
+    pipe.execute()
+    ticket_views.invalidate()
+
+
+def _view_row(view: SavedView):
+    return {"id": view.id, "name": view.name, "owner_id": view.owner_id,
+            "filters": view.filters, "created_at": view.created_at}
+
+
+def create_view(db: Session, view: SavedViewCreate):
+    """
+    Crea una vista guardada y materializa sus resultados.
+
+    Args:
+    - db (Session): Sesión de la base de datos principal.
+    - view (SavedViewCreate): Nombre, propietario y filtro de la vista.
+
+    Raises:
+    - InvalidViewFilter: Si el filtro no es válido.
+    - ViewNotFound: Si la vista se borra mientras se materializa.
+
+    Returns:
+    - dict: Los campos de SavedViewBase de la vista creada.
+    """
+    db_view = SavedView(name=view.name, owner_id=view.owner_id,
+                        filters=normalize_filters(db, view.filters))
+    db.add(db_view)
+    db.commit()
+    db.refresh(db_view)
+    # Desde aquí las escrituras ya evalúan la vista; build rellena los tickets anteriores
+    _bump_generation(db_view.id, active=True)
+    ticket_views.build(db_view.id, db_view.filters, events=False)
+    return _view_row(db_view)
+
+
+def get_view(db: Session, view_id: int):
+    """
+    Obtiene una vista guardada por su ID.
+
+    Returns:
+    - dict: Los campos de SavedViewBase de la vista, o None si no existe.
+    """
+    db_view = db.get(SavedView, view_id)
+    return _view_row(db_view) if db_view else None
+
+
+def list_views(db: Session, owner_id: int = None):
+    """
+    Lista las vistas guardadas, de un propietario si se indica.
+
+    Returns:
+    - list: Las vistas como diccionarios de SavedViewBase.
+    """
+    query = select(SavedView).order_by(SavedView.id)
+    if owner_id is not None:
+        query = query.where(SavedView.owner_id == owner_id)
+    return [_view_row(view) for view in db.execute(query).scalars()]
+
+
+def delete_view(db: Session, view_id: int):
+    """
+    Borra una vista guardada con sus resultados y su stream de eventos.
+
+    Returns:
+    - bool: True si la vista existía.
+    """
+    db_view = db.get(SavedView, view_id)
+    if db_view is None:
+        return False
+    db.delete(db_view)
+    db.commit()
+    _bump_generation(view_id, active=False)
+    return True
+
+
+def rebuild_view(db: Session, view_id: int):
+    """
+    Vuelve a materializar una vista (tras un rebalanceo de shards o una caída de Redis).
+
+    Returns:
+    - dict: Tickets añadidos y quitados, o None si la vista no existe.
+    """
+    db_view = db.get(SavedView, view_id)
+    if db_view is None:
+        return None
+    r.sadd(ACTIVE_KEY, view_id)
+    try:
+        return ticket_views.build(view_id, db_view.filters)
+    except ViewNotFound:
+        # Borrada mientras se materializaba
+        return None
+
+
+async def view_events(view_id: int, after: str = "$"):
+    """
+    Eventos de una vista en formato Server-Sent Events: cada cambio (add, upd o del) con
+    el id y la versión del ticket, y un comentario de latido si no hay cambios.
+
+    Args:
+    - view_id (int): Identificador de la vista.
+    - after (str): Último evento recibido (Last-Event-ID o el cursor de una página); "$"
+      para recibir solo los nuevos.
+
+    Yields:
+    - bytes: Mensajes SSE.
+    """
+    client = aioredis.from_url(REDIS_URL)
+    key = _events_key(view_id)
+    try:
+        if after == "$":
+            # Se fija la posición una vez: con "$" en cada lectura se perderían los eventos
+            # publicados entre dos lecturas
+            last = await client.xrevrange(key, count=1)
+            after = _decode(last[0][0]) if last else "0-0"
+        while True:
+            response = await client.xread({key: after}, count=500, block=TICKET_VIEW_EVENTS_BLOCK_MS)
+            if not response:
+                yield b": ping\n\n"
+                continue
+            messages = []
+            for entry_id, fields in response[0][1]:
+                after = _decode(entry_id)
+                fields = {_decode(name): _decode(value) for name, value in fields.items()}
+                data = {"id": int(fields["id"])}
+                if "v" in fields:
+                    data["version"] = int(fields["v"])
+                messages.append(b"id: %s\nevent: %s\ndata: %s\n\n" % (
+                    after.encode(), fields["op"].encode(), orjson.dumps(data)))
+            yield b"".join(messages)
+    finally:
+        await client.aclose()
+
+
+def rebuild_all():
+    """
+    Vuelve a materializar todas las vistas.
+    """
+    with SessionLocal() as db:
+        view_ids = db.execute(select(SavedView.id).order_by(SavedView.id)).scalars().all()
+        for view_id in view_ids:
+            started = time.perf_counter()
+            result = rebuild_view(db, view_id)
+            print(f"Vista {view_id}: {result} en {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python -m services.ticket_service.services.view_service",
+        description="Vuelve a materializar las vistas guardadas (p. ej. tras un rebalanceo)")
+    parser.parse_args()
+    rebuild_all()
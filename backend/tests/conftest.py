@@ -0,0 +1,50 @@
+import os
+import tempfile
+
+import pytest
+
+# ddbb lee la configuración al importarse: las pruebas fijan antes el entorno, con bases de
+# datos SQLite locales como primario y shard adicional. Redis no se conecta (el cliente no
+# conecta hasta el primer comando): las pruebas que lo necesitan usan el fixture fake_redis
+DATA_DIR = tempfile.mkdtemp(prefix="ticket-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{DATA_DIR}/shard0.db"
+os.environ["DATABASE_SHARD_URLS"] = f"sqlite:///{DATA_DIR}/shard1.db"
+os.environ["DATABASE_REPLICA_URLS"] = ""
+os.environ["ATTACHMENT_ROOT"] = f"{DATA_DIR}/attachments"
+os.environ["REDIS_URL"] = "redis://localhost:6379/15"
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """
+    Redis en memoria (fakeredis, con lupa para los scripts Lua) detrás del cliente compartido
+    de ddbb.redis.db_redis, vacío en cada prueba.
+    """
+    fakeredis = pytest.importorskip("fakeredis")
+    from ddbb.redis.db_redis import r
+    client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+    monkeypatch.setattr(r, "connection_pool", client.connection_pool)
+    return r
+
+
+@pytest.fixture(scope="session")
+def client():
+    """
+    Servicio de tickets sobre los dos shards SQLite, con los estados de ticket creados. Las
+    rutas que se prueban con él no usan Redis.
+    """
+    from fastapi.testclient import TestClient
+    from ddbb.database.db_postgres import SessionLocal, engine
+    from ddbb.database.models import TicketStatus
+    from ddbb.database.models.base import Base
+    from ddbb.database.sharding import shards
+    from services.ticket_service.app.main import app
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        for status_id, name in enumerate(("open", "in_progress", "closed"), start=1):
+            db.merge(TicketStatus(id=status_id, name=name))
+        db.commit()
+    # Copia los estados a los shards adicionales
+    shards.prepare()
+    return TestClient(app, follow_redirects=False)
@@ -0,0 +1,105 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, update
+
+from ddbb.database.models import Attachment, AttachmentArchive, Comment, CommentArchive, Ticket, TicketArchive
+from ddbb.database.sharding import shards
+from ddbb.redis.leader import LeaderLock
+from services.ticket_service.services.archive_service import archive_all, archive_closed_tickets, restore_ticket
+
+
+def _closed_ticket(index, created_at=datetime(2024, 3, 5)):
+    with shards.session(index) as db:
+        ticket = Ticket(title="Portátil", description="No arranca", user_id=3, status_id=3)
+        db.add(ticket)
+        db.flush()
+        db.add(Comment(content="Reiniciado", ticket_id=ticket.id, user_id=3))
+        db.add(Attachment(ticket_id=ticket.id, filename="foto.jpg", content_type="image/jpeg",
+                          size=10, sha256="1" * 64))
+        db.flush()
+        db.execute(update(Ticket).where(Ticket.id == ticket.id).values(
+            created_at=created_at, updated_at=datetime.now() - timedelta(days=1)))
+        db.commit()
+        return ticket.id
+
+
+def _rows(db, ticket_id):
+    return {
+        "ticket": db.execute(select(Ticket.__table__).where(Ticket.id == ticket_id)).mappings().all(),
+        "comments": db.execute(select(Comment.__table__).where(Comment.ticket_id == ticket_id)).mappings().all(),
+        "attachments": db.execute(select(Attachment.__table__).where(
+            Attachment.ticket_id == ticket_id)).mappings().all(),
+    }
+
+
+@pytest.mark.parametrize("index,created_at", [(0, datetime(2024, 3, 5)), (1, None)])
+def test_archive_and_restore_round_trip(client, fake_redis, index, created_at):
+    ticket_id = _closed_ticket(index, created_at)
+    with shards.session(index) as db:
+        before = _rows(db, ticket_id)
+        assert archive_closed_tickets(db, datetime.now()) >= 1
+        assert _rows(db, ticket_id) == {"ticket": [], "comments": [], "attachments": []}
+        archived = db.execute(select(TicketArchive).where(TicketArchive.id == ticket_id)).scalar_one()
+        # La clave de partición no puede ser nula: se guarda la fecha del archivado
+        assert archived.created_at_missing is (created_at is None)
+        assert archived.created_at is not None
+        assert db.execute(select(CommentArchive.id).where(CommentArchive.ticket_id == ticket_id)).first()
+        assert db.execute(select(AttachmentArchive.id).where(AttachmentArchive.ticket_id == ticket_id)).first()
+
+        assert restore_ticket(db, ticket_id)
+        db.commit()
+        assert _rows(db, ticket_id) == before
+        assert db.execute(select(TicketArchive).where(TicketArchive.id == ticket_id)).first() is None
+        assert restore_ticket(db, ticket_id) is False
+
+
+def test_archived_ticket_is_still_readable(client, fake_redis):
+    ticket_id = _closed_ticket(1)
+    with shards.session(1) as db:
+        archive_closed_tickets(db, datetime.now())
+    assert client.get(f"/tickets/{ticket_id}").json()["title"] == "Portátil"
+    assert len(client.get(f"/tickets/{ticket_id}/comments/export").text.splitlines()) == 1
+
+
+def test_archive_all_stops_when_asked(client, fake_redis):
+    _closed_ticket(0)
+    stop = threading.Event()
+    stop.set()
+    assert archive_all(datetime.now(), stop) == 0
+
+
+def _leader_lock(ttl):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer())
+    return client, LeaderLock(client, "test_archiver", ttl)
+
+
+def test_leader_lock_is_renewed_while_the_pass_runs():
+    async def scenario():
+        client, lock = _leader_lock(ttl=0.3)
+        assert await lock.acquire_or_renew()
+
+        def long_pass(lost):
+            time.sleep(1)
+            return lost.is_set()
+        # La pasada dura más que el ttl: sin renovar, el lock caducaría a mitad
+        assert await lock.run_renewing(long_pass) is False
+        assert await client.get(lock.key) == lock.token.encode()
+    asyncio.run(scenario())
+
+
+def test_lost_leadership_stops_the_pass():
+    async def scenario():
+        client, lock = _leader_lock(ttl=0.3)
+        assert await lock.acquire_or_renew()
+        await client.set(lock.key, "otra réplica")
+
+        def long_pass(lost):
+            return lost.wait(2)
+        assert await lock.run_renewing(long_pass) is True
+        assert lock.is_leader is False
+    asyncio.run(scenario())
@@ -0,0 +1,75 @@
+from services.ticket_service.services.assignment_service import (
+    ALL_AGENTS, AssignmentEngine, LoadIndex)
+
+
+def test_least_loaded_agent_and_rotation_on_ties():
+    index = LoadIndex()
+    for agent_id, count in ((1, 3), (2, 1), (3, 1)):
+        index.set(agent_id, count)
+    # Los empates se reparten por turno
+    assert [index.least() for _ in range(3)] == [2, 3, 2]
+    assert index.min_count == 1
+
+    index.change(2, 1)
+    index.change(3, 5)
+    assert index.least() == 2
+    assert index.counts == {1: 3, 2: 2, 3: 6}
+
+
+def test_min_count_follows_changes_and_removals():
+    index = LoadIndex()
+    index.set(1, 0)
+    index.set(2, 4)
+    index.change(1, 5)
+    assert (index.min_count, index.least()) == (4, 2)
+
+    index.remove(2)
+    assert (index.min_count, index.least()) == (5, 1)
+    index.remove(1)
+    assert index.least() is None and len(index) == 0
+
+
+def test_counts_never_go_below_zero():
+    index = LoadIndex()
+    index.set(1, 0)
+    index.change(1, -1)
+    index.set(2, -3)
+    assert index.counts == {1: 0, 2: 0}
+    # Un agente que no está en el índice se ignora
+    index.change(9, 1)
+    assert 9 not in index.counts
+
+
+def _engine(strategy="least_open"):
+    engine = AssignmentEngine(strategy)
+    engine.teams = {1: "agent", 2: "agent", 3: "support"}
+    engine.indexes = {ALL_AGENTS: LoadIndex(), "agent": LoadIndex(), "support": LoadIndex()}
+    for agent_id, team in engine.teams.items():
+        for name in (ALL_AGENTS, team):
+            engine.indexes[name].set(agent_id, 0)
+    engine._rotation = {name: list(index.counts) for name, index in engine.indexes.items()}
+    engine._rebuilt_at = engine._synced_at = float("inf")
+    return engine
+
+
+def test_assignments_update_counts_incrementally(fake_redis):
+    engine = _engine()
+    assert [engine.assign() for _ in range(3)] == [1, 2, 3]
+    assert engine.assign(team="support") == 3
+    assert engine.indexes[ALL_AGENTS].counts == {1: 1, 2: 1, 3: 2}
+
+    # Cerrar un ticket lo descuenta, reabrirlo lo vuelve a contar
+    engine.status_changed(1, "open", "closed")
+    assert engine.assign() == 1
+    engine.status_changed(2, "in_progress", "open")
+    assert engine.indexes["agent"].counts == {1: 1, 2: 1}
+    # Los cambios se replican en Redis para las demás réplicas
+    assert fake_redis.hgetall("assignment:open_tickets") == {b"1": b"1", b"2": b"1", b"3": b"2"}
+
+
+def test_invalidate_schedules_a_rebuild_on_sync(fake_redis):
+    engine = _engine()
+    engine.invalidate()
+    engine._sync()
+    assert engine._rebuilt_at == 0.0
+    assert fake_redis.get("assignment:stale") is None
@@ -0,0 +1,52 @@
+import pytest
+from fastapi import HTTPException
+
+from services.ticket_service.api.attachment import _byte_range
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-3", (0, 3)),
+    ("bytes=4-", (4, 9)),
+    ("bytes=-3", (7, 9)),
+    ("bytes=-20", (0, 9)),
+    ("bytes=5-100", (5, 9)),
+    # Sin cabecera, con varios rangos o con una cabecera no válida se sirve el blob completo
+    (None, None),
+    ("bytes=0-1,4-5", None),
+    ("items=0-3", None),
+    ("bytes=5-2", None),
+    ("bytes=-", None),
+    ("bytes=a-3", None),
+])
+def test_byte_range(header, expected):
+    assert _byte_range(header, 10) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=10-", "bytes=12-20"])
+def test_byte_range_past_the_end_is_not_satisfiable(header):
+    with pytest.raises(HTTPException) as error:
+        _byte_range(header, 10)
+    assert error.value.status_code == 416
+    assert error.value.headers["Content-Range"] == "bytes */10"
+
+
+def test_download_serves_ranges(client):
+    ticket_id = client.post("/tickets/", json={"title": "Adjuntos", "description": "Rango",
+                                               "user_id": 1, "status_id": 1}).json()["id"]
+    response = client.post(f"/tickets/{ticket_id}/attachments/?filename=log.txt",
+                           content=b"0123456789", headers={"Content-Type": "text/plain"})
+    assert response.status_code == 201
+    url = f"/tickets/{ticket_id}/attachments/{response.json()['id']}"
+
+    response = client.get(url)
+    assert (response.status_code, response.content) == (200, b"0123456789")
+    etag = response.headers["etag"]
+
+    response = client.get(url, headers={"Range": "bytes=2-4"})
+    assert (response.status_code, response.content) == (206, b"234")
+    assert response.headers["content-range"] == "bytes 2-4/10"
+    assert client.get(url, headers={"Range": "bytes=-2"}).content == b"89"
+    assert client.get(url, headers={"Range": "bytes=10-"}).status_code == 416
+    # Con If-Range de otra versión del blob se sirve entero
+    assert client.get(url, headers={"Range": "bytes=2-4", "If-Range": etag}).status_code == 206
+    assert client.get(url, headers={"Range": "bytes=2-4", "If-Range": '"otro"'}).status_code == 200
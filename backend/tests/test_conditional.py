@@ -0,0 +1,61 @@
+from ddbb.database.models import Comment, Ticket
+from ddbb.database.sharding import shards
+
+
+def _ticket(index=1):
+    with shards.session(index) as db:
+        ticket = Ticket(title="Teclado", description="Teclas pegadas", user_id=9, status_id=1)
+        db.add(ticket)
+        db.flush()
+        comment = Comment(content="Limpiado", ticket_id=ticket.id, user_id=9)
+        db.add(comment)
+        db.commit()
+        return ticket.id, comment.id
+
+
+def test_get_returns_etag_and_304_when_unchanged(client):
+    ticket_id, _ = _ticket()
+    response = client.get(f"/tickets/{ticket_id}")
+    etag = response.headers["etag"]
+    assert etag == '"1"'
+
+    assert client.get(f"/tickets/{ticket_id}", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(f"/tickets/{ticket_id}", headers={"If-None-Match": 'W/"1", "7"'}).status_code == 304
+    assert client.get(f"/tickets/{ticket_id}", headers={"If-None-Match": '"7"'}).status_code == 200
+
+
+def test_patch_with_stale_if_match_is_rejected(client, fake_redis):
+    ticket_id, _ = _ticket()
+    response = client.patch(f"/tickets/{ticket_id}", json={"title": "Teclado nuevo"},
+                            headers={"If-Match": '"1"'})
+    assert response.status_code == 200
+    assert response.headers["etag"] == '"2"'
+
+    # Otro cliente con la versión anterior no pisa el cambio
+    response = client.patch(f"/tickets/{ticket_id}", json={"title": "Otro título"},
+                            headers={"If-Match": '"1"'})
+    assert response.status_code == 412
+    assert client.get(f"/tickets/{ticket_id}").json()["title"] == "Teclado nuevo"
+
+    # Sin If-Match (o con "*") la actualización no se condiciona
+    assert client.patch(f"/tickets/{ticket_id}", json={"title": "Sin condición"}).status_code == 200
+    assert client.patch(f"/tickets/{ticket_id}", json={"title": "x"},
+                        headers={"If-Match": "no es un etag"}).status_code == 400
+
+
+def test_patch_comment_with_stale_if_match_is_rejected(client):
+    _, comment_id = _ticket()
+    response = client.patch(f"/tickets/comments/{comment_id}", json={"content": "Cambiado"},
+                            headers={"If-Match": '"1"'})
+    assert (response.status_code, response.headers["etag"]) == (200, '"2"')
+    assert client.patch(f"/tickets/comments/{comment_id}", json={"content": "Tarde"},
+                        headers={"If-Match": '"1"'}).status_code == 412
+
+
+def test_invalid_updates_are_client_errors(client, fake_redis):
+    ticket_id, _ = _ticket()
+    assert client.patch(f"/tickets/{ticket_id}", json={"status": "Nope"}).status_code == 422
+    response = client.patch(f"/tickets/{ticket_id}", json={"title": None})
+    assert response.status_code == 422
+    assert "constraint" in response.json()["detail"]
+    assert client.get(f"/tickets/{ticket_id}").headers["etag"] == '"1"'
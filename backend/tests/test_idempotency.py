@@ -0,0 +1,75 @@
+import orjson
+import pytest
+from fastapi import HTTPException
+from pydantic import BaseModel
+from starlette.requests import Request
+
+from ddbb.redis import idempotency
+from services.ticket_service.api.idempotency import idempotent_response
+
+
+class Payload(BaseModel):
+    title: str
+
+
+def _request(authorization=None):
+    headers = [(b"authorization", authorization.encode())] if authorization else []
+    return Request({"type": "http", "method": "POST", "headers": headers})
+
+
+@pytest.fixture
+def creations(fake_redis):
+    calls = []
+
+    def create():
+        calls.append(1)
+        return Payload(title=f"ticket {len(calls)}")
+    return calls, create
+
+
+def test_retry_replays_the_first_response(creations):
+    calls, create = creations
+    first = idempotent_response("k1", "POST /tickets/", Payload(title="a"), create, _request("Bearer x"))
+    retry = idempotent_response("k1", "POST /tickets/", Payload(title="a"), create, _request("Bearer x"))
+    assert calls == [1]
+    assert retry.body == first.body == orjson.dumps({"title": "ticket 1"})
+    assert "idempotent-replayed" not in first.headers
+    assert retry.headers["idempotent-replayed"] == "true"
+
+
+def test_key_reused_with_another_body_is_rejected(creations):
+    calls, create = creations
+    idempotent_response("k1", "POST /tickets/", Payload(title="a"), create, _request("Bearer x"))
+    with pytest.raises(HTTPException) as error:
+        idempotent_response("k1", "POST /tickets/", Payload(title="b"), create, _request("Bearer x"))
+    assert error.value.status_code == 422
+    assert calls == [1]
+
+
+def test_keys_are_scoped_by_credential(creations, fake_redis):
+    calls, create = creations
+    idempotent_response("k1", "POST /tickets/", Payload(title="a"), create, _request("Bearer x"))
+    # Otro token con la misma clave (aunque dijera ser el mismo usuario) no recibe la respuesta
+    other = idempotent_response("k1", "POST /tickets/", Payload(title="a"), create, _request("Bearer y"))
+    assert calls == [1, 1]
+    assert "idempotent-replayed" not in other.headers
+    assert not any(b"Bearer" in key for key in fake_redis.keys("idempotency:*"))
+
+
+def test_concurrent_duplicate_gets_conflict(creations, fake_redis, monkeypatch):
+    calls, create = creations
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_WAIT_SECONDS", 0.1)
+    # Otra petición con la misma clave tiene el lock y no termina
+    scope_key = "idempotency:POST /tickets/:anonymous:k1"
+    fake_redis.set(f"{scope_key}:lock", "otro")
+    with pytest.raises(HTTPException) as error:
+        idempotent_response("k1", "POST /tickets/", Payload(title="a"), create, _request())
+    assert error.value.status_code == 409
+    assert calls == []
+
+
+def test_without_key_always_creates(creations):
+    calls, create = creations
+    idempotent_response(None, "POST /tickets/", Payload(title="a"), create, _request())
+    idempotent_response(None, "POST /tickets/", Payload(title="a"), create, _request())
+    assert calls == [1, 1]
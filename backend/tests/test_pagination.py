@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from ddbb.database.models import Comment, Ticket
+from ddbb.database.sharding import shards
+
+
+def _ticket(index, user_id, created_at):
+    with shards.session(index) as db:
+        ticket = Ticket(title="Pantalla", description="Parpadea", user_id=user_id, status_id=1)
+        db.add(ticket)
+        db.flush()
+        # created_at tiene valor por defecto: las filas antiguas sin fecha se simulan con un UPDATE
+        db.execute(update(Ticket).where(Ticket.id == ticket.id).values(created_at=created_at))
+        db.commit()
+        return ticket.id
+
+
+def _pages(client, url, limit, **params):
+    items, cursor = [], None
+    while True:
+        params = {**params, "limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.get(url, params=params)
+        assert response.status_code == 200
+        items += response.json()
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            return items
+
+
+def test_ticket_pages_include_rows_without_created_at(client):
+    start = datetime(2024, 1, 1)
+    dated = [_ticket(index % 2, 501, start + timedelta(days=index)) for index in range(3)]
+    undated = sorted(_ticket(index % 2, 501, None) for index in range(3))
+
+    ids = [ticket["id"] for ticket in _pages(client, "/tickets/", limit=2, user_id=501)]
+    # Más recientes primero y, al final, los que no tienen fecha, sin repetir ni saltar ninguno
+    assert ids[:3] == dated[::-1]
+    assert sorted(ids[3:]) == undated
+    assert len(ids) == len(set(ids)) == 6
+
+
+def test_comment_pages_include_rows_without_created_at(client):
+    ticket_id = _ticket(1, 502, datetime(2024, 1, 1))
+    with shards.session(1) as db:
+        comments = [Comment(content=f"Comentario {index}", ticket_id=ticket_id, user_id=502)
+                    for index in range(5)]
+        db.add_all(comments)
+        db.flush()
+        db.execute(update(Comment).where(Comment.id.in_([comments[1].id, comments[3].id]))
+                   .values(created_at=None))
+        db.commit()
+        ids = [comment.id for comment in comments]
+
+    paged = [comment["id"] for comment in _pages(client, f"/tickets/{ticket_id}/comments/", limit=2)]
+    assert paged == [ids[0], ids[2], ids[4], ids[1], ids[3]]
+
+    lines = client.get(f"/tickets/{ticket_id}/comments/export").text.splitlines()
+    assert len(lines) == 5
+
+
+def test_comment_export_of_unknown_ticket_is_not_found(client):
+    missing = shards.id_range(1)[0] + 999998
+    assert client.get(f"/tickets/{missing}/comments/export").status_code == 404
+
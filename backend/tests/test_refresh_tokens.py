@@ -0,0 +1,66 @@
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+from redis.exceptions import ConnectionError
+
+from services.auth_service.app.config import JWT_ALGORITHM, JWT_SECRET_KEY
+from services.auth_service.services import refresh_service
+from services.auth_service.services.auth_service import refresh_access_token
+from services.auth_service.services.refresh_service import (
+    issue_refresh_token, revoke_refresh_token, revoke_user_sessions, rotate_refresh_token)
+
+
+def _rejected(token):
+    with pytest.raises(HTTPException) as error:
+        rotate_refresh_token(token)
+    return error.value.status_code == 401
+
+
+def test_rotation_issues_a_new_token_and_consumes_the_old_one(fake_redis):
+    first = issue_refresh_token("ana@example.com")
+    sub, second = rotate_refresh_token(first)
+    assert sub == "ana@example.com" and second != first
+    # Solo se guarda el hash del token
+    assert not any(first.encode() in key or second.encode() in key for key in fake_redis.keys())
+
+    assert rotate_refresh_token(second)[0] == "ana@example.com"
+    assert _rejected("no-existe")
+
+
+def test_reused_token_revokes_the_whole_session(fake_redis):
+    stolen = issue_refresh_token("ana@example.com")
+    _, current = rotate_refresh_token(stolen)
+    other_session = issue_refresh_token("ana@example.com")
+
+    # El token ya rotado vuelve a presentarse: se revoca también el vigente de esa sesión
+    assert _rejected(stolen)
+    assert _rejected(current)
+    # Las demás sesiones del usuario siguen activas
+    assert rotate_refresh_token(other_session)[0] == "ana@example.com"
+
+
+def test_logout_and_logout_all(fake_redis):
+    session = issue_refresh_token("ana@example.com")
+    assert revoke_refresh_token(session) == "ana@example.com"
+    assert _rejected(session)
+    assert revoke_refresh_token(session) is None
+
+    sessions = [issue_refresh_token("ana@example.com") for _ in range(2)]
+    revoke_user_sessions("ana@example.com")
+    assert all(_rejected(token) for token in sessions)
+
+
+def test_refresh_access_token(fake_redis):
+    token = refresh_access_token(issue_refresh_token("ana@example.com"))
+    claims = jwt.decode(token.access_token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+    assert claims["sub"] == "ana@example.com"
+    assert token.refresh_token
+
+
+def test_refresh_without_redis_is_unavailable(monkeypatch):
+    def down(*args, **kwargs):
+        raise ConnectionError("Redis caído")
+    monkeypatch.setattr(refresh_service, "_rotate", down)
+    with pytest.raises(HTTPException) as error:
+        refresh_access_token("token")
+    assert error.value.status_code == 503
@@ -0,0 +1,196 @@
+import base64
+import json
+import threading
+import time
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, insert, select
+from starlette.requests import Request
+
+from ddbb.database import db_postgres
+from ddbb.database.db_postgres import ReplicaPool, engine, get_db, get_primary_db
+from ddbb.redis.cache import TTLCache
+from ddbb.resources import ResourceManager
+
+marker = Table("routing_marker", MetaData(),
+               Column("id", Integer, primary_key=True),
+               Column("source", String))
+
+
+def _token(subject, issued_at=0):
+    def encode(data):
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+    return f"Bearer {encode({'alg': 'HS256'})}.{encode({'sub': subject, 'iat': issued_at})}.firma"
+
+
+def _request(method="GET", authorization=None, host="10.0.0.1", client_id=None):
+    headers = [(b"authorization", authorization.encode())] if authorization else []
+    if client_id:
+        headers.append((b"x-client-id", client_id.encode()))
+    return Request({"type": "http", "method": method, "headers": headers, "client": (host, 1234)})
+
+
+def _session(dependency, request):
+    generator = dependency(request)
+    db = next(generator)
+    return db, generator
+
+
+def _source(dependency, request):
+    db, generator = _session(dependency, request)
+    try:
+        return db.execute(select(marker.c.source)).scalar()
+    finally:
+        generator.close()
+
+
+@pytest.fixture
+def replica(monkeypatch, tmp_path):
+    """
+    Réplica de prueba: otra base de datos SQLite con la misma tabla, para saber de dónde
+    viene cada lectura.
+    """
+    pool = ReplicaPool([f"sqlite:///{tmp_path / 'replica.db'}"], eject_seconds=0, max_lag=5, probe_seconds=3600)
+    for target, source in ((engine, "primary"), (pool.engines[0], "replica")):
+        marker.drop(target, checkfirst=True)
+        marker.create(target)
+        with target.begin() as connection:
+            connection.execute(insert(marker).values(source=source))
+    # El sondeo periódico no se lanza en las pruebas; cada una sondea cuando lo necesita
+    pool._next_probe = float("inf")
+    monkeypatch.setattr(db_postgres, "replicas", pool)
+    monkeypatch.setattr(db_postgres, "_sticky_clients", TTLCache(100, 60))
+    yield pool
+    pool.engines[0].dispose()
+
+
+def test_get_reads_from_replica(replica):
+    assert _source(get_db, _request("GET")) == "replica"
+    assert _source(get_db, _request("POST")) == "primary"
+    assert _source(get_primary_db, _request("GET")) == "primary"
+
+
+def test_read_your_writes_after_write(replica):
+    writer = _token(7, issued_at=1)
+    db, generator = _session(get_db, _request("POST", writer))
+    db.execute(insert(marker).values(source="primary"))
+    db.commit()
+    generator.close()
+
+    # El mismo usuario, aunque con otro token, lee del primario durante la ventana
+    assert _source(get_db, _request("GET", _token(7, issued_at=2))) == "primary"
+    # Los demás usuarios siguen leyendo de la réplica
+    assert _source(get_db, _request("GET", _token(8))) == "replica"
+
+
+def test_read_your_writes_window_expires(replica, monkeypatch):
+    monkeypatch.setattr(db_postgres, "_sticky_clients", TTLCache(100, 0))
+    db, generator = _session(get_db, _request("POST", _token(7)))
+    db.execute(insert(marker).values(source="primary"))
+    db.commit()
+    generator.close()
+    assert _source(get_db, _request("GET", _token(7))) == "replica"
+
+
+def test_sticky_clients_are_bounded_and_hashed(replica, monkeypatch):
+    monkeypatch.setattr(db_postgres, "_sticky_clients", TTLCache(2, 60))
+    for subject in (1, 2, 3):
+        db, generator = _session(get_db, _request("POST", _token(subject)))
+        db.execute(insert(marker).values(source="primary"))
+        db.commit()
+        generator.close()
+    # Solo se recuerdan los dos últimos clientes, y nunca el token
+    assert _source(get_db, _request("GET", _token(1))) == "replica"
+    assert _source(get_db, _request("GET", _token(3))) == "primary"
+    assert all("Bearer" not in key for key in db_postgres._sticky_clients._data)
+
+
+def _write(request):
+    db, generator = _session(get_db, request)
+    db.execute(insert(marker).values(source="primary"))
+    db.commit()
+    generator.close()
+
+
+def test_anonymous_writes_do_not_pin_other_clients(replica):
+    # Detrás del gateway todas las peticiones comparten IP: sin identificador no hay ventana
+    _write(_request("POST", host="10.0.0.9"))
+    assert _source(get_db, _request("GET", host="10.0.0.9")) == "replica"
+
+
+def test_read_your_writes_with_client_id(replica):
+    _write(_request("POST", client_id="a"))
+    assert _source(get_db, _request("GET", client_id="a")) == "primary"
+    assert _source(get_db, _request("GET", client_id="b")) == "replica"
+
+
+def test_lagging_replica_falls_back_to_primary(replica, monkeypatch):
+    monkeypatch.setattr(ReplicaPool, "_measure_lag", staticmethod(lambda connection: 30.0))
+    replica.probe_all()
+    assert replica.lag[replica.engines[0]] == 30.0
+    assert _source(get_db, _request("GET")) == "primary"
+
+    # Cuando se pone al día vuelve a recibir lecturas
+    monkeypatch.setattr(ReplicaPool, "_measure_lag", staticmethod(lambda connection: 0.5))
+    replica.probe_all()
+    assert _source(get_db, _request("GET")) == "replica"
+
+
+def test_ejected_replica_falls_back_until_probed(replica):
+    replica.eject(replica.engines[0])
+    assert replica.choose() is None
+    assert _source(get_db, _request("GET")) == "primary"
+
+    # Elegir réplica no la readmite; lo hace el sondeo si responde
+    replica.probe_all()
+    assert _source(get_db, _request("GET")) == "replica"
+
+
+def test_unreachable_replica_stays_ejected(replica, monkeypatch):
+    def fail(connection):
+        raise RuntimeError("réplica caída")
+    monkeypatch.setattr(ReplicaPool, "_measure_lag", staticmethod(fail))
+    status = replica.probe(replica.engines[0])
+    assert status["ok"] is False
+    assert replica.choose() is None
+    assert _source(get_db, _request("GET")) == "primary"
+
+
+def test_probe_runs_in_background_once(replica, monkeypatch):
+    calls = []
+    release = threading.Event()
+
+    def slow_lag(connection):
+        calls.append(1)
+        release.wait(5)
+        return 0.0
+    monkeypatch.setattr(ReplicaPool, "_measure_lag", staticmethod(slow_lag))
+    replica.eject(replica.engines[0])
+    replica._next_probe = 0.0
+    replica.probe_seconds = 0
+
+    # Las peticiones no esperan al sondeo ni lanzan otro mientras está en curso
+    assert replica.choose() is None
+    assert replica.choose() is None
+    release.set()
+    for _ in range(100):
+        if not replica._probing:
+            break
+        time.sleep(0.01)
+    assert calls == [1]
+    assert replica.choose() is replica.engines[0]
+
+
+def test_health_check_respects_the_ejection_window(replica):
+    replica.eject_seconds = 60
+    replica.eject(replica.engines[0])
+    # Mientras dura la expulsión se informa como expulsada, sin sondearla ni readmitirla
+    [status] = ResourceManager._probe_replicas()
+    assert status["ejected"] is True and status["ok"] is False
+    assert 0 < status["ejected_for"] <= 60
+    assert replica.choose() is None
+
+    replica.ejected_until[replica.engines[0]] = time.monotonic() - 1
+    [status] = ResourceManager._probe_replicas()
+    assert (status["ok"], status["ejected"]) == (True, False)
+    assert replica.choose() is replica.engines[0]
@@ -0,0 +1,152 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert, select, text, update
+from sqlalchemy.exc import IntegrityError
+
+from ddbb.database import sharding
+from ddbb.database.models import (
+    ActivityLog, Attachment, AttachmentArchive, Comment, CommentArchive, Ticket, TicketArchive)
+from ddbb.database.sharding import find_moved_ticket, move_ticket, shards
+from services.ticket_service.services.archive_service import archive_closed_tickets, restore_ticket
+
+
+def _create_ticket(index, user_id=1):
+    with shards.session(index) as db:
+        ticket = Ticket(title="Impresora", description="No imprime", user_id=user_id, status_id=1)
+        db.add(ticket)
+        db.flush()
+        db.add(Comment(content="Primer comentario", ticket_id=ticket.id, user_id=user_id))
+        db.add(Attachment(ticket_id=ticket.id, filename="log.txt", content_type="text/plain",
+                          size=3, sha256="0" * 64))
+        db.commit()
+        return ticket.id
+
+
+def test_ids_identify_their_shard(client):
+    shard0, shard1 = _create_ticket(0), _create_ticket(1)
+    assert shards.shard_of(shard0) == 0 < shard0 < shards.id_range(1)[0]
+    assert shards.shard_of(shard1) == 1
+    assert shards.id_range(1)[0] <= shard1 < shards.id_range(1)[1]
+    assert client.get(f"/tickets/{shard1}").json()["id"] == shard1
+
+
+def test_choose_is_stable_per_user():
+    assert shards.choose(42) == shards.choose(42)
+    assert {shards.choose(user_id) for user_id in range(100)} == {0, 1}
+
+
+def test_prepare_is_idempotent_and_keeps_the_counter(client):
+    first = _create_ticket(1)
+    shards.prepare()
+    assert _create_ticket(1) > first
+
+
+@pytest.mark.parametrize("index", [0, 1])
+def test_exhausted_id_range_fails(client, index):
+    start, end = shards.id_range(index)
+    with shards.engines[index].begin() as connection:
+        highest = connection.execute(text("SELECT MAX(id) FROM activity_logs")).scalar()
+        connection.execute(insert(ActivityLog).values(id=end - 1, action="último id del rango"))
+    try:
+        with shards.session(index) as db:
+            # El siguiente id sería el primero del shard siguiente
+            db.add(ActivityLog(action="fuera de rango"))
+            with pytest.raises(IntegrityError, match="agotado"):
+                db.commit()
+    finally:
+        with shards.engines[index].begin() as connection:
+            connection.execute(text("DELETE FROM activity_logs WHERE id = :id"), {"id": end - 1})
+            if index:
+                # Los shards adicionales usan AUTOINCREMENT: se devuelve el contador a su sitio
+                connection.execute(text("UPDATE sqlite_sequence SET seq = :seq WHERE name = 'activity_logs'"),
+                                   {"seq": max(highest or 0, start)})
+
+
+def test_move_ticket_copies_children_and_records_forwarding(client):
+    old_id = _create_ticket(0)
+    new_id = move_ticket(old_id, 1)
+    assert shards.shard_of(new_id) == 1
+    assert find_moved_ticket(old_id) == new_id
+    with shards.session(0) as db:
+        assert db.get(Ticket, old_id) is None
+        assert db.execute(select(Comment).where(Comment.ticket_id == old_id)).first() is None
+    with shards.session(1) as db:
+        assert db.get(Ticket, new_id).title == "Impresora"
+        assert db.execute(select(Comment.content).where(Comment.ticket_id == new_id)).scalar() == "Primer comentario"
+        assert db.execute(select(Attachment.filename).where(Attachment.ticket_id == new_id)).scalar() == "log.txt"
+
+    # Repetir el traslado no duplica el ticket, y un segundo traslado actualiza la redirección
+    assert move_ticket(new_id, 1) == new_id
+    _create_ticket(0)
+    newest = move_ticket(new_id, 0)
+    assert find_moved_ticket(old_id) == find_moved_ticket(new_id) == newest
+    assert move_ticket(shards.id_range(1)[0] + 999999, 0) is None
+
+
+def _attachment_id(index, ticket_id):
+    with shards.session(index) as db:
+        return db.execute(select(Attachment.id).where(Attachment.ticket_id == ticket_id)).scalar()
+
+
+def test_move_archived_ticket_moves_its_archive(client, fake_redis, monkeypatch):
+    moved = []
+    monkeypatch.setattr(sharding, "_move_listeners", [lambda *args: moved.append(args)])
+    old_id = _create_ticket(0)
+    with shards.session(0) as db:
+        db.execute(update(Ticket).where(Ticket.id == old_id).values(
+            status_id=3, updated_at=datetime.now() - timedelta(days=1)))
+        db.commit()
+        assert archive_closed_tickets(db, datetime.now()) >= 1
+
+    new_id = move_ticket(old_id, 1)
+    assert shards.shard_of(new_id) == 1
+    for model, key in ((TicketArchive, TicketArchive.id), (CommentArchive, CommentArchive.ticket_id),
+                       (AttachmentArchive, AttachmentArchive.ticket_id)):
+        with shards.session(0) as db:
+            assert db.execute(select(model).where(key == old_id)).first() is None
+        with shards.session(1) as db:
+            assert db.execute(select(model).where(key == new_id)).first() is not None
+    assert [(old, ticket["id"], archived) for old, ticket, archived in moved] == [(old_id, new_id, True)]
+
+    # Los ids del archivo salen del rango del destino: restaurarlo no choca con nada
+    with shards.session(1) as db:
+        assert restore_ticket(db, new_id)
+        db.commit()
+        assert db.execute(select(Comment.content).where(Comment.ticket_id == new_id)).scalar() == "Primer comentario"
+    assert shards.shard_of(_attachment_id(1, new_id)) == 1
+
+
+def test_moved_ticket_routes_redirect(client):
+    old_id = _create_ticket(0)
+    old_attachment_id = _attachment_id(0, old_id)
+    new_id = move_ticket(old_id, 1)
+
+    response = client.get(f"/tickets/{old_id}?fields=all")
+    assert response.status_code == 301
+    assert response.headers["location"] == f"/tickets/{new_id}?fields=all"
+
+    # Las escrituras se redirigen con 308 para repetir el método y el cuerpo
+    response = client.patch(f"/tickets/{old_id}", json={"title": "Nuevo título"})
+    assert response.status_code == 308
+    assert response.headers["location"] == f"/tickets/{new_id}"
+    assert client.patch(response.headers["location"], json={"title": "Nuevo título"}).status_code == 200
+
+    assert client.get(f"/tickets/{old_id}/comments/").headers["location"] == f"/tickets/{new_id}/comments/"
+    response = client.post(f"/tickets/{old_id}/comments/", json={"content": "Hola"})
+    assert (response.status_code, response.headers["location"]) == (308, f"/tickets/{new_id}/comments/")
+    assert client.get(f"/tickets/{old_id}/attachments/").headers["location"] == f"/tickets/{new_id}/attachments/"
+    response = client.post(f"/tickets/{old_id}/attachments/?filename=a.txt", content=b"abc")
+    assert (response.status_code, response.headers["location"]) == (
+        308, f"/tickets/{new_id}/attachments/?filename=a.txt")
+    # La descarga de un adjunto lleva también a su id nuevo
+    response = client.get(f"/tickets/{old_id}/attachments/{old_attachment_id}")
+    assert (response.status_code, response.headers["location"]) == (
+        301, f"/tickets/{new_id}/attachments/{_attachment_id(1, new_id)}")
+
+
+def test_unknown_ticket_is_not_found(client):
+    missing = shards.id_range(1)[0] + 999999
+    assert client.get(f"/tickets/{missing}").status_code == 404
+    assert client.patch(f"/tickets/{missing}", json={"title": "x"}).status_code == 404
+    assert client.post(f"/tickets/{missing}/comments/", json={"content": "x"}).status_code == 404